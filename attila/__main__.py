@@ -1,17 +1,21 @@
 from signal import signal, SIGTERM, SIGINT
 from getopt import getopt, GetoptError
-import importlib
-import logging
-from sys import argv, exit, stdout
-from typing import Any
+import os
+import sys
+from typing import TYPE_CHECKING, Any, Optional
 from attila.exceptions import (
+    ATCancelledError,
     ATREUninitializedError,
     ATRuntimeError,
     ATScriptNotFound,
     ATScriptSyntaxError,
     ATSerialPortError,
 )
-from attila.atre import ATRuntimeEnvironment
+from attila.atcommand import parse_time
+
+# The parser, the script cache and the logging are loaded once the options are valid
+if TYPE_CHECKING:
+    from attila.cancel import CancelToken
 
 PROGRAM_NAME = "attila"
 
@@ -28,7 +32,7 @@ USAGE = (
   \n\
   \t-p <device path>\tUse this device to communicate\n\
   \t-b <baud rate>\t\tUse the specified baudrate to communicate\n\
-  \t-T <default timeout>\tUse the specified timeout as default to communicate\n\
+  \t-T <default timeout>\tUse the specified timeout as default to communicate (e.g. 5, 0.5, 500ms)\n\
   \t-B <break>\t\tUse the specified line break [CRLF, LF, CR, NONE] (Default: CRLF)\n\
   \t-A <True/False>\t\tAbort on failure (Default: True)\n\
   \t-L <logfile>\t\tEnable log and log to the specified log file (stdout is supported)\n\
@@ -37,9 +41,50 @@ USAGE = (
   \t-D <True/False>\t\tSpecify value for dsrdtr (Default: True)\n\
   \t-v\t\t\tBe more verbose\n\
   \t-q\t\t\tBe quiet (print only PRINT ESKs and ERRORS)\n\
+  \t--output <format>\tOutput format [text, jsonl] (Default: text). jsonl prints a JSON record for each command; other messages are printed on stderr\n\
+  \t--no-cache\t\tDon't use the compiled script cache\n\
   \t-h\t\t\tShow this page\n\
+  \n\
+  %s discover [OPTION]... [PORT]...\n\
+  \n\
+  Find the AT-capable devices (/dev/ttyUSB*, /dev/ttyACM* with no PORT) and print them as JSON\n\
+  \n\
+  \t-b <baud rates>\tComma separated baud rates to try (Default: 115200)\n\
+  \t-t <timeout>\t\tTimeout of the AT handshake in seconds (Default: 0.2)\n\
+  \t-j <workers>\t\tPorts probed at the same time (Default: 8)\n\
+  \t-c <cache file>\tUse the specified cache file\n\
+  \t-r\t\t\tIgnore cached results\n\
+  \n\
+  %s compile [OPTION]... FILE...\n\
+  \n\
+  Parse the ATScripts and store them in the compiled script cache, used by the next runs\n\
+  \n\
+  \t-c <cache dir>\tUse the specified cache directory (Default: $ATTILA_CACHE_DIR or $XDG_CACHE_HOME/attila/scripts)\n\
+  \n\
+  %s daemon [OPTION]... PORT[:BAUD]...\n\
+  \n\
+  Keep the ports open and serve the requests of the clients on a Unix socket (same as --daemon)\n\
+  \n\
+  \t-s <socket>\t\tUse the specified socket (Default: $ATTILA_SOCKET, $XDG_RUNTIME_DIR/attila.sock or /tmp/attila-UID.sock)\n\
+  \t-b <baud rate>\t\tBaud rate of the ports without BAUD (Default: 115200)\n\
+  \t-T <default timeout>\tUse the specified timeout as default to communicate (e.g. 5, 0.5, 500ms)\n\
+  \t-B <break>\t\tUse the specified line break [CRLF, LF, CR, NONE] (Default: CRLF)\n\
+  \t-A <True/False>\t\tAbort on failure (Default: True)\n\
+  \t--no-cache\t\tDon't use the compiled script cache\n\
+  \n\
+  %s client [-s <socket>] [-P <priority>] REQUEST\n\
+  \n\
+  Send a request to the daemon and print the result as JSON. REQUEST is one of\n\
+  \n\
+  \tports\t\t\tList the ports\n\
+  \texec PORT ROW\t\tExecute a command or ESK (ATScript syntax)\n\
+  \trun PORT FILE\t\tRun an ATScript (- reads it from stdin)\n\
+  \tstats [PORT]\t\tGet the statistics of the ports\n\
+  \tsubscribe [PORT]\tPrint the URCs of the ports, one per line\n\
+  \n\
+  \t-P <priority>\t\tPriority of exec and run: the lower, the sooner (0: urgent, 2: normal, 3: background) (Default: 2)\n\
   "
-    % PROGRAM_NAME
+    % (PROGRAM_NAME, PROGRAM_NAME, PROGRAM_NAME, PROGRAM_NAME, PROGRAM_NAME)
 )
 
 LOG_LEVEL_DEBUG = 4
@@ -48,9 +93,13 @@ LOG_LEVEL_WARN = 2
 LOG_LEVEL_ERROR = 1
 LOG_LEVEL_CRITICAL = 0
 
+OUTPUT_TEXT = "text"
+OUTPUT_JSONL = "jsonl"
+
 # Globals
 sigterm_called = False
 interactive_mode = True
+cancel_token: Optional["CancelToken"] = None
 
 
 class _Getch(object):
@@ -71,7 +120,6 @@ class _GetchUnix(object):
         pass
 
     def __call__(self) -> Any:
-        import sys
         import termios
         import tty
 
@@ -87,6 +135,8 @@ class _GetchUnix(object):
 
 class _GetchWindows(object):
     def __init__(self):
+        import importlib.util
+
         if importlib.util.find_spec("msvcrt") is None:
             raise ImportError("msvcrt")
 
@@ -100,12 +150,16 @@ class _GetchWindows(object):
 
 def sigterm_handler(_signo: Any, _stack_frame: Any):
     """
-    Handle sigterm (or sigint) setting sigterm_called to True
+    Handle sigterm (or sigint) setting sigterm_called to True and interrupting the command being executed
     """
+    import logging
+
     global interactive_mode
     global sigterm_called
     logging.warning("SIGTERM called")
     sigterm_called = True
+    if cancel_token:
+        cancel_token.cancel()
     if interactive_mode:
         print("Press ENTER to QUIT")
 
@@ -119,7 +173,7 @@ def opt_error(message: str):
     """
     print(message)
     print(USAGE)
-    exit(1)
+    sys.exit(1)
 
 
 def get_log_level_from_option(log_level_int: int):
@@ -130,6 +184,8 @@ def get_log_level_from_option(log_level_int: int):
     :type int
     :returns logging level
     """
+    import logging
+
     if log_level_int == LOG_LEVEL_DEBUG:
         return logging.DEBUG
     elif log_level_int == LOG_LEVEL_INFO:
@@ -144,9 +200,284 @@ def get_log_level_from_option(log_level_int: int):
         return logging.INFO
 
 
+def get_line_break_from_option(line_break: str) -> Optional[str]:
+    """
+    Get line break from attila option
+
+    :param line_break: CRLF, LF, CR or NONE
+    :type line_break: str
+    :returns str
+    """
+    if line_break == "CRLF":
+        return "\r\n"
+    elif line_break == "LF":
+        return "\n"
+    elif line_break == "CR":
+        return "\r"
+    elif line_break == "NONE":
+        return None
+    opt_error("Invalid line break '%s'" % line_break)
+
+
+def discover_main(args: list) -> int:
+    """
+    Discover subcommand: probe the serial ports and print the devices found as JSON
+
+    :param args: subcommand arguments
+    :type args: list
+    :returns int: exit code
+    """
+    baud_rates = (115200,)
+    timeout = 0.2
+    workers = 8
+    cache_path = None
+    refresh = False
+    try:
+        optlist, ports = getopt(args, "b:t:j:c:rh")
+        for opt, arg in optlist:
+            if opt == "-b":
+                try:
+                    baud_rates = tuple(int(x) for x in arg.split(","))
+                except ValueError:
+                    opt_error("Specified baud rates are not numbers!")
+            elif opt == "-t":
+                try:
+                    timeout = float(arg)
+                except ValueError:
+                    opt_error("Specified timeout is not a number!")
+            elif opt == "-j":
+                try:
+                    workers = int(arg)
+                except ValueError:
+                    opt_error("Specified workers are not a number!")
+            elif opt == "-c":
+                cache_path = arg
+            elif opt == "-r":
+                refresh = True
+            elif opt == "-h":
+                print(USAGE)
+                return 0
+    except GetoptError as err:
+        opt_error(err)
+    # Discovery is loaded only by this subcommand
+    import json
+    from attila.discovery import DiscoveryCache, discover
+
+    devices = discover(
+        ports if ports else None,
+        baud_rates,
+        timeout,
+        workers,
+        DiscoveryCache(cache_path),
+        refresh,
+    )
+    print(json.dumps({port: x.to_dict() for port, x in devices.items()}, indent=2))
+    return 0
+
+
+def compile_main(args: list) -> int:
+    """
+    Compile subcommand: parse the scripts and store them in the compiled script cache
+
+    :param args: subcommand arguments
+    :type args: list
+    :returns int: exit code
+    """
+    cache_dir = None
+    try:
+        optlist, script_files = getopt(args, "c:h")
+        for opt, arg in optlist:
+            if opt == "-c":
+                cache_dir = arg
+            elif opt == "-h":
+                print(USAGE)
+                return 0
+    except GetoptError as err:
+        opt_error(err)
+    if not script_files:
+        opt_error("No script to compile")
+    from attila.atscriptparser import ATScriptParser
+    from attila.scriptcache import ScriptCache
+
+    parser = ATScriptParser(ScriptCache(cache_dir))
+    exit_code = 0
+    for script_file in script_files:
+        try:
+            commands, _ = parser.compile_file(script_file)
+            print("%s: %d commands" % (script_file, len(commands)))
+        except ATScriptNotFound as err:
+            print("Could not find script file %s: %s" % (script_file, err))
+            exit_code = 1
+        except ATScriptSyntaxError as err:
+            print("%s: script syntax error: %s" % (script_file, err))
+            exit_code = 1
+    return exit_code
+
+
+def daemon_main(args: list) -> int:
+    """
+    Daemon subcommand: keep the ports open and serve the requests on a Unix socket until SIGTERM
+
+    :param args: subcommand arguments
+    :type args: list
+    :returns int: exit code
+    """
+    socket_path = None
+    baud_rate = 115200
+    default_timeout = 0
+    line_break = "\r\n"
+    abort_on_failure = True
+    use_cache = True
+    try:
+        optlist, ports = getopt(args, "s:b:T:B:A:h", ["no-cache"])
+        for opt, arg in optlist:
+            if opt == "-s":
+                socket_path = arg
+            elif opt == "-b":
+                try:
+                    baud_rate = int(arg)
+                except ValueError:
+                    opt_error("Specified baud rate is not a number!")
+            elif opt == "-T":
+                try:
+                    default_timeout = parse_time(arg)
+                except ValueError:
+                    opt_error("Specified default timeout is not a number!")
+            elif opt == "-B":
+                line_break = get_line_break_from_option(arg)
+            elif opt == "-A":
+                if arg not in ("True", "False"):
+                    opt_error(
+                        "Abort on failure has a bad value: '%s', but should be True or False"
+                        % arg
+                    )
+                abort_on_failure = arg == "True"
+            elif opt == "--no-cache":
+                use_cache = False
+            elif opt == "-h":
+                print(USAGE)
+                return 0
+    except GetoptError as err:
+        opt_error(err)
+    if not ports:
+        opt_error("No port to serve")
+    from threading import Thread
+    from attila.atre import ATRuntimeEnvironment
+    from attila.daemon import ATDaemon
+    from attila.exceptions import ATDaemonError
+    from attila.scriptcache import ScriptCache
+
+    daemon = ATDaemon(socket_path)
+    for port in ports:
+        device, _, port_baud_rate = port.partition(":")
+        try:
+            port_baud_rate = int(port_baud_rate) if port_baud_rate else baud_rate
+        except ValueError:
+            opt_error("Baud rate of %s is not a number!" % device)
+        atrunenv = ATRuntimeEnvironment(
+            abort_on_failure, script_cache=ScriptCache() if use_cache else None
+        )
+        atrunenv.configure_communicator(
+            device, port_baud_rate, default_timeout, line_break
+        )
+        try:
+            daemon.add_port(device, atrunenv)
+        except ATDaemonError as err:
+            opt_error(err)
+    try:
+        daemon.start()
+    except (ATDaemonError, ATSerialPortError, ATREUninitializedError) as err:
+        print("Could not start daemon: %s" % err)
+        return 1
+
+    def stop(_signo: Any, _stack_frame: Any):
+        # Shutdown waits for serve_forever to return, so it can't run in the signal handler
+        Thread(target=daemon.shutdown).start()
+
+    signal(SIGTERM, stop)
+    signal(SIGINT, stop)
+    print("Serving %s on %s" % (", ".join(daemon.ports), daemon.socket_path))
+    daemon.serve_forever()
+    return 0
+
+
+def client_main(args: list) -> int:
+    """
+    Client subcommand: send a request to the daemon and print its result as JSON
+
+    :param args: subcommand arguments
+    :type args: list
+    :returns int: exit code
+    """
+    socket_path = None
+    priority = None
+    try:
+        optlist, request = getopt(args, "s:P:h")
+        for opt, arg in optlist:
+            if opt == "-s":
+                socket_path = arg
+            elif opt == "-P":
+                try:
+                    priority = int(arg)
+                except ValueError:
+                    opt_error("Specified priority is not a number!")
+            elif opt == "-h":
+                print(USAGE)
+                return 0
+    except GetoptError as err:
+        opt_error(err)
+    if not request:
+        opt_error("No request")
+    import json
+    from attila.daemon import ATDaemonClient
+    from attila.exceptions import ATDaemonError
+
+    op, params = request[0], request[1:]
+    try:
+        with ATDaemonClient(socket_path) as client:
+            if op == "ports" and not params:
+                result = client.ports()
+            elif op == "exec" and len(params) == 2:
+                result = client.exec(params[0], params[1], priority)
+            elif op == "run" and len(params) == 2:
+                if params[1] == "-":
+                    result = client.run(
+                        params[0], text=sys.stdin.read(), priority=priority
+                    )
+                else:
+                    result = client.run(
+                        params[0], os.path.abspath(params[1]), priority=priority
+                    )
+            elif op == "stats" and len(params) <= 1:
+                result = client.stats(*params)
+            elif op == "subscribe" and len(params) <= 1:
+                try:
+                    for port, urc in client.subscribe(*params):
+                        print(json.dumps({"port": port, "urc": urc}), flush=True)
+                except KeyboardInterrupt:
+                    pass
+                return 0
+            else:
+                opt_error("Invalid request '%s'" % " ".join(request))
+    except ATDaemonError as err:
+        print("Request failed: %s" % err)
+        return 1
+    print(json.dumps(result, indent=2))
+    return 0
+
+
 def main():
     global sigterm_called
     global interactive_mode
+    global cancel_token
+    if len(sys.argv) > 1 and sys.argv[1] == "discover":
+        sys.exit(discover_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "compile":
+        sys.exit(compile_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] in ("daemon", "--daemon"):
+        sys.exit(daemon_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "client":
+        sys.exit(client_main(sys.argv[2:]))
     # Options
     script_file = None
     device = None
@@ -161,9 +492,14 @@ def main():
     quiet = False
     abort_on_failure = True
     to_stdout = False
+    output_format = OUTPUT_TEXT
+    records = None
+    use_cache = True
 
     try:
-        optlist, args = getopt(argv[1:], "p::b::T::B::L::l::A::R::D::vqh")
+        optlist, args = getopt(
+            sys.argv[1:], "p::b::T::B::L::l::A::R::D::vqh", ["output=", "no-cache"]
+        )
         if args:
             interactive_mode = False
             script_file = args[0]
@@ -177,22 +513,11 @@ def main():
                     opt_error("Specified baud rate is not a number!")
             elif opt == "-T":
                 try:
-                    default_timeout = int(arg)
+                    default_timeout = parse_time(arg)
                 except ValueError:
                     opt_error("Specified default timeout is not a number!")
             elif opt == "-B":
-                line_break = arg
-                # Verify line break
-                if line_break == "CRLF":
-                    line_break = "\r\n"
-                elif line_break == "LF":
-                    line_break = "\n"
-                elif line_break == "CR":
-                    line_break = "\r"
-                elif line_break == "NONE":
-                    line_break = None
-                else:
-                    opt_error("Invalid line break '%s'" % line_break)
+                line_break = get_line_break_from_option(arg)
             elif opt == "-L":
                 logfile = arg
             elif opt == "-l":
@@ -238,19 +563,26 @@ def main():
                 verbose = True
             elif opt == "-q":
                 quiet = True
+            elif opt == "--output":
+                if arg not in (OUTPUT_TEXT, OUTPUT_JSONL):
+                    opt_error("Invalid output format '%s'" % arg)
+                output_format = arg
+            elif opt == "--no-cache":
+                use_cache = False
             elif opt == "-h":
                 print(USAGE)
-                exit(0)
+                sys.exit(0)
             else:
                 opt_error("Unkown option '%s'" % opt)
     except GetoptError as err:
         opt_error(err)
+    import logging
 
     # Prepare logger if requested
     if logfile:
         if logfile == "stdout":
             to_stdout = True
-            stdout_handler = logging.StreamHandler(stdout)
+            stdout_handler = logging.StreamHandler(sys.stdout)
             stdout_handler.setFormatter(
                 logging.Formatter(
                     "%(asctime)s [%(levelname)s]: %(message)s",
@@ -267,15 +599,35 @@ def main():
             )
     else:
         logging.getLogger().disabled = True
-    # Instance ATRuntime environment
-    atrunenv = ATRuntimeEnvironment(abort_on_failure)
+    if output_format == OUTPUT_JSONL:
+        from attila.jsonl import (
+            JSONLinesWriter,
+            STATUS_CANCELLED,
+            error_to_record,
+            response_to_record,
+        )
+
+        # Records are written to stdout; everything else (including PRINT ESKs) to stderr
+        records = JSONLinesWriter(sys.stdout.buffer)
+        sys.stdout = sys.stderr
+    # Instance ATRuntime environment; the runtime environment and the serial backend are loaded once the options are valid
+    from attila.atre import ATRuntimeEnvironment
+    from attila.cancel import CancelToken
+    from attila.scriptcache import ScriptCache
+
+    cancel_token = CancelToken()
+    atrunenv = ATRuntimeEnvironment(
+        abort_on_failure,
+        cancel_token=cancel_token,
+        script_cache=ScriptCache() if use_cache else None,
+    )
     # Configure serial
     if device and baud_rate:
         atrunenv.configure_communicator(
             device, baud_rate, default_timeout, line_break, rtscts, dsrdtr
         )
         logging.info(
-            "Setup communicator (device: %s, baud_rate: %d)" % (device, baud_rate)
+            "Setup communicator (device: %s, baud_rate: %d)", device, baud_rate
         )
         if verbose and not to_stdout:
             print(
@@ -284,36 +636,42 @@ def main():
         # Open serial
         try:
             atrunenv.open_serial()
-            logging.info("Serial port opened (%s)" % device)
+            logging.info("Serial port opened (%s)", device)
             if verbose and not to_stdout:
                 print("Serial port opened")
         except ATSerialPortError as err:
-            logging.error("Could not open serial port: %s" % err)
+            logging.error("Could not open serial port: %s", err)
             if not to_stdout and not quiet:
                 print("Could not open serial port: %s" % err)
         except ATREUninitializedError as err:
-            logging.error("Uninitialized runtime environment: %s " % err)
+            logging.error("Uninitialized runtime environment: %s ", err)
             if not to_stdout and not quiet:
                 print("Uninitialized runtime environment: %s" % err)
-            exit(1)
+            sys.exit(1)
     # Parse file if set
     if script_file:
         # Set signal handlers listener
         signal(SIGTERM, sigterm_handler)
         signal(SIGINT, sigterm_handler)
-        logging.debug("Trying to parse file %s..." % script_file)
+        logging.debug("Trying to parse file %s...", script_file)
         try:
             atrunenv.parse_ATScript(script_file)
         except ATScriptNotFound as err:
-            logging.error("Could not find script file %s: %s" % (script_file, err))
+            logging.error("Could not find script file %s: %s", script_file, err)
             if not to_stdout:
                 print("Could not find script file %s: %s" % (script_file, err))
-            exit(1)
+            if records:
+                records.write(error_to_record(err, device=device))
+                records.flush()
+            sys.exit(1)
         except ATScriptSyntaxError as err:
-            logging.error("Script Syntax error: %s" % err)
+            logging.error("Script Syntax error: %s", err)
             if not to_stdout:
                 print("Script syntax error: %s" % err)
-            exit(1)
+            if records:
+                records.write(error_to_record(err, device=device))
+                records.flush()
+            sys.exit(1)
         # Execute script
         response = 1
         while response and not sigterm_called:
@@ -321,17 +679,17 @@ def main():
                 response = atrunenv.exec_next()
                 if not response:
                     continue
+                if records:
+                    records.write(response_to_record(response, device))
                 # Handle response
                 if response.response and response.command:
                     logging.info(
-                        "%s (%d ms) >> %s"
-                        % (
-                            response.command.command,
-                            response.execution_time,
-                            response.response,
-                        )
+                        "%s (%d ms) >> %s",
+                        response.command.command,
+                        response.execution_time,
+                        response.response,
                     )
-                    if not to_stdout and not quiet:
+                    if not to_stdout and not quiet and not records:
                         print(
                             "%s (%d ms) >> %s"
                             % (
@@ -342,14 +700,12 @@ def main():
                         )
                 else:  # Command failed (this snippet gets executed only if aof is false)
                     logging.error(
-                        "%s (%d ms) >> %s"
-                        % (
-                            response.command.command,
-                            response.execution_time,
-                            "\n".join(response.full_response),
-                        )
+                        "%s (%d ms) >> %s",
+                        response.command.command,
+                        response.execution_time,
+                        "\n".join(response.full_response),
                     )
-                    if not to_stdout and not quiet:
+                    if not to_stdout and not quiet and not records:
                         print(
                             "%s (%d ms) >> %s"
                             % (
@@ -359,19 +715,36 @@ def main():
                             )
                         )
             except ATSerialPortError as err:
-                logging.error("Serial Port error: %s" % err)
+                logging.error("Serial Port error: %s", err)
                 if not to_stdout:
                     print("Serial Port error: %s" % err)
+                if records:
+                    records.write(error_to_record(err, device=device))
                 if atrunenv.aof:
                     break
             except ATRuntimeError as err:
-                logging.error("Runtime error: %s" % err)
+                logging.error("Runtime error: %s", err)
                 if not to_stdout:
                     print("Runtime error: %s" % err)
+                if records:
+                    records.write(
+                        response_to_record(err.response, device)
+                        if err.response
+                        else error_to_record(err, device=device)
+                    )
                 if atrunenv.aof:
                     break
             except ATREUninitializedError as err:
-                logging.error("Uninitialized runtime environment: %s " % err)
+                logging.error("Uninitialized runtime environment: %s ", err)
+            except ATCancelledError:
+                logging.warning("Execution cancelled")
+                if not to_stdout and not quiet:
+                    print("Execution cancelled")
+                if records:
+                    records.write(
+                        error_to_record("Execution cancelled", STATUS_CANCELLED, device)
+                    )
+                break
     else:  # Interactive mode
         getch = _Getch()
         command_line = ""
@@ -428,15 +801,16 @@ def main():
             # Parse and execute command
             try:
                 response = atrunenv.exec(command_line)
-                if response:  # Was a command (otherwise was probably ESK)
+                if response and records:
+                    records.write(response_to_record(response, device))
+                    records.flush()
+                elif response:  # Was a command (otherwise was probably ESK)
                     if response.response:  # Command was successful
                         logging.info(
-                            "%s (%d ms) >> %s"
-                            % (
-                                response.command.command,
-                                response.execution_time,
-                                response.response,
-                            )
+                            "%s (%d ms) >> %s",
+                            response.command.command,
+                            response.execution_time,
+                            response.response,
                         )
                         if not to_stdout and not quiet:
                             print(
@@ -449,12 +823,10 @@ def main():
                             )
                     else:  # Command error
                         logging.error(
-                            "%s (%d ms) >> %s"
-                            % (
-                                response.command.command,
-                                response.execution_time,
-                                "\n".join(response.full_response),
-                            )
+                            "%s (%d ms) >> %s",
+                            response.command.command,
+                            response.execution_time,
+                            "\n".join(response.full_response),
                         )
                         if not to_stdout and not quiet:
                             print(
@@ -466,40 +838,51 @@ def main():
                                 )
                             )
                 else:
-                    logging.info("%s >> OK" % command_line)
+                    logging.info("%s >> OK", command_line)
                     if not to_stdout and not quiet:
                         print("%s >> OK" % command_line)
             except ATScriptSyntaxError as err:
-                logging.error("Syntax error: %s" % err)
+                logging.error("Syntax error: %s", err)
                 if not to_stdout:
                     print("Syntax error: %s" % err)
             except ATSerialPortError as err:
-                logging.error("Serial Port error: %s" % err)
+                logging.error("Serial Port error: %s", err)
                 if not to_stdout:
                     print("Serial Port error: %s" % err)
             except ATRuntimeError as err:
-                logging.error("Runtime error: %s" % err)
+                logging.error("Runtime error: %s", err)
                 if not to_stdout:
                     print("Runtime error: %s" % err)
+                if records and err.response:
+                    records.write(response_to_record(err.response, device))
+                    records.flush()
             except ATREUninitializedError as err:
-                logging.error("Uninitialized error: %s" % err)
+                logging.error("Uninitialized error: %s", err)
                 if not to_stdout:
                     print("Uninitialized error: %s" % err)
             # Reset command line and history index
             command_line = ""
             history_index = len(history)
             print(">> ", end="", flush=True)
+    # Wait for the ESKs executed in background
+    try:
+        if not atrunenv.barrier():
+            logging.error("Some background ESKs failed")
+    except ATCancelledError:
+        logging.warning("Background ESKs cancelled")
+    if records:
+        records.flush()
     # Close serial
     try:
         atrunenv.close_serial()
     except ATSerialPortError as err:
-        logging.error("Could not close serial port: %s" % err)
+        logging.error("Could not close serial port: %s", err)
         if not to_stdout and not quiet:
             print("Could not close serial port: %s" % err)
-        exit(1)
+        sys.exit(1)
     except ATREUninitializedError as err:
         logging.error(
-            "Couldn't close serial port, since device was not initialized: %s" % err
+            "Couldn't close serial port, since device was not initialized: %s", err
         )
         if verbose and not to_stdout:
             print(
@@ -0,0 +1,428 @@
+from .atbatch import get_keyword
+
+import json
+import os
+import re
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+# Effective timeout boundaries in seconds; the ceiling applies to commands without a timeout
+DEFAULT_FLOOR = 1.0
+DEFAULT_CEILING = 10.0
+DEFAULT_QUANTILE = 0.99
+# Weight of the last sample in the moving average
+DEFAULT_ALPHA = 0.2
+# Factor applied to the latency estimate
+DEFAULT_MARGIN = 1.5
+# Samples required before the estimate is used
+DEFAULT_MIN_SAMPLES = 5
+BASIC_COMMAND_REGEX = re.compile("^AT([A-Z&]?)", re.IGNORECASE)
+
+
+def get_command_key(command: str) -> str:
+    """
+    Get the key latency is learned for: the keyword and the form of the command
+    (e.g. +COPS? and +COPS=? have very different latencies)
+
+    :param command
+    :type command: str
+    :returns str
+    """
+    command = command.strip()
+    parts = command.split(";")
+    if len(parts) > 1 and all(x.startswith(("+", "&")) for x in parts[1:]):
+        # Merged command line
+        return ";".join(
+            [get_command_key(parts[0])]
+            + [get_command_key("AT%s" % x) for x in parts[1:]]
+        )
+    keyword = get_keyword(command)
+    if keyword:
+        rest = command[len(keyword) + 2 :]
+        if rest.startswith("=?"):
+            return "%s=?" % keyword
+        elif rest.startswith("?"):
+            return "%s?" % keyword
+        elif rest.startswith("="):
+            return "%s=" % keyword
+        return keyword
+    match = BASIC_COMMAND_REGEX.match(command)
+    if match:
+        return "AT%s" % match.group(1).upper()
+    return command.split(" ")[0]
+
+
+class P2Quantile(object):
+    """
+    P2Quantile class estimates a quantile of a stream of samples with the P-square algorithm
+    (Jain and Chlamtac), using constant memory
+    """
+
+    def __init__(self, quantile: float):
+        """
+        Class constructor. Instantiates a new :class:`.P2Quantile.` object with the provided parameters.
+
+        :param quantile: quantile to estimate (0 < quantile < 1)
+        :type quantile: float
+        """
+        self._quantile = quantile
+        # Marker heights and positions
+        self._heights: List[float] = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [
+            1,
+            1 + 2 * quantile,
+            1 + 4 * quantile,
+            3 + 2 * quantile,
+            5,
+        ]
+        self._increments = [0, quantile / 2, quantile, (1 + quantile) / 2, 1]
+
+    @property
+    def quantile(self):
+        return self._quantile
+
+    @property
+    def count(self):
+        if len(self._heights) < 5:
+            return len(self._heights)
+        return self._positions[4]
+
+    @property
+    def value(self) -> Optional[float]:
+        if not self._heights:
+            return None
+        if len(self._heights) < 5:
+            return self._heights[
+                min(len(self._heights) - 1, int(self._quantile * len(self._heights)))
+            ]
+        return self._heights[2]
+
+    @property
+    def maximum(self) -> Optional[float]:
+        # The last marker is the highest sample
+        return self._heights[-1] if self._heights else None
+
+    def add(self, sample: float) -> None:
+        """
+        Add a sample
+
+        :param sample
+        :type sample: float
+        """
+        heights = self._heights
+        positions = self._positions
+        if len(heights) < 5:
+            heights.append(sample)
+            heights.sort()
+            return
+        if sample < heights[0]:
+            heights[0] = sample
+            cell = 0
+        elif sample >= heights[4]:
+            heights[4] = sample
+            cell = 3
+        else:
+            cell = 0
+            while sample >= heights[cell + 1]:
+                cell += 1
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+        # Adjust the middle markers
+        for i in range(1, 4):
+            delta = self._desired[i] - positions[i]
+            if (delta >= 1 and positions[i + 1] - positions[i] > 1) or (
+                delta <= -1 and positions[i - 1] - positions[i] < -1
+            ):
+                step = 1 if delta > 0 else -1
+                height = self.__parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / (
+                        positions[i + step] - positions[i]
+                    )
+                heights[i] = height
+                positions[i] += step
+
+    def __parabolic(self, i: int, step: int) -> float:
+        """
+        Piecewise parabolic prediction of the height of marker i moved by step
+        """
+        q = self._heights
+        n = self._positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "quantile": self._quantile,
+            "heights": self._heights,
+            "positions": self._positions,
+            "desired": self._desired,
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> "P2Quantile":
+        """
+        Restore an estimator from a dictionary
+
+        :param data
+        :type data: dict
+        :returns P2Quantile
+        :raises KeyError, TypeError, ValueError
+        """
+        estimator = P2Quantile(float(data["quantile"]))
+        heights = [float(x) for x in data["heights"]]
+        positions = [int(x) for x in data["positions"]]
+        desired = [float(x) for x in data["desired"]]
+        if len(heights) > 5 or len(positions) != 5 or len(desired) != 5:
+            raise ValueError("Invalid P2 state")
+        estimator._heights = heights
+        estimator._positions = positions
+        estimator._desired = desired
+        return estimator
+
+
+class LatencyEstimator(object):
+    """
+    LatencyEstimator class keeps the exponentially weighted moving average and a high quantile
+    of the latency of a command
+    """
+
+    def __init__(
+        self, quantile: float = DEFAULT_QUANTILE, alpha: float = DEFAULT_ALPHA
+    ):
+        """
+        Class constructor. Instantiates a new :class:`.LatencyEstimator.` object with the provided parameters.
+
+        :param quantile: quantile of the latency to estimate
+        :param alpha: weight of the last sample in the moving average
+        :type quantile: float
+        :type alpha: float
+        """
+        self._alpha = alpha
+        self.average: Optional[float] = None
+        self.quantile = P2Quantile(quantile)
+        # Timeouts in a row; each one doubles the estimate
+        self.timeouts = 0
+
+    @property
+    def count(self):
+        return self.quantile.count
+
+    @property
+    def maximum(self) -> Optional[float]:
+        return self.quantile.maximum
+
+    def add(self, latency: float) -> None:
+        """
+        Add a latency sample
+
+        :param latency: latency in seconds
+        :type latency: float
+        """
+        if self.average is None:
+            self.average = latency
+        else:
+            self.average += self._alpha * (latency - self.average)
+        self.quantile.add(latency)
+        self.timeouts = 0
+
+    def estimate(self) -> Optional[float]:
+        """
+        Get the latency estimate: the highest between the average and the quantile
+
+        :returns float; None if there are no samples
+        """
+        if self.average is None:
+            return None
+        estimate = max(self.average, self.quantile.value)
+        return estimate * (2**self.timeouts)
+
+    def to_dict(self) -> dict:
+        return {
+            "alpha": self._alpha,
+            "average": self.average,
+            "quantile": self.quantile.to_dict(),
+            "timeouts": self.timeouts,
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> "LatencyEstimator":
+        """
+        Restore an estimator from a dictionary
+
+        :param data
+        :type data: dict
+        :returns LatencyEstimator
+        :raises KeyError, TypeError, ValueError
+        """
+        estimator = LatencyEstimator(alpha=float(data["alpha"]))
+        average = data["average"]
+        estimator.average = float(average) if average is not None else None
+        estimator.quantile = P2Quantile.from_dict(data["quantile"])
+        estimator.timeouts = int(data.get("timeouts", 0))
+        return estimator
+
+
+class AdaptiveTimeouts(object):
+    """
+    AdaptiveTimeouts class learns the latency of each command keyword on each device
+    and provides timeouts based on it, bounded by a floor and by the command timeout.
+    It can be shared among many runtime environments and it can be persisted to a JSON file
+    """
+
+    def __init__(
+        self,
+        floor: float = DEFAULT_FLOOR,
+        ceiling: float = DEFAULT_CEILING,
+        quantile: float = DEFAULT_QUANTILE,
+        alpha: float = DEFAULT_ALPHA,
+        margin: float = DEFAULT_MARGIN,
+        min_samples: int = DEFAULT_MIN_SAMPLES,
+    ):
+        """
+        Class constructor. Instantiates a new :class:`.AdaptiveTimeouts.` object with the provided parameters.
+
+        :param floor: minimum timeout in seconds
+        :param ceiling: maximum timeout in seconds of commands without a timeout
+        :param quantile: quantile of the latency to estimate
+        :param alpha: weight of the last sample in the moving average
+        :param margin: factor applied to the latency estimate
+        :param min_samples: samples required before a learned timeout is provided
+        :type floor: float
+        :type ceiling: float
+        :type quantile: float
+        :type alpha: float
+        :type margin: float
+        :type min_samples: int
+        """
+        self._floor = floor
+        self._ceiling = ceiling
+        self._quantile = quantile
+        self._alpha = alpha
+        self._margin = margin
+        self._min_samples = min_samples
+        self._estimators: Dict[Tuple[str, str], LatencyEstimator] = {}
+        self._lock = Lock()
+
+    @property
+    def floor(self):
+        return self._floor
+
+    @property
+    def ceiling(self):
+        return self._ceiling
+
+    def get_estimator(self, device: str, command: str) -> Optional[LatencyEstimator]:
+        """
+        Get the estimator of a command on a device
+
+        :param device: serial port
+        :param command
+        :type device: str
+        :type command: str
+        :returns LatencyEstimator; None if the command has never been observed
+        """
+        return self._estimators.get((device, get_command_key(command)))
+
+    def observe(
+        self, device: str, command: str, latency: float, timed_out: bool = False
+    ) -> None:
+        """
+        Record the latency of a command
+
+        :param device: serial port
+        :param command
+        :param latency: seconds elapsed until the response was complete
+        :param timed_out: whether the command timed out; the estimate is doubled instead
+        :type device: str
+        :type command: str
+        :type latency: float
+        :type timed_out: bool
+        """
+        key = (device, get_command_key(command))
+        with self._lock:
+            estimator = self._estimators.get(key)
+            if estimator is None:
+                if timed_out:
+                    return
+                estimator = LatencyEstimator(self._quantile, self._alpha)
+                self._estimators[key] = estimator
+            if timed_out:
+                estimator.timeouts += 1
+            else:
+                estimator.add(latency)
+
+    def get_timeout(
+        self, device: str, command: str, timeout: Optional[float] = None
+    ) -> Optional[float]:
+        """
+        Get the timeout learned for a command on a device.
+        It is never shorter than the highest latency observed, nor longer than the command timeout
+
+        :param device: serial port
+        :param command
+        :param timeout (optional): command timeout in seconds; if not set, the ceiling is used
+        :type device: str
+        :type command: str
+        :type timeout: float
+        :returns float: timeout in seconds; None if not enough samples have been observed
+        """
+        with self._lock:
+            estimator = self.get_estimator(device, command)
+            if estimator is None or estimator.count < self._min_samples:
+                return None
+            estimate = max(estimator.estimate() * self._margin, estimator.maximum)
+        return min(timeout if timeout else self._ceiling, max(self._floor, estimate))
+
+    def save(self, path: str) -> None:
+        """
+        Write the learned state to a JSON file
+
+        :param path
+        :type path: str
+        :raises OSError
+        """
+        with self._lock:
+            data = [
+                {"device": device, "command": command, "estimator": x.to_dict()}
+                for (device, command), x in self._estimators.items()
+            ]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = "%s.tmp" % path
+        with open(tmp_path, "w") as state_file:
+            json.dump(data, state_file)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> bool:
+        """
+        Load the learned state from a JSON file; invalid entries are ignored
+
+        :param path
+        :type path: str
+        :returns bool: False if the file couldn't be read
+        """
+        try:
+            with open(path, "r") as state_file:
+                data = json.load(state_file)
+        except (OSError, ValueError):
+            return False
+        if not isinstance(data, list):
+            return False
+        estimators = {}
+        for entry in data:
+            try:
+                estimators[(entry["device"], entry["command"])] = (
+                    LatencyEstimator.from_dict(entry["estimator"])
+                )
+            except (KeyError, TypeError, ValueError):
+                continue
+        with self._lock:
+            self._estimators.update(estimators)
+        return True
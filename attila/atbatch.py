@@ -0,0 +1,167 @@
+from .atcommand import ATCommand
+
+import re
+from typing import List, Optional, Tuple, Union
+
+# Default maximum length of a command line sent to the device
+MAX_LINE_LENGTH = 256
+
+# Final result codes which terminate the response to a command line
+FINAL_RESULT_CODES_PATTERN = (
+    "OK|ERROR|\\+CME ERROR:.*|\\+CMS ERROR:.*|NO CARRIER|BUSY|NO ANSWER|NO DIALTONE"
+    "|SEND OK|SEND FAIL"
+)
+FINAL_RESULT_CODES = re.compile("^(%s)$" % FINAL_RESULT_CODES_PATTERN)
+FINAL_RESULT_CODES_RAW = re.compile(FINAL_RESULT_CODES.pattern.encode("utf-8"))
+
+KEYWORD_REGEX = re.compile("^AT([+&%$^#*][A-Z0-9]+)", re.IGNORECASE)
+
+# Execution commands whose response lines are prefixed by their keyword (e.g. +CSQ: 23,99).
+# Others (e.g. AT+CGSN, AT+CIMI) reply with bare lines, which couldn't be told apart in a merged response
+PREFIXED_EXECUTION_COMMANDS = ("+CSQ", "+CBC", "+CLCC", "+CNUM")
+
+
+def get_keyword(command: str) -> Optional[str]:
+    """
+    Get the keyword of an extended AT command (e.g. +CSQ for AT+CSQ or AT+CSQ=?)
+
+    :param command
+    :type command: str
+    :returns str; None if command is not an extended AT command
+    """
+    match = KEYWORD_REGEX.match(command)
+    if match:
+        return match.group(1).upper()
+    return None
+
+
+def is_query(command: str) -> bool:
+    """
+    Returns whether an extended command only queries the device: read (AT+CREG?), test (AT+CREG=?)
+    or execution without parameters (AT+CSQ)
+
+    :param command
+    :type command: str
+    :returns bool
+    """
+    match = KEYWORD_REGEX.match(command)
+    if not match:
+        return False
+    return command[match.end() :].strip() in ("", "?", "=?")
+
+
+def has_prefixed_response(command: str) -> bool:
+    """
+    Returns whether the response lines of a query are prefixed by the command keyword.
+    This is true for read (AT+CREG?) and test (AT+CREG=?) commands, while only some
+    executions without parameters (e.g. AT+CSQ) have a prefixed response
+
+    :param command
+    :type command: str
+    :returns bool
+    """
+    if not is_query(command):
+        return False
+    match = KEYWORD_REGEX.match(command)
+    if command[match.end() :].strip():
+        return True
+    return match.group(1).upper() in PREFIXED_EXECUTION_COMMANDS
+
+
+def is_mergeable(command: ATCommand, first: bool = False) -> bool:
+    """
+    Returns whether a command can be concatenated with other commands in the same command line.
+    Only extended queries without doppelganger and payload can be merged, since a failed command line
+    is executed again one command at a time: set and action commands (e.g. AT+CMGD=1) would be repeated.
+    The response lines must be prefixed by the command keyword too, otherwise they couldn't be split.
+    Commands after the first one mustn't have a delay and mustn't use session values (which could be
+    collected by the previous ones)
+
+    :param command
+    :param first: whether the command would be the first of the command line
+    :type command: ATCommand
+    :type first: bool
+    :returns bool
+    """
+    if command.doppel_ganger or command.payload is not None:
+        return False
+    if not command.command.upper().startswith("AT+"):
+        return False
+    if not has_prefixed_response(command.command):
+        return False
+    if not first and (command.delay or "${" in command.command):
+        return False
+    return True
+
+
+def get_merge_batch(
+    commands: List[ATCommand], max_line_length: int = MAX_LINE_LENGTH
+) -> List[ATCommand]:
+    """
+    Get the longest sequence of commands, starting from the first one, which can be sent in a single command line
+
+    :param commands: commands to execute, in order
+    :param max_line_length: maximum length of the command line
+    :type commands: list of ATCommand
+    :type max_line_length: int
+    :returns list of ATCommand (at least the first command)
+    """
+    if not commands:
+        return []
+    batch = [commands[0]]
+    if not is_mergeable(commands[0], True):
+        return batch
+    line_length = len(commands[0].command)
+    for command in commands[1:]:
+        # ';' + command without 'AT'
+        line_length += len(command.command) - 1
+        if line_length > max_line_length or not is_mergeable(command):
+            break
+        batch.append(command)
+    return batch
+
+
+def merge_commands(commands: List[str]) -> str:
+    """
+    Concatenate commands in a single command line (e.g. AT+CSQ;+CREG?)
+
+    :param commands
+    :type commands: list of str
+    :returns str
+    """
+    return ";".join([commands[0]] + [x[2:] for x in commands[1:]])
+
+
+def split_response(
+    lines: Union[List[str], List[bytes]], commands: List[str]
+) -> Tuple[List[list], Optional[Union[str, bytes]]]:
+    """
+    Split the response to a merged command line into the responses of each command.
+    Each line is associated to the command whose keyword prefixes the line (e.g. +CSQ: ...)
+    or, if there's no prefix, to the last associated command.
+
+    :param lines: response lines (str or bytes)
+    :param commands: merged commands, in order
+    :type lines: list of str or list of bytes
+    :type commands: list of str
+    :returns tuple of (list of the response lines for each command, final result code or None)
+    """
+    raw = len(lines) > 0 and isinstance(lines[0], (bytes, bytearray))
+    prefixes = []
+    for command in commands:
+        prefix = "%s:" % get_keyword(command)
+        prefixes.append(prefix.encode("utf-8") if raw else prefix)
+    final_regex = FINAL_RESULT_CODES_RAW if raw else FINAL_RESULT_CODES
+    responses: List[list] = [[] for _ in commands]
+    final = None
+    current = 0
+    for line in lines:
+        if final_regex.match(line):
+            final = line
+            continue
+        for i in range(current, len(prefixes)):
+            if line.startswith(prefixes[i]):
+                current = i
+                break
+        responses[current].append(line)
+    return (responses, final)
@@ -1,6 +1,34 @@
-from typing import List, Optional, Any
+from typing import List, Optional, Any, Union
+import re
 
 from .atresponse import ATResponse
+from .collectables import Collectable, compile_collectables
+
+# Terminator of the payloads entered after the '> ' prompt
+CTRL_Z = b"\x1a"
+# Minimum command timeout in seconds
+MIN_TIMEOUT = 0.001
+TIME_REGEX = re.compile("^([0-9]*\\.?[0-9]+)\\s*(ms|s)?$")
+
+
+def parse_time(value: str, unit: str = "s") -> float:
+    """
+    Parse a time, such as 5, 0.5, 500ms or 2s
+
+    :param value
+    :param unit: unit of the values without unit ("s" or "ms")
+    :type value: str
+    :type unit: str
+    :returns float: time in seconds
+    :raises ValueError
+    """
+    match = TIME_REGEX.match(value.strip())
+    if not match:
+        raise ValueError("Invalid time '%s'" % value)
+    seconds = float(match.group(1))
+    if (match.group(2) or unit) == "ms":
+        seconds /= 1000
+    return seconds
 
 
 class ATCommand(object):
@@ -8,30 +36,49 @@ class ATCommand(object):
     This class represents an AT command
     """
 
+    __slots__ = (
+        "_command",
+        "_expected_response",
+        "_timeout",
+        "_delay",
+        "_collectables",
+        "_extractors",
+        "_doppel_ganger",
+        "_payload",
+        "_terminator",
+        "_response",
+    )
+
     def __init__(
         self,
         cmd: str,
         exp_response: Optional[str] = None,
-        tout: Optional[int] = None,
-        delay: Optional[int] = 0,
+        tout: Optional[float] = None,
+        delay: Optional[float] = 0,
         collectables: Optional[List[str]] = None,
         dganger: Optional[Any] = None,
+        payload: Optional[Union[str, bytes]] = None,
+        terminator: Optional[bytes] = CTRL_Z,
     ):
         """
         Class constructor. Instantiates a new :class:`.ATCommand.` object with the provided parameters.
 
         :param cmd: command to execute
         :param exp_response: expected response from command execution. a literal or a generic response can be provided
-        :param tout (optional): command timeout execution in seconds.
+        :param tout (optional): command timeout execution in seconds (fractions of second are allowed)
         :param delay (optional): delay in milliseconds before command execution
         :param collectables (optional): values to store from response. Follow collectables syntax as specified in ATtila documentation
         :param dganger (optional): doppelganger command associated to this command (command to execute in case of this command fails)
+        :param payload (optional): payload to send once the device prompts for it ('> '), e.g. the text of AT+CMGS
+        :param terminator (optional): sent after the payload; None for length-delimited payloads (e.g. AT+CIPSEND=<length>)
         :type cmd: string
         :type exp_respose: string
-        :type tout: int
-        :type delay: int
+        :type tout: float
+        :type delay: float
         :type collectables: list of string
         :type dganger: ATCommand
+        :type payload: str or bytes
+        :type terminator: bytes
         """
         self._command: str = cmd
         self._expected_response = exp_response
@@ -41,10 +88,14 @@ class ATCommand(object):
             self._collectables: Optional[List[str]] = None
         else:
             self._collectables: List[str] = collectables
+        # Compiled with the first response
+        self._extractors: Optional[List[Collectable]] = None
         if isinstance(dganger, ATCommand):
             self._doppel_ganger = dganger
         else:
             self._doppel_ganger = None
+        self._payload = payload
+        self._terminator = terminator
         self._response = None
 
     @property
@@ -76,18 +127,18 @@ class ATCommand(object):
         return self._timeout
 
     @timeout.setter
-    def timeout(self, tout: int):
-        if tout > 1:
+    def timeout(self, tout: float):
+        if tout > MIN_TIMEOUT:
             self._timeout = tout
         else:
-            self._timeout = 1
+            self._timeout = MIN_TIMEOUT
 
     @property
     def delay(self):
         return self._delay
 
     @delay.setter
-    def delay(self, delay: int):
+    def delay(self, delay: float):
         if delay > 0:
             self._delay = delay
         else:
@@ -100,6 +151,17 @@ class ATCommand(object):
     @collectables.setter
     def collectables(self, collectables: Optional[List[str]]):
         self._collectables = collectables
+        self._extractors = None
+
+    @property
+    def extractors(self) -> List[Collectable]:
+        if self._extractors is None:
+            self._extractors = compile_collectables(self._collectables)
+        return self._extractors
+
+    @extractors.setter
+    def extractors(self, extractors: List[Collectable]):
+        self._extractors = extractors
 
     @property
     def doppel_ganger(self):
@@ -111,3 +173,19 @@ class ATCommand(object):
             self._doppel_ganger = dganger
         else:
             self._doppel_ganger = None
+
+    @property
+    def payload(self):
+        return self._payload
+
+    @payload.setter
+    def payload(self, payload: Optional[Union[str, bytes]]):
+        self._payload = payload
+
+    @property
+    def terminator(self):
+        return self._terminator
+
+    @terminator.setter
+    def terminator(self, terminator: Optional[bytes]):
+        self._terminator = terminator
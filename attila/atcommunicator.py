@@ -1,10 +1,44 @@
+from .atbatch import FINAL_RESULT_CODES_PATTERN
+from .atcommand import CTRL_Z
+from .bulk import (
+    DEFAULT_CHUNK_SIZE,
+    DOWNLOAD_TRAILER,
+    TRAILER_WINDOW,
+    UPLOAD_READY,
+    Checksum,
+    TransferResult,
+)
+from .cancel import CancelToken
+from .clock import Clock
 from .exceptions import ATSerialPortError
 
 from serial import Serial, SerialException, SerialTimeoutException
 import re
-from time import time
-from time import sleep
-from typing import List, Optional, Tuple
+from typing import Any, BinaryIO, List, Optional, Pattern, Tuple
+
+# Interval in seconds between two reads when no data is available
+POLL_INTERVAL = 0.001
+# Prompt which asks for a payload ('> ' at the beginning of a line), or a final result code
+PROMPT_OR_FINAL_RESULT = re.compile(
+    b"(?:^|[\\r\\n])(?:> ?$|(?:%s)\\r?\\n)" % FINAL_RESULT_CODES_PATTERN.encode("utf-8")
+)
+FINAL_RESULT = re.compile(
+    b"(?:^|[\\r\\n])(?:%s)\\r?\\n" % FINAL_RESULT_CODES_PATTERN.encode("utf-8")
+)
+OK_RESULT = re.compile(b"(?:^|[\\r\\n])OK\\r?\\n")
+# CONNECT (the device enters data mode), or a final result code
+CONNECT_OR_FINAL_RESULT = re.compile(
+    b"(?:^|[\\r\\n])(?:CONNECT[^\\r\\n]*|%s)\\r?\\n"
+    % FINAL_RESULT_CODES_PATTERN.encode("utf-8")
+)
+# Baud rates probed by autobaud, most common first
+AUTOBAUD_RATES = (115200, 9600, 57600, 38400, 19200, 230400, 460800, 921600)
+# Baud rates tried by upshift, when the device doesn't report the supported ones (AT+IPR=?)
+UPSHIFT_RATES = (3000000, 921600, 460800, 230400)
+# Timeout in seconds of an AT probe
+PROBE_TIMEOUT = 0.2
+# Time in seconds given to the device to switch baud rate
+BAUD_SWITCH_TIME = 0.05
 
 
 class ATCommunicator(object):
@@ -17,10 +51,14 @@ class ATCommunicator(object):
         self,
         serial_port: str,
         baud_rate: int,
-        default_timeout: int = 10,
+        default_timeout: float = 10,
         line_break: str = "\r\n",
         rtscts: Optional[bool] = True,
         dsrdtr: Optional[bool] = True,
+        clock: Optional[Clock] = None,
+        encoding: str = "utf-8",
+        decode_errors: str = "strict",
+        cancel_token: Optional[CancelToken] = None,
     ):
         """
         Class constructor. Instantiates a new :class:`.ATCommunicator.` object with the provided parameters.
@@ -31,20 +69,32 @@ class ATCommunicator(object):
         :param line_break: line break to send with commands
         :param rtscts: use rtscts
         :param dsrdtr: use dsrdtr
+        :param clock (optional): time source used for timeouts and execution times; system clock if not set
+        :param encoding: encoding used for commands and responses
+        :param decode_errors: error policy used when decoding responses (strict, replace, ignore, backslashreplace...)
+        :param cancel_token (optional): token which interrupts the command being executed
         :type serial_port: string
         :type baud_rate: int
-        :type default_timeout: int > 0
+        :type default_timeout: float > 0
         :type line_break: string
         :type rtscts: bool
         :type dsrdtr: bool
+        :type clock: Clock
+        :type encoding: str
+        :type decode_errors: str
+        :type cancel_token: CancelToken
         """
         self._device: Optional[Serial] = None
         self._serial_port: str = serial_port
         self._baud_rate: int = baud_rate
-        self.default_timeout: Optional[int] = default_timeout
+        self.default_timeout: Optional[float] = default_timeout
         self._line_break: str = line_break
         self._rtscts: Optional[bool] = rtscts
         self._dsrdtr: Optional[bool] = dsrdtr
+        self._clock: Clock = clock if clock else Clock()
+        self._encoding: str = encoding
+        self._decode_errors: str = decode_errors
+        self._cancel_token: Optional[CancelToken] = cancel_token
 
     @property
     def serial_port(self):
@@ -67,7 +117,7 @@ class ATCommunicator(object):
         return self._default_timeout
 
     @default_timeout.setter
-    def default_timeout(self, timeout: int):
+    def default_timeout(self, timeout: float):
         if timeout:
             if timeout > 0:
                 self._default_timeout = timeout
@@ -84,6 +134,38 @@ class ATCommunicator(object):
     def line_break(self, brk: str):
         self._line_break = brk
 
+    @property
+    def clock(self):
+        return self._clock
+
+    @clock.setter
+    def clock(self, clock: Clock):
+        self._clock = clock
+
+    @property
+    def encoding(self):
+        return self._encoding
+
+    @encoding.setter
+    def encoding(self, encoding: str):
+        self._encoding = encoding
+
+    @property
+    def decode_errors(self):
+        return self._decode_errors
+
+    @decode_errors.setter
+    def decode_errors(self, errors: str):
+        self._decode_errors = errors
+
+    @property
+    def cancel_token(self):
+        return self._cancel_token
+
+    @cancel_token.setter
+    def cancel_token(self, cancel_token: Optional[CancelToken]):
+        self._cancel_token = cancel_token
+
     @property
     def rtscts(self):
         return self._rtscts
@@ -148,54 +230,466 @@ class ATCommunicator(object):
         """
         return self._device is not None
 
-    def exec(self, command: str, timeout: int = None) -> Tuple[List[str], int]:
+    def fileno(self) -> int:
         """
-        Execute AT command
+        Get the file descriptor of the serial port (e.g. to relay data in data mode)
 
-        :param command: command to execute
-        :param timeout: timeout for command, if not set default will be used
-        :type command: str
-        :type timeout: int
-        :returns tuple of (list of string, execution time ms); list: command response without line break; empty lines are ignored
+        :returns int
         :raises ATSerialPortError
         """
         if not self._device:
             raise ATSerialPortError("Serial port device is closed")
-        # Flush before write
-        self.__flush()
-        if not timeout:
-            timeout = self.default_timeout
-            self._device.write_timeout = self.default_timeout
-        else:  # Set write timeout to timeout
-            self._device.write_timeout = timeout
-        # Get start time
-        t_start = int(time() * 1000)
         try:
-            if self._line_break:
-                self._device.write(
-                    b"%s%s"
-                    % (
-                        command.encode("utf-8"),
-                        self._line_break.encode("utf-8"),
+            return self._device.fileno()
+        except (AttributeError, OSError, ValueError):
+            raise ATSerialPortError("Serial port device has no file descriptor")
+
+    def read_available(self) -> bytes:
+        """
+        Read the data available on the serial port without writing anything (e.g. the URCs
+        emitted by the device between commands)
+
+        :returns bytes: empty if there is no data available
+        :raises ATSerialPortError
+        """
+        if not self._device:
+            raise ATSerialPortError("Serial port device is closed")
+        try:
+            in_waiting = self._device.in_waiting
+            if not in_waiting:
+                return b""
+            return bytes(self._device.read(in_waiting))
+        except (OSError, SerialException) as error:
+            raise ATSerialPortError(str(error))
+
+    def probe(self, timeout: float = PROBE_TIMEOUT, attempts: int = 2) -> bool:
+        """
+        Check whether the device answers OK to AT at the current baud rate
+
+        :param timeout: timeout of each attempt in seconds
+        :param attempts: amount of AT sent before giving up; the first one may only wake up the UART
+        :type timeout: float
+        :type attempts: int
+        :returns bool
+        :raises ATSerialPortError, ATCancelledError
+        """
+        for _ in range(attempts):
+            _, t_timeout = self._write_command("AT", timeout)
+            data = self._read_until(FINAL_RESULT, bytearray(), t_timeout)
+            self._device.reset_input_buffer()
+            if OK_RESULT.search(data):
+                return True
+        return False
+
+    def set_baud_rate(self, baud_rate: int) -> None:
+        """
+        Change the baud rate of the open serial port, without closing it
+
+        :param baud_rate
+        :type baud_rate: int
+        :raises ATSerialPortError
+        """
+        if not self._device:
+            raise ATSerialPortError("Serial port device is closed")
+        try:
+            self._device.baudrate = baud_rate
+        except (OSError, ValueError, SerialException) as error:
+            raise ATSerialPortError(str(error))
+        self._baud_rate = baud_rate
+
+    def autobaud(
+        self, rates: Tuple[int, ...] = AUTOBAUD_RATES, timeout: float = PROBE_TIMEOUT
+    ) -> Optional[int]:
+        """
+        Find the baud rate the device is using, probing it with AT at the current rate and then at each rate.
+        The serial port is left at the detected rate, or at the original one if the device never answered
+
+        :param rates: candidate baud rates
+        :param timeout: timeout of each probe in seconds
+        :type rates: tuple of int
+        :type timeout: float
+        :returns int: detected baud rate; None if the device didn't answer
+        :raises ATSerialPortError, ATCancelledError
+        """
+        original = self._baud_rate
+        candidates = [original] + [rate for rate in rates if rate != original]
+        for rate in candidates:
+            if rate != self._baud_rate:
+                self.set_baud_rate(rate)
+            if self.probe(timeout):
+                return rate
+        self.set_baud_rate(original)
+        return None
+
+    def supported_baud_rates(self, timeout: float = PROBE_TIMEOUT) -> List[int]:
+        """
+        Get the fixed baud rates supported by the device (AT+IPR=?)
+
+        :param timeout: timeout in seconds
+        :type timeout: float
+        :returns list of int: in descending order; empty if the device didn't report them
+        :raises ATSerialPortError, ATCancelledError
+        """
+        _, t_timeout = self._write_command("AT+IPR=?", timeout)
+        data = self._read_until(FINAL_RESULT, bytearray(), t_timeout)
+        self._device.reset_input_buffer()
+        if not OK_RESULT.search(data):
+            return []
+        rates = set()
+        for line in bytes(data).splitlines():
+            if line.startswith(b"+IPR:"):
+                # e.g. +IPR: (0,300,...,115200),(0,300,...,921600); 0 is autobaud
+                rates.update(int(x) for x in re.findall(b"\\d+", line[5:]))
+        rates.discard(0)
+        return sorted(rates, reverse=True)
+
+    def upshift(
+        self,
+        max_baud_rate: Optional[int] = None,
+        rates: Optional[Tuple[int, ...]] = None,
+        timeout: float = PROBE_TIMEOUT,
+    ) -> int:
+        """
+        Raise the baud rate to the highest one the device accepts.
+        Each rate is requested with AT+IPR=<rate>, then the serial port is switched to it and verified with AT;
+        if the verification fails, the link is restored to the previous rate
+
+        :param max_baud_rate (optional): highest baud rate to use
+        :param rates (optional): candidate baud rates; reported by the device (AT+IPR=?) or UPSHIFT_RATES if not set
+        :param timeout: timeout of each probe in seconds
+        :type max_baud_rate: int
+        :type rates: tuple of int
+        :type timeout: float
+        :returns int: baud rate in use
+        :raises ATSerialPortError, ATCancelledError
+        """
+        current = self._baud_rate
+        if rates is None:
+            rates = tuple(self.supported_baud_rates(timeout)) or UPSHIFT_RATES
+        for rate in sorted(rates, reverse=True):
+            if rate <= current or (max_baud_rate and rate > max_baud_rate):
+                continue
+            _, t_timeout = self._write_command("AT+IPR=%d" % rate, timeout)
+            data = self._read_until(FINAL_RESULT, bytearray(), t_timeout)
+            if not OK_RESULT.search(data):
+                continue
+            # The device answers OK at the old rate, then switches
+            self._sleep(BAUD_SWITCH_TIME)
+            self.set_baud_rate(rate)
+            if self.probe(timeout):
+                return rate
+            # Restore the previous rate on both sides
+            self.set_baud_rate(current)
+            if not self.probe(timeout):
+                self.set_baud_rate(rate)
+                self._write_command("AT+IPR=%d" % current, timeout)
+                self._sleep(BAUD_SWITCH_TIME)
+                self.set_baud_rate(current)
+                if not self.probe(timeout):
+                    raise ATSerialPortError(
+                        "Could not restore baud rate %d after upshift to %d"
+                        % (current, rate)
                     )
-                )
-            else:
-                self._device.write(b"%s" % command.encode("utf-8"))
-        except SerialTimeoutException as err:
-            raise ATSerialPortError(str(err))
+        return current
+
+    def exec(
+        self, command: str, timeout: Optional[float] = None
+    ) -> Tuple[List[str], float]:
+        """
+        Execute AT command
+
+        :param command: command to execute
+        :param timeout: timeout for command, if not set default will be used
+        :type command: str
+        :type timeout: float
+        :returns tuple of (list of string, execution time ms); list: command response without line break; empty lines are ignored
+        :raises ATSerialPortError, ATCancelledError
+        """
+        data, execution_time = self._exec(command, timeout)
+        return (self.__decode(data), execution_time)
+
+    def exec_raw(
+        self, command: str, timeout: Optional[float] = None
+    ) -> Tuple[List[bytes], float]:
+        """
+        Execute AT command, without decoding its response
+
+        :param command: command to execute
+        :param timeout: timeout for command, if not set default will be used
+        :type command: str
+        :type timeout: float
+        :returns tuple of (list of bytes, execution time ms); list: command response lines without line break
+        :raises ATSerialPortError, ATCancelledError
+        """
+        data, execution_time = self._exec(command, timeout)
+        return (data.splitlines(), execution_time)
+
+    def exec_prompt(
+        self,
+        command: str,
+        payload: bytes,
+        timeout: Optional[float] = None,
+        terminator: Optional[bytes] = CTRL_Z,
+    ) -> Tuple[List[str], float]:
+        """
+        Execute an AT command which prompts for a payload ('> '), e.g. AT+CMGS, AT+CIPSEND, AT+QFUPL.
+        As soon as the prompt is received, the payload is sent, followed by the terminator,
+        then the final result code is awaited
+
+        :param command: command to execute
+        :param payload: payload to send after the prompt
+        :param timeout: timeout for the whole exchange, if not set default will be used
+        :param terminator: sent after the payload (Ctrl-Z by default); None for length-delimited payloads
+        :type command: str
+        :type payload: bytes
+        :type timeout: float
+        :type terminator: bytes
+        :returns tuple of (list of string, execution time ms)
+        :raises ATSerialPortError, ATCancelledError
+        """
+        data, execution_time = self._exec_prompt(command, payload, timeout, terminator)
+        return (self.__decode(data), execution_time)
+
+    def exec_prompt_raw(
+        self,
+        command: str,
+        payload: bytes,
+        timeout: Optional[float] = None,
+        terminator: Optional[bytes] = CTRL_Z,
+    ) -> Tuple[List[bytes], float]:
+        """
+        Execute an AT command which prompts for a payload, without decoding its response
+
+        :param command: command to execute
+        :param payload: payload to send after the prompt
+        :param timeout: timeout for the whole exchange, if not set default will be used
+        :param terminator: sent after the payload (Ctrl-Z by default); None for length-delimited payloads
+        :type command: str
+        :type payload: bytes
+        :type timeout: float
+        :type terminator: bytes
+        :returns tuple of (list of bytes, execution time ms)
+        :raises ATSerialPortError, ATCancelledError
+        """
+        data, execution_time = self._exec_prompt(command, payload, timeout, terminator)
+        return (data.splitlines(), execution_time)
+
+    def exec_connect(
+        self, command: str, timeout: Optional[float] = None
+    ) -> Tuple[List[str], float, bytes]:
+        """
+        Execute an AT command which makes the device enter data mode (e.g. ATD*99***1#).
+        The response is read up to CONNECT; the data received after it isn't flushed, but returned
+
+        :param command: command to execute
+        :param timeout: timeout for command, if not set default will be used
+        :type command: str
+        :type timeout: float
+        :returns tuple of (list of string, execution time ms, data received after CONNECT)
+        :raises ATSerialPortError, ATCancelledError
+        """
+        data, execution_time, pending = self._exec_connect(command, timeout)
+        return (self.__decode(data), execution_time, pending)
+
+    def exec_connect_raw(
+        self, command: str, timeout: Optional[float] = None
+    ) -> Tuple[List[bytes], float, bytes]:
+        """
+        Execute an AT command which makes the device enter data mode, without decoding its response
+
+        :param command: command to execute
+        :param timeout: timeout for command, if not set default will be used
+        :type command: str
+        :type timeout: float
+        :returns tuple of (list of bytes, execution time ms, data received after CONNECT)
+        :raises ATSerialPortError, ATCancelledError
+        """
+        data, execution_time, pending = self._exec_connect(command, timeout)
+        return (data.splitlines(), execution_time, pending)
+
+    def upload(
+        self,
+        command: str,
+        source: BinaryIO,
+        size: Optional[int] = None,
+        timeout: Optional[float] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        checksum: Optional[Checksum] = None,
+        checksum_pattern: Optional[Pattern] = None,
+    ) -> TransferResult:
+        """
+        Execute an AT command which receives a file (e.g. AT+QFUPL), streaming the file content
+        from source in chunks once the device is ready ('> ' or CONNECT).
+        Chunks are read into a preallocated buffer and never decoded; with rtscts each chunk waits for CTS
+
+        :param command: command to execute
+        :param source: binary file object the content is read from
+        :param size (optional): amount of bytes to send; until EOF if not set
+        :param timeout: timeout for the whole transfer, if not set default will be used
+        :param chunk_size: amount of bytes written at once
+        :param checksum (optional): checksum updated with each chunk
+        :param checksum_pattern (optional): bytes regex matching the checksum (hex) reported by the device; verified against checksum
+        :type command: str
+        :type source: BinaryIO
+        :type size: int
+        :type timeout: float
+        :type chunk_size: int
+        :type checksum: Checksum
+        :type checksum_pattern: re.Pattern
+        :returns TransferResult
+        :raises ATSerialPortError, ATCancelledError
+        """
+        _, t_timeout = self._write_command(command, timeout)
+        data = self._read_until(UPLOAD_READY, bytearray(), t_timeout)
+        match = UPLOAD_READY.search(data)
+        if not match:
+            self._device.reset_input_buffer()
+            raise ATSerialPortError(
+                "Device is not ready to receive data: %s" % bytes(data).strip()
+            )
+        buffer = memoryview(bytearray(chunk_size))
+        transferred = 0
+        t_transfer = self._clock.now() * 1000
+        while size is None or transferred < size:
+            amount = chunk_size if size is None else min(chunk_size, size - transferred)
+            amount = source.readinto(buffer[:amount])
+            if not amount:
+                break
+            chunk = buffer[:amount]
+            self.__wait_cts(t_timeout)
+            try:
+                self._device.write(chunk)
+            except SerialTimeoutException as err:
+                raise ATSerialPortError(str(err))
+            if checksum:
+                checksum.update(chunk)
+            transferred += amount
+        t_end = self._clock.now() * 1000
+        data = self._read_until(FINAL_RESULT, bytearray(), t_timeout)
+        self._device.reset_input_buffer()
+        result = TransferResult(
+            transferred, t_end - t_transfer, bytes(data).splitlines(), checksum
+        )
+        self.__verify(result, checksum_pattern)
+        return result
+
+    def download(
+        self,
+        command: str,
+        sink: BinaryIO,
+        size: Optional[int] = None,
+        timeout: Optional[float] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        checksum: Optional[Checksum] = None,
+        checksum_pattern: Optional[Pattern] = None,
+    ) -> TransferResult:
+        """
+        Execute an AT command which sends a file (e.g. AT+QFDWL), streaming the file content
+        following CONNECT to sink. Data is never decoded.
+        If size is not provided, the content ends where the trailer (e.g. +QFDWL: ... OK) begins;
+        the last bytes are held back until the device stops sending
+
+        :param command: command to execute
+        :param sink: binary file object the content is written to
+        :param size (optional): size of the file
+        :param timeout: timeout for the whole transfer, if not set default will be used
+        :param chunk_size: maximum amount of bytes read at once
+        :param checksum (optional): checksum updated with each chunk
+        :param checksum_pattern (optional): bytes regex matching the checksum (hex) reported by the device; verified against checksum
+        :type command: str
+        :type sink: BinaryIO
+        :type size: int
+        :type timeout: float
+        :type chunk_size: int
+        :type checksum: Checksum
+        :type checksum_pattern: re.Pattern
+        :returns TransferResult
+        :raises ATSerialPortError, ATCancelledError
+        """
+        _, t_timeout = self._write_command(command, timeout)
+        data = self._read_until(UPLOAD_READY, bytearray(), t_timeout)
+        match = UPLOAD_READY.search(data)
+        if not match or match.group().lstrip(b"\r\n").startswith(b">"):
+            self._device.reset_input_buffer()
+            raise ATSerialPortError(
+                "Device didn't start the transfer: %s" % bytes(data).strip()
+            )
+        t_transfer = self._clock.now() * 1000
+        # Content already read with CONNECT
+        pending = bytes(data[match.end() :])
+        transferred = 0
+        trailer = b""
+
+        def write(chunk: memoryview) -> None:
+            sink.write(chunk)
+            if checksum:
+                checksum.update(chunk)
+
+        while True:
+            if size is not None:
+                amount = min(len(pending), size - transferred)
+                if amount:
+                    write(memoryview(pending)[:amount])
+                    transferred += amount
+                if transferred == size:
+                    trailer = pending[amount:]
+                    break
+                pending = b""
+            elif len(pending) > TRAILER_WINDOW:
+                amount = len(pending) - TRAILER_WINDOW
+                write(memoryview(pending)[:amount])
+                transferred += amount
+                pending = pending[amount:]
+            if self._clock.now() * 1000 >= t_timeout:
+                trailer = pending
+                break
+            read_bytes = self._device.read(min(self._device.in_waiting, chunk_size))
+            if read_bytes:
+                pending += read_bytes
+                continue
+            if size is None:
+                match = DOWNLOAD_TRAILER.search(pending)
+                if match:
+                    # The device stopped sending after the trailer
+                    write(memoryview(pending)[: match.start()])
+                    transferred += match.start()
+                    trailer = pending[match.start() :]
+                    break
+            self._sleep(POLL_INTERVAL)
+        t_end = self._clock.now() * 1000
+        if not FINAL_RESULT.search(trailer):
+            trailer = self._read_until(FINAL_RESULT, bytearray(trailer), t_timeout)
+        self._device.reset_input_buffer()
+        result = TransferResult(
+            transferred, t_end - t_transfer, bytes(trailer).splitlines(), checksum
+        )
+        self.__verify(result, checksum_pattern)
+        return result
+
+    def _exec(self, command: str, timeout: Optional[float]) -> Tuple[bytes, float]:
+        """
+        Write command to the device and read its response
+
+        :param command: command to execute
+        :param timeout: timeout for command, if not set default will be used
+        :type command: str
+        :type timeout: float
+        :returns tuple of (response data, execution time ms)
+        :raises ATSerialPortError, ATCancelledError
+        """
+        t_start, t_timeout = self._write_command(command, timeout)
         data = bytearray()
-        # Set timeout to t_start + timeout seconds
-        t_timeout = t_start + (timeout * 1000)
         t_now = t_start
         data_still_available = True
         sleep_time_based_on_baud = 100 / self.baud_rate  # Milliseconds
 
         # Try to read until there are data available and t_now < t_timeout
         while t_now < t_timeout and data_still_available:
-            t_now = int(time() * 1000)
+            t_now = self._clock.now() * 1000
             # Read available bytes
             read_bytes = self._device.read(self._device.in_waiting)
             if not read_bytes:
+                self._sleep(POLL_INTERVAL)
                 continue
             # Mini sleep to wait for incoming data
             t_waiting_elapsed = 0
@@ -205,7 +699,7 @@ class ATCommunicator(object):
                 self._device.in_waiting == 0
                 and sleep_time_based_on_baud > t_waiting_elapsed
             ):
-                sleep(mini_sleep_time)  # 1ms
+                self._sleep(mini_sleep_time)  # 1ms
                 t_waiting_elapsed += mini_sleep_time
             # Check if there are still data available
             if self._device.in_waiting > 0:
@@ -215,16 +709,215 @@ class ATCommunicator(object):
             data += read_bytes
             # End of read
 
-        data = data.decode("utf-8")
-        lines: List[str] = data.splitlines()
-        t_end = int(time() * 1000)
+        t_end = self._clock.now() * 1000
+        # Flush input buffer
+        self._device.reset_input_buffer()
+        return (bytes(data), t_end - t_start)
+
+    def _exec_prompt(
+        self,
+        command: str,
+        payload: bytes,
+        timeout: Optional[float],
+        terminator: Optional[bytes],
+    ) -> Tuple[bytes, float]:
+        """
+        Write command to the device, send the payload when prompted and read the response
+
+        :param command: command to execute
+        :param payload: payload to send after the prompt
+        :param timeout: timeout for the whole exchange, if not set default will be used
+        :param terminator: sent after the payload
+        :type command: str
+        :type payload: bytes
+        :type timeout: float
+        :type terminator: bytes
+        :returns tuple of (response data, execution time ms)
+        :raises ATSerialPortError, ATCancelledError
+        """
+        t_start, t_timeout = self._write_command(command, timeout)
+        data = self._read_until(PROMPT_OR_FINAL_RESULT, bytearray(), t_timeout)
+        match = PROMPT_OR_FINAL_RESULT.search(data)
+        # Send payload only if prompted
+        if match and match.group().lstrip(b"\r\n").startswith(b">"):
+            try:
+                self._device.write(payload)
+                if terminator:
+                    self._device.write(terminator)
+            except SerialTimeoutException as err:
+                raise ATSerialPortError(str(err))
+            data = self._read_until(FINAL_RESULT, data, t_timeout, match.end())
+        t_end = self._clock.now() * 1000
+        # Flush input buffer
+        self._device.reset_input_buffer()
+        return (bytes(data), t_end - t_start)
+
+    def _exec_connect(
+        self, command: str, timeout: Optional[float]
+    ) -> Tuple[bytes, float, bytes]:
+        """
+        Write command to the device and read its response up to CONNECT
+
+        :param command: command to execute
+        :param timeout: timeout for command, if not set default will be used
+        :type command: str
+        :type timeout: float
+        :returns tuple of (response data, execution time ms, data received after CONNECT)
+        :raises ATSerialPortError, ATCancelledError
+        """
+        t_start, t_timeout = self._write_command(command, timeout)
+        data = self._read_until(CONNECT_OR_FINAL_RESULT, bytearray(), t_timeout)
+        match = CONNECT_OR_FINAL_RESULT.search(data)
+        t_end = self._clock.now() * 1000
+        if match and match.group().lstrip(b"\r\n").startswith(b"CONNECT"):
+            # Data mode: what follows CONNECT (e.g. the first PPP frames) mustn't be flushed
+            return (
+                bytes(data[: match.end()]),
+                t_end - t_start,
+                bytes(data[match.end() :]),
+            )
+        # Flush input buffer
+        self._device.reset_input_buffer()
+        return (bytes(data), t_end - t_start, b"")
+
+    def _write_command(
+        self, command: str, timeout: Optional[float]
+    ) -> Tuple[float, float]:
+        """
+        Write command to the device
+
+        :param command: command to execute
+        :param timeout: timeout for command, if not set default will be used
+        :type command: str
+        :type timeout: float
+        :returns tuple of (start time ms, timeout time ms)
+        :raises ATSerialPortError, ATCancelledError
+        """
+        if not self._device:
+            raise ATSerialPortError("Serial port device is closed")
+        if self._cancel_token:
+            self._cancel_token.raise_if_cancelled()
+        # Flush before write
+        self.__flush()
+        if not timeout:
+            timeout = self.default_timeout
+            self._device.write_timeout = self.default_timeout
+        else:  # Set write timeout to timeout
+            self._device.write_timeout = timeout
+        # Get start time
+        t_start = self._clock.now() * 1000
+        try:
+            if self._line_break:
+                self._device.write(
+                    b"%s%s"
+                    % (
+                        command.encode(self._encoding),
+                        self._line_break.encode(self._encoding),
+                    )
+                )
+            else:
+                self._device.write(b"%s" % command.encode(self._encoding))
+        except SerialTimeoutException as err:
+            raise ATSerialPortError(str(err))
+        # Set timeout to t_start + timeout seconds
+        return (t_start, t_start + (timeout * 1000))
+
+    def _read_until(
+        self, pattern: Any, data: bytearray, t_timeout: float, start: int = 0
+    ) -> bytearray:
+        """
+        Read from the device until the data matches pattern (or timeout)
+
+        :param pattern: compiled bytes regex
+        :param data: data already read
+        :param t_timeout: timeout time ms
+        :param start: position of data where the pattern is searched from
+        :type pattern: re.Pattern
+        :type data: bytearray
+        :type t_timeout: float
+        :type start: int
+        :returns bytearray
+        """
+        while self._clock.now() * 1000 < t_timeout:
+            read_bytes = self._device.read(self._device.in_waiting)
+            if not read_bytes:
+                self._sleep(POLL_INTERVAL)
+                continue
+            data += read_bytes
+            if pattern.search(data, start):
+                break
+        return data
+
+    def _sleep(self, seconds: float) -> None:
+        """
+        Wait for the provided amount of seconds, unless the execution gets cancelled
+
+        :param seconds
+        :type seconds: float
+        :raises ATCancelledError
+        """
+        self._clock.sleep(seconds, self._cancel_token)
+        if self._cancel_token:
+            self._cancel_token.raise_if_cancelled()
+
+    def __wait_cts(self, t_timeout: float) -> None:
+        """
+        Wait for the device to assert CTS, if hardware flow control is enabled
+
+        :param t_timeout: timeout time ms
+        :type t_timeout: float
+        :raises ATSerialPortError, ATCancelledError
+        """
+        if not self._rtscts:
+            return
+        while not getattr(self._device, "cts", True):
+            if self._clock.now() * 1000 >= t_timeout:
+                raise ATSerialPortError("Timeout waiting for CTS")
+            self._sleep(POLL_INTERVAL)
+
+    def __verify(
+        self, result: TransferResult, checksum_pattern: Optional[Pattern]
+    ) -> None:
+        """
+        Verify the checksum reported by the device
+
+        :param result
+        :param checksum_pattern
+        :type result: TransferResult
+        :type checksum_pattern: re.Pattern
+        :raises ATSerialPortError
+        """
+        if not result.checksum or not checksum_pattern:
+            return
+        reported = result.reported_checksum(checksum_pattern)
+        if reported is None:
+            raise ATSerialPortError("Device didn't report the checksum")
+        if reported != result.checksum.value:
+            raise ATSerialPortError(
+                "Checksum mismatch: computed %s, reported %x"
+                % (result.checksum.hexdigest(), reported)
+            )
+
+    def __decode(self, data: bytes) -> List[str]:
+        """
+        Decode response data into lines
+
+        :param data
+        :type data: bytes
+        :returns list of str
+        :raises ATSerialPortError
+        """
+        try:
+            lines: List[str] = data.decode(
+                self._encoding, self._decode_errors
+            ).splitlines()
+        except UnicodeDecodeError as err:
+            raise ATSerialPortError("Could not decode response: %s" % err)
         for i in range(len(lines)):
             # Remove newline
             if re.search("(\\r|)\\n$", lines[i]):
                 lines[i] = re.sub("(\\r|)\\n$", "", lines[i])
-        # Flush input buffer
-        self._device.reset_input_buffer()
-        return (lines, t_end - t_start)
+        return lines
 
     def __flush(self) -> None:
         """
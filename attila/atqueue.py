@@ -0,0 +1,221 @@
+from .atre import ATRuntimeEnvironment
+from .atcommand import ATCommand
+from .exceptions import ATCancelledError, ATRuntimeError, ATSerialPortError
+
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+import logging
+from threading import Condition, Thread, get_ident
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+# Priorities: the lower the value, the sooner the command is executed
+PRIORITY_URGENT = 0
+PRIORITY_HIGH = 1
+PRIORITY_NORMAL = 2
+PRIORITY_BACKGROUND = 3
+
+
+class ATCommandQueue(object):
+    """
+    ATCommandQueue class is a thread-safe front end of a runtime environment: the commands submitted by
+    any thread are queued and executed one at a time by the queue thread, which is the only one using the
+    runtime environment. Commands with a higher priority (lower value) are executed first; commands with the
+    same priority are taken in turn from each producer (by default the submitting thread), in the order
+    each producer submitted them. A command being executed is never interrupted by a more urgent one
+    """
+
+    def __init__(
+        self,
+        atre: ATRuntimeEnvironment,
+        idle_callback: Optional[Callable[[], Any]] = None,
+        idle_interval: Optional[float] = None,
+    ):
+        """
+        Class constructor. Instantiates a new :class:`.ATCommandQueue.` object with the provided parameters.
+
+        :param atre: runtime environment with a configured communicator
+        :param idle_callback (optional): function called by the queue thread every idle_interval seconds while the queue is empty
+        :param idle_interval (optional): seconds between two calls of idle_callback
+        :type atre: ATRuntimeEnvironment
+        :type idle_callback: function
+        :type idle_interval: float
+        """
+        self._atre = atre
+        self._idle_callback = idle_callback
+        self._idle_interval = idle_interval if idle_callback else None
+        # Priority -> producer -> tasks
+        self._levels: Dict[int, "OrderedDict[Any, Deque[Tuple[Future, Any]]]"] = {}
+        self._pending = 0
+        self._condition = Condition()
+        self._thread: Optional[Thread] = None
+        self._stopped = False
+
+    @property
+    def atre(self):
+        return self._atre
+
+    @property
+    def pending(self) -> int:
+        with self._condition:
+            return self._pending
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        """
+        Open the serial port and start executing the commands
+
+        :raises ATSerialPortError, ATREUninitializedError
+        """
+        if self._thread:
+            return
+        self._atre.open_serial()
+        self._stopped = False
+        self._thread = Thread(target=self.__work, name="attila-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Interrupt the command being executed, fail the queued ones with ATCancelledError and close the serial port
+        """
+        if not self._thread:
+            return
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._atre.cancel()
+        self._thread.join()
+        self._thread = None
+        with self._condition:
+            levels = self._levels
+            self._levels = {}
+            self._pending = 0
+        for level in levels.values():
+            for tasks in level.values():
+                for future, _ in tasks:
+                    # Futures cancelled by the caller are only notified
+                    if future.set_running_or_notify_cancel():
+                        future.set_exception(ATCancelledError("Command queue stopped"))
+        self._atre.cancel_token.reset()
+        try:
+            self._atre.close_serial()
+        except ATSerialPortError as err:
+            logging.error("Could not close serial port: %s", err)
+
+    def submit(
+        self,
+        task: Callable[[ATRuntimeEnvironment], Any],
+        priority: int = PRIORITY_NORMAL,
+        producer: Any = None,
+    ) -> Future:
+        """
+        Queue a task, which is called by the queue thread with the runtime environment
+
+        :param task: function which takes the runtime environment
+        :param priority: the lower the value, the sooner the task is executed
+        :param producer (optional): tasks with the same priority are taken in turn from each producer; submitting thread if not set
+        :type task: function
+        :type priority: int
+        :type producer: any hashable
+        :returns Future: resolved with the value returned by task (or the exception it raised)
+        """
+        future = Future()
+        if producer is None:
+            producer = get_ident()
+        with self._condition:
+            if not self._thread or self._stopped:
+                future.set_exception(ATRuntimeError("Command queue is not running"))
+                return future
+            level = self._levels.setdefault(priority, OrderedDict())
+            level.setdefault(producer, deque()).append((future, task))
+            self._pending += 1
+            self._condition.notify()
+        return future
+
+    def exec(
+        self, command: str, priority: int = PRIORITY_NORMAL, producer: Any = None
+    ) -> Future:
+        """
+        Queue a command (or ESK) to execute in the session, as ATRuntimeEnvironment.exec
+
+        :param command: ATScript row
+        :param priority: the lower the value, the sooner the command is executed
+        :param producer (optional): commands with the same priority are taken in turn from each producer
+        :type command: str
+        :type priority: int
+        :type producer: any hashable
+        :returns Future: resolved with the ATResponse (None for ESKs)
+        """
+        return self.submit(lambda atre: atre.exec(command), priority, producer)
+
+    def exec_many(
+        self,
+        commands: List[Union[str, ATCommand]],
+        priority: int = PRIORITY_NORMAL,
+        producer: Any = None,
+    ) -> Future:
+        """
+        Queue a list of commands to execute in the session, as ATRuntimeEnvironment.exec_many.
+        The commands are executed one after the other, without any other command in between
+
+        :param commands
+        :param priority: the lower the value, the sooner the commands are executed
+        :param producer (optional): commands with the same priority are taken in turn from each producer
+        :type commands: list of str or ATCommand
+        :type priority: int
+        :type producer: any hashable
+        :returns Future: resolved with the list of ATResponse
+        """
+        return self.submit(lambda atre: atre.exec_many(commands), priority, producer)
+
+    def __pop(self) -> Optional[Tuple[Future, Callable[[ATRuntimeEnvironment], Any]]]:
+        """
+        Take the next task: the first one of the next producer with the highest priority.
+        Must be called holding the condition
+        """
+        if not self._levels:
+            return None
+        priority = min(self._levels)
+        level = self._levels[priority]
+        producer, tasks = next(iter(level.items()))
+        item = tasks.popleft()
+        if tasks:
+            # Round robin: the other producers come first
+            level.move_to_end(producer)
+        else:
+            del level[producer]
+            if not level:
+                del self._levels[priority]
+        self._pending -= 1
+        return item
+
+    def __work(self) -> None:
+        """
+        Execute the queued tasks, calling the idle callback while there are none
+        """
+        while True:
+            with self._condition:
+                if self._stopped:
+                    return
+                item = self.__pop()
+                if item is None:
+                    self._condition.wait(self._idle_interval)
+                    if self._stopped:
+                        return
+                    item = self.__pop()
+            if item is None:
+                if self._idle_callback:
+                    try:
+                        self._idle_callback()
+                    except Exception as err:
+                        logging.error("Idle callback failed: %s", err)
+                continue
+            future, task = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(task(self._atre))
+            except Exception as err:
+                future.set_exception(err)
@@ -1,8 +1,18 @@
+from .atbatch import (
+    FINAL_RESULT_CODES,
+    FINAL_RESULT_CODES_RAW,
+    MAX_LINE_LENGTH,
+    get_merge_batch,
+    merge_commands,
+    split_response,
+)
 from .atsession import ATSession
 from .atcommand import ATCommand, ATResponse
+from .atresponse import ATResponseSummary
 from .esk import ESKValue, ESK
 from .atscriptparser import ATScriptParser
 from .exceptions import (
+    ATCancelledError,
     ATScriptNotFound,
     ATScriptSyntaxError,
     ATSerialPortError,
@@ -10,12 +20,40 @@ from .exceptions import (
     ATRuntimeError,
 )
 from .atcommunicator import ATCommunicator
-from .virtual.atvirtualcommunicator import ATVirtualCommunicator
+from .cancel import CancelToken
+from .clock import Clock
+from .bulk import DEFAULT_CHUNK_SIZE, Checksum, TransferResult
 
+from collections import deque
 from os import environ, system
-from time import sleep
 
-from typing import Callable, List, Optional, Tuple, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Callable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Tuple,
+    Union,
+)
+
+# Backends and features which are not needed to run a script are loaded on first use
+if TYPE_CHECKING:
+    from .adaptive import AdaptiveTimeouts
+    from .cmux import CMUXMultiplexer
+    from .datamode import DataModeRelay
+    from .scriptcache import ScriptCache
+    from .sideeffects import SideEffectExecutor, SideEffectResult
+    from .virtual.scenario import VirtualDevice
+
+# History retention policies: entire responses, summaries or nothing
+RETENTION_FULL = "full"
+RETENTION_SUMMARY = "summary"
+RETENTION_NONE = "none"
+RETENTION_POLICIES = (RETENTION_FULL, RETENTION_SUMMARY, RETENTION_NONE)
 
 
 class ATRuntimeEnvironment(object):
@@ -26,31 +64,163 @@ class ATRuntimeEnvironment(object):
     of the command execution flow
     """
 
-    def __init__(self, abort_on_failure: bool = True):
+    def __init__(
+        self,
+        abort_on_failure: bool = True,
+        clock: Optional[Clock] = None,
+        raw_responses: bool = False,
+        decode_errors: str = "strict",
+        max_line_length: int = MAX_LINE_LENGTH,
+        adaptive_timeouts: Optional["AdaptiveTimeouts"] = None,
+        cancel_token: Optional[CancelToken] = None,
+        retention: str = RETENTION_FULL,
+        history_size: Optional[int] = None,
+        script_cache: Optional["ScriptCache"] = None,
+        async_side_effects: bool = False,
+    ):
         """
         Class constructor. Instantiates a new :class:`.ATRuntimeEnvironment.` object with the provided parameters.
 
         :param abort_on_failure
+        :param clock (optional): time source used by the runtime and its communicators; system clock if not set
+        :param raw_responses: keep responses as bytes: expected responses and collectables are matched on bytes and the full response is decoded only when accessed
+        :param decode_errors: error policy used when decoding responses (strict, replace, ignore, backslashreplace...)
+        :param max_line_length: maximum length of a command line made up of merged commands
+        :param adaptive_timeouts (optional): learn the latency of commands and use it as timeout, bounded by the command timeout
+        :param cancel_token (optional): token which interrupts the execution when cancelled; a new one if not set
+        :param retention: what is kept in the history of a run: the entire responses (full), their summaries (summary) or nothing (none)
+        :param history_size (optional): maximum amount of responses kept in the history (the oldest ones are dropped); unbounded if not set
+        :param script_cache (optional): compiled script cache used by parse_ATScript
+        :param async_side_effects: execute PRINT, EXEC and WRITE ESKs in background (as the ASYNC ESK)
         :type abort_on_failure bool
+        :type clock: Clock
+        :type raw_responses: bool
+        :type decode_errors: str
+        :type max_line_length: int
+        :type adaptive_timeouts: AdaptiveTimeouts
+        :type cancel_token: CancelToken
+        :type retention: str
+        :type history_size: int
+        :type script_cache: ScriptCache
+        :type async_side_effects: bool
+        :raises ValueError: if retention is not a retention policy
         """
+        self.__clock: Clock = clock if clock else Clock()
+        self.__raw_responses: bool = raw_responses
+        self.__decode_errors: str = decode_errors
+        self.__max_line_length: int = max_line_length
+        self.__adaptive_timeouts: Optional["AdaptiveTimeouts"] = adaptive_timeouts
+        self.__cancel_token: CancelToken = (
+            cancel_token if cancel_token else CancelToken()
+        )
         self.__session = ATSession([])
-        self.__communicator = ATCommunicator(None, None)
-        self.__script_parser = ATScriptParser()
+        self.__communicator = ATCommunicator(
+            None,
+            None,
+            clock=self.__clock,
+            decode_errors=decode_errors,
+            cancel_token=self.__cancel_token,
+        )
+        self.__script_parser = ATScriptParser(script_cache)
         self.__esks = []
-        self.__virtual_communicator = False
+        # Commands and ESKs of a script parsed while it is executed
+        self.__script_stream: Optional[Iterator[Union[ATCommand, ESKValue]]] = None
+        # Execution index of the next command read from the stream
+        self.__script_index = 0
+        self.__script_group_open = False
+        # Payload ESK for the next command executed with exec
+        self.__payload: Optional[ESKValue] = None
         # ES Params
         self.__aof: bool = abort_on_failure
         self.__current_command = 0
+        # Responses of a group of commands not returned yet
+        self.__pending_responses = deque()
+        # Responses retained by the current run
+        self.retention = retention
+        self.__history: deque = deque(maxlen=history_size)
+        # Time (clock seconds) the current run must end by
+        self.__deadline: Optional[float] = None
+        self.__deadline_exceeded: bool = False
+        # Background execution of PRINT, EXEC and WRITE; the executor is started by the first one
+        self.__async_side_effects: bool = async_side_effects
+        self.__side_effects: Optional["SideEffectExecutor"] = None
+        self.__side_effect_results: List["SideEffectResult"] = []
 
     @property
     def aof(self):
         return self.__aof
 
+    @property
+    def clock(self):
+        return self.__clock
+
+    @property
+    def raw_responses(self):
+        return self.__raw_responses
+
+    @property
+    def decode_errors(self):
+        return self.__decode_errors
+
+    @property
+    def max_line_length(self):
+        return self.__max_line_length
+
+    @max_line_length.setter
+    def max_line_length(self, max_line_length: int):
+        self.__max_line_length = max_line_length
+
+    @property
+    def deadline_exceeded(self):
+        return self.__deadline_exceeded
+
+    @property
+    def retention(self):
+        return self.__retention
+
+    @retention.setter
+    def retention(self, retention: str):
+        if retention not in RETENTION_POLICIES:
+            raise ValueError("Invalid retention policy '%s'" % retention)
+        self.__retention = retention
+
+    @property
+    def history_size(self):
+        return self.__history.maxlen
+
+    @property
+    def history(self) -> List[Union[ATResponse, ATResponseSummary]]:
+        return list(self.__history)
+
+    @property
+    def cancel_token(self):
+        return self.__cancel_token
+
+    @property
+    def adaptive_timeouts(self):
+        return self.__adaptive_timeouts
+
+    @adaptive_timeouts.setter
+    def adaptive_timeouts(self, adaptive_timeouts: Optional["AdaptiveTimeouts"]):
+        self.__adaptive_timeouts = adaptive_timeouts
+
+    @property
+    def async_side_effects(self):
+        return self.__async_side_effects
+
+    @async_side_effects.setter
+    def async_side_effects(self, async_side_effects: bool):
+        self.__async_side_effects = async_side_effects
+
+    @property
+    def side_effect_results(self) -> List["SideEffectResult"]:
+        return list(self.__side_effect_results)
+
     def configure_communicator(
         self,
         serial_port: str,
         baud_rate: int,
-        timeout: int = None,
+        timeout: Optional[float] = None,
         line_break: str = "\r\n",
         rtscts: Optional[bool] = True,
         dsrdtr: Optional[bool] = True,
@@ -66,7 +236,7 @@ class ATRuntimeEnvironment(object):
         :param dsrdtr: use dsrdtr
         :type serial_port: String
         :type baud_rate: int
-        :type timeout: int
+        :type timeout: float
         :type line_break: String
         :type rtscts: bool
         :type dsrdtr: bool
@@ -74,9 +244,14 @@ class ATRuntimeEnvironment(object):
         if self.__communicator:  # If device is open, close device
             if self.__communicator.is_open():
                 self.__communicator.close()
-        if self.__virtual_communicator:
-            self.__communicator = ATCommunicator(serial_port, baud_rate)
-        self.__virtual_communicator = False
+        if type(self.__communicator) is not ATCommunicator:
+            self.__communicator = ATCommunicator(
+                serial_port,
+                baud_rate,
+                clock=self.__clock,
+                decode_errors=self.__decode_errors,
+                cancel_token=self.__cancel_token,
+            )
         self.__communicator.serial_port = serial_port
         self.__communicator.baud_rate = baud_rate
         self.__communicator.default_timeout = timeout
@@ -88,11 +263,12 @@ class ATRuntimeEnvironment(object):
         self,
         serial_port: str,
         baud_rate: int,
-        timeout: int = None,
+        timeout: Optional[float] = None,
         line_break: str = "\r\n",
         read_callback: Optional[Callable[[], str]] = None,
         write_callback: Optional[Callable[[str], None]] = None,
         in_waiting_callback: Optional[Callable[[], int]] = None,
+        device: Optional["VirtualDevice"] = None,
     ) -> None:
         """
         Configure ATRE Virtual communicator
@@ -104,18 +280,21 @@ class ATRuntimeEnvironment(object):
         :param read_callback (optional): Specify a read function to call to read using the virtual communicator
         :param write_callback (optional): Specifiy a write funtion to call to write using the virtual communicator
         :param in_waiting_callback (optional): Specify a in waiting function to call
+        :param device (optional): virtual device running a scenario; replaces the callbacks. It should use the ATRE clock
         :type serial_port: String
         :type baud_rate: int
-        :type timeout: int
+        :type timeout: float
         :type line_break: String
         :type read_callback: function which returns string and takes nbytes as argument, if nbytes is -1 returns all lines
         :type write_callback: function which takes string and raises VirtualSerialException
         :type in_waiting_callback: function which returns True if there are data available to read
+        :type device: VirtualDevice
         """
+        from .virtual.atvirtualcommunicator import ATVirtualCommunicator
+
         if self.__communicator:  # If device is open, close device
             if self.__communicator.is_open():
                 self.__communicator.close()
-        self.__virtual_communicator = True
         self.__communicator = ATVirtualCommunicator(
             serial_port,
             baud_rate,
@@ -124,37 +303,94 @@ class ATRuntimeEnvironment(object):
             read_callback,
             write_callback,
             in_waiting_callback,
+            self.__clock,
+            device,
+        )
+        self.__communicator.decode_errors = self.__decode_errors
+        self.__communicator.cancel_token = self.__cancel_token
+
+    def configure_cmux_communicator(
+        self,
+        multiplexer: "CMUXMultiplexer",
+        dlci: int,
+        timeout: Optional[float] = None,
+        line_break: str = "\r\n",
+    ) -> None:
+        """
+        Configure ATRE communicator to use a DLCI of a multiplexer.
+        Many runtime environments can use different DLCIs of the same multiplexer at the same time
+
+        :param multiplexer: multiplexer running on the device
+        :param dlci: DLCI used by the communicator (1 - 63)
+        :param timeout: default timeout for commands
+        :param line_break: line break used by the device
+        :type multiplexer: CMUXMultiplexer
+        :type dlci: int
+        :type timeout: float
+        :type line_break: String
+        """
+        from .cmux import ATCMUXCommunicator
+
+        if self.__communicator:  # If device is open, close device
+            if self.__communicator.is_open():
+                self.__communicator.close()
+        self.__communicator = ATCMUXCommunicator(
+            multiplexer,
+            dlci,
+            timeout,
+            line_break,
+            self.__clock,
+            decode_errors=self.__decode_errors,
         )
+        self.__communicator.cancel_token = self.__cancel_token
 
     def init_session(self, commands: List[ATCommand]) -> None:
         """
-        Initialize a new ATSession
+        Initialize a new ATSession; the execution starts again from its first command
 
         :param commands
         :type commands: Array of ATCommands
         """
         self.__session.reset()
+        self.__script_stream = None
+        self.__script_index = 0
+        self.__script_group_open = False
+        self.__current_command = 0
+        self.__pending_responses.clear()
         for command in commands:
             self.__session.add_command(command)
 
     def set_ESKs(self, esks: Tuple[ESKValue, int]) -> None:
         """
         Set ATRE Environment Setup Keywords
-        The previous ESKs will be overwritten, the newer will be associated to the current session
+        The previous ESKs will be overwritten, the newer will be associated to the current session:
+        the execution index counts the commands from the beginning of the session
 
         :param esks
         :type esks: tuple of (ESKValue, execution_index)
         """
         self.__esks = esks
 
-    def parse_ATScript(self, script_file: str) -> None:
+    def parse_ATScript(self, script_file: str, stream: bool = False) -> None:
         """
-        Parse an AT Script file
+        Parse an AT Script file.
+        In stream mode the script is parsed while it is executed: commands are read from the file
+        when they are about to be executed and released once executed, so that memory usage and
+        time to first command don't depend on the script size; syntax errors are then raised
+        by the execution, when the wrong row is reached
 
         :param script: Script content
+        :param stream: parse the script while executing it
         :type script_file: String
+        :type stream: bool
         :raises ATScriptSyntaxError, ATScriptNotFound
         """
+        if stream:
+            stream_items = self.__script_parser.iter_parse_file(script_file)
+            self.init_session([])
+            self.set_ESKs([])
+            self.__script_stream = stream_items
+            return
         try:
             parse_result = self.__script_parser.parse_file(script_file)
         except ATScriptNotFound as err:
@@ -176,12 +412,46 @@ class ATRuntimeEnvironment(object):
         """
         return self.__session.add_command(command)
 
-    def run(self) -> List[ATResponse]:
+    def run(
+        self,
+        deadline: Optional[float] = None,
+        callback: Optional[Callable[[ATResponse], Any]] = None,
+        keep_open: bool = False,
+    ) -> List[Union[ATResponse, ATResponseSummary]]:
+        """
+        Starts and run current ATSession.
+        If a deadline is provided (or set by the DEADLINE ESK), delays and timeouts of the commands are capped
+        to the remaining time; once it runs out the run stops and the responses got so far are returned
+        (deadline_exceeded is then True)
+
+        :param deadline (optional): seconds the whole session must be executed within
+        :param callback (optional): function called with each response as soon as it is available
+        :param keep_open: don't close the serial port once the session ends
+        :type deadline: float
+        :type callback: function which takes an ATResponse
+        :type keep_open: bool
+        :returns list of ATResponse (or ATResponseSummary): the history of the run, according to the retention policy
+        :raises ATSerialPortError, ATRuntimeError, ATREUninitializedError, ATCancelledError, ATScriptSyntaxError
         """
-        Starts and run current ATSession
+        for response in self.run_iter(deadline, keep_open):
+            if callback:
+                callback(response)
+        return list(self.__history)
 
-        :returns List of ATResponse
-        :raises ATSerialPortError, ATRuntimeError, ATREUninitializedError
+    def run_iter(
+        self, deadline: Optional[float] = None, keep_open: bool = False
+    ) -> Iterator[ATResponse]:
+        """
+        Starts and run current ATSession, yielding each response as soon as it is available.
+        The serial port is opened by the first iteration and closed once the session ends
+        (or the iteration is stopped), unless keep_open is set; the history is kept according to the retention policy
+
+        :param deadline (optional): seconds the whole session must be executed within
+        :param keep_open: don't close the serial port once the session ends (e.g. to run other sessions on it)
+        :type deadline: float
+        :type keep_open: bool
+        :returns iterator of ATResponse
+        :raises ATSerialPortError, ATRuntimeError, ATREUninitializedError, ATCancelledError, ATScriptSyntaxError
         """
         # Open serial port to initialize communication with device
         if not self.__communicator or not self.__session:
@@ -190,17 +460,73 @@ class ATRuntimeEnvironment(object):
             self.open_serial()
         except ATSerialPortError as err:
             raise err
-        response_list = []
-        while self.__session.get_next_command():  # For each command execute it
-            response = self.exec_next()
-            response_list.append(response)
-            # Proceed with the next command (or its doppelganger maybe...)
+        self.__deadline_exceeded = False
+        self.__deadline = None
+        if deadline is not None:
+            self.__set_deadline(deadline)
+        self.__history.clear()
+        # For each command execute it
+        try:
+            while self.__pending_responses or self.__has_next_command():
+                response = self.exec_next()
+                if response is None and self.__deadline_exceeded:
+                    break
+                if self.__retention == RETENTION_FULL:
+                    self.__history.append(response)
+                elif self.__retention == RETENTION_SUMMARY:
+                    self.__history.append(response.summarize() if response else None)
+                yield response
+                # Proceed with the next command (or its doppelganger maybe...)
+                if self.__deadline_exceeded:
+                    break
+        except (ATCancelledError, GeneratorExit) as err:
+            # Release the serial port before giving up
+            if not keep_open:
+                try:
+                    self.close_serial()
+                except ATSerialPortError:
+                    pass
+            raise err
+        finally:
+            self.__deadline = None
+        # Side effects executed in background are completed within the run
+        if self.__side_effects and self.__side_effects.submitted:
+            self.barrier()
+        if keep_open:
+            return
         # Close serial
         try:
             self.close_serial()
         except ATSerialPortError as err:
             raise err
-        return response_list
+
+    def barrier(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the ESKs executed in background (PRINT, EXEC, WRITE) to complete, in order.
+        The results of the completed ones are then available in side_effect_results
+
+        :param timeout (optional): seconds to wait at most, capped to the time left before the deadline; no limit if not set
+        :type timeout: float
+        :returns bool: True if all of them completed successfully (exit status 0 for EXEC)
+        :raises ATCancelledError
+        """
+        if not self.__side_effects:
+            self.__side_effect_results = []
+            return True
+        remaining = self.__get_remaining_time()
+        if remaining is not None:
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        results, completed = self.__side_effects.barrier(timeout, self.__cancel_token)
+        self.__side_effect_results = results
+        return completed and all(x.succeeded for x in results)
+
+    def cancel(self) -> None:
+        """
+        Cancel the execution: the command being executed (or its delay) is interrupted within milliseconds
+        and ATCancelledError is raised. It can be called from another thread or from a signal handler.
+        The cancel token must be reset before executing other commands
+        """
+        self.__cancel_token.cancel()
 
     def exec(self, command: str) -> Optional[ATResponse]:
         """
@@ -212,7 +538,7 @@ class ATRuntimeEnvironment(object):
         :param command
         :type command String
         :returns ATResponse or None
-        :raises ATScriptSyntaxError, ATSerialPortError, ATREUninitializedError, ATRuntimeError
+        :raises ATScriptSyntaxError, ATSerialPortError, ATREUninitializedError, ATRuntimeError, ATCancelledError
         """
         # Try to parse command
         try:
@@ -229,29 +555,20 @@ class ATRuntimeEnvironment(object):
                 raise ATREUninitializedError("Communicator is not initialized")
             # Clear commands in order to prevent conflicts
             self.__session.clear_commands()
+            if self.__payload:
+                command.payload = self.__payload.value
+                if self.__payload.keyword is ESK.PAYLOADRAW:
+                    command.terminator = None
+                self.__payload = None
             # Add command to session
             self.__session.add_command(command)
             atcmd = self.__session.get_next_command()
             # Delay
             if atcmd is None:
                 return None
-            if atcmd.delay:
-                sleep(atcmd.delay / 1000)
-            # Execute command on device
-            response, execution_time = self.__communicator.exec(
-                atcmd.command, atcmd.timeout
-            )
-            # Validate response
-            response = self.__session.validate_response(response, execution_time)
-            if (
-                self.__session.last_command_failed
-                and not atcmd.doppel_ganger
-                and self.__aof
-            ):
-                raise ATRuntimeError(
-                    "Command '%s' got a bad response: '%s' (and hasn't any doppelganger)!"
-                    % (atcmd.command, response.full_response)
-                )
+            # Execute command on device and validate response
+            response = self.__exec_command(atcmd)
+            self.__check_failure(atcmd, response)
             return response
         elif len(esks) > 0:
             # Process ESK
@@ -262,18 +579,65 @@ class ATRuntimeEnvironment(object):
         else:
             return None
 
+    def exec_many(self, commands: List[Union[str, ATCommand]]) -> List[ATResponse]:
+        """
+        Execute in the current session a list of commands, merging compatible commands
+        in as few command lines as possible (e.g. AT+CSQ;+CREG?;+COPS?).
+        Only extended commands without doppelganger are merged; the following commands mustn't have
+        a delay or use session values. The response of a merged command line is split back
+        into the responses of each command; if the command line fails, its commands are executed one by one.
+        This method doesn't open or close the serial
+
+        :param commands: ATCommand or command rows to be parsed by the ATScriptParser
+        :type commands: list of ATCommand or str
+        :returns list of ATResponse (doppelgangers responses included)
+        :raises ATScriptSyntaxError, ATSerialPortError, ATREUninitializedError, ATRuntimeError
+        """
+        to_execute: List[ATCommand] = []
+        for command in commands:
+            if isinstance(command, ATCommand):
+                to_execute.append(command)
+                continue
+            parsed = self.__script_parser.parse(command)[0]
+            if len(parsed) == 0:
+                raise ATScriptSyntaxError("'%s' is not a command" % command)
+            to_execute.extend(parsed)
+        if not self.__session:
+            raise ATREUninitializedError("Session is not initialized")
+        if not self.__communicator.serial_port:
+            raise ATREUninitializedError("Communicator is not initialized")
+        # Clear commands in order to prevent conflicts
+        self.__session.clear_commands()
+        for command in to_execute:
+            self.__session.add_command(command)
+        return self.__exec_group(len(to_execute))[0]
+
     def exec_next(self) -> Optional[ATResponse]:
         """
         Execute next command (It doesn't open/close the serial port)
+        If the next command begins a group, the whole group is executed and
+        its responses are returned by the next calls
 
-        :returns ATResponse (None if there's no command to execute)
-        :raises ATSerialPortError, ATRuntimeError
+        :returns ATResponse (None if there's no command to execute or the deadline has been exceeded)
+        :raises ATSerialPortError, ATRuntimeError, ATCancelledError, ATScriptSyntaxError
         """
+        if self.__pending_responses:
+            return self.__pending_responses.popleft()
+        self.__cancel_token.raise_if_cancelled()
+        self.__fill_session()
+        if self.__get_remaining_time() == 0:
+            self.__deadline_exceeded = True
+            return None
         # Before executing command, check if an ESK has to be executed
         esks: List[ESKValue] = [
             i[0] for i in self.__esks if i[1] == self.__current_command
         ]
+        group_size = 0
         for esk in esks:
+            if esk.keyword is ESK.GROUP:
+                if esk.value:
+                    group_size = self.__get_group_size()
+                continue
             if not self.__process_ESK(esk) and self.__aof:
                 raise ATRuntimeError(
                     "Runtime Error while processing ESK (%s %s)"
@@ -281,35 +645,515 @@ class ATRuntimeEnvironment(object):
                 )
         # Then remove already executed esks esks
         self.__esks = [i for i in self.__esks if i[1] != self.__current_command]
+        if group_size > 0:
+            # ESKs inside the group are processed before executing it
+            group_end = self.__current_command + group_size
+            for esk, index in self.__esks:
+                if self.__current_command < index < group_end:
+                    if esk.keyword is not ESK.GROUP:
+                        if not self.__process_ESK(esk) and self.__aof:
+                            raise ATRuntimeError(
+                                "Runtime Error while processing ESK (%s %s)"
+                                % (esk.keyword, esk.value)
+                            )
+            self.__esks = [
+                i
+                for i in self.__esks
+                if i[1] <= self.__current_command or i[1] >= group_end
+            ]
+            responses, succeeded = self.__exec_group(group_size)
+            self.__current_command += succeeded
+            if not responses:
+                return None
+            self.__pending_responses.extend(responses[1:])
+            return responses[0]
         # Get next command
         next_command = self.__session.get_next_command()
         if not next_command:
             return None
-        # Delay
-        if next_command.delay:
-            sleep(next_command.delay / 1000)
-        # Send command to communicator
+        # Send command to communicator and validate response
         try:
-            response, execution_time = self.__communicator.exec(
-                next_command.command, next_command.timeout
-            )
+            response = self.__exec_command(next_command)
         except ATSerialPortError as err:
             raise err
-        # Validate response
-        response = self.__session.validate_response(response, execution_time)
-        # Check if last command failed; if it hasn't a doppelganger and abort on failure is True, then raise RuntimeError
+        self.__check_failure(next_command, response)
+        if not self.__session.last_command_failed:
+            self.__current_command += 1
+        return response
+
+    def __has_next_command(self) -> bool:
+        """
+        Returns whether there is a command left to execute in the session (or in the script stream)
+
+        :returns bool
+        :raises ATScriptSyntaxError
+        """
+        self.__fill_session()
+        return len(self.__session.peek_commands(1)) > 0
+
+    def __fill_session(self) -> None:
+        """
+        Read commands and ESKs from the script stream until the next command
+        (or the whole group beginning with it) is in the session.
+        The commands already executed are removed from the session
+
+        :raises ATScriptSyntaxError
+        """
+        if self.__script_stream is None:
+            return
+        self.__session.discard_executed()
+        while self.__script_group_open or not self.__session.peek_commands(1):
+            try:
+                item = next(self.__script_stream)
+            except StopIteration:
+                self.__script_stream = None
+                self.__script_group_open = False
+                return
+            except (ATScriptSyntaxError, ATScriptNotFound) as err:
+                self.__script_stream = None
+                raise err
+            if isinstance(item, ESKValue):
+                if item.keyword is ESK.GROUP:
+                    self.__script_group_open = bool(item.value)
+                self.__esks.append((item, self.__script_index))
+            else:
+                self.__session.add_command(item)
+                self.__script_index += 1
+
+    def __get_group_size(self) -> int:
+        """
+        Get the amount of commands in the group beginning with the current command.
+        A group without end lasts until the end of the session
+
+        :returns int
+        """
+        group_ends = [
+            i[1]
+            for i in self.__esks
+            if i[0].keyword is ESK.GROUP
+            and not i[0].value
+            and i[1] >= self.__current_command
+        ]
+        if group_ends:
+            return min(group_ends) - self.__current_command
+        return len(self.__session.peek_commands())
+
+    def __exec_group(self, count: int) -> Tuple[List[ATResponse], int]:
+        """
+        Execute the next commands of the session, merging them when possible
+
+        :param count: amount of commands to execute (doppelgangers excluded)
+        :type count: int
+        :returns tuple of (list of ATResponse, amount of commands succeeded)
+        :raises ATSerialPortError, ATRuntimeError
+        """
+        responses: List[ATResponse] = []
+        succeeded = 0
+        while count > 0:
+            batch = get_merge_batch(
+                self.__session.peek_commands(count), self.__max_line_length
+            )
+            if not batch:
+                break
+            result = self.__exec_merged(batch) if len(batch) > 1 else None
+            if result is None:
+                # Execute commands one by one
+                for command in batch:
+                    command_responses, command_succeeded = self.__exec_single()
+                    responses.extend(command_responses)
+                    succeeded += command_succeeded
+            else:
+                responses.extend(result[0])
+                succeeded += result[1]
+            count -= len(batch)
+        return (responses, succeeded)
+
+    def __exec_single(self) -> Tuple[List[ATResponse], int]:
+        """
+        Execute the next command of the session and, if it fails, its doppelgangers
+
+        :returns tuple of (list of ATResponse, 1 if succeeded, 0 otherwise)
+        :raises ATSerialPortError, ATRuntimeError
+        """
+        responses: List[ATResponse] = []
+        command = self.__session.get_next_command()
+        while command:
+            response = self.__exec_command(command)
+            self.__check_failure(command, response)
+            responses.append(response)
+            if not self.__session.last_command_failed:
+                return (responses, 1)
+            if not command.doppel_ganger:
+                break
+            command = self.__session.get_next_command()
+        return (responses, 0)
+
+    def __exec_merged(
+        self, commands: List[ATCommand]
+    ) -> Optional[Tuple[List[ATResponse], int]]:
+        """
+        Execute the next commands of the session in a single command line.
+        The response is split and validated for each command
+
+        :param commands: next commands of the session, which can be merged
+        :type commands: list of ATCommand
+        :returns tuple of (list of ATResponse, amount of commands succeeded); None if the command line failed
+        :raises ATSerialPortError, ATRuntimeError
+        """
+        for command in commands:
+            self.__session.prepare(command)
+        command_strs = [x.command for x in commands]
+        # The device answers to the commands one after the other (the deadline caps the timeout)
+        timeout = sum(
+            [
+                x.timeout if x.timeout else self.__communicator.default_timeout
+                for x in commands
+            ]
+        )
+        response, execution_time = self.__send(
+            merge_commands(command_strs), timeout, commands[0].delay, None, None
+        )
+        splitted, final_result = split_response(response, command_strs)
+        if final_result not in ("OK", b"OK"):
+            return None
+        responses: List[ATResponse] = []
+        succeeded = 0
+        for command, lines in zip(commands, splitted):
+            atresponse = self.__session.validate_response(
+                lines + [final_result],
+                execution_time,
+                self.__communicator.encoding,
+                self.__decode_errors,
+            )
+            self.__check_failure(command, atresponse)
+            if not self.__session.last_command_failed:
+                succeeded += 1
+            responses.append(atresponse)
+        return (responses, succeeded)
+
+    def __check_failure(self, command: ATCommand, response: ATResponse) -> None:
+        """
+        Check if last command failed; if it hasn't a doppelganger and abort on failure is True, then raise RuntimeError
+
+        :param command
+        :param response
+        :type command: ATCommand
+        :type response: ATResponse
+        :raises ATRuntimeError
+        """
+        # Once the deadline has been exceeded the run just stops
         if (
             self.__session.last_command_failed
-            and not next_command.doppel_ganger
+            and not command.doppel_ganger
             and self.__aof
+            and not self.__deadline_exceeded
         ):
             raise ATRuntimeError(
                 "Command '%s' got a bad response: '%s' (and hasn't any doppelganger)!"
-                % (next_command.command, response.full_response)
+                % (command.command, response.get_printable_response()),
+                response,
             )
-        if not self.__session.last_command_failed:
-            self.__current_command += 1
-        return response
+
+    def __send(
+        self,
+        command: str,
+        timeout: Optional[float],
+        delay: Optional[int],
+        payload: Optional[Union[str, bytes]],
+        terminator: Optional[bytes],
+        connect: bool = False,
+    ) -> Tuple[Union[List[str], List[bytes]], int]:
+        """
+        Send a command line to the device, waiting for the delay first.
+        If a payload is provided, it is sent as soon as the device prompts for it
+
+        :param command
+        :param timeout
+        :param delay: delay in milliseconds
+        :param payload
+        :param terminator: sent after the payload
+        :param connect: the command makes the device enter data mode; the response is read up to CONNECT
+        :type command: str
+        :type timeout: float
+        :type delay: int
+        :type payload: str or bytes
+        :type terminator: bytes
+        :type connect: bool
+        :returns tuple of (response lines, execution time); with connect, the data received after CONNECT follows
+        :raises ATSerialPortError
+        """
+        remaining = self.__get_remaining_time()
+        if delay:
+            if remaining is not None:
+                delay = min(delay, remaining * 1000)
+            self.__clock.sleep(delay / 1000, self.__cancel_token)
+            self.__cancel_token.raise_if_cancelled()
+        adaptive = self.__adaptive_timeouts
+        device = self.__communicator.serial_port
+        if adaptive:
+            learned_timeout = adaptive.get_timeout(
+                device,
+                command,
+                timeout if timeout else self.__communicator.default_timeout,
+            )
+            if learned_timeout is not None:
+                timeout = learned_timeout
+        remaining = self.__get_remaining_time()
+        if remaining is not None:
+            if remaining == 0:
+                # Deadline exceeded: the command isn't sent
+                self.__deadline_exceeded = True
+                return ([], 0, b"") if connect else ([], 0)
+            if remaining < (
+                timeout if timeout else self.__communicator.default_timeout
+            ):
+                timeout = remaining
+                # A timeout caused by the deadline doesn't tell anything about the command latency
+                adaptive = None
+        if payload is not None:
+            if isinstance(payload, str):
+                payload = payload.encode(self.__communicator.encoding)
+            if self.__raw_responses:
+                result = self.__communicator.exec_prompt_raw(
+                    command, payload, timeout, terminator
+                )
+            else:
+                result = self.__communicator.exec_prompt(
+                    command, payload, timeout, terminator
+                )
+        elif connect and self.__raw_responses:
+            result = self.__communicator.exec_connect_raw(command, timeout)
+        elif connect:
+            result = self.__communicator.exec_connect(command, timeout)
+        elif self.__raw_responses:
+            result = self.__communicator.exec_raw(command, timeout)
+        else:
+            result = self.__communicator.exec(command, timeout)
+        if adaptive:
+            # A response without final result code timed out
+            final_regex = (
+                FINAL_RESULT_CODES_RAW if self.__raw_responses else FINAL_RESULT_CODES
+            )
+            lines = [x.strip() for x in result[0] if x.strip()]
+            timed_out = not lines or not final_regex.match(lines[-1])
+            adaptive.observe(device, command, result[1] / 1000, timed_out)
+        if self.__get_remaining_time() == 0:
+            self.__deadline_exceeded = True
+        return result
+
+    def __set_deadline(self, seconds: float) -> None:
+        """
+        Set the deadline of the current run, unless an earlier one has already been set
+
+        :param seconds: seconds from now
+        :type seconds: float
+        """
+        deadline = self.__clock.now() + seconds
+        if self.__deadline is None or deadline < self.__deadline:
+            self.__deadline = deadline
+
+    def __get_remaining_time(self) -> Optional[float]:
+        """
+        Get the time left before the deadline
+
+        :returns float: seconds (0 if exceeded); None if there's no deadline
+        """
+        if self.__deadline is None:
+            return None
+        return max(0.0, self.__deadline - self.__clock.now())
+
+    def __exec_command(self, command: ATCommand) -> ATResponse:
+        """
+        Execute a prepared command on the device (waiting for its delay first) and validate its response
+
+        :param command
+        :type command: ATCommand
+        :returns ATResponse
+        :raises ATSerialPortError
+        """
+        response, execution_time = self.__send(
+            command.command,
+            command.timeout,
+            command.delay,
+            command.payload,
+            command.terminator,
+        )
+        return self.__session.validate_response(
+            response,
+            execution_time,
+            self.__communicator.encoding,
+            self.__decode_errors,
+        )
+
+    def data_mode(
+        self,
+        peer: Any,
+        command: Optional[str] = None,
+        buffer_size: Optional[int] = None,
+    ) -> "DataModeRelay":
+        """
+        Get a relay for the data mode, which moves raw bytes between the serial port and a peer (a pty or a socket).
+        If a command is provided (e.g. 'ATD*99***1#;;CONNECT'), it is executed first and it must get CONNECT.
+        Once the relay has escaped the data mode, commands can be executed again on the same serial port.
+        This method doesn't open or close the serial
+
+        :param peer: file descriptor or object with fileno (socket, file...)
+        :param command (optional): command which makes the device enter data mode
+        :param buffer_size (optional): maximum amount of bytes moved by a single transfer (DEFAULT_BUFFER_SIZE if not set)
+        :type peer: int or object
+        :type command: str
+        :type buffer_size: int
+        :returns DataModeRelay
+        :raises ATScriptSyntaxError, ATSerialPortError, ATREUninitializedError, ATRuntimeError
+        """
+        from .datamode import DEFAULT_BUFFER_SIZE, DataModeRelay, get_fileno
+
+        if not self.__communicator.is_open():
+            raise ATREUninitializedError("Communicator is not open")
+        pending = b""
+        if command:
+            response, pending = self.__exec_connect(command)
+            if (
+                response is None
+                or response.response is None
+                or "CONNECT" not in response.response
+            ):
+                raise ATRuntimeError("Command '%s' didn't CONNECT" % command)
+        return DataModeRelay(
+            self.__communicator.fileno(),
+            get_fileno(peer),
+            buffer_size if buffer_size else DEFAULT_BUFFER_SIZE,
+            self.__clock,
+            pending=pending,
+        )
+
+    def __exec_connect(self, command: str) -> Tuple[Optional[ATResponse], bytes]:
+        """
+        Execute in the current session a command which makes the device enter data mode.
+        The data received after CONNECT is returned instead of being flushed
+
+        :param command: ATScript row
+        :type command: str
+        :returns tuple of (ATResponse, data received after CONNECT)
+        :raises ATScriptSyntaxError, ATSerialPortError, ATRuntimeError
+        """
+        commands = self.__script_parser.parse(command)[0]
+        if len(commands) != 1:
+            raise ATScriptSyntaxError("'%s' is not a command" % command)
+        self.__session.clear_commands()
+        self.__session.add_command(commands[0])
+        atcmd = self.__session.get_next_command()
+        if atcmd is None:
+            return (None, b"")
+        lines, execution_time, pending = self.__send(
+            atcmd.command, atcmd.timeout, atcmd.delay, None, None, True
+        )
+        response = self.__session.validate_response(
+            lines,
+            execution_time,
+            self.__communicator.encoding,
+            self.__decode_errors,
+        )
+        self.__check_failure(atcmd, response)
+        return (response, pending)
+
+    def autobaud(
+        self, upshift: bool = False, max_baud_rate: Optional[int] = None
+    ) -> int:
+        """
+        Detect the baud rate of the device, probing it with AT at the common baud rates.
+        If upshift is True, the link is then raised to the highest baud rate the device accepts (AT+IPR),
+        up to max_baud_rate. This method doesn't open or close the serial
+
+        :param upshift: raise the baud rate after the detection
+        :param max_baud_rate (optional): highest baud rate to use when upshifting
+        :type upshift: bool
+        :type max_baud_rate: int
+        :returns int: baud rate in use
+        :raises ATSerialPortError, ATREUninitializedError, ATRuntimeError
+        """
+        if not self.__communicator.is_open():
+            raise ATREUninitializedError("Communicator is not open")
+        baud_rate = self.__communicator.autobaud()
+        if baud_rate is None:
+            raise ATRuntimeError("Could not detect the baud rate of the device")
+        if upshift:
+            baud_rate = self.__communicator.upshift(max_baud_rate)
+        return baud_rate
+
+    def upload(
+        self,
+        command: str,
+        source: BinaryIO,
+        size: Optional[int] = None,
+        timeout: Optional[float] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        checksum: Optional[Checksum] = None,
+        checksum_pattern: Optional[Pattern] = None,
+    ) -> TransferResult:
+        """
+        Send a file to the device with a command such as AT+QFUPL, streaming it from source.
+        This method doesn't open or close the serial
+
+        :param command: command which receives the file
+        :param source: binary file object the content is read from
+        :param size (optional): amount of bytes to send; until EOF if not set
+        :param timeout (optional): timeout for the whole transfer
+        :param chunk_size: amount of bytes written at once
+        :param checksum (optional): checksum computed on the fly
+        :param checksum_pattern (optional): bytes regex matching the checksum (hex) reported by the device
+        :type command: str
+        :type source: BinaryIO
+        :type size: int
+        :type timeout: float
+        :type chunk_size: int
+        :type checksum: Checksum
+        :type checksum_pattern: re.Pattern
+        :returns TransferResult
+        :raises ATSerialPortError, ATREUninitializedError
+        """
+        if not self.__communicator.is_open():
+            raise ATREUninitializedError("Communicator is not open")
+        return self.__communicator.upload(
+            command, source, size, timeout, chunk_size, checksum, checksum_pattern
+        )
+
+    def download(
+        self,
+        command: str,
+        sink: BinaryIO,
+        size: Optional[int] = None,
+        timeout: Optional[float] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        checksum: Optional[Checksum] = None,
+        checksum_pattern: Optional[Pattern] = None,
+    ) -> TransferResult:
+        """
+        Receive a file from the device with a command such as AT+QFDWL, streaming it to sink.
+        This method doesn't open or close the serial
+
+        :param command: command which sends the file
+        :param sink: binary file object the content is written to
+        :param size (optional): size of the file, if known
+        :param timeout (optional): timeout for the whole transfer
+        :param chunk_size: maximum amount of bytes read at once
+        :param checksum (optional): checksum computed on the fly
+        :param checksum_pattern (optional): bytes regex matching the checksum (hex) reported by the device
+        :type command: str
+        :type sink: BinaryIO
+        :type size: int
+        :type timeout: float
+        :type chunk_size: int
+        :type checksum: Checksum
+        :type checksum_pattern: re.Pattern
+        :returns TransferResult
+        :raises ATSerialPortError, ATREUninitializedError
+        """
+        if not self.__communicator.is_open():
+            raise ATREUninitializedError("Communicator is not open")
+        return self.__communicator.download(
+            command, sink, size, timeout, chunk_size, checksum, checksum_pattern
+        )
 
     def open_serial(self) -> None:
         """
@@ -341,6 +1185,17 @@ class ATRuntimeEnvironment(object):
         except ATSerialPortError as err:
             raise err
 
+    def read_available(self) -> bytes:
+        """
+        Read the data sent by the device while no command is being executed (e.g. URCs)
+
+        :returns bytes: empty if there is no data available
+        :raises ATSerialPortError, ATREUninitializedError
+        """
+        if not self.__communicator.serial_port:
+            raise ATREUninitializedError("Communicator is not initialized")
+        return self.__communicator.read_available()
+
     def get_session_value(self, key: str) -> Union[str, int]:
         """
         Try to get a value from the current session storage
@@ -399,15 +1254,48 @@ class ATRuntimeEnvironment(object):
         elif esk.keyword is ESK.PRINT:
             # Replace session values
             to_out = self.__session.replace_session_keys(esk.value)
-            print(to_out)
+            if self.__async_side_effects:
+                self.__get_side_effects().print(to_out)
+            else:
+                print(to_out)
         elif esk.keyword is ESK.EXEC:
+            if self.__async_side_effects:
+                # Fire and forget: the exit status is checked by BARRIER
+                self.__get_side_effects().exec(esk.value)
+                return True
             rc = system(esk.value)
             if rc != 0:
                 return False
         elif esk.keyword is ESK.WRITE:
             file_path = esk.value[0]
             write_cnt = esk.value[1]
+            if self.__async_side_effects:
+                self.__get_side_effects().write(
+                    file_path, self.__session.replace_session_keys(write_cnt)
+                )
+                return True
             return self.__write_file(file_path, write_cnt)
+        elif esk.keyword is ESK.ASYNC:
+            # Side effects executed in background come before the ones executed from now on
+            if not esk.value and self.__async_side_effects:
+                self.__async_side_effects = False
+                return self.barrier()
+            self.__async_side_effects = esk.value
+        elif esk.keyword is ESK.BARRIER:
+            return self.barrier(esk.value)
+        elif esk.keyword is ESK.GROUP:
+            # Groups are handled when executing commands
+            pass
+        elif esk.keyword in (ESK.PAYLOAD, ESK.PAYLOADRAW):
+            # Payload for the next command executed
+            self.__payload = esk
+        elif esk.keyword is ESK.DEADLINE:
+            self.__set_deadline(esk.value)
+        elif esk.keyword is ESK.AUTOBAUD:
+            try:
+                self.autobaud(esk.value[0], esk.value[1])
+            except (ATREUninitializedError, ATRuntimeError, ATSerialPortError):
+                return False
         else:
             return False
         return True
@@ -437,6 +1325,16 @@ class ATRuntimeEnvironment(object):
         else:
             return True
 
+    def __get_side_effects(self) -> "SideEffectExecutor":
+        """
+        Get the executor of the side effects, instancing it on first use
+        """
+        if not self.__side_effects:
+            from .sideeffects import SideEffectExecutor
+
+            self.__side_effects = SideEffectExecutor()
+        return self.__side_effects
+
     def __write_file(self, file_path: str, content: str) -> bool:
         """
         Write file from ESK.
@@ -1,18 +1,34 @@
+from .exceptions import ATSerialPortError
+
 from typing import List, Union, Any, Optional
 
 
 class ATResponse(object):
     """
     This class represents an AT command response and provide access to the expected
-    response format, the entire response and the command execution time (milliseconds)
+    response format, the entire response and the command execution time (milliseconds).
+    If the entire response is provided as bytes, it is decoded only when accessed
     """
 
+    __slots__ = (
+        "_response",
+        "_raw_response",
+        "_full_response",
+        "_encoding",
+        "_errors",
+        "_execution_time",
+        "_command",
+        "_collectables",
+    )
+
     def __init__(
         self,
         resp: Optional[str],
-        fullresponse: List[str],
+        fullresponse: Union[List[str], List[bytes]],
         command: Any,
-        executiontime: int = 0,
+        executiontime: float = 0,
+        encoding: str = "utf-8",
+        errors: str = "strict",
     ):
         """
         Class constructor. Instantiates a new :class:`.ATResponse.` object with the provided parameters.
@@ -21,16 +37,28 @@ class ATResponse(object):
         :param fullresponse: entire response received from command execution
         :param command: command associated to response
         :param executiontime: execution time of the command in milliseconds
+        :param encoding: encoding used to decode the entire response, if provided as bytes
+        :param errors: decoding error policy
         :type resp: Optional[str]
-        :type fullresponse: list of string
+        :type fullresponse: list of string or list of bytes
         :type command: ATCommand
-        :type executiontime: int
+        :type executiontime: float
+        :type encoding: str
+        :type errors: str
         """
         self._response = resp
-        self._full_response = fullresponse
+        if fullresponse and isinstance(fullresponse[0], (bytes, bytearray)):
+            self._raw_response = fullresponse
+            self._full_response = None
+        else:
+            self._raw_response = None
+            self._full_response = fullresponse
+        self._encoding = encoding
+        self._errors = errors
         self._execution_time = executiontime
         self._command = command
-        self._collectables = {}
+        # Allocated with the first collectable
+        self._collectables: Optional[dict] = None
 
     @property
     def response(self):
@@ -42,11 +70,36 @@ class ATResponse(object):
 
     @property
     def full_response(self):
+        if self._full_response is None:
+            try:
+                self._full_response = [
+                    line.decode(self._encoding, self._errors)
+                    for line in self._raw_response
+                ]
+            except UnicodeDecodeError as err:
+                raise ATSerialPortError("Could not decode response: %s" % err)
         return self._full_response
 
     @full_response.setter
     def full_response(self, full_response: List[str]):
         self._full_response = full_response
+        self._raw_response = None
+
+    @property
+    def raw_response(self):
+        if self._raw_response is None:
+            return [line.encode(self._encoding) for line in self._full_response]
+        return self._raw_response
+
+    def get_printable_response(self) -> List[str]:
+        """
+        Get the entire response, replacing the bytes which can't be decoded (e.g. to report a failure)
+
+        :returns list of str
+        """
+        if self._full_response is not None:
+            return self._full_response
+        return [line.decode(self._encoding, "replace") for line in self._raw_response]
 
     @property
     def command(self):
@@ -57,7 +110,7 @@ class ATResponse(object):
         return self._execution_time
 
     @execution_time.setter
-    def execution_time(self, executiontime: int):
+    def execution_time(self, executiontime: float):
         if executiontime > 0:
             self._execution_time = executiontime
         else:
@@ -74,6 +127,8 @@ class ATResponse(object):
         :returns None
         """
 
+        if self._collectables is None:
+            self._collectables = {}
         self._collectables[key] = value
         return
 
@@ -85,4 +140,98 @@ class ATResponse(object):
         :type key: string
         :returns Union[str, int]
         """
+        if self._collectables is None:
+            return None
         return self._collectables.get(key)
+
+    def summarize(self) -> "ATResponseSummary":
+        """
+        Get a summary of the response, which doesn't keep the entire response nor the command
+
+        :returns ATResponseSummary
+        """
+        return ATResponseSummary(
+            self._command.command if self._command else None,
+            self._response,
+            self._execution_time,
+            dict(self._collectables) if self._collectables else None,
+        )
+
+
+class ATResponseSummary(object):
+    """
+    This class represents the summary of an AT command response: the command line, the response in the
+    expected format, the execution time and the collectables. It is retained in place of the response
+    when the entire response isn't needed anymore
+    """
+
+    __slots__ = ("_command", "_response", "_execution_time", "_collectables")
+
+    def __init__(
+        self,
+        command: Optional[str],
+        resp: Optional[str],
+        executiontime: float = 0,
+        collectables: Optional[dict] = None,
+    ):
+        """
+        Class constructor. Instantiates a new :class:`.ATResponseSummary.` object with the provided parameters.
+
+        :param command: command line
+        :param resp: main response from command (None if the command failed)
+        :param executiontime: execution time of the command in milliseconds
+        :param collectables (optional): collectables of the response
+        :type command: str
+        :type resp: Optional[str]
+        :type executiontime: float
+        :type collectables: dict
+        """
+        self._command = command
+        self._response = resp
+        self._execution_time = executiontime
+        self._collectables = collectables
+
+    @property
+    def command(self):
+        return self._command
+
+    @property
+    def response(self):
+        return self._response
+
+    @property
+    def execution_time(self):
+        return self._execution_time
+
+    @property
+    def succeeded(self):
+        return self._response is not None
+
+    def get_collectable(self, key: str) -> Union[str, int]:
+        """
+        Returns the value associated to the collectable
+
+        :param key: key of the collectable
+        :type key: string
+        :returns Union[str, int]
+        """
+        if self._collectables is None:
+            return None
+        return self._collectables.get(key)
+
+    def to_dict(self) -> dict:
+        """
+        Get the summary as a dict of plain values (e.g. to be serialized as JSON)
+
+        :returns dict
+        """
+        response = self._response
+        if isinstance(response, bytes):
+            response = response.decode("utf-8", "replace")
+        return {
+            "command": self._command,
+            "response": response,
+            "execution_time": self._execution_time,
+            "succeeded": self.succeeded,
+            "collectables": dict(self._collectables) if self._collectables else {},
+        }
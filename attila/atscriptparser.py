@@ -1,8 +1,25 @@
-from .exceptions import ATScriptNotFound, ATScriptSyntaxError
-from .atcommand import ATCommand
+from .exceptions import (
+    ATCollectableSyntaxError,
+    ATScriptNotFound,
+    ATScriptSyntaxError,
+)
+from .collectables import parse_collectables
+from .atcommand import ATCommand, CTRL_Z, parse_time
 from .esk import ESK, ESKValue
 
-from typing import List, Optional, Tuple
+from typing import (
+    TYPE_CHECKING,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+    Union,
+)
+
+if TYPE_CHECKING:
+    from .scriptcache import ScriptCache
 
 
 class ATScriptParser(object):
@@ -10,6 +27,23 @@ class ATScriptParser(object):
     This class represents an AT script parser, which is the component which purpose is to parse an ATScript.
     """
 
+    def __init__(self, cache: Optional["ScriptCache"] = None):
+        """
+        Class constructor. Instantiates a new :class:`.ATScriptParser.` object with the provided parameters.
+
+        :param cache (optional): compiled script cache used by parse_file
+        :type cache: ScriptCache
+        """
+        self._cache = cache
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @cache.setter
+    def cache(self, cache: Optional["ScriptCache"]):
+        self._cache = cache
+
     def parse(self, script: str) -> Tuple[List[ATCommand], List[Tuple[ESKValue, int]]]:
         """
         Parse an ATScript
@@ -19,22 +53,91 @@ class ATScriptParser(object):
         :returns Tuple of array of ATCommand and array of tuple of (ESKValue, execution index)
         :raises ATScriptSyntaxError
         """
-        result = ([], [])
-        commands = result[0]
-        esks = result[1]
-        execution_index = 0
+        return self.__collect(self.iter_parse(script.splitlines()))
+
+    def parse_file(
+        self, file_path: str
+    ) -> Tuple[List[ATCommand], List[Tuple[ESKValue, int]]]:
+        """
+        Parse an ATScript file.
+        If the parser has a cache, the compiled script is loaded from it when up to date,
+        otherwise the script is parsed and stored in the cache
+
+        :param file_path: path of the ATScript file
+        :type file_path: String
+        :returns Tuple of array of ATCommand and array of tuple of (ESKValue, execution index)
+        :raises ATScriptNotFound, ATScriptSyntaxError
+        """
+        if self._cache:
+            return self.compile_file(file_path)
+        try:
+            with open(file_path) as hnd:
+                return self.__collect(self.iter_parse(hnd))
+        except IOError as err:
+            raise ATScriptNotFound(err)
+        except ATScriptSyntaxError as err:
+            raise err
+
+    def compile_file(
+        self, file_path: str
+    ) -> Tuple[List[ATCommand], List[Tuple[ESKValue, int]]]:
+        """
+        Parse an ATScript file through the compiled script cache; a cache which can't be written is ignored
+
+        :param file_path: path of the ATScript file
+        :type file_path: String
+        :returns Tuple of array of ATCommand and array of tuple of (ESKValue, execution index)
+        :raises ATScriptNotFound, ATScriptSyntaxError
+        """
+        from locale import getpreferredencoding
+        from .scriptcache import ScriptCache
+
+        cache = self._cache if self._cache else ScriptCache()
+        try:
+            with open(file_path, "rb") as hnd:
+                content = hnd.read()
+        except IOError as err:
+            raise ATScriptNotFound(err)
+        result = cache.load(file_path, content)
+        if result is not None:
+            return result
+        try:
+            script = content.decode(getpreferredencoding(False))
+        except UnicodeDecodeError as err:
+            raise ATScriptSyntaxError("Could not decode script: %s" % err)
+        result = self.parse(script)
+        try:
+            cache.store(file_path, content, result)
+        except OSError:
+            pass
+        return result
+
+    def iter_parse(self, rows: Iterable[str]) -> Iterator[Union[ATCommand, ESKValue]]:
+        """
+        Parse an ATScript row by row, yielding commands and ESKs in the order they appear in the script.
+        The ESKs yielded before a command are executed before it; payloads are attached to the next command
+
+        :param rows: rows of the at script (trailing line breaks are ignored)
+        :type rows: iterable of String
+        :returns iterator of ATCommand and ESKValue
+        :raises ATScriptSyntaxError
+        """
         line_no = 0
-        # Split script into rows
-        for row in script.splitlines():
+        # Payload for the next command
+        payload: Optional[ESKValue] = None
+        for row in rows:
             # Increment line number
             line_no += 1
+            row = row.rstrip("\r\n")
             if not row:  # Empty row
                 continue
             if row.startswith("#"):  # Is comment
                 continue
             eks, error = self.__parse_esk(row)
-            if eks:
-                esks.append((eks, execution_index))
+            if eks and eks.keyword in (ESK.PAYLOAD, ESK.PAYLOADRAW):
+                payload = eks
+            elif eks:
+                yield eks
             elif error:  # If error is set, it means line is EKS, but has invalid syntax
                 raise ATScriptSyntaxError(
                     "Syntax error at line %d: %s (%s)" % (line_no, error, row)
@@ -43,9 +146,15 @@ class ATScriptParser(object):
                 # Try as ommand
                 command, error = self.__parse_command(row)
                 if command:
-                    commands.append(command)
-                    # Increment execution_index
-                    execution_index += 1
+                    if payload:
+                        # Text payloads are terminated by Ctrl-Z, raw payloads are length-delimited
+                        command.payload = payload.value
+                        if payload.keyword is ESK.PAYLOADRAW:
+                            command.terminator = None
+                        else:
+                            command.terminator = CTRL_Z
+                        payload = None
+                    yield command
                 elif error:
                     raise ATScriptSyntaxError(
                         "Syntax error at line %d: %s (%s)" % (line_no, error, row)
@@ -55,28 +164,53 @@ class ATScriptParser(object):
                         "Syntax error at line %d: %s -- Don't know how to interpret this line, sorry..."
                         % (line_no, row)
                     )
-        return result
+        if payload:
+            # Payload without a command: it's up to the runtime environment
+            yield payload
 
-    def parse_file(
-        self, file_path: str
-    ) -> Tuple[List[ATCommand], List[Tuple[ESKValue, int]]]:
+    def iter_parse_file(self, file_path: str) -> Iterator[Union[ATCommand, ESKValue]]:
         """
-        Parse an ATScript file
+        Parse an ATScript file while reading it, yielding commands and ESKs in order.
+        Only the row being parsed is kept in memory; the file is closed once the iteration ends
 
         :param file_path: path of the ATScript file
         :type file_path: String
-        :returns Tuple of array of ATCommand and array of tuple of (ESKValue, execution index)
+        :returns iterator of ATCommand and ESKValue
         :raises ATScriptNotFound, ATScriptSyntaxError
         """
         try:
             hnd = open(file_path)
-            script = hnd.read()
-            hnd.close()
-            return self.parse(script)
         except IOError as err:
             raise ATScriptNotFound(err)
-        except ATScriptSyntaxError as err:
-            raise err
+        return self.__iter_file(hnd)
+
+    def __iter_file(self, hnd: TextIO) -> Iterator[Union[ATCommand, ESKValue]]:
+        """
+        Parse an open ATScript file, closing it at the end
+        """
+        with hnd:
+            try:
+                yield from self.iter_parse(hnd)
+            except IOError as err:
+                raise ATScriptNotFound(err)
+
+    def __collect(
+        self, items: Iterator[Union[ATCommand, ESKValue]]
+    ) -> Tuple[List[ATCommand], List[Tuple[ESKValue, int]]]:
+        """
+        Collect the parsed commands and the ESKs with their execution index
+
+        :returns Tuple of array of ATCommand and array of tuple of (ESKValue, execution index)
+        :raises ATScriptSyntaxError
+        """
+        commands = []
+        esks = []
+        for item in items:
+            if isinstance(item, ESKValue):
+                esks.append((item, len(commands)))
+            else:
+                commands.append(item)
+        return (commands, esks)
 
     def __parse_esk(self, row: str) -> Tuple[Optional[ESKValue], str]:
         """
@@ -101,6 +235,10 @@ class ATScriptParser(object):
         if not esk:
             # Not an ESK
             return (esk_value, error)  # None, None
+        if esk in (ESK.PAYLOAD, ESK.PAYLOADRAW):
+            # Payloads are taken as they are, after the keyword and its separator (whitespaces included)
+            remainder = row.lstrip()[len(esk_str) + 1 :]
+            esk_attr = remainder if remainder else None
         # Eval attributes
         esk_value = ESK.to_ESKValue(esk, esk_attr)
         if not esk_value:
@@ -129,6 +267,7 @@ class ATScriptParser(object):
         delay = 0
         timeout = None
         collectables = None
+        extractors = None
         doppelganger = None
         doppelganger_response = None
         has_doppelganger = False
@@ -138,27 +277,30 @@ class ATScriptParser(object):
         if len(command_tokens) > 2:  # Delay
             if command_tokens[2]:
                 try:
-                    delay = int(command_tokens[2])
+                    delay = parse_time(command_tokens[2], "ms") * 1000
                 except ValueError:
                     error = "Delay is not a number"
                     return (command, error)
         if len(command_tokens) > 3:  # Timeout
             if command_tokens[3]:
                 try:
-                    timeout = int(command_tokens[3])
+                    timeout = parse_time(command_tokens[3])
                 except ValueError:
                     error = "Timeout is not a number"
                     return (command, error)
         if len(command_tokens) > 4:  # Collectables
             if command_tokens[4]:
                 try:
-                    collectables = eval(command_tokens[4])
-                except NameError as err:
-                    error = "Collectables has invalid syntax (%s)" % err
-                    return (command, error)
-                except SyntaxError as err:
-                    error = "Collectables has invalid syntax (%s)" % err
+                    extractors = list(parse_collectables(command_tokens[4]))
+                except ATCollectableSyntaxError as err:
+                    # Column in the row
+                    column = len(";;".join(command_tokens[:4])) + 2 + err.column
+                    error = "Collectables has invalid syntax (%s at column %d)" % (
+                        err.message,
+                        column,
+                    )
                     return (command, error)
+                collectables = [x.source for x in extractors]
         if len(command_tokens) > 5:  # Doppelganger
             if command_tokens[5]:
                 has_doppelganger = True
@@ -175,6 +317,8 @@ class ATScriptParser(object):
                 collectables,
                 None,
             )
+            if extractors is not None:
+                doppelganger.extractors = extractors
         # Instance new AT command
         command = ATCommand(
             atcommand,
@@ -184,4 +328,6 @@ class ATScriptParser(object):
             collectables,
             doppelganger,
         )
+        if extractors is not None:
+            command.extractors = extractors
         return (command, error)
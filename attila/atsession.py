@@ -1,8 +1,9 @@
 from .atcommand import ATCommand
 from .atresponse import ATResponse
+from .collectables import _compile
 
 import re
-from typing import List, Dict, Optional, Union, Tuple
+from typing import List, Dict, Optional, Union
 
 
 class ATSession(object):
@@ -52,6 +53,13 @@ class ATSession(object):
         self._current_command_index = 0
         self._last_command_failed = False
 
+    def discard_executed(self) -> None:
+        """
+        Remove the commands already executed from the command list (their responses are released too)
+        """
+        del self._commands[: self._current_command_index]
+        self._current_command_index = 0
+
     def add_command(self, command: ATCommand) -> bool:
         """
         Add a command at the end of the command list
@@ -84,7 +92,7 @@ class ATSession(object):
         :type command: string
         :type ATResponse: string
         :type exp_respose: string
-        :type tout: int
+        :type tout: float
         :type delay: int
         :type collectables: list of string
         :type dganger: ATCommand
@@ -126,6 +134,20 @@ class ATSession(object):
         # Return command
         return next_command
 
+    def peek_commands(self, count: Optional[int] = None) -> List[ATCommand]:
+        """
+        Get the next commands to execute, without preparing them
+
+        :param count (optional): maximum amount of commands to get; all the remaining commands if not set
+        :type count: int
+        :returns list of ATCommand
+        """
+        if count is None:
+            return self._commands[self._current_command_index :]
+        return self._commands[
+            self._current_command_index : self._current_command_index + count
+        ]
+
     def get_command(self, index: int) -> Optional[ATCommand]:
         """
         Get the command with the provided index
@@ -138,16 +160,28 @@ class ATSession(object):
             return None
         return self._commands[index]
 
-    def validate_response(self, response: List[str], execution_time: int) -> ATResponse:
+    def validate_response(
+        self,
+        response: Union[List[str], List[bytes]],
+        execution_time: float,
+        encoding: str = "utf-8",
+        errors: str = "strict",
+    ) -> ATResponse:
         """
         Validate a response of a command. The response is associated to the current command.
         Based on the response and the command associated to it,
         the ATResponse will have collectables based on expected response,
-        also the next command, in case of a wrong response will be the doppelganger (if set)
+        also the next command, in case of a wrong response will be the doppelganger (if set).
+        If the response is made up of bytes, the expected response and the collectables are matched as bytes
+        and only the matched values get decoded
         :param response
         :param execution_time
-        :type response: list of string
-        :type execution_time: int
+        :param encoding: encoding of the response, if provided as bytes
+        :param errors: decoding error policy
+        :type response: list of string or list of bytes
+        :type execution_time: float
+        :type encoding: str
+        :type errors: str
         :returns ATResponse
         """
         # Get current command expected response
@@ -157,23 +191,32 @@ class ATSession(object):
         # Prepare variables for looking for response
         expected_response = current_command.expected_response
         vars_to_collect = current_command.collectables
+        raw = len(response) > 0 and isinstance(response[0], (bytes, bytearray))
         # Variables for response object
         response_str = None
         # If expected response is set, look for it
         if expected_response:
+            if raw:
+                pattern = _compile(expected_response.encode(encoding))
+            else:
+                pattern = _compile(expected_response)
             # Search for response
             for line in response:
                 # Search for expected response in line
-                regresult = re.search(expected_response, line)
+                regresult = pattern.search(line)
                 if regresult:
                     response_str = regresult.group()
+                    if raw:
+                        response_str = response_str.decode(encoding, errors)
                     self._last_command_failed = False
                     break
             # If response hasn't been found => last command failed
             if not response_str:
                 self._last_command_failed = True
         # Instance ATResponse
-        atresponse = ATResponse(response_str, response, current_command, execution_time)
+        atresponse = ATResponse(
+            response_str, response, current_command, execution_time, encoding, errors
+        )
         # If last command failed => set doppelganger as next command
         if self._last_command_failed:
             # @! Response NOK
@@ -185,9 +228,9 @@ class ATSession(object):
             # @! Response OK
             # Try to get collectables
             if vars_to_collect:
-                for to_collect in vars_to_collect:  # String
-                    collected = self.__get_value_from_response(
-                        to_collect, response
+                for extractor in current_command.extractors:
+                    collected = extractor.extract(
+                        response, self.replace_session_keys, encoding, errors
                     )  # collected => tuple(key, value)
                     if collected is not None:
                         self._session_storage[collected[0]] = collected[1]
@@ -222,7 +265,7 @@ class ATSession(object):
 
     def prepare(self, command: ATCommand) -> None:
         """
-        Prepare command to execute, replacing session variable with values in session;
+        Prepare command to execute, replacing session variable with values in session (in the command and in its text payload);
         if value is not in session, it will be replaced with an empty string
 
         :param command
@@ -236,6 +279,8 @@ class ATSession(object):
         # Other stuff???
         # Reassign command to ATCommand
         command.command = command_str
+        if isinstance(command.payload, str):
+            command.payload = self.replace_session_keys(command.payload)
         return
 
     def set_session_value(self, key: str, value: Union[str, int]) -> None:
@@ -263,82 +308,3 @@ class ATSession(object):
             return self._session_storage[key]
         except KeyError:
             raise KeyError("Could not find %s in current session storage" % key)
-
-    def __get_value_from_response(
-        self, to_collect: str, response: List[str]
-    ) -> Optional[Tuple[str, Union[str, int]]]:
-        """
-        Get a value from response.
-        The collectable syntax is '...?{KEY_NAME}...'
-        The ?{} part is replaced by (.*) in a regex
-
-        :param to_collect: collectable syntax to match
-        :param response: list of string gained in the response
-        :type to_collect: string
-        :type response: list of string
-        :returns tuple(string, string/int); None if not found
-        """
-        # Replace session keys in response first
-        reg_result = re.search("\\?{(.*)}", to_collect)
-        if reg_result:
-            key_group = reg_result.group()
-        else:
-            return None
-        # Remove ?{} from key group and split by regex specifier
-        key_parts = key_group[2:-1].split("::")
-        key_regex = None
-        if len(key_parts) > 1:
-            key_regex = key_parts[1]
-        key_name = key_parts[0]
-        # part_to_remove = to_collect.replace(key_group, "")
-        key_value = None
-        # compose regex with to_collect[0] + (.*) + to_collect[1]
-        regex = to_collect.replace(key_group, "")
-        # Escape regex
-        if to_collect == key_group:
-            collect_expr_parts = []
-        else:
-            collect_expr_parts = to_collect.split(key_group)
-        # Collect regex part to build regex; excape parts
-        part_to_remove: List[str] = []
-        if len(collect_expr_parts) > 0:
-            for i in range(len(collect_expr_parts)):
-                if not collect_expr_parts[i]:  # Skip empty tokens
-                    continue
-                collect_expr_parts[i] = self.replace_session_keys(collect_expr_parts[i])
-                # First collect this part in parts to remove
-                part_to_remove.append(collect_expr_parts[i])
-                # Then escape regex
-                collect_expr_parts[i] = re.escape(collect_expr_parts[i])
-            # Eventually compose regex
-            collect_expr_parts.insert(1, "(.*)")
-            regex = ""
-            for expr_part in collect_expr_parts:
-                regex += expr_part
-        else:  # If there are no collect parts, just get everything
-            regex = "(.*)"
-        # Iterate over lines
-        for line in response:
-            search = re.search(regex, line)
-            if search is not None:
-                # If a key regex is set, check if line complies
-                if key_regex:
-                    key_regex_match = re.search(key_regex, line)
-                    if key_regex_match:
-                        key_value = key_regex_match.group()
-                    else:
-                        # Line doesn't comply
-                        continue
-                key_value = search.group()
-                for part in part_to_remove:
-                    key_value = key_value.replace(part, "")
-                try:
-                    key_value = int(key_value)
-                except ValueError:
-                    break
-                break
-        # Return values
-        if key_value is not None:
-            return (key_name, key_value)
-        else:
-            return None
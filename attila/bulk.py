@@ -0,0 +1,165 @@
+from abc import ABC, abstractmethod
+import re
+import zlib
+from typing import List, Optional, Pattern
+
+# Default amount of bytes read from the source (or from the device) at once
+DEFAULT_CHUNK_SIZE = 4096
+# Device ready to receive the file content: a '> ' prompt or CONNECT
+UPLOAD_READY = re.compile(b"(?:^|[\\r\\n])(?:> ?$|CONNECT[^\\r\\n]*\\r?\\n)")
+# Bytes kept back from the sink while the file size is unknown, enough to hold the trailer
+TRAILER_WINDOW = 256
+# Trailer sent by the device after the file content
+DOWNLOAD_TRAILER = re.compile(
+    b"\\r?\\n(?:\\+[A-Z]+:[^\\r\\n]*\\r?\\n)*(?:\\r?\\n)?"
+    b"(?:OK|ERROR|\\+CME ERROR:[^\\r\\n]*)\\r?\\n$"
+)
+# Checksum reported by Quectel file commands (e.g. +QFUPL: 1024,3fa2)
+QFILE_CHECKSUM = re.compile(b"\\+QF(?:UPL|DWL): \\d+,([0-9a-fA-F]+)")
+
+
+class Checksum(ABC):
+    """
+    Checksum class is the interface of the checksums computed on the fly during a bulk transfer
+    """
+
+    @abstractmethod
+    def update(self, data: memoryview) -> None:
+        """
+        Update the checksum with a chunk of data
+
+        :param data
+        :type data: memoryview
+        """
+
+    @property
+    @abstractmethod
+    def value(self) -> int:
+        """
+        Get the checksum of the data received so far
+
+        :returns int
+        """
+
+    def hexdigest(self) -> str:
+        """
+        Get the checksum as hex string
+
+        :returns str
+        """
+        return "%x" % self.value
+
+
+class XOR16Checksum(Checksum):
+    """
+    XOR16Checksum class computes the XOR of the 16-bit big endian words of the data,
+    as done by Quectel modules for AT+QFUPL/AT+QFDWL
+    """
+
+    def __init__(self):
+        """
+        Class constructor. Instantiates a new :class:`.XOR16Checksum.` object
+        """
+        self._value = 0
+        # Odd byte left by the previous chunk
+        self._pending: Optional[int] = None
+
+    def update(self, data: memoryview) -> None:
+        if not data:
+            return
+        if self._pending is not None:
+            self._value ^= (self._pending << 8) | data[0]
+            self._pending = None
+            data = data[1:]
+        # The last byte of an odd chunk is the high byte of a word completed by the next chunk
+        if len(data) % 2:
+            self._pending = data[-1]
+            data = data[:-1]
+        # Fold the chunk, read as a big endian integer, in halves until a single word is left
+        words = len(data) // 2
+        value = int.from_bytes(data, "big")
+        while words > 1:
+            half = (words // 2) * 16
+            value = (value >> half) ^ (value & ((1 << half) - 1))
+            words -= words // 2
+        self._value ^= value
+
+    @property
+    def value(self) -> int:
+        if self._pending is not None:
+            return self._value ^ (self._pending << 8)
+        return self._value
+
+
+class CRC32Checksum(Checksum):
+    """
+    CRC32Checksum class computes the CRC-32 of the data
+    """
+
+    def __init__(self):
+        """
+        Class constructor. Instantiates a new :class:`.CRC32Checksum.` object
+        """
+        self._value = 0
+
+    def update(self, data: memoryview) -> None:
+        self._value = zlib.crc32(data, self._value)
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+
+class TransferResult(object):
+    """
+    TransferResult class describes the outcome of a bulk transfer
+    """
+
+    def __init__(
+        self,
+        transferred: int,
+        elapsed: int,
+        response: List[bytes],
+        checksum: Optional[Checksum] = None,
+    ):
+        """
+        Class constructor. Instantiates a new :class:`.TransferResult.` object with the provided parameters.
+
+        :param transferred: amount of bytes of the file sent or received
+        :param elapsed: duration of the transfer of the file content in milliseconds
+        :param response: response lines of the device
+        :param checksum (optional): checksum computed on the file content
+        :type transferred: int
+        :type elapsed: int
+        :type response: list of bytes
+        :type checksum: Checksum
+        """
+        self.transferred = transferred
+        self.elapsed = elapsed
+        self.response = response
+        self.checksum = checksum
+
+    @property
+    def bytes_per_second(self) -> float:
+        if self.elapsed <= 0:
+            return float(self.transferred) * 1000
+        return self.transferred * 1000 / self.elapsed
+
+    @property
+    def succeeded(self) -> bool:
+        lines = [line for line in self.response if line]
+        return bool(lines) and lines[-1] == b"OK"
+
+    def reported_checksum(self, pattern: Pattern = QFILE_CHECKSUM) -> Optional[int]:
+        """
+        Get the checksum reported by the device in the response
+
+        :param pattern: bytes regex whose first group is the checksum in hex
+        :type pattern: re.Pattern
+        :returns int; None if the device didn't report it
+        """
+        for line in self.response:
+            match = pattern.search(line)
+            if match:
+                return int(match.group(1), 16)
+        return None
@@ -0,0 +1,130 @@
+from .exceptions import ATCancelledError
+
+import os
+from select import select
+from threading import Lock
+from time import monotonic, sleep
+from typing import Optional, Tuple
+
+# Interval in seconds between two checks of the cancellation, when the self-pipe is not available
+CANCEL_CHECK_INTERVAL = 0.01
+
+
+class CancelToken(object):
+    """
+    CancelToken class allows to interrupt a running command execution (e.g. from another thread or
+    from a signal handler). Waits on the token are woken up through a self-pipe, which is created by the
+    first wait (tokens which are never waited on don't use any file descriptor); cancel doesn't take
+    any lock, so it is safe to call it from a signal handler.
+    Once cancelled, the token stays cancelled until it is reset
+    """
+
+    def __init__(self):
+        """
+        Class constructor. Instantiates a new :class:`.CancelToken.` object
+        """
+        self._cancelled = False
+        self._pipe: Optional[Tuple[int, int]] = None
+        self._pipe_lock = Lock()
+
+    def __del__(self):
+        self.close()
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def cancel(self) -> None:
+        """
+        Cancel the operations using the token
+        """
+        self._cancelled = True
+        if self._pipe:
+            try:
+                os.write(self._pipe[1], b"\x00")
+            except OSError:
+                # Pipe full: a wakeup is already pending
+                pass
+
+    def reset(self) -> None:
+        """
+        Make the token usable again after a cancellation
+        """
+        self._cancelled = False
+        if self._pipe:
+            try:
+                while os.read(self._pipe[0], 512):
+                    pass
+            except OSError:
+                pass
+
+    def fileno(self) -> Optional[int]:
+        """
+        Get the file descriptor which becomes readable once the token is cancelled, to be used in select
+
+        :returns int; None if the platform doesn't support it
+        """
+        pipe = self.__get_pipe()
+        return pipe[0] if pipe else None
+
+    def wait(self, seconds: float) -> bool:
+        """
+        Wait for the provided amount of seconds or until the token gets cancelled
+
+        :param seconds
+        :type seconds: float
+        :returns bool: True if the token has been cancelled
+        """
+        pipe = self.__get_pipe()
+        # Checked once the pipe exists: a later cancel wakes up the select
+        if self._cancelled:
+            return True
+        if pipe:
+            select([pipe[0]], [], [], max(0, seconds))
+            return self._cancelled
+        t_end = monotonic() + seconds
+        remaining = seconds
+        while remaining > 0 and not self._cancelled:
+            sleep(min(remaining, CANCEL_CHECK_INTERVAL))
+            remaining = t_end - monotonic()
+        return self._cancelled
+
+    def raise_if_cancelled(self) -> None:
+        """
+        Raise ATCancelledError if the token has been cancelled
+
+        :raises ATCancelledError
+        """
+        if self._cancelled:
+            raise ATCancelledError("Operation cancelled")
+
+    def close(self) -> None:
+        """
+        Close the self-pipe
+        """
+        if self._pipe:
+            for fd in self._pipe:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+            self._pipe = None
+
+    def __get_pipe(self) -> Optional[Tuple[int, int]]:
+        """
+        Get the self-pipe, creating it on first use
+
+        :returns tuple of (read fd, write fd); None if the platform doesn't support it
+        """
+        if self._pipe or os.name != "posix":
+            return self._pipe
+        with self._pipe_lock:
+            if not self._pipe:
+                pipe = os.pipe()
+                for fd in pipe:
+                    os.set_blocking(fd, False)
+                self._pipe = pipe
+                if self._cancelled:
+                    # Cancelled before the pipe existed
+                    os.write(pipe[1], b"\x00")
+        return self._pipe
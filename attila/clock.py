@@ -0,0 +1,84 @@
+from .cancel import CancelToken
+
+from time import monotonic, sleep
+from typing import Optional
+
+
+class Clock(object):
+    """
+    Clock class provides the time source used by ATtila to measure timeouts, execution times and
+    to wait for delays. The default implementation uses the monotonic clock of the system,
+    which isn't affected by system time changes.
+    """
+
+    def now(self) -> float:
+        """
+        Returns current time in seconds; only the difference between two values is meaningful
+
+        :returns float
+        """
+        return monotonic()
+
+    def sleep(self, seconds: float, cancel_token: Optional[CancelToken] = None) -> None:
+        """
+        Wait for the provided amount of seconds
+
+        :param seconds
+        :param cancel_token (optional): token which ends the wait as soon as it gets cancelled
+        :type seconds: float
+        :type cancel_token: CancelToken
+        """
+        if seconds > 0:
+            if cancel_token:
+                cancel_token.wait(seconds)
+            else:
+                sleep(seconds)
+
+
+class VirtualClock(Clock):
+    """
+    VirtualClock class provides a simulated time source: sleeping doesn't block,
+    but just advances the clock, so that timeouts and delays elapse instantly.
+    This clock should be used in test and simulation environments only
+    """
+
+    def __init__(self, start: float = 0.0):
+        """
+        Class constructor. Instantiates a new :class:`.VirtualClock.` object with the provided parameters.
+
+        :param start: initial time in seconds
+        :type start: float
+        """
+        self._now: float = start
+
+    def now(self) -> float:
+        """
+        Returns current virtual time in seconds
+
+        :returns float
+        """
+        return self._now
+
+    def sleep(self, seconds: float, cancel_token: Optional[CancelToken] = None) -> None:
+        """
+        Advance the virtual time by the provided amount of seconds, without blocking.
+        Time doesn't advance if cancel_token has been cancelled
+
+        :param seconds
+        :param cancel_token (optional)
+        :type seconds: float
+        :type cancel_token: CancelToken
+        """
+        if cancel_token and cancel_token.cancelled:
+            return
+        self.advance(seconds)
+
+    def advance(self, seconds: float) -> None:
+        """
+        Advance the virtual time
+
+        :param seconds
+        :type seconds: float
+        """
+        if seconds > 0:
+            self._now += seconds
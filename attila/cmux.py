@@ -0,0 +1,634 @@
+from .atcommunicator import ATCommunicator
+from .clock import Clock
+from .exceptions import ATSerialPortError
+
+from serial import Serial, SerialException
+from threading import Event, Lock, Thread
+from typing import Dict, List, Optional, Tuple
+
+# GSM 07.10 basic mode frame delimiter
+FLAG = 0xF9
+# Address field bits
+ADDRESS_EA = 0x01
+ADDRESS_CR = 0x02
+# Frame types (control field without the P/F bit)
+FRAME_SABM = 0x2F
+FRAME_UA = 0x63
+FRAME_DM = 0x0F
+FRAME_DISC = 0x43
+FRAME_UIH = 0xEF
+FRAME_UI = 0x03
+CONTROL_PF = 0x10
+# Multiplexer control channel commands (type octet, with EA bit)
+MUX_CLD = 0xC1
+MUX_COMMAND = 0x02
+# Default maximum information field length (N1) in basic mode
+DEFAULT_FRAME_SIZE = 31
+# Value of the FCS computed on a frame and its FCS when the frame is valid
+FCS_GOOD = 0xCF
+
+
+def _make_fcs_table() -> Tuple[int, ...]:
+    """
+    Build the table of the reversed CRC-8 (polynomial x^8 + x^2 + x + 1) used by the frame check sequence
+
+    :returns tuple of 256 int
+    """
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            if crc & 0x01:
+                crc = (crc >> 1) ^ 0xE0
+            else:
+                crc >>= 1
+        table.append(crc)
+    return tuple(table)
+
+
+FCS_TABLE = _make_fcs_table()
+
+
+def fcs(data: bytes) -> int:
+    """
+    Compute the frame check sequence of the provided frame fields
+
+    :param data: address, control and length fields (and information field for UI frames)
+    :type data: bytes
+    :returns int
+    """
+    crc = 0xFF
+    for byte in data:
+        crc = FCS_TABLE[crc ^ byte]
+    return 0xFF - crc
+
+
+def encode_frame(
+    dlci: int, control: int, data: bytes = b"", command: bool = True
+) -> bytes:
+    """
+    Encode a basic mode frame
+
+    :param dlci: data link connection identifier (0 - 63)
+    :param control: frame type, with P/F bit
+    :param data: information field
+    :param command: whether the frame is a command (C/R bit set by the initiator)
+    :type dlci: int
+    :type control: int
+    :type data: bytes
+    :type command: bool
+    :returns bytes
+    """
+    address = (dlci << 2) | ADDRESS_EA | (ADDRESS_CR if command else 0)
+    length = len(data)
+    if length < 128:
+        header = bytes((address, control, (length << 1) | 0x01))
+    else:
+        header = bytes((address, control, (length << 1) & 0xFE, length >> 7))
+    checked = header + data if control & ~CONTROL_PF == FRAME_UI else header
+    return b"%c%s%s%c%c" % (FLAG, header, data, fcs(checked), FLAG)
+
+
+class CMUXFrame(object):
+    """
+    CMUXFrame class represents a decoded basic mode frame
+    """
+
+    def __init__(self, dlci: int, control: int, data: bytes, command: bool):
+        """
+        Class constructor. Instantiates a new :class:`.CMUXFrame.` object with the provided parameters.
+
+        :param dlci
+        :param control: frame type, with P/F bit
+        :param data: information field
+        :param command: C/R bit
+        :type dlci: int
+        :type control: int
+        :type data: bytes
+        :type command: bool
+        """
+        self.dlci = dlci
+        self.control = control
+        self.data = data
+        self.command = command
+
+    @property
+    def frame_type(self):
+        return self.control & ~CONTROL_PF
+
+
+class CMUXDecoder(object):
+    """
+    CMUXDecoder class decodes basic mode frames from a byte stream.
+    Frames with a bad FCS are discarded and the decoder resynchronizes on the next flag
+    """
+
+    def __init__(self):
+        """
+        Class constructor. Instantiates a new :class:`.CMUXDecoder.` object
+        """
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[CMUXFrame]:
+        """
+        Feed data to the decoder
+
+        :param data
+        :type data: bytes
+        :returns list of the CMUXFrame completed by data
+        """
+        self._buffer += data
+        frames: List[CMUXFrame] = []
+        buffer = self._buffer
+        while True:
+            start = buffer.find(FLAG)
+            if start < 0:
+                del buffer[:]
+                break
+            # Skip flags (the closing flag of a frame can be the opening one of the next)
+            while start + 1 < len(buffer) and buffer[start + 1] == FLAG:
+                start += 1
+            del buffer[:start]
+            if len(buffer) < 4:
+                break
+            header_size = 4 if buffer[3] & 0x01 else 5
+            if len(buffer) < header_size:
+                break
+            length = buffer[3] >> 1
+            if header_size == 5:
+                length |= buffer[4] << 7
+            size = header_size + length + 2
+            if len(buffer) < size:
+                break
+            header = bytes(buffer[1:header_size])
+            data = bytes(buffer[header_size : header_size + length])
+            control = buffer[2]
+            checked = header + data if control & ~CONTROL_PF == FRAME_UI else header
+            if buffer[size - 1] != FLAG or fcs(checked) != buffer[size - 2]:
+                # Bad frame, resynchronize
+                del buffer[:1]
+                continue
+            frames.append(
+                CMUXFrame(buffer[1] >> 2, control, data, bool(buffer[1] & ADDRESS_CR))
+            )
+            # Keep closing flag
+            del buffer[: size - 1]
+        return frames
+
+
+class CMUXChannel(object):
+    """
+    CMUXChannel class provides a serial-like interface to a DLCI of a multiplexer
+    """
+
+    def __init__(self, multiplexer, dlci: int):
+        """
+        Class constructor. Instantiates a new :class:`.CMUXChannel.` object with the provided parameters.
+
+        :param multiplexer: multiplexer the channel belongs to
+        :param dlci
+        :type multiplexer: CMUXMultiplexer
+        :type dlci: int
+        """
+        self._multiplexer = multiplexer
+        self._dlci = dlci
+        self._buffer = bytearray()
+        self._lock = Lock()
+        self.write_timeout = None
+
+    @property
+    def dlci(self):
+        return self._dlci
+
+    @property
+    def in_waiting(self):
+        with self._lock:
+            return len(self._buffer)
+
+    def read(self, size: int = 1) -> bytes:
+        """
+        Read up to size bytes received on the channel; it doesn't block
+
+        :param size
+        :type size: int
+        :returns bytes
+        """
+        with self._lock:
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+        return data
+
+    def write(self, data: bytes) -> int:
+        """
+        Write data to the channel
+
+        :param data
+        :type data: bytes
+        :returns int
+        :raises ATSerialPortError
+        """
+        self._multiplexer.send(self._dlci, data)
+        return len(data)
+
+    def reset_input_buffer(self) -> None:
+        """
+        Discard data received on the channel
+        """
+        with self._lock:
+            del self._buffer[:]
+
+    def close(self) -> None:
+        """
+        Close the channel
+
+        :raises ATSerialPortError
+        """
+        self._multiplexer.close_channel(self._dlci)
+
+    def feed(self, data: bytes) -> None:
+        """
+        Add data received on the channel
+
+        :param data
+        :type data: bytes
+        """
+        with self._lock:
+            self._buffer += data
+
+
+class CMUXMultiplexer(object):
+    """
+    CMUXMultiplexer class implements the GSM 07.10 multiplexer protocol (basic mode) on a serial port.
+    Each DLCI is a logical channel, which can be used by its own communicator;
+    a reader thread dispatches the received frames to the channels
+    """
+
+    def __init__(
+        self,
+        serial_port: str,
+        baud_rate: int,
+        rtscts: Optional[bool] = False,
+        dsrdtr: Optional[bool] = False,
+        frame_size: int = DEFAULT_FRAME_SIZE,
+        timeout: float = 5,
+        init_command: Optional[str] = "AT+CMUX=0",
+    ):
+        """
+        Class constructor. Instantiates a new :class:`.CMUXMultiplexer.` object with the provided parameters.
+
+        :param serial_port: serial port of the device
+        :param baud_rate: baud rate to set
+        :param rtscts: use rtscts
+        :param dsrdtr: use dsrdtr
+        :param frame_size: maximum length of the information field of a frame (N1)
+        :param timeout: seconds to wait for the device to answer to control frames
+        :param init_command (optional): command which starts the multiplexer on the device; not sent if None
+        :type serial_port: str
+        :type baud_rate: int
+        :type rtscts: bool
+        :type dsrdtr: bool
+        :type frame_size: int
+        :type timeout: float
+        :type init_command: str
+        """
+        self._serial_port = serial_port
+        self._baud_rate = baud_rate
+        self._rtscts = rtscts
+        self._dsrdtr = dsrdtr
+        self._frame_size = frame_size
+        self._timeout = timeout
+        self._init_command = init_command
+        self._device: Optional[Serial] = None
+        self._reader: Optional[Thread] = None
+        self._running = False
+        self._channels: Dict[int, CMUXChannel] = {}
+        # Answers (UA/DM) to control frames by DLCI
+        self._answers: Dict[int, Tuple[Event, List[int]]] = {}
+        self._write_lock = Lock()
+        self._lock = Lock()
+
+    @property
+    def serial_port(self):
+        return self._serial_port
+
+    @property
+    def baud_rate(self):
+        return self._baud_rate
+
+    @property
+    def frame_size(self):
+        return self._frame_size
+
+    @property
+    def channels(self):
+        return list(self._channels.keys())
+
+    def is_open(self) -> bool:
+        """
+        Returns whether the multiplexer is running
+
+        :returns bool
+        """
+        return self._device is not None
+
+    def open(self) -> None:
+        """
+        Open the serial port and start the multiplexer
+
+        :raises ATSerialPortError
+        """
+        with self._lock:
+            if self._device:
+                return
+            try:
+                self._device = Serial(
+                    self._serial_port,
+                    self._baud_rate,
+                    timeout=0.05,
+                    write_timeout=self._timeout,
+                    rtscts=self._rtscts,
+                    dsrdtr=self._dsrdtr,
+                )
+            except (OSError, SerialException) as error:
+                raise ATSerialPortError(str(error))
+            try:
+                if self._init_command:
+                    self.__start_device()
+                self._running = True
+                self._reader = Thread(target=self.__read_frames, daemon=True)
+                self._reader.start()
+                self.__connect(0)
+            except ATSerialPortError as err:
+                self.__shutdown()
+                raise err
+
+    def close(self) -> None:
+        """
+        Close all the channels, stop the multiplexer on the device and close the serial port
+
+        :raises ATSerialPortError
+        """
+        with self._lock:
+            if not self._device:
+                return
+            try:
+                for dlci in list(self._channels.keys()):
+                    self.__disconnect(dlci)
+                # Multiplexer close down
+                self.__write(
+                    encode_frame(0, FRAME_UIH, bytes((MUX_CLD | MUX_COMMAND, 0x01)))
+                )
+            finally:
+                self.__shutdown()
+
+    def open_channel(self, dlci: int) -> CMUXChannel:
+        """
+        Establish a DLCI and get its channel; the multiplexer is started if it isn't running yet
+
+        :param dlci: 1 - 63
+        :type dlci: int
+        :returns CMUXChannel
+        :raises ATSerialPortError
+        """
+        if dlci < 1 or dlci > 63:
+            raise ATSerialPortError("Invalid DLCI %d" % dlci)
+        self.open()
+        with self._lock:
+            channel = self._channels.get(dlci)
+            if channel:
+                return channel
+            channel = CMUXChannel(self, dlci)
+            self._channels[dlci] = channel
+            try:
+                self.__connect(dlci)
+            except ATSerialPortError as err:
+                del self._channels[dlci]
+                raise err
+            return channel
+
+    def close_channel(self, dlci: int) -> None:
+        """
+        Release a DLCI
+
+        :param dlci
+        :type dlci: int
+        :raises ATSerialPortError
+        """
+        with self._lock:
+            if dlci in self._channels and self._device:
+                self.__disconnect(dlci)
+
+    def send(self, dlci: int, data: bytes) -> None:
+        """
+        Send data on a DLCI, splitting it into frames
+
+        :param dlci
+        :param data
+        :type dlci: int
+        :type data: bytes
+        :raises ATSerialPortError
+        """
+        if dlci not in self._channels:
+            raise ATSerialPortError("DLCI %d is not established" % dlci)
+        view = memoryview(data)
+        frames = b"".join(
+            [
+                encode_frame(dlci, FRAME_UIH, bytes(view[i : i + self._frame_size]))
+                for i in range(0, len(data), self._frame_size)
+            ]
+        )
+        self.__write(frames)
+
+    def __start_device(self) -> None:
+        """
+        Send the init command and wait for OK
+
+        :raises ATSerialPortError
+        """
+        self._device.reset_input_buffer()
+        self.__write(b"%s\r" % self._init_command.encode("utf-8"))
+        response = bytearray()
+        for _ in range(int(self._timeout / self._device.timeout)):
+            response += self._device.read(max(1, self._device.in_waiting))
+            if b"OK" in response:
+                return
+            if b"ERROR" in response:
+                break
+        raise ATSerialPortError(
+            "Device didn't start multiplexer: '%s'"
+            % response.decode("utf-8", "replace").strip()
+        )
+
+    def __connect(self, dlci: int) -> None:
+        """
+        Establish a DLCI (SABM)
+
+        :raises ATSerialPortError
+        """
+        answer = self.__request(dlci, FRAME_SABM | CONTROL_PF)
+        if answer != FRAME_UA:
+            raise ATSerialPortError("Device refused to establish DLCI %d" % dlci)
+
+    def __disconnect(self, dlci: int) -> None:
+        """
+        Release a DLCI (DISC)
+
+        :raises ATSerialPortError
+        """
+        try:
+            self.__request(dlci, FRAME_DISC | CONTROL_PF)
+        finally:
+            self._channels.pop(dlci, None)
+
+    def __request(self, dlci: int, control: int) -> int:
+        """
+        Send a control frame and wait for its answer
+
+        :returns answer frame type
+        :raises ATSerialPortError
+        """
+        event = Event()
+        answer: List[int] = []
+        self._answers[dlci] = (event, answer)
+        try:
+            self.__write(encode_frame(dlci, control))
+            if not event.wait(self._timeout):
+                raise ATSerialPortError("Device didn't answer on DLCI %d" % dlci)
+        finally:
+            self._answers.pop(dlci, None)
+        return answer[0]
+
+    def __write(self, data: bytes) -> None:
+        """
+        Write data to the serial port
+
+        :raises ATSerialPortError
+        """
+        with self._write_lock:
+            if not self._device:
+                raise ATSerialPortError("Serial port device is closed")
+            try:
+                self._device.write(data)
+            except (OSError, SerialException) as error:
+                raise ATSerialPortError(str(error))
+
+    def __read_frames(self) -> None:
+        """
+        Reader thread: decode frames and dispatch them to channels
+        """
+        decoder = CMUXDecoder()
+        device = self._device
+        while self._running:
+            try:
+                data = device.read(max(1, device.in_waiting))
+            except (OSError, SerialException, TypeError):
+                break
+            if not data:
+                continue
+            for frame in decoder.feed(data):
+                frame_type = frame.frame_type
+                if frame_type in (FRAME_UIH, FRAME_UI):
+                    channel = self._channels.get(frame.dlci)
+                    if channel:
+                        channel.feed(frame.data)
+                elif frame_type in (FRAME_UA, FRAME_DM):
+                    pending = self._answers.get(frame.dlci)
+                    if pending:
+                        pending[1].append(frame_type)
+                        pending[0].set()
+        self._running = False
+
+    def __shutdown(self) -> None:
+        """
+        Stop reader thread and close serial port
+        """
+        self._running = False
+        if self._reader:
+            self._reader.join()
+            self._reader = None
+        self._channels = {}
+        try:
+            self._device.close()
+        except (OSError, SerialException):
+            pass
+        self._device = None
+
+
+class ATCMUXCommunicator(ATCommunicator):
+    """
+    ATCMUXCommunicator class provides an interface to communicate with an
+    RF module using AT commands through a DLCI of a multiplexer.
+    Communicators on different DLCIs of the same multiplexer can be used concurrently
+    """
+
+    def __init__(
+        self,
+        multiplexer: CMUXMultiplexer,
+        dlci: int,
+        default_timeout: float = 10,
+        line_break: str = "\r\n",
+        clock: Optional[Clock] = None,
+        encoding: str = "utf-8",
+        decode_errors: str = "strict",
+    ):
+        """
+        Class constructor. Instantiates a new :class:`.ATCMUXCommunicator.` object with the provided parameters.
+
+        :param multiplexer: multiplexer running on the device
+        :param dlci: DLCI used by the communicator (1 - 63)
+        :param default_timeout (optional): the default timeout for command response read in seconds
+        :param line_break: line break to send with commands
+        :param clock (optional): time source used for timeouts and execution times; system clock if not set
+        :param encoding: encoding used for commands and responses
+        :param decode_errors: error policy used when decoding responses
+        :type multiplexer: CMUXMultiplexer
+        :type dlci: int
+        :type default_timeout: float > 0
+        :type line_break: string
+        :type clock: Clock
+        :type encoding: str
+        :type decode_errors: str
+        """
+        super().__init__(
+            "%s:%d" % (multiplexer.serial_port, dlci),
+            multiplexer.baud_rate,
+            default_timeout,
+            line_break,
+            False,
+            False,
+            clock,
+            encoding,
+            decode_errors,
+        )
+        self._multiplexer = multiplexer
+        self._dlci = dlci
+
+    @property
+    def multiplexer(self):
+        return self._multiplexer
+
+    @property
+    def dlci(self):
+        return self._dlci
+
+    def open(self) -> None:
+        """
+        Establish the DLCI (starting the multiplexer if necessary)
+
+        :raises ATSerialPortError
+        """
+        self._device = self._multiplexer.open_channel(self._dlci)
+        self._device.reset_input_buffer()
+
+    def close(self) -> None:
+        """
+        Release the DLCI
+
+        :raises ATSerialPortError
+        """
+        if not self._device:
+            raise ATSerialPortError("Serial port device is closed")
+        try:
+            self._device.close()
+        finally:
+            self._device = None
@@ -0,0 +1,360 @@
+from .exceptions import ATCollectableSyntaxError
+
+import re
+from functools import lru_cache
+from typing import Any, Callable, List, Optional, Tuple, Union
+
+KEY_START = "?{"
+KEY_REGEX_SEPARATOR = "::"
+SESSION_KEY_START = "${"
+# A string literal of the collectables list; the value is group 1 (double quotes) or 2 (single quotes)
+STRING_REGEX = re.compile(
+    "\"([^\"\\\\]*(?:\\\\.[^\"\\\\]*)*)\"|'([^'\\\\]*(?:\\\\.[^'\\\\]*)*)'", re.DOTALL
+)
+# A string literal of the collectables list followed by ',', ']' or ', ]' (group 3)
+ITEM_REGEX = re.compile(
+    "[ \\t]*(?:%s)[ \\t]*(\\]|,[ \\t]*\\]|,)" % STRING_REGEX.pattern, re.DOTALL
+)
+WHITESPACE_REGEX = re.compile("[ \\t]*")
+EMPTY_LIST_REGEX = re.compile("[ \\t]*\\]")
+KEY_END_REGEX = re.compile("::|}")
+# PREFIX?{KEY}SUFFIX or PREFIX?{KEY::REGEX}SUFFIX with a regex nesting braces once at most
+COLLECTABLE_REGEX = re.compile(
+    "([^?]*(?:\\?(?!{)[^?]*)*)\\?{([^:}]+)(?:::([^{}\\\\]*(?:(?:\\\\.|{[^{}]*})[^{}\\\\]*)*))?}(.*)",
+    re.DOTALL,
+)
+BRACE_REGEX = re.compile("\\\\.|[{}]", re.DOTALL)
+ESCAPE_REGEX = re.compile(
+    "\\\\(x[0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|[xuU]|.)", re.DOTALL
+)
+ESCAPES = {
+    "\\": "\\",
+    "'": "'",
+    '"': '"',
+    "a": "\a",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+    "v": "\v",
+    "0": "\0",
+}
+
+
+class Collectable(object):
+    """
+    Collectable class is a compiled collectable ('PREFIX?{KEY}SUFFIX' or 'PREFIX?{KEY::REGEX}SUFFIX'),
+    which extracts the value of KEY from the response of a command.
+    Its patterns are compiled once, with the first extraction, unless prefix or suffix contain session keys (${KEY})
+    """
+
+    __slots__ = (
+        "_source",
+        "_key",
+        "_key_regex",
+        "_prefix",
+        "_suffix",
+        "_dynamic",
+        "_pattern",
+        "_key_pattern",
+        "_raw_patterns",
+    )
+
+    def __init__(
+        self,
+        source: str,
+        key: str,
+        key_regex: Optional[str] = None,
+        prefix: str = "",
+        suffix: str = "",
+    ):
+        """
+        Class constructor. Instantiates a new :class:`.Collectable.` object with the provided parameters.
+
+        :param source: collectable as written in the ATScript
+        :param key: session key the value is stored into
+        :param key_regex (optional): regex the line containing the value must comply with
+        :param prefix (optional): text preceeding the value
+        :param suffix (optional): text following the value
+        :type source: str
+        :type key: str
+        :type key_regex: str
+        :type prefix: str
+        :type suffix: str
+        :raises re.error
+        """
+        self._source = source
+        self._key = key
+        self._key_regex = key_regex
+        self._prefix = prefix
+        self._suffix = suffix
+        self._dynamic = SESSION_KEY_START in prefix or SESSION_KEY_START in suffix
+        self._key_pattern = re.compile(key_regex) if key_regex else None
+        # Compiled with the first extraction
+        self._pattern = None
+        # (encoding, pattern, key pattern, parts) for bytes responses
+        self._raw_patterns: Optional[Tuple[str, Any, Any, List[bytes]]] = None
+
+    @property
+    def source(self):
+        return self._source
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def key_regex(self):
+        return self._key_regex
+
+    def extract(
+        self,
+        response: Union[List[str], List[bytes]],
+        replace_session_keys: Optional[Callable[[str], str]] = None,
+        encoding: str = "utf-8",
+        errors: str = "strict",
+    ) -> Optional[Tuple[str, Union[str, int]]]:
+        """
+        Get the value from the first line of the response which matches the collectable
+
+        :param response: list of string (or bytes) gained in the response
+        :param replace_session_keys (optional): function replacing the session keys in prefix and suffix
+        :param encoding: encoding of the response, if provided as bytes
+        :param errors: decoding error policy
+        :type response: list of string or list of bytes
+        :type replace_session_keys: callable
+        :type encoding: str
+        :type errors: str
+        :returns tuple(string, string/int); None if not found
+        """
+        raw = len(response) > 0 and isinstance(response[0], (bytes, bytearray))
+        if self._dynamic:
+            parts = [
+                replace_session_keys(x) if replace_session_keys else x
+                for x in (self._prefix, self._suffix)
+            ]
+            pattern = _compile(_get_regex(parts[0], parts[1]))
+            key_pattern = self._key_pattern
+            parts = [x for x in parts if x]
+            if raw:
+                pattern = _compile(pattern.pattern.encode(encoding))
+                if key_pattern:
+                    key_pattern = _compile(self._key_regex.encode(encoding))
+                parts = [x.encode(encoding) for x in parts]
+        elif raw:
+            if self._raw_patterns is None or self._raw_patterns[0] != encoding:
+                self._raw_patterns = (
+                    encoding,
+                    re.compile(_get_regex(self._prefix, self._suffix).encode(encoding)),
+                    (
+                        re.compile(self._key_regex.encode(encoding))
+                        if self._key_regex
+                        else None
+                    ),
+                    [x.encode(encoding) for x in (self._prefix, self._suffix) if x],
+                )
+            _, pattern, key_pattern, parts = self._raw_patterns
+        else:
+            if self._pattern is None:
+                self._pattern = re.compile(_get_regex(self._prefix, self._suffix))
+            pattern = self._pattern
+            key_pattern = self._key_pattern
+            parts = [x for x in (self._prefix, self._suffix) if x]
+        empty = b"" if raw else ""
+        for line in response:
+            search = pattern.search(line)
+            if search is None:
+                continue
+            # If a key regex is set, check if line complies
+            if key_pattern and not key_pattern.search(line):
+                continue
+            value = search.group()
+            for part in parts:
+                value = value.replace(part, empty)
+            if raw:
+                value = value.decode(encoding, errors)
+            try:
+                return (self._key, int(value))
+            except ValueError:
+                return (self._key, value)
+        return None
+
+
+def compile_collectable(source: str, column: int = 1) -> Collectable:
+    """
+    Compile a collectable
+
+    :param source: collectable ('PREFIX?{KEY}SUFFIX' or 'PREFIX?{KEY::REGEX}SUFFIX')
+    :param column: column of the first character of the collectable, reported in errors
+    :type source: str
+    :type column: int
+    :returns Collectable
+    :raises ATCollectableSyntaxError
+    """
+    match = COLLECTABLE_REGEX.fullmatch(source)
+    if match is not None:
+        prefix, key, key_regex, suffix = match.groups()
+        if key_regex != "" and KEY_START not in suffix:
+            try:
+                return Collectable(source, key, key_regex, prefix, suffix)
+            except re.error:
+                # Reported below
+                pass
+    start = source.find(KEY_START)
+    if start == -1:
+        raise ATCollectableSyntaxError("missing ?{KEY} in '%s'" % source, column)
+    key_start = start + len(KEY_START)
+    key_end = KEY_END_REGEX.search(source, key_start)
+    end = key_end.start() if key_end else len(source)
+    key = source[key_start:end]
+    key_regex = None
+    if not key:
+        raise ATCollectableSyntaxError("empty key", column + key_start)
+    if key_end and key_end.group() == KEY_REGEX_SEPARATOR:
+        # Key regex ends with the '}' balancing '?{'
+        regex_start = key_end.end()
+        end = len(source)
+        depth = 0
+        for brace in BRACE_REGEX.finditer(source, regex_start):
+            if brace.group() == "{":
+                depth += 1
+            elif brace.group() == "}":
+                if depth == 0:
+                    end = brace.start()
+                    break
+                depth -= 1
+        key_regex = source[regex_start:end]
+        if not key_regex:
+            raise ATCollectableSyntaxError("empty key regex", column + regex_start)
+    if end >= len(source):
+        raise ATCollectableSyntaxError("unterminated ?{", column + start)
+    suffix = source[end + 1 :]
+    if KEY_START in suffix:
+        position = end + 1 + suffix.find(KEY_START)
+        raise ATCollectableSyntaxError("more than one ?{KEY}", column + position)
+    try:
+        return Collectable(source, key, key_regex, source[:start], suffix)
+    except re.error as err:
+        position = start + len(KEY_START) + len(key) + len(KEY_REGEX_SEPARATOR)
+        if err.pos is not None:
+            position += err.pos
+        raise ATCollectableSyntaxError(
+            "invalid key regex (%s)" % err.msg,
+            column + position,
+        )
+
+
+@lru_cache(maxsize=1024)
+def parse_collectables(text: str) -> Tuple[Collectable, ...]:
+    """
+    Parse the collectables of an ATScript command: a list of string literals
+    (e.g. ["AT+CSQ=?{rssi},", '?{IMEI::^[0-9]{15}$}']). The text is not evaluated;
+    the same text is parsed only once
+
+    :param text: collectables field of the command
+    :type text: str
+    :returns tuple of Collectable
+    :raises ATCollectableSyntaxError: the column of the error is relative to the text
+    """
+    collectables = []
+    pos = _skip_whitespaces(text, 0)
+    if not text.startswith("[", pos):
+        raise ATCollectableSyntaxError("expected '['", pos + 1)
+    end = EMPTY_LIST_REGEX.match(text, pos + 1)
+    pos = end.end() if end else pos + 1
+    closed = end is not None
+    while not closed:
+        match = ITEM_REGEX.match(text, pos)
+        if match is None:
+            pos = _skip_whitespaces(text, pos)
+            string = STRING_REGEX.match(text, pos)
+            if string is not None:
+                pos = _skip_whitespaces(text, string.end())
+                raise ATCollectableSyntaxError("expected ',' or ']'", pos + 1)
+            if text.startswith(("'", '"'), pos):
+                raise ATCollectableSyntaxError("unterminated string", pos + 1)
+            raise ATCollectableSyntaxError("expected a string", pos + 1)
+        double_quoted, single_quoted, delimiter = match.groups()
+        if double_quoted is not None:
+            value, value_column = double_quoted, match.start(1) + 1
+        else:
+            value, value_column = single_quoted, match.start(2) + 1
+        if "\\" in value:
+            value = _unescape(value, value_column)
+        collectables.append(compile_collectable(value, value_column))
+        pos = match.end()
+        closed = delimiter.endswith("]")
+    if pos < len(text):
+        pos = _skip_whitespaces(text, pos)
+        if pos < len(text):
+            raise ATCollectableSyntaxError("unexpected '%s'" % text[pos], pos + 1)
+    return tuple(collectables)
+
+
+@lru_cache(maxsize=1024)
+def get_collectable(source: str) -> Optional[Collectable]:
+    """
+    Get the compiled collectable; compiled collectables are cached
+
+    :param source
+    :type source: str
+    :returns Collectable; None if the collectable is invalid
+    """
+    try:
+        return compile_collectable(source)
+    except ATCollectableSyntaxError:
+        return None
+
+
+def compile_collectables(collectables: Optional[List[str]]) -> List[Collectable]:
+    """
+    Compile a list of collectables; invalid collectables are skipped
+
+    :param collectables
+    :type collectables: list of string
+    :returns list of Collectable
+    """
+    if not collectables:
+        return []
+    compiled = [get_collectable(x) for x in collectables]
+    return [x for x in compiled if x is not None]
+
+
+def _get_regex(prefix: str, suffix: str) -> str:
+    """
+    Get the regex matching the value with its prefix and suffix
+    """
+    return "%s(.*)%s" % (re.escape(prefix), re.escape(suffix))
+
+
+def _skip_whitespaces(text: str, pos: int) -> int:
+    """
+    Get the position of the first character which is not a whitespace
+    """
+    return WHITESPACE_REGEX.match(text, pos).end()
+
+
+def _unescape(value: str, column: int) -> str:
+    """
+    Replace the escape sequences of a string literal; unknown sequences are kept as they are (e.g. '\\d')
+    """
+
+    def replace(match: Any) -> str:
+        sequence = match.group(1)
+        if len(sequence) > 1:
+            return chr(int(sequence[1:], 16))
+        if sequence in "xuU":
+            position = column + match.start()
+            raise ATCollectableSyntaxError("invalid escape sequence", position)
+        return ESCAPES.get(sequence, match.group())
+
+    return ESCAPE_REGEX.sub(replace, value)
+
+
+@lru_cache(maxsize=256)
+def _compile(pattern: Union[str, bytes]) -> Any:
+    """
+    Compile a regex (str or bytes) caching the result
+    """
+    return re.compile(pattern)
@@ -0,0 +1,682 @@
+from .atqueue import ATCommandQueue, PRIORITY_NORMAL
+from .atre import ATRuntimeEnvironment
+from .atresponse import ATResponse
+from .atscriptparser import ATScriptParser
+from .exceptions import ATDaemonError, ATSerialPortError
+
+from concurrent.futures import Future
+import json
+import os
+import queue
+import re
+import socket
+import socketserver
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Seconds between two reads of the URCs while a port is idle
+URC_POLL_INTERVAL = 0.05
+# Seconds a subscriber waits for URCs before checking whether the daemon is still running
+SUBSCRIBE_POLL_INTERVAL = 0.5
+LINE_BREAK_REGEX = re.compile(b"\r\n|\r|\n")
+
+OP_PORTS = "ports"
+OP_EXEC = "exec"
+OP_RUN = "run"
+OP_STATS = "stats"
+OP_SUBSCRIBE = "subscribe"
+
+
+def get_default_socket_path() -> str:
+    """
+    Get the path of the daemon socket ($ATTILA_SOCKET, $XDG_RUNTIME_DIR/attila.sock or /tmp/attila-<uid>.sock)
+
+    :returns str
+    """
+    socket_path = os.environ.get("ATTILA_SOCKET")
+    if socket_path:
+        return socket_path
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "attila.sock")
+    return "/tmp/attila-%d.sock" % os.getuid()
+
+
+def response_to_dict(response: Optional[ATResponse]) -> Optional[dict]:
+    """
+    Get a response as a dict of plain values (e.g. to be serialized as JSON)
+
+    :param response
+    :type response: ATResponse
+    :returns dict; None if response is None
+    """
+    if response is None:
+        return None
+    result = response.summarize().to_dict()
+    result["full_response"] = response.get_printable_response()
+    return result
+
+
+def _get_error_message(error: Exception) -> str:
+    """
+    Get the message of an exception
+    """
+    message = getattr(error, "message", None)
+    return str(message) if message is not None else str(error)
+
+
+class PortStats(object):
+    """
+    PortStats class collects the statistics of a port served by the daemon
+    """
+
+    def __init__(self):
+        """
+        Class constructor. Instantiates a new :class:`.PortStats.` object with the provided parameters.
+        """
+        self.requests = 0
+        self.commands = 0
+        self.failed_commands = 0
+        self.errors = 0
+        self.urcs = 0
+        # Milliseconds spent executing commands
+        self.execution_time = 0
+
+    def to_dict(self) -> dict:
+        """
+        Get the statistics as a dict
+
+        :returns dict
+        """
+        return {
+            "requests": self.requests,
+            "commands": self.commands,
+            "failed_commands": self.failed_commands,
+            "errors": self.errors,
+            "urcs": self.urcs,
+            "execution_time": self.execution_time,
+        }
+
+
+class DaemonPort(object):
+    """
+    DaemonPort class keeps the serial port of a runtime environment open and executes the requests to it
+    one at a time through a command queue, by priority and in turn for each client.
+    While there are no requests, the data sent by the device (URCs) is read and published to the subscribers
+    """
+
+    def __init__(self, name: str, atre: ATRuntimeEnvironment):
+        """
+        Class constructor. Instantiates a new :class:`.DaemonPort.` object with the provided parameters.
+
+        :param name: name of the port used by the requests
+        :param atre: runtime environment with a configured communicator
+        :type name: str
+        :type atre: ATRuntimeEnvironment
+        """
+        self._name = name
+        self._atre = atre
+        self._stats = PortStats()
+        self._queue = ATCommandQueue(atre, self.poll_urcs, URC_POLL_INTERVAL)
+        self._subscribers: List[queue.Queue] = []
+        self._subscribers_lock = Lock()
+        # Incomplete line read while polling URCs
+        self._urc_buffer = bytearray()
+        self._parser = ATScriptParser()
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def atre(self):
+        return self._atre
+
+    @property
+    def stats(self):
+        return self._stats
+
+    @property
+    def queued(self) -> int:
+        return self._queue.pending
+
+    def start(self) -> None:
+        """
+        Open the serial port and start executing the requests
+
+        :raises ATSerialPortError, ATREUninitializedError
+        """
+        self._queue.start()
+
+    def stop(self) -> None:
+        """
+        Interrupt the request being executed, fail the queued ones and close the serial port
+        """
+        self._queue.stop()
+
+    def submit(self, request: dict, producer: Any = None) -> Future:
+        """
+        Queue a request
+
+        :param request: exec or run request, with an optional priority
+        :param producer (optional): requests with the same priority are taken in turn from each producer (e.g. a client)
+        :type request: dict
+        :type producer: any hashable
+        :returns Future: resolved with the result of the request
+        """
+        priority = request.get("priority")
+        if priority is None:
+            priority = PRIORITY_NORMAL
+        if not self._queue.running or not isinstance(priority, int):
+            future = Future()
+            future.set_exception(
+                ATDaemonError(
+                    "Port %s is not running" % self._name
+                    if not self._queue.running
+                    else "Priority must be an integer"
+                )
+            )
+            return future
+        return self._queue.submit(
+            lambda _atre: self.__process(request), priority, producer
+        )
+
+    def subscribe(self, subscriber: Optional[queue.Queue] = None) -> queue.Queue:
+        """
+        Subscribe to the URCs of the port
+
+        :param subscriber (optional): queue the URCs are put into; a new one if not set
+        :type subscriber: queue.Queue
+        :returns queue.Queue: receives tuples of (port name, URC)
+        """
+        if subscriber is None:
+            subscriber = queue.Queue()
+        with self._subscribers_lock:
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue) -> None:
+        """
+        Stop publishing the URCs to a subscriber
+
+        :param subscriber: queue returned by subscribe
+        :type subscriber: queue.Queue
+        """
+        with self._subscribers_lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def execute(self, request: dict) -> Any:
+        """
+        Execute a request on the port; must be called by the command queue thread only
+
+        :param request
+        :type request: dict
+        :returns result of the request
+        :raises ATDaemonError, ATSerialPortError, ATRuntimeError, ATScriptSyntaxError, ATScriptNotFound, ATCancelledError
+        """
+        op = request.get("op")
+        if op == OP_EXEC:
+            command = request.get("command")
+            if not isinstance(command, str):
+                raise ATDaemonError("exec requires a command")
+            response = self._atre.exec(command)
+            self.__count([response])
+            return response_to_dict(response)
+        elif op == OP_RUN:
+            if request.get("script"):
+                self._atre.parse_ATScript(request["script"])
+            elif request.get("text") is not None:
+                commands, esks = self._parser.parse(request["text"])
+                self._atre.init_session(commands)
+                self._atre.set_ESKs(esks)
+            else:
+                raise ATDaemonError("run requires a script or a text")
+            # Collected here, since the history depends on the retention policy
+            responses = list(
+                self._atre.run_iter(request.get("deadline"), keep_open=True)
+            )
+            self.__count(responses)
+            return {
+                "responses": [response_to_dict(x) for x in responses],
+                "deadline_exceeded": self._atre.deadline_exceeded,
+            }
+        raise ATDaemonError("Unknown operation '%s'" % op)
+
+    def poll_urcs(self) -> None:
+        """
+        Read the data sent by the device and publish each complete line as URC
+        """
+        try:
+            data = self._atre.read_available()
+        except ATSerialPortError:
+            return
+        if not data:
+            return
+        self._urc_buffer += data
+        lines = LINE_BREAK_REGEX.split(bytes(self._urc_buffer))
+        # The last token is an incomplete line (empty if data ended with a line break)
+        self._urc_buffer = bytearray(lines.pop())
+        for line in lines:
+            if not line:
+                continue
+            urc = line.decode("utf-8", "replace")
+            self._stats.urcs += 1
+            with self._subscribers_lock:
+                for subscriber in self._subscribers:
+                    subscriber.put((self._name, urc))
+
+    def __count(self, responses: List[Optional[ATResponse]]) -> None:
+        """
+        Update statistics with the responses of a request
+        """
+        for response in responses:
+            if response is None:
+                continue
+            self._stats.commands += 1
+            self._stats.execution_time += response.execution_time
+            if response.response is None:
+                self._stats.failed_commands += 1
+
+    def __process(self, request: dict) -> Any:
+        """
+        Execute a request, publishing first the URCs received so far, since the input is flushed before writing the command.
+        A partially received URC is kept in the buffer
+        """
+        self.poll_urcs()
+        self._stats.requests += 1
+        try:
+            return self.execute(request)
+        except Exception:
+            self._stats.errors += 1
+            raise
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handle a client connection: each line is a JSON request, answered by a JSON line
+    """
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            request_id = None
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ATDaemonError("Request is not an object")
+                request_id = request.get("id")
+                if request.get("op") == OP_SUBSCRIBE:
+                    self.__subscribe(request_id, request.get("port"))
+                    return
+                result = self.server.daemon.handle_request(request, self)
+                self.__send({"id": request_id, "result": result})
+            except (ValueError, UnicodeDecodeError) as err:
+                self.__send({"id": request_id, "error": "Bad request: %s" % err})
+            except Exception as err:
+                self.__send({"id": request_id, "error": _get_error_message(err)})
+
+    def __send(self, message: dict) -> None:
+        self.wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+    def __subscribe(self, request_id: Any, port: Optional[str]) -> None:
+        """
+        Stream the URCs of a port (or of every port) until the client disconnects
+        """
+        daemon = self.server.daemon
+        ports = [daemon.get_port(port)] if port else list(daemon.ports.values())
+        subscriber = queue.Queue()
+        for daemon_port in ports:
+            daemon_port.subscribe(subscriber)
+        try:
+            self.__send({"id": request_id, "result": [x.name for x in ports]})
+            while not daemon.closed:
+                try:
+                    name, urc = subscriber.get(timeout=SUBSCRIBE_POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+                self.__send({"port": name, "urc": urc})
+        except OSError:
+            pass
+        finally:
+            for daemon_port in ports:
+                daemon_port.unsubscribe(subscriber)
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server handling each connection on its own thread
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, daemon: "ATDaemon"):
+        self.daemon = daemon
+        super().__init__(socket_path, _RequestHandler)
+
+
+class ATDaemon(object):
+    """
+    ATDaemon class keeps one or more serial ports open and serves the requests of the clients on a Unix socket.
+    The requests to a port are queued and executed one at a time; the protocol is a JSON object per line:
+
+        {"id": 1, "op": "exec", "port": "modem", "command": "AT+CSQ;;OK;;;;;;[\\"+CSQ: ?{rssi},\\"]"}
+        {"id": 1, "result": {"command": "AT+CSQ", "response": "OK", "collectables": {"rssi": 20}, ...}}
+
+    Operations are ports, exec (command), run (script or text, optional deadline), stats (optional port)
+    and subscribe (optional port), which streams {"port": ..., "urc": ...} objects until the client disconnects.
+    exec and run accept a priority (the lower, the sooner; see atqueue)
+    """
+
+    def __init__(self, socket_path: Optional[str] = None):
+        """
+        Class constructor. Instantiates a new :class:`.ATDaemon.` object with the provided parameters.
+
+        :param socket_path (optional): path of the Unix socket; default socket path if not set
+        :type socket_path: str
+        """
+        self._socket_path = socket_path if socket_path else get_default_socket_path()
+        self._ports: Dict[str, DaemonPort] = {}
+        self._server: Optional[_UnixServer] = None
+        self._closed = False
+
+    @property
+    def socket_path(self):
+        return self._socket_path
+
+    @property
+    def ports(self):
+        return self._ports
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def add_port(self, name: str, atre: ATRuntimeEnvironment) -> DaemonPort:
+        """
+        Add a port served by the daemon. The port is opened by start
+
+        :param name: name of the port used by the requests (e.g. the device path)
+        :param atre: runtime environment with a configured communicator
+        :type name: str
+        :type atre: ATRuntimeEnvironment
+        :returns DaemonPort
+        :raises ATDaemonError: if the name is already used
+        """
+        if name in self._ports:
+            raise ATDaemonError("Port %s already exists" % name)
+        port = DaemonPort(name, atre)
+        self._ports[name] = port
+        return port
+
+    def get_port(self, name: str) -> DaemonPort:
+        """
+        Get a port by name
+
+        :param name
+        :type name: str
+        :returns DaemonPort
+        :raises ATDaemonError
+        """
+        port = self._ports.get(name)
+        if port is None:
+            raise ATDaemonError("Unknown port '%s'" % name)
+        return port
+
+    def start(self) -> None:
+        """
+        Open the ports and listen on the socket.
+        A stale socket is removed; the socket is accessible by the current user only
+
+        :raises ATDaemonError, ATSerialPortError, ATREUninitializedError
+        """
+        if self._server:
+            return
+        if os.path.exists(self._socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self._socket_path)
+                raise ATDaemonError(
+                    "A daemon is already listening on %s" % self._socket_path
+                )
+            except OSError:
+                os.unlink(self._socket_path)
+            finally:
+                probe.close()
+        try:
+            for port in self._ports.values():
+                port.start()
+            umask = os.umask(0o177)
+            try:
+                self._server = _UnixServer(self._socket_path, self)
+            finally:
+                os.umask(umask)
+        except Exception:
+            for port in self._ports.values():
+                port.stop()
+            raise
+        self._closed = False
+
+    def serve_forever(self) -> None:
+        """
+        Start the daemon and serve the requests until shutdown is called
+
+        :raises ATDaemonError, ATSerialPortError, ATREUninitializedError
+        """
+        self.start()
+        self._server.serve_forever()
+
+    def shutdown(self) -> None:
+        """
+        Stop serving the requests, stop the ports and remove the socket.
+        Must not be called by the thread running serve_forever
+        """
+        self._closed = True
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            try:
+                os.unlink(self._socket_path)
+            except OSError:
+                pass
+        for port in self._ports.values():
+            port.stop()
+
+    def handle_request(self, request: dict, producer: Any = None) -> Any:
+        """
+        Handle a request (but subscribe)
+
+        :param request
+        :param producer (optional): requests with the same priority are taken in turn from each producer (e.g. a client)
+        :type request: dict
+        :type producer: any hashable
+        :returns result of the request
+        :raises ATDaemonError, ATSerialPortError, ATRuntimeError, ATScriptSyntaxError, ATScriptNotFound, ATCancelledError
+        """
+        op = request.get("op")
+        if op == OP_PORTS:
+            return list(self._ports.keys())
+        elif op == OP_STATS:
+            ports = (
+                [self.get_port(request["port"])]
+                if request.get("port")
+                else self._ports.values()
+            )
+            return {x.name: dict(x.stats.to_dict(), queued=x.queued) for x in ports}
+        elif op in (OP_EXEC, OP_RUN):
+            port = self.get_port(request.get("port"))
+            return port.submit(request, producer).result()
+        raise ATDaemonError("Unknown operation '%s'" % op)
+
+
+class ATDaemonClient(object):
+    """
+    ATDaemonClient class sends requests to a running daemon
+    """
+
+    def __init__(self, socket_path: Optional[str] = None):
+        """
+        Class constructor. Instantiates a new :class:`.ATDaemonClient.` object with the provided parameters.
+
+        :param socket_path (optional): path of the daemon socket; default socket path if not set
+        :type socket_path: str
+        :raises ATDaemonError: if the daemon is not running
+        """
+        self._socket_path = socket_path if socket_path else get_default_socket_path()
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._socket.connect(self._socket_path)
+        except OSError as err:
+            self._socket.close()
+            raise ATDaemonError(
+                "Could not connect to %s: %s" % (self._socket_path, err)
+            )
+        self._stream = self._socket.makefile("rwb")
+        self._next_id = 0
+
+    @property
+    def socket_path(self):
+        return self._socket_path
+
+    def request(self, op: str, **params: Any) -> Any:
+        """
+        Send a request and wait for its result
+
+        :param op: operation
+        :param params: parameters of the operation
+        :type op: str
+        :returns result of the request
+        :raises ATDaemonError: if the request fails
+        """
+        request_id = self.__send(op, params)
+        message = self.__receive()
+        if message.get("id") != request_id:
+            raise ATDaemonError("Unexpected response %s" % message)
+        if "error" in message:
+            raise ATDaemonError(message["error"])
+        return message.get("result")
+
+    def ports(self) -> List[str]:
+        """
+        Get the ports served by the daemon
+
+        :returns list of str
+        :raises ATDaemonError
+        """
+        return self.request(OP_PORTS)
+
+    def exec(
+        self, port: str, command: str, priority: Optional[int] = None
+    ) -> Optional[dict]:
+        """
+        Execute a command (or ESK) on a port
+
+        :param port
+        :param command: ATScript row
+        :param priority (optional): the lower the value, the sooner the command is executed; normal if not set
+        :type port: str
+        :type command: str
+        :type priority: int
+        :returns dict: the response; None for ESKs
+        :raises ATDaemonError
+        """
+        return self.request(OP_EXEC, port=port, command=command, priority=priority)
+
+    def run(
+        self,
+        port: str,
+        script: Optional[str] = None,
+        text: Optional[str] = None,
+        deadline: Optional[float] = None,
+        priority: Optional[int] = None,
+    ) -> dict:
+        """
+        Run an ATScript on a port
+
+        :param port
+        :param script (optional): path of the script, as seen by the daemon
+        :param text (optional): content of the script
+        :param deadline (optional): seconds the whole script must be executed within
+        :param priority (optional): the lower the value, the sooner the script is executed; normal if not set
+        :type port: str
+        :type script: str
+        :type text: str
+        :type deadline: float
+        :type priority: int
+        :returns dict with responses and deadline_exceeded
+        :raises ATDaemonError
+        """
+        params = {"port": port, "script": script, "text": text, "priority": priority}
+        if deadline is not None:
+            params["deadline"] = deadline
+        return self.request(OP_RUN, **params)
+
+    def stats(self, port: Optional[str] = None) -> Dict[str, dict]:
+        """
+        Get the statistics of the ports
+
+        :param port (optional): port; every port if not set
+        :type port: str
+        :returns dict of port name to statistics
+        :raises ATDaemonError
+        """
+        return self.request(OP_STATS, port=port)
+
+    def subscribe(self, port: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+        """
+        Subscribe to the URCs of a port (or of every port).
+        The connection can't be used for other requests afterwards
+
+        :param port (optional): port; every port if not set
+        :type port: str
+        :returns iterator of tuple of (port name, URC)
+        :raises ATDaemonError
+        """
+        self.request(OP_SUBSCRIBE, port=port)
+        while True:
+            try:
+                message = self.__receive()
+            except ATDaemonError:
+                return
+            yield (message["port"], message["urc"])
+
+    def close(self) -> None:
+        """
+        Close the connection to the daemon
+        """
+        self._stream.close()
+        self._socket.close()
+
+    def __enter__(self) -> "ATDaemonClient":
+        return self
+
+    def __exit__(self, *_args: Any) -> None:
+        self.close()
+
+    def __send(self, op: str, params: dict) -> int:
+        """
+        Send a request and get its id
+        """
+        self._next_id += 1
+        request = dict(params, id=self._next_id, op=op)
+        try:
+            self._stream.write(json.dumps(request).encode("utf-8") + b"\n")
+            self._stream.flush()
+        except OSError as err:
+            raise ATDaemonError("Could not send request: %s" % err)
+        return self._next_id
+
+    def __receive(self) -> dict:
+        """
+        Receive a message from the daemon
+        """
+        try:
+            line = self._stream.readline()
+        except OSError as err:
+            raise ATDaemonError("Could not receive response: %s" % err)
+        if not line:
+            raise ATDaemonError("Connection closed by the daemon")
+        return json.loads(line)
@@ -0,0 +1,297 @@
+from .clock import Clock
+from .exceptions import ATSerialPortError
+
+import errno
+import os
+from select import select
+from threading import Event
+from typing import Any, Optional, Tuple
+
+# Maximum amount of bytes moved by a single transfer (default pipe capacity)
+DEFAULT_BUFFER_SIZE = 65536
+# Silence required before and after the escape sequence
+DEFAULT_GUARD_TIME = 1.0
+ESCAPE_SEQUENCE = b"+++"
+# Interval in seconds between two checks of the stop request
+SELECT_INTERVAL = 0.05
+# errno values meaning that splice can't be used with the provided fds
+SPLICE_UNSUPPORTED = (errno.EINVAL, errno.ENOSYS, errno.EBADF, errno.EOPNOTSUPP)
+
+
+def open_pty() -> Tuple[int, int, str]:
+    """
+    Open a pty in raw mode to be used as data mode peer (e.g. by pppd).
+    The master is relayed, while the slave path is given to the peer; the slave fd should be kept open
+    until the peer opens it, otherwise the master gets closed
+
+    :returns tuple of (master fd, slave fd, slave path)
+    :raises ATSerialPortError
+    """
+    try:
+        import tty
+
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        path = os.ttyname(slave)
+    except (ImportError, AttributeError, OSError) as err:
+        raise ATSerialPortError("Could not open pty: %s" % err)
+    return (master, slave, path)
+
+
+def get_fileno(peer: Any) -> int:
+    """
+    Get the file descriptor of a peer
+
+    :param peer: file descriptor or object with fileno (socket, file...)
+    :type peer: int or object
+    :returns int
+    """
+    if isinstance(peer, int):
+        return peer
+    return peer.fileno()
+
+
+class DataModeStats(object):
+    """
+    DataModeStats class reports the amount of data relayed in data mode and the achieved throughput
+    """
+
+    def __init__(self):
+        """
+        Class constructor. Instantiates a new :class:`.DataModeStats.` object
+        """
+        self.bytes_to_device = 0
+        self.bytes_from_device = 0
+        self.elapsed = 0.0
+
+    @property
+    def throughput_to_device(self):
+        return self.bytes_to_device / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def throughput_from_device(self):
+        return self.bytes_from_device / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class DataModeRelay(object):
+    """
+    DataModeRelay class relays raw bytes between the serial port of a device in data mode (after CONNECT)
+    and a local peer (a pty or a socket). Data is moved with splice when the platform supports it,
+    otherwise through preallocated buffers. The escape sequence returns the device to command mode,
+    without closing the serial port
+    """
+
+    def __init__(
+        self,
+        serial_fd: int,
+        peer_fd: int,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        clock: Optional[Clock] = None,
+        use_splice: bool = True,
+        pending: bytes = b"",
+    ):
+        """
+        Class constructor. Instantiates a new :class:`.DataModeRelay.` object with the provided parameters.
+
+        :param serial_fd: file descriptor of the serial port
+        :param peer_fd: file descriptor of the peer
+        :param buffer_size: maximum amount of bytes moved by a single transfer
+        :param clock (optional): time source used for guard times and stats; system clock if not set
+        :param use_splice: move data with os.splice, if available
+        :param pending: data already received from the device (e.g. along with CONNECT), sent to the peer first
+        :type serial_fd: int
+        :type peer_fd: int
+        :type buffer_size: int
+        :type clock: Clock
+        :type use_splice: bool
+        :type pending: bytes
+        """
+        self._serial_fd = serial_fd
+        self._peer_fd = peer_fd
+        self._buffer_size = buffer_size
+        self._clock = clock if clock else Clock()
+        self._splice = use_splice and hasattr(os, "splice")
+        self._pipe: Optional[Tuple[int, int]] = None
+        # Preallocated buffers, one for each direction
+        self._buffers = (bytearray(buffer_size), bytearray(buffer_size))
+        self._stop = Event()
+        self._stats = DataModeStats()
+        self._pending = pending
+
+    @property
+    def stats(self):
+        return self._stats
+
+    @property
+    def splice(self):
+        return self._splice
+
+    def run(self, duration: Optional[float] = None) -> DataModeStats:
+        """
+        Relay data until the peer or the device closes, stop() is called or duration elapses
+
+        :param duration (optional): maximum duration of the relay in seconds
+        :type duration: float
+        :returns DataModeStats
+        :raises ATSerialPortError
+        """
+        self._stop.clear()
+        if self._splice and not self._pipe:
+            self._pipe = os.pipe()
+        t_start = self._clock.now()
+        try:
+            if self._pending:
+                try:
+                    self.__write(self._peer_fd, memoryview(self._pending))
+                except OSError as err:
+                    raise ATSerialPortError(str(err))
+                self._stats.bytes_from_device += len(self._pending)
+                self._pending = b""
+            while not self._stop.is_set():
+                if duration is not None and self._clock.now() - t_start >= duration:
+                    break
+                try:
+                    readable = select(
+                        [self._serial_fd, self._peer_fd], [], [], SELECT_INTERVAL
+                    )[0]
+                except (OSError, ValueError) as err:
+                    raise ATSerialPortError(str(err))
+                if self._serial_fd in readable:
+                    moved = self.__transfer(self._serial_fd, self._peer_fd, 0)
+                    if moved == 0:
+                        break
+                    if moved > 0:
+                        self._stats.bytes_from_device += moved
+                if self._peer_fd in readable:
+                    moved = self.__transfer(self._peer_fd, self._serial_fd, 1)
+                    if moved == 0:
+                        break
+                    if moved > 0:
+                        self._stats.bytes_to_device += moved
+        finally:
+            self._stats.elapsed += self._clock.now() - t_start
+            self.__close_pipe()
+        return self._stats
+
+    def stop(self) -> None:
+        """
+        Stop the relay; it can be called from another thread
+        """
+        self._stop.set()
+
+    def escape(
+        self,
+        guard_time: float = DEFAULT_GUARD_TIME,
+        timeout: float = 5.0,
+        escape_sequence: bytes = ESCAPE_SEQUENCE,
+    ) -> bool:
+        """
+        Send the escape sequence, preceded and followed by the guard time, and wait for OK.
+        Data received from the device in the meantime is discarded
+
+        :param guard_time: seconds of silence before and after the escape sequence
+        :param timeout: seconds to wait for OK after the guard time
+        :param escape_sequence
+        :type guard_time: float
+        :type timeout: float
+        :type escape_sequence: bytes
+        :returns bool: True if the device returned to command mode
+        :raises ATSerialPortError
+        """
+        self._clock.sleep(guard_time)
+        try:
+            self.__write(self._serial_fd, memoryview(escape_sequence))
+        except OSError as err:
+            raise ATSerialPortError(str(err))
+        self._clock.sleep(guard_time)
+        response = bytearray()
+        for _ in range(max(1, int(timeout / SELECT_INTERVAL))):
+            try:
+                if select([self._serial_fd], [], [], SELECT_INTERVAL)[0]:
+                    response += os.read(self._serial_fd, self._buffer_size)
+            except OSError as err:
+                raise ATSerialPortError(str(err))
+            if b"OK" in response:
+                return True
+        return False
+
+    def __transfer(self, src: int, dst: int, direction: int) -> int:
+        """
+        Move the data available on src to dst
+
+        :param src
+        :param dst
+        :param direction: index of the buffer to use
+        :type src: int
+        :type dst: int
+        :type direction: int
+        :returns int: amount of bytes moved (-1 if no data was available); 0 if src has been closed
+        :raises ATSerialPortError
+        """
+        try:
+            if self._splice:
+                try:
+                    return self.__splice(src, dst)
+                except OSError as err:
+                    if err.errno not in SPLICE_UNSUPPORTED:
+                        raise err
+                    # Never use splice again on these fds
+                    self._splice = False
+            buffer = self._buffers[direction]
+            amount = os.readv(src, [buffer])
+            if amount:
+                self.__write(dst, memoryview(buffer)[:amount])
+            return amount
+        except BlockingIOError:
+            return -1
+        except OSError as err:
+            if err.errno == errno.EIO:
+                # pty closed on the other side
+                return 0
+            raise ATSerialPortError(str(err))
+
+    def __splice(self, src: int, dst: int) -> int:
+        """
+        Move the data available on src to dst through the pipe, without copying it in user space
+
+        :returns int
+        :raises OSError
+        """
+        pipe_r, pipe_w = self._pipe
+        amount = os.splice(src, pipe_w, self._buffer_size)
+        moved = 0
+        try:
+            while moved < amount:
+                try:
+                    moved += os.splice(pipe_r, dst, amount - moved)
+                except BlockingIOError:
+                    select([], [dst], [], SELECT_INTERVAL)
+        except OSError as err:
+            if err.errno not in SPLICE_UNSUPPORTED:
+                raise err
+            # Drain the pipe
+            self.__write(dst, memoryview(os.read(pipe_r, amount - moved)))
+        return amount
+
+    def __write(self, fd: int, data: memoryview) -> None:
+        """
+        Write all data to fd, waiting for it to be writable if it is non-blocking
+
+        :raises OSError
+        """
+        while data:
+            try:
+                written = os.write(fd, data)
+            except BlockingIOError:
+                select([], [fd], [], SELECT_INTERVAL)
+                continue
+            data = data[written:]
+
+    def __close_pipe(self) -> None:
+        """
+        Close the pipe used by splice
+        """
+        if self._pipe:
+            for fd in self._pipe:
+                os.close(fd)
+            self._pipe = None
@@ -0,0 +1,317 @@
+from .atcommunicator import ATCommunicator, PROBE_TIMEOUT
+from .exceptions import ATSerialPortError
+
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+import json
+import os
+from time import time
+from typing import Dict, List, Optional, Tuple
+
+# Nodes probed when no port is provided
+DEFAULT_PORT_PATTERNS = ("/dev/ttyUSB*", "/dev/ttyACM*")
+DEFAULT_BAUD_RATES = (115200,)
+# Maximum amount of ports probed at the same time
+DEFAULT_WORKERS = 8
+# Seconds a cached result is valid for
+DEFAULT_CACHE_TTL = 3600
+# Timeout in seconds of the fingerprinting commands
+QUERY_TIMEOUT = 1
+
+
+def get_default_cache_path() -> str:
+    """
+    Get the path of the discovery cache ($XDG_CACHE_HOME/attila/discovery.json)
+
+    :returns str
+    """
+    cache_home = os.environ.get(
+        "XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")
+    )
+    return os.path.join(cache_home, "attila", "discovery.json")
+
+
+def list_ports(patterns: Tuple[str, ...] = DEFAULT_PORT_PATTERNS) -> List[str]:
+    """
+    List the serial ports matching patterns
+
+    :param patterns: glob patterns
+    :type patterns: tuple of str
+    :returns list of str
+    """
+    ports = set()
+    for pattern in patterns:
+        ports.update(glob(pattern))
+    return sorted(ports)
+
+
+class DiscoveredDevice(object):
+    """
+    DiscoveredDevice class describes an AT-capable device found on a serial port
+    """
+
+    def __init__(
+        self,
+        port: str,
+        baud_rate: int,
+        identification: Optional[List[str]] = None,
+        model: Optional[str] = None,
+        imei: Optional[str] = None,
+    ):
+        """
+        Class constructor. Instantiates a new :class:`.DiscoveredDevice.` object with the provided parameters.
+
+        :param port: serial port
+        :param baud_rate: baud rate the device answered at
+        :param identification (optional): ATI response
+        :param model (optional): AT+CGMM response
+        :param imei (optional): AT+CGSN response
+        :type port: str
+        :type baud_rate: int
+        :type identification: list of str
+        :type model: str
+        :type imei: str
+        """
+        self.port = port
+        self.baud_rate = baud_rate
+        self.identification = identification if identification else []
+        self.model = model
+        self.imei = imei
+
+    def to_dict(self) -> dict:
+        """
+        Get the device as a dictionary
+
+        :returns dict
+        """
+        return {
+            "port": self.port,
+            "baud_rate": self.baud_rate,
+            "identification": self.identification,
+            "model": self.model,
+            "imei": self.imei,
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> "DiscoveredDevice":
+        """
+        Instantiate a device from a dictionary
+
+        :param data
+        :type data: dict
+        :returns DiscoveredDevice
+        :raises KeyError
+        """
+        return DiscoveredDevice(
+            data["port"],
+            data["baud_rate"],
+            data.get("identification"),
+            data.get("model"),
+            data.get("imei"),
+        )
+
+
+class DiscoveryCache(object):
+    """
+    DiscoveryCache class stores the result of the probe of each port in a JSON file.
+    An entry is valid until its TTL elapses or the device node changes (e.g. the device has been replugged)
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: int = DEFAULT_CACHE_TTL):
+        """
+        Class constructor. Instantiates a new :class:`.DiscoveryCache.` object with the provided parameters.
+
+        :param path (optional): cache file; default cache path if not set
+        :param ttl: seconds an entry is valid for
+        :type path: str
+        :type ttl: int
+        """
+        self._path = path if path else get_default_cache_path()
+        self._ttl = ttl
+        self._entries: Dict[str, dict] = {}
+        self.load()
+
+    @property
+    def path(self):
+        return self._path
+
+    def load(self) -> None:
+        """
+        Load the cache file; a missing or corrupted file is an empty cache
+        """
+        try:
+            with open(self._path, "r") as cache_file:
+                entries = json.load(cache_file)
+            self._entries = entries if isinstance(entries, dict) else {}
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def save(self) -> None:
+        """
+        Write the cache file
+
+        :raises OSError
+        """
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = "%s.tmp" % self._path
+        with open(tmp_path, "w") as cache_file:
+            json.dump(self._entries, cache_file, indent=2)
+        os.replace(tmp_path, self._path)
+
+    def lookup(self, port: str) -> Tuple[bool, Optional[DiscoveredDevice]]:
+        """
+        Look up the result of the probe of a port
+
+        :param port
+        :type port: str
+        :returns tuple of (hit, device); device is None if the port didn't answer
+        """
+        entry = self._entries.get(port)
+        if not entry or time() - entry.get("timestamp", 0) > self._ttl:
+            return (False, None)
+        if entry.get("node") != self.__get_node(port):
+            return (False, None)
+        device = entry.get("device")
+        try:
+            return (True, DiscoveredDevice.from_dict(device) if device else None)
+        except (KeyError, TypeError):
+            return (False, None)
+
+    def store(self, port: str, device: Optional[DiscoveredDevice]) -> None:
+        """
+        Store the result of the probe of a port
+
+        :param port
+        :param device: None if the port didn't answer
+        :type port: str
+        :type device: DiscoveredDevice
+        """
+        self._entries[port] = {
+            "timestamp": time(),
+            "node": self.__get_node(port),
+            "device": device.to_dict() if device else None,
+        }
+
+    def __get_node(self, port: str) -> Optional[List[float]]:
+        """
+        Get the identity of the device node
+        """
+        try:
+            stat = os.stat(port)
+        except OSError:
+            return None
+        return [stat.st_rdev, stat.st_ctime]
+
+
+def probe_port(
+    port: str,
+    baud_rates: Tuple[int, ...] = DEFAULT_BAUD_RATES,
+    timeout: float = PROBE_TIMEOUT,
+) -> Optional[DiscoveredDevice]:
+    """
+    Probe a serial port with AT at each baud rate; if the device answers, fingerprint it with ATI, AT+CGMM and AT+CGSN
+
+    :param port: serial port
+    :param baud_rates: baud rates to try
+    :param timeout: timeout of the AT handshake in seconds
+    :type port: str
+    :type baud_rates: tuple of int
+    :type timeout: float
+    :returns DiscoveredDevice; None if the port can't be opened or the device didn't answer
+    """
+    communicator = ATCommunicator(
+        port, baud_rates[0], QUERY_TIMEOUT, "\r\n", False, False
+    )
+    try:
+        communicator.open()
+    except ATSerialPortError:
+        return None
+    try:
+        baud_rate = communicator.autobaud(baud_rates[1:], timeout)
+        if baud_rate is None:
+            return None
+        identification = _query(communicator, "ATI")
+        model = _query(communicator, "AT+CGMM")
+        imei = _query(communicator, "AT+CGSN")
+        return DiscoveredDevice(
+            port,
+            baud_rate,
+            identification,
+            model[0] if model else None,
+            imei[0] if imei else None,
+        )
+    except ATSerialPortError:
+        return None
+    finally:
+        try:
+            communicator.close()
+        except ATSerialPortError:
+            pass
+
+
+def _query(communicator: ATCommunicator, command: str) -> List[str]:
+    """
+    Execute a fingerprinting command
+
+    :returns list of str: information lines of the response; empty if the command failed
+    """
+    lines, _ = communicator.exec(command, QUERY_TIMEOUT)
+    lines = [line.strip() for line in lines]
+    if "OK" not in lines:
+        return []
+    return [line for line in lines if line and line != "OK" and line != command]
+
+
+def discover(
+    ports: Optional[List[str]] = None,
+    baud_rates: Tuple[int, ...] = DEFAULT_BAUD_RATES,
+    timeout: float = PROBE_TIMEOUT,
+    workers: int = DEFAULT_WORKERS,
+    cache: Optional[DiscoveryCache] = None,
+    refresh: bool = False,
+) -> Dict[str, DiscoveredDevice]:
+    """
+    Find the AT-capable devices, probing the ports concurrently
+
+    :param ports (optional): ports to probe; /dev/ttyUSB* and /dev/ttyACM* if not set
+    :param baud_rates: baud rates to try on each port
+    :param timeout: timeout of the AT handshake in seconds
+    :param workers: maximum amount of ports probed at the same time
+    :param cache (optional): cache of the previous probes
+    :param refresh: probe again the ports in cache
+    :type ports: list of str
+    :type baud_rates: tuple of int
+    :type timeout: float
+    :type workers: int
+    :type cache: DiscoveryCache
+    :type refresh: bool
+    :returns dict of port => DiscoveredDevice
+    """
+    if ports is None:
+        ports = list_ports()
+    devices: Dict[str, DiscoveredDevice] = {}
+    to_probe: List[str] = []
+    for port in ports:
+        hit, device = cache.lookup(port) if cache and not refresh else (False, None)
+        if not hit:
+            to_probe.append(port)
+        elif device:
+            devices[port] = device
+    if to_probe:
+        with ThreadPoolExecutor(max_workers=min(workers, len(to_probe))) as executor:
+            results = executor.map(
+                lambda port: probe_port(port, baud_rates, timeout), to_probe
+            )
+            for port, device in zip(to_probe, results):
+                if device:
+                    devices[port] = device
+                if cache:
+                    cache.store(port, device)
+        if cache:
+            try:
+                cache.save()
+            except OSError:
+                pass
+    return {port: devices[port] for port in ports if port in devices}
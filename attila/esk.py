@@ -1,3 +1,5 @@
+from .atcommand import parse_time
+
 from enum import Enum
 from typing import Optional, Any
 
@@ -19,6 +21,13 @@ class ESK(Enum):
     DSRDTR = 9
     RTSCTS = 10
     WRITE = 11
+    GROUP = 12
+    PAYLOAD = 13
+    PAYLOADRAW = 14
+    AUTOBAUD = 15
+    DEADLINE = 16
+    ASYNC = 17
+    BARRIER = 18
 
     @staticmethod
     def get_esk_from_string(esk_string: str) -> Optional[object]:
@@ -53,6 +62,20 @@ class ESK(Enum):
             return ESK.RTSCTS
         elif esk_string == "WRITE":
             return ESK.WRITE
+        elif esk_string == "GROUP":
+            return ESK.GROUP
+        elif esk_string == "PAYLOAD":
+            return ESK.PAYLOAD
+        elif esk_string == "PAYLOADRAW":
+            return ESK.PAYLOADRAW
+        elif esk_string == "AUTOBAUD":
+            return ESK.AUTOBAUD
+        elif esk_string == "DEADLINE":
+            return ESK.DEADLINE
+        elif esk_string == "ASYNC":
+            return ESK.ASYNC
+        elif esk_string == "BARRIER":
+            return ESK.BARRIER
         else:
             return None
 
@@ -81,8 +104,9 @@ class ESK(Enum):
             except ValueError:  # NaN
                 return None
         elif esk is ESK.TIMEOUT:
+            # Seconds, fractions of second or milliseconds (e.g. 5, 0.5, 500ms)
             try:
-                timeout = int(attr)
+                timeout = parse_time(str(attr))
                 return ESKValue(esk, timeout)
             except ValueError:  # NaN
                 return None
@@ -155,6 +179,64 @@ class ESK(Enum):
             file_path = write_attr[0]
             file_content = " ".join(write_attr[1:])
             return ESKValue(esk, (file_path, file_content))
+        elif esk is ESK.GROUP:
+            # True when the group begins, False when it ends
+            if attr == "BEGIN":
+                return ESKValue(esk, True)
+            elif attr == "END":
+                return ESKValue(esk, False)
+            else:
+                return None
+        elif esk is ESK.PAYLOAD:
+            if attr:
+                return ESKValue(esk, attr)
+            else:
+                return None
+        elif esk is ESK.PAYLOADRAW:
+            # Payload is hex encoded
+            if not attr:
+                return None
+            try:
+                return ESKValue(esk, bytes.fromhex(attr))
+            except ValueError:
+                return None
+        elif esk is ESK.DEADLINE:
+            # Seconds the script must be executed within (e.g. 60, 1.5, 500ms)
+            if not attr:
+                return None
+            try:
+                return ESKValue(esk, parse_time(str(attr)))
+            except ValueError:
+                return None
+        elif esk is ESK.AUTOBAUD:
+            # Tuple of upshift and maximum baud rate
+            if not attr:
+                return ESKValue(esk, (False, None))
+            elif attr == "MAX":
+                return ESKValue(esk, (True, None))
+            try:
+                return ESKValue(esk, (True, int(attr)))
+            except ValueError:  # NaN
+                return None
+        elif esk is ESK.ASYNC:
+            # Execute PRINT, EXEC and WRITE in background
+            if not attr:
+                return None
+            check = attr.lower()
+            if check == "true":
+                return ESKValue(esk, True)
+            elif check == "false":
+                return ESKValue(esk, False)
+            else:
+                return None
+        elif esk is ESK.BARRIER:
+            # Seconds to wait at most for the background ESKs; no limit if not set
+            if not attr:
+                return ESKValue(esk, None)
+            try:
+                return ESKValue(esk, parse_time(str(attr)))
+            except ValueError:
+                return None
         else:
             return None
 
@@ -164,6 +246,8 @@ class ESKValue(object):
     This class represents an Environment Setup Keyword value
     """
 
+    __slots__ = ("_keyword", "_value")
+
     def __init__(self, keyword: ESK, value: Any):
         """
         Class constructor. Instantiates a new :class:`.ESKValue.` object with the provided paramters
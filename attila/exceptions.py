@@ -1,3 +1,6 @@
+from typing import Any
+
+
 class ATSerialPortError(Exception):
     """
     ATSerialPortError class provides an exception in case of an error on the serial port
@@ -60,7 +63,55 @@ class ATREUninitializedError(Exception):
 
 class ATRuntimeError(Exception):
     """
-    ATRuntimeError class provides an exception in case of a Runtime Error
+    ATRuntimeError class provides an exception in case of a Runtime Error.
+    If it has been raised by a failed command, response is its response
+    """
+
+    def __init__(self, message: str, response: Any = None):
+        self.message = message
+        self.response = response
+
+    def __str__(self):
+        return repr(self.message)
+
+    def __repr__(self):
+        return str(self.message)
+
+
+class ATCancelledError(Exception):
+    """
+    ATCancelledError class provides an exception in case of a cancelled command execution
+    """
+
+    def __init__(self, message: str):
+        self.message = message
+
+    def __str__(self):
+        return repr(self.message)
+
+    def __repr__(self):
+        return str(self.message)
+
+
+class ATCollectableSyntaxError(ATScriptSyntaxError):
+    """
+    ATCollectableSyntaxError class provides an exception in case of a syntax error in the collectables of a command
+    """
+
+    def __init__(self, message: str, column: int):
+        self.message = message
+        self.column = column
+
+    def __str__(self):
+        return repr(self.message)
+
+    def __repr__(self):
+        return str(self.message)
+
+
+class ATDaemonError(Exception):
+    """
+    ATDaemonError class provides an exception in case of an error of the daemon or of a request to the daemon
     """
 
     def __init__(self, message: str):
@@ -0,0 +1,113 @@
+from .atresponse import ATResponse
+
+import json
+from typing import Any, BinaryIO, Optional
+
+# Bytes buffered before writing records to the stream
+DEFAULT_BUFFER_SIZE = 65536
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_ERROR = "error"
+STATUS_CANCELLED = "cancelled"
+
+
+def response_to_record(response: ATResponse, device: Optional[str] = None) -> dict:
+    """
+    Get the record of a command: command, expected and matched response, entire response, collectables,
+    timing (delay waited before the command and execution time in milliseconds, timeout in seconds), device and status
+
+    :param response
+    :param device (optional): serial port the command has been executed on
+    :type response: ATResponse
+    :type device: str
+    :returns dict
+    """
+    summary = response.summarize().to_dict()
+    command = response.command
+    return {
+        "command": summary["command"],
+        "expected": command.expected_response if command else None,
+        "response": summary["response"],
+        "full_response": response.get_printable_response(),
+        "collectables": summary["collectables"],
+        "timing": {
+            "delay": command.delay if command and command.delay else 0,
+            "execution": summary["execution_time"],
+            "timeout": command.timeout if command else None,
+        },
+        "device": device,
+        "status": STATUS_OK if summary["succeeded"] else STATUS_FAILED,
+    }
+
+
+def error_to_record(
+    error: Any, status: str = STATUS_ERROR, device: Optional[str] = None
+) -> dict:
+    """
+    Get the record of an error which isn't a command response
+
+    :param error: exception or message
+    :param status: error or cancelled
+    :param device (optional): serial port the error occurred on
+    :type error: Exception or str
+    :type status: str
+    :type device: str
+    :returns dict
+    """
+    message = getattr(error, "message", error)
+    return {
+        "command": None,
+        "error": str(message) if message is not None else None,
+        "device": device,
+        "status": status,
+    }
+
+
+class JSONLinesWriter(object):
+    """
+    JSONLinesWriter class writes records as compact JSON, one per line. Records are buffered
+    and written to the stream once the buffer is full, or when flushed
+    """
+
+    def __init__(self, stream: BinaryIO, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        """
+        Class constructor. Instantiates a new :class:`.JSONLinesWriter.` object with the provided parameters.
+
+        :param stream: binary stream records are written to
+        :param buffer_size: bytes buffered before writing to the stream; 0 writes each record
+        :type stream: BinaryIO
+        :type buffer_size: int
+        """
+        self._stream = stream
+        self._buffer_size = buffer_size
+        self._buffer = bytearray()
+        self._encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    @property
+    def buffer_size(self):
+        return self._buffer_size
+
+    def write(self, record: dict) -> None:
+        """
+        Write a record
+
+        :param record
+        :type record: dict
+        :raises OSError
+        """
+        self._buffer += self._encoder.encode(record).encode("utf-8")
+        self._buffer += b"\n"
+        if len(self._buffer) >= self._buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write the buffered records to the stream
+
+        :raises OSError
+        """
+        if self._buffer:
+            self._stream.write(self._buffer)
+            self._buffer.clear()
+        self._stream.flush()
@@ -0,0 +1,171 @@
+from .atcommand import ATCommand
+from .esk import ESK, ESKValue
+
+from hashlib import blake2b
+import marshal
+import os
+from typing import List, Optional, Tuple
+
+# Version of the compiled script format; compiled scripts with a different version are ignored
+FORMAT_VERSION = 1
+COMPILED_SCRIPT_EXTENSION = ".atc"
+
+
+def get_default_cache_dir() -> str:
+    """
+    Get the directory of the compiled scripts ($ATTILA_CACHE_DIR or $XDG_CACHE_HOME/attila/scripts)
+
+    :returns str
+    """
+    cache_dir = os.environ.get("ATTILA_CACHE_DIR")
+    if cache_dir:
+        return cache_dir
+    cache_home = os.environ.get(
+        "XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")
+    )
+    return os.path.join(cache_home, "attila", "scripts")
+
+
+def _dump_command(command: ATCommand) -> tuple:
+    """
+    Get a command as a tuple of plain values
+    """
+    doppelganger = command.doppel_ganger
+    return (
+        command.command,
+        command.expected_response,
+        command.timeout,
+        command.delay,
+        command.collectables,
+        _dump_command(doppelganger) if doppelganger else None,
+        command.payload,
+        command.terminator,
+    )
+
+
+def _load_command(data: tuple) -> ATCommand:
+    """
+    Instantiate a command from a tuple of plain values
+    """
+    return ATCommand(
+        data[0],
+        data[1],
+        data[2],
+        data[3],
+        list(data[4]) if data[4] is not None else None,
+        _load_command(data[5]) if data[5] else None,
+        data[6],
+        data[7],
+    )
+
+
+class ScriptCache(object):
+    """
+    ScriptCache class stores compiled ATScripts (the parsed commands and ESKs) serialized with marshal,
+    one file for each script. A compiled script is valid as long as the modification time
+    and the content hash of the script don't change
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        """
+        Class constructor. Instantiates a new :class:`.ScriptCache.` object with the provided parameters.
+
+        :param directory (optional): directory of the compiled scripts; default cache directory if not set
+        :type directory: str
+        """
+        self._directory = directory if directory else get_default_cache_dir()
+
+    @property
+    def directory(self):
+        return self._directory
+
+    def get_compiled_path(self, script_path: str) -> str:
+        """
+        Get the path of the compiled script
+
+        :param script_path
+        :type script_path: str
+        :returns str
+        """
+        digest = blake2b(
+            os.path.abspath(script_path).encode("utf-8"), digest_size=16
+        ).hexdigest()
+        return os.path.join(self._directory, digest + COMPILED_SCRIPT_EXTENSION)
+
+    def load(
+        self, script_path: str, content: bytes
+    ) -> Optional[Tuple[List[ATCommand], List[Tuple[ESKValue, int]]]]:
+        """
+        Load the compiled script
+
+        :param script_path
+        :param content: current content of the script
+        :type script_path: str
+        :type content: bytes
+        :returns Tuple of array of ATCommand and array of tuple of (ESKValue, execution index); None if not in cache or outdated
+        """
+        try:
+            mtime = os.stat(script_path).st_mtime_ns
+            with open(self.get_compiled_path(script_path), "rb") as compiled:
+                data = marshal.loads(compiled.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        try:
+            version, path, compiled_mtime, digest, commands, esks = data
+            if (
+                version != FORMAT_VERSION
+                or path != os.path.abspath(script_path)
+                or compiled_mtime != mtime
+                or digest != self.__digest(content)
+            ):
+                return None
+            return (
+                [_load_command(x) for x in commands],
+                [(ESKValue(ESK(x[0]), x[1]), x[2]) for x in esks],
+            )
+        except (TypeError, ValueError, IndexError):
+            return None
+
+    def store(
+        self,
+        script_path: str,
+        content: bytes,
+        result: Tuple[List[ATCommand], List[Tuple[ESKValue, int]]],
+    ) -> None:
+        """
+        Store the compiled script
+
+        :param script_path
+        :param content: content the script has been parsed from
+        :param result: result of the parser
+        :type script_path: str
+        :type content: bytes
+        :type result: tuple of (list of ATCommand, list of tuple of (ESKValue, execution index))
+        :raises OSError
+        """
+        data = (
+            FORMAT_VERSION,
+            os.path.abspath(script_path),
+            os.stat(script_path).st_mtime_ns,
+            self.__digest(content),
+            [_dump_command(x) for x in result[0]],
+            [(esk.keyword.value, esk.value, index) for esk, index in result[1]],
+        )
+        os.makedirs(self._directory, exist_ok=True)
+        compiled_path = self.get_compiled_path(script_path)
+        tmp_path = "%s.%d.tmp" % (compiled_path, os.getpid())
+        try:
+            with open(tmp_path, "wb") as compiled:
+                compiled.write(marshal.dumps(data))
+            os.replace(tmp_path, compiled_path)
+        except OSError:
+            # Don't leave partial compiled scripts behind
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def __digest(self, content: bytes) -> bytes:
+        """
+        Get the hash of the content of a script
+        """
+        return blake2b(content, digest_size=16).digest()
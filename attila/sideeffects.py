@@ -0,0 +1,289 @@
+from .cancel import CancelToken
+from .esk import ESK
+
+from concurrent.futures import Future, wait
+import os
+import queue
+import sys
+from threading import Thread
+from typing import Any, List, Optional, TextIO, Tuple
+
+# Seconds between two checks of the cancel token while waiting at a barrier
+BARRIER_POLL_INTERVAL = 0.05
+
+
+class SideEffectResult(object):
+    """
+    SideEffectResult class describes the outcome of a side effect ESK (PRINT, EXEC, WRITE) executed in background
+    """
+
+    def __init__(
+        self,
+        keyword: ESK,
+        value: Any,
+        exit_status: Optional[int] = None,
+        error: Optional[str] = None,
+    ):
+        """
+        Class constructor. Instantiates a new :class:`.SideEffectResult.` object with the provided parameters.
+
+        :param keyword: ESK
+        :param value: value of the ESK (text printed, shell command or tuple of file path and content)
+        :param exit_status (optional): exit status of the shell command (EXEC only)
+        :param error (optional): error occurred executing the side effect
+        :type keyword: ESK
+        :type value: any
+        :type exit_status: int
+        :type error: str
+        """
+        self._keyword = keyword
+        self._value = value
+        self._exit_status = exit_status
+        self._error = error
+
+    @property
+    def keyword(self):
+        return self._keyword
+
+    @property
+    def value(self):
+        return self._value
+
+    @property
+    def exit_status(self):
+        return self._exit_status
+
+    @property
+    def error(self):
+        return self._error
+
+    @property
+    def succeeded(self) -> bool:
+        return self._error is None and not self._exit_status
+
+
+def _get_exit_code(status: int) -> int:
+    """
+    Get the exit code of a process from the value returned by os.system
+    """
+    if os.name == "posix" and hasattr(os, "waitstatus_to_exitcode"):
+        try:
+            return os.waitstatus_to_exitcode(status)
+        except ValueError:
+            return status
+    return status
+
+
+class SideEffectExecutor(object):
+    """
+    SideEffectExecutor class executes side effect ESKs (PRINT, EXEC, WRITE) on a background thread,
+    so that slow hooks don't stall the communication with the device.
+    Side effects are executed and completed in the order they have been submitted; the text printed
+    is buffered and written at once, and a file written again before the first write has been executed
+    is written only once (unless a shell command is executed in between)
+    """
+
+    def __init__(self, output: Optional[TextIO] = None):
+        """
+        Class constructor. Instantiates a new :class:`.SideEffectExecutor.` object with the provided parameters.
+
+        :param output (optional): stream PRINT writes to; current stdout if not set
+        :type output: TextIO
+        """
+        self._output = output
+        self._jobs: queue.Queue = queue.Queue()
+        self._thread: Optional[Thread] = None
+        # Futures of the side effects submitted after the last barrier
+        self._submitted: List[Future] = []
+
+    @property
+    def submitted(self) -> int:
+        return len(self._submitted)
+
+    @property
+    def pending(self) -> int:
+        return len([x for x in self._submitted if not x.done()])
+
+    def print(self, text: str) -> Future:
+        """
+        Print a text (PRINT ESK)
+
+        :param text
+        :type text: str
+        :returns Future: resolved with a SideEffectResult
+        """
+        return self.__submit(ESK.PRINT, text)
+
+    def exec(self, command: str) -> Future:
+        """
+        Execute a shell command (EXEC ESK)
+
+        :param command
+        :type command: str
+        :returns Future: resolved with a SideEffectResult, with the exit status of the command
+        """
+        return self.__submit(ESK.EXEC, command)
+
+    def write(self, file_path: str, content: str) -> Future:
+        """
+        Write a file (WRITE ESK)
+
+        :param file_path
+        :param content
+        :type file_path: str
+        :type content: str
+        :returns Future: resolved with a SideEffectResult
+        """
+        return self.__submit(ESK.WRITE, (file_path, content))
+
+    def barrier(
+        self,
+        timeout: Optional[float] = None,
+        cancel_token: Optional[CancelToken] = None,
+    ) -> Tuple[List[SideEffectResult], bool]:
+        """
+        Wait for the side effects submitted since the last barrier to complete
+
+        :param timeout (optional): seconds to wait at most; no limit if not set
+        :param cancel_token (optional): token which interrupts the wait
+        :type timeout: float
+        :type cancel_token: CancelToken
+        :returns tuple of (results of the side effects completed, in submission order; whether all of them completed)
+        :raises ATCancelledError
+        """
+        futures = self._submitted
+        pending = [x for x in futures if not x.done()]
+        remaining = timeout
+        while pending and (remaining is None or remaining > 0):
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            interval = (
+                BARRIER_POLL_INTERVAL
+                if remaining is None
+                else min(BARRIER_POLL_INTERVAL, remaining)
+            )
+            pending = list(wait(pending, interval).not_done)
+            if remaining is not None:
+                remaining -= interval
+        # The completed side effects are collected, in order, up to the first one still running
+        results = []
+        collected = 0
+        for future in futures:
+            if not future.done():
+                break
+            collected += 1
+            # Side effects cancelled by the caller have no result
+            if not future.cancelled():
+                results.append(future.result())
+        self._submitted = futures[collected:]
+        return (results, not self._submitted)
+
+    def __submit(self, keyword: ESK, value: Any) -> Future:
+        """
+        Queue a side effect, starting the worker thread if needed
+        """
+        future = Future()
+        self._submitted.append(future)
+        self._jobs.put((future, keyword, value))
+        if not self._thread:
+            self._thread = Thread(
+                target=self.__work, name="attila-side-effects", daemon=True
+            )
+            self._thread.start()
+        return future
+
+    def __work(self) -> None:
+        """
+        Execute the side effects, taking all the queued ones at once
+        """
+        while True:
+            batch = [self._jobs.get()]
+            while True:
+                try:
+                    batch.append(self._jobs.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.__execute(batch)
+            except Exception as err:
+                # The worker must survive, or the side effects queued later would never complete
+                for future, keyword, value in batch:
+                    if not future.done():
+                        future.set_result(
+                            SideEffectResult(keyword, value, error=str(err))
+                        )
+
+    def __execute(self, batch: List[Tuple[Future, ESK, Any]]) -> None:
+        """
+        Execute a batch of side effects in order
+        """
+        text: List[str] = []
+        done: List[Tuple[Future, SideEffectResult]] = []
+        for i, (future, keyword, value) in enumerate(batch):
+            if keyword is ESK.PRINT:
+                text.append(value)
+                done.append((future, SideEffectResult(keyword, value)))
+                continue
+            if keyword is ESK.EXEC:
+                # The shell command may read what has been printed or written so far
+                self.__print(text, done)
+                self.__complete(done)
+                try:
+                    status = _get_exit_code(os.system(value))
+                    result = SideEffectResult(keyword, value, status)
+                except Exception as err:
+                    # e.g. OSError, or ValueError if the command contains a NUL
+                    result = SideEffectResult(keyword, value, error=str(err))
+                self.__complete([(future, result)])
+                continue
+            # WRITE: skipped if the file is written again before any shell command
+            superseded = False
+            for _, next_keyword, next_value in batch[i + 1 :]:
+                if next_keyword is ESK.EXEC:
+                    break
+                if next_keyword is ESK.WRITE and next_value[0] == value[0]:
+                    superseded = True
+                    break
+            error = None
+            if not superseded:
+                try:
+                    with open(value[0], "w") as hnd:
+                        hnd.write(value[1])
+                except Exception as err:
+                    error = str(err)
+            done.append((future, SideEffectResult(keyword, value, error=error)))
+        self.__print(text, done)
+        self.__complete(done)
+
+    def __print(
+        self, text: List[str], done: List[Tuple[Future, SideEffectResult]]
+    ) -> None:
+        """
+        Write the buffered text; if it can't be written, the PRINTs among the side effects executed fail
+        """
+        if not text:
+            return
+        output = self._output if self._output else sys.stdout
+        try:
+            output.write("\n".join(text) + "\n")
+            output.flush()
+        except Exception as err:
+            # e.g. UnicodeEncodeError, or the stream has been closed
+            done[:] = [
+                (
+                    (future, SideEffectResult(ESK.PRINT, result.value, error=str(err)))
+                    if result.keyword is ESK.PRINT
+                    else (future, result)
+                )
+                for future, result in done
+            ]
+        text.clear()
+
+    def __complete(self, done: List[Tuple[Future, SideEffectResult]]) -> None:
+        """
+        Resolve the futures of the side effects executed (unless cancelled by the caller)
+        """
+        for future, result in done:
+            if not future.done():
+                future.set_result(result)
+        done.clear()
@@ -1,7 +1,10 @@
+from attila.clock import Clock
 from attila.exceptions import ATSerialPortError
 from attila.virtual.virtualserial import VirtualSerial, VirtualSerialException
+from attila.virtual.scenario import VirtualDevice
 from attila.atcommunicator import ATCommunicator
-from typing import Callable, Optional, List, Tuple
+from attila.bulk import DEFAULT_CHUNK_SIZE, Checksum, TransferResult
+from typing import BinaryIO, Callable, Optional, List, Pattern, Tuple
 
 
 class ATVirtualCommunicator(ATCommunicator):
@@ -15,11 +18,13 @@ class ATVirtualCommunicator(ATCommunicator):
         self,
         serial_port: str,
         baud_rate: int,
-        default_timeout: int = 10,
+        default_timeout: float = 10,
         line_break: str = "\r\n",
         read_callback: Optional[Callable[[], str]] = None,
         write_callback: Optional[Callable[[str], None]] = None,
         in_waiting_callback: Optional[Callable[[], int]] = None,
+        clock: Optional[Clock] = None,
+        device: Optional[VirtualDevice] = None,
     ):
         """
         Class constructor. Instantiates a new :class:`.ATCommunicator.` object with the provided parameters.
@@ -31,22 +36,40 @@ class ATVirtualCommunicator(ATCommunicator):
         :param read_callback (optional): Specify a read function to call to read using the virtual communicator
         :param write_callback (optional): Specifiy a write funtion to call to write using the virtual communicator
         :param in_waiting_callback (optional): Specify a in waiting function to call
+        :param clock (optional): time source used for timeouts and execution times; system clock if not set
+        :param device (optional): virtual device running a scenario; replaces the callbacks and provides the clock if not set
         :type serial_port: string
         :type baud_rate: int
-        :type default_timeout: int > 0
+        :type default_timeout: float > 0
         :type line_break: string
         :type read_callback: function which returns string and takes nbytes as argument, if nbytes is -1 returns all lines
         :type write_callback: function which takes string and raises VirtualSerialException
         :type in_waiting_callback: function which returns True if there are data available to read
+        :type clock: Clock
+        :type device: VirtualDevice
         """
         self._device = None
         self._serial_port = serial_port
         self._baud_rate = baud_rate
-        self.default_timeout: int = default_timeout
+        self.default_timeout: float = default_timeout
         self._line_break = line_break
+        self.__resetCB = None
+        if device:
+            read_callback = device.read
+            write_callback = device.write
+            in_waiting_callback = device.in_waiting
+            self.__resetCB = device.reset_input_buffer
+            if not clock:
+                clock = device.clock
         self.__writeCB = write_callback
         self.__readCB = read_callback
         self.__inwaitingCB = in_waiting_callback
+        self._clock = clock if clock else Clock()
+        self._encoding = "utf-8"
+        self._decode_errors = "strict"
+        self._rtscts = False
+        self._dsrdtr = False
+        self._cancel_token = None
 
     @property
     def serial_port(self):
@@ -69,7 +92,7 @@ class ATVirtualCommunicator(ATCommunicator):
         return self._default_timeout
 
     @default_timeout.setter
-    def default_timeout(self, timeout: int):
+    def default_timeout(self, timeout: float):
         if timeout:
             if timeout > 0:
                 self._default_timeout = timeout
@@ -102,6 +125,8 @@ class ATVirtualCommunicator(ATCommunicator):
                 read_callback=self.__readCB,
                 write_callback=self.__writeCB,
                 in_waiting_callback=self.__inwaitingCB,
+                clock=self._clock,
+                reset_callback=self.__resetCB,
             )
         except (OSError, VirtualSerialException) as error:
             raise ATSerialPortError(error)
@@ -129,15 +154,15 @@ class ATVirtualCommunicator(ATCommunicator):
         return super().is_open()
 
     def exec(
-        self, command: str, timeout: Optional[int] = None
-    ) -> Tuple[List[str], int]:
+        self, command: str, timeout: Optional[float] = None
+    ) -> Tuple[List[str], float]:
         """
         Execute AT command
 
         :param command: command to execute
         :param timeout: timeout for command, if not set default will be used
         :type command: str
-        :type timeout: int
+        :type timeout: float
         :returns tuple of (list of string, execution time ms); list: command response without line break; empty lines are ignored
         :raises ATSerialPortError
         """
@@ -145,3 +170,121 @@ class ATVirtualCommunicator(ATCommunicator):
             return super().exec(command, timeout)
         except ATSerialPortError as err:
             raise err
+
+    def read_available(self) -> bytes:
+        """
+        Read the data available on the virtual device
+
+        :returns bytes
+        :raises ATSerialPortError
+        """
+        try:
+            return super().read_available()
+        except VirtualSerialException as err:
+            raise ATSerialPortError(str(err))
+
+    def _exec(self, command: str, timeout: Optional[float]) -> Tuple[bytes, float]:
+        """
+        Write command to the virtual device and read its response
+
+        :param command: command to execute
+        :param timeout: timeout for command, if not set default will be used
+        :type command: str
+        :type timeout: float
+        :returns tuple of (response data, execution time ms)
+        :raises ATSerialPortError
+        """
+        try:
+            return super()._exec(command, timeout)
+        except VirtualSerialException as err:
+            raise ATSerialPortError(str(err))
+
+    def _exec_prompt(
+        self,
+        command: str,
+        payload: bytes,
+        timeout: Optional[float],
+        terminator: Optional[bytes],
+    ) -> Tuple[bytes, float]:
+        """
+        Write command to the virtual device, send the payload when prompted and read the response
+
+        :param command: command to execute
+        :param payload: payload to send after the prompt
+        :param timeout: timeout for the whole exchange, if not set default will be used
+        :param terminator: sent after the payload
+        :type command: str
+        :type payload: bytes
+        :type timeout: float
+        :type terminator: bytes
+        :returns tuple of (response data, execution time ms)
+        :raises ATSerialPortError
+        """
+        try:
+            return super()._exec_prompt(command, payload, timeout, terminator)
+        except VirtualSerialException as err:
+            raise ATSerialPortError(str(err))
+
+    def _exec_connect(
+        self, command: str, timeout: Optional[float]
+    ) -> Tuple[bytes, float, bytes]:
+        """
+        Write command to the virtual device and read its response up to CONNECT
+
+        :param command: command to execute
+        :param timeout: timeout for command, if not set default will be used
+        :type command: str
+        :type timeout: float
+        :returns tuple of (response data, execution time ms, data received after CONNECT)
+        :raises ATSerialPortError
+        """
+        try:
+            return super()._exec_connect(command, timeout)
+        except VirtualSerialException as err:
+            raise ATSerialPortError(str(err))
+
+    def upload(
+        self,
+        command: str,
+        source: BinaryIO,
+        size: Optional[int] = None,
+        timeout: Optional[float] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        checksum: Optional[Checksum] = None,
+        checksum_pattern: Optional[Pattern] = None,
+    ) -> TransferResult:
+        """
+        Send a file to the virtual device
+
+        :returns TransferResult
+        :raises ATSerialPortError
+        """
+        try:
+            return super().upload(
+                command, source, size, timeout, chunk_size, checksum, checksum_pattern
+            )
+        except VirtualSerialException as err:
+            raise ATSerialPortError(str(err))
+
+    def download(
+        self,
+        command: str,
+        sink: BinaryIO,
+        size: Optional[int] = None,
+        timeout: Optional[float] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        checksum: Optional[Checksum] = None,
+        checksum_pattern: Optional[Pattern] = None,
+    ) -> TransferResult:
+        """
+        Receive a file from the virtual device
+
+        :returns TransferResult
+        :raises ATSerialPortError
+        """
+        try:
+            return super().download(
+                command, sink, size, timeout, chunk_size, checksum, checksum_pattern
+            )
+        except VirtualSerialException as err:
+            raise ATSerialPortError(str(err))
@@ -0,0 +1,217 @@
+from attila.cmux import (
+    CMUXDecoder,
+    CONTROL_PF,
+    DEFAULT_FRAME_SIZE,
+    FRAME_DISC,
+    FRAME_DM,
+    FRAME_SABM,
+    FRAME_UA,
+    FRAME_UI,
+    FRAME_UIH,
+    MUX_CLD,
+    MUX_COMMAND,
+    encode_frame,
+)
+from attila.virtual.exceptions import VirtualSerialException
+from attila.virtual.scenario import Scenario, VirtualDevice
+
+import os
+import re
+from select import select
+from threading import Thread
+from typing import Dict, Optional
+
+
+class CMUXSimulator(object):
+    """
+    CMUXSimulator class simulates a device speaking the GSM 07.10 multiplexer protocol (basic mode) on a pty.
+    The device starts in AT mode and switches to multiplexer mode on AT+CMUX=...;
+    each established DLCI gets its own VirtualDevice running the scenario
+    """
+
+    def __init__(
+        self,
+        scenario: Scenario,
+        seed: Optional[int] = None,
+        frame_size: int = DEFAULT_FRAME_SIZE,
+        max_dlci: int = 4,
+    ):
+        """
+        Class constructor. Instantiates a new :class:`.CMUXSimulator.` object with the provided parameters.
+
+        :param scenario: scenario run on each channel
+        :param seed (optional): seed for latency sampling
+        :param frame_size: maximum length of the information field of the frames sent by the simulator
+        :param max_dlci: highest DLCI the simulator accepts to establish
+        :type scenario: Scenario
+        :type seed: int
+        :type frame_size: int
+        :type max_dlci: int
+        """
+        self._scenario = scenario
+        self._seed = seed
+        self._frame_size = frame_size
+        self._max_dlci = max_dlci
+        self._master: Optional[int] = None
+        self._slave: Optional[int] = None
+        self._port: Optional[str] = None
+        self._thread: Optional[Thread] = None
+        self._running = False
+        self._multiplexing = False
+        self._decoder = CMUXDecoder()
+        self._devices: Dict[int, VirtualDevice] = {}
+        self._inputs: Dict[int, bytearray] = {}
+
+    @property
+    def port(self):
+        return self._port
+
+    @property
+    def multiplexing(self):
+        return self._multiplexing
+
+    @property
+    def devices(self):
+        return self._devices
+
+    def start(self) -> None:
+        """
+        Open the pty and start the simulator
+
+        :raises VirtualSerialException
+        """
+        try:
+            import tty
+
+            self._master, self._slave = os.openpty()
+            tty.setraw(self._slave)
+            self._port = os.ttyname(self._slave)
+        except (ImportError, AttributeError, OSError) as err:
+            raise VirtualSerialException("Could not open pty: %s" % err)
+        self._multiplexing = False
+        self._devices = {0: self.__new_device()}
+        self._inputs = {0: bytearray()}
+        self._running = True
+        self._thread = Thread(target=self.__run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the simulator and close the pty
+        """
+        self._running = False
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                os.close(fd)
+        self._master = None
+        self._slave = None
+
+    def __new_device(self) -> VirtualDevice:
+        """
+        Instantiate the device for a channel
+        """
+        return VirtualDevice(self._scenario, seed=self._seed)
+
+    def __run(self) -> None:
+        """
+        Simulator thread: process incoming data and send the data available on the devices
+        """
+        while self._running:
+            readable, _, _ = select([self._master], [], [], 0.005)
+            if readable:
+                try:
+                    data = os.read(self._master, 4096)
+                except OSError:
+                    break
+                if self._multiplexing:
+                    self.__receive_frames(data)
+                else:
+                    self.__receive_at(data)
+            for dlci, device in list(self._devices.items()):
+                if device.in_waiting() > 0:
+                    self.__send(dlci, device.read(-1))
+
+    def __receive_at(self, data: bytes) -> None:
+        """
+        Process data received in AT mode
+        """
+        buffer = self._inputs[0]
+        buffer += data
+        while re.search(b"\r|\n", buffer):
+            line, _, rest = bytes(buffer).partition(b"\r" if b"\r" in buffer else b"\n")
+            buffer[:] = rest.lstrip(b"\n")
+            if not line:
+                continue
+            if line.upper().startswith(b"AT+CMUX="):
+                self.__write(b"\r\nOK\r\n")
+                self._multiplexing = True
+                self._devices = {}
+                self._inputs = {}
+                # Data after the command is already multiplexed
+                self.__receive_frames(bytes(buffer))
+                return
+            self._devices[0].write(line + b"\r")
+
+    def __receive_frames(self, data: bytes) -> None:
+        """
+        Process data received in multiplexer mode
+        """
+        for frame in self._decoder.feed(data):
+            frame_type = frame.frame_type
+            dlci = frame.dlci
+            if frame_type == FRAME_SABM:
+                if dlci > self._max_dlci:
+                    self.__write(encode_frame(dlci, FRAME_DM | CONTROL_PF))
+                    continue
+                if dlci > 0 and dlci not in self._devices:
+                    self._devices[dlci] = self.__new_device()
+                    self._inputs[dlci] = bytearray()
+                self.__write(encode_frame(dlci, FRAME_UA | CONTROL_PF))
+            elif frame_type == FRAME_DISC:
+                self._devices.pop(dlci, None)
+                self._inputs.pop(dlci, None)
+                self.__write(encode_frame(dlci, FRAME_UA | CONTROL_PF))
+            elif frame_type in (FRAME_UIH, FRAME_UI):
+                if dlci == 0:
+                    if frame.data and frame.data[0] & ~MUX_COMMAND == MUX_CLD:
+                        self.__write(
+                            encode_frame(0, FRAME_UIH, bytes((MUX_CLD, 0x01)), False)
+                        )
+                        self._multiplexing = False
+                        self._devices = {0: self.__new_device()}
+                        self._inputs = {0: bytearray()}
+                    continue
+                device = self._devices.get(dlci)
+                if not device:
+                    continue
+                # Commands can be split among many frames: write only complete lines
+                buffer = self._inputs[dlci]
+                buffer += frame.data
+                end = max(buffer.rfind(b"\r"), buffer.rfind(b"\n"))
+                if end >= 0:
+                    device.write(bytes(buffer[: end + 1]))
+                    del buffer[: end + 1]
+
+    def __send(self, dlci: int, data: bytes) -> None:
+        """
+        Send data from the device of a channel
+        """
+        if not self._multiplexing:
+            self.__write(data)
+            return
+        for i in range(0, len(data), self._frame_size):
+            self.__write(
+                encode_frame(dlci, FRAME_UIH, data[i : i + self._frame_size], False)
+            )
+
+    def __write(self, data: bytes) -> None:
+        """
+        Write data to the pty
+        """
+        view = memoryview(data)
+        while view:
+            written = os.write(self._master, view)
+            view = view[written:]
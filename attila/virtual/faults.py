@@ -0,0 +1,256 @@
+from attila.virtual.exceptions import VirtualSerialException
+
+from random import Random
+from typing import Any, Dict, List, Optional, Tuple
+
+# Faults which can be injected by the FaultInjector
+FAULT_DROP = "drop"
+FAULT_GARBLE = "garble"
+FAULT_NON_UTF8 = "non_utf8"
+FAULT_SPLIT = "split"
+FAULT_STALL = "stall"
+FAULT_LATE = "late"
+FAULT_URC = "urc"
+FAULT_PORT_LOSS = "port_loss"
+
+FAULTS = (
+    FAULT_DROP,
+    FAULT_GARBLE,
+    FAULT_NON_UTF8,
+    FAULT_SPLIT,
+    FAULT_STALL,
+    FAULT_LATE,
+    FAULT_URC,
+    FAULT_PORT_LOSS,
+)
+
+# Key used in the report for commands without faults
+NO_FAULT = "none"
+
+# Bytes which are never valid in an UTF-8 stream
+INVALID_UTF8 = (b"\xff", b"\xfe", b"\xc0", b"\xc1", b"\xf8")
+
+
+def _is_command_of(command: str, command_line: str) -> bool:
+    """
+    Check whether a command has been sent in a command line, alone or merged with other commands
+    (e.g. AT+CREG? in AT+CSQ;+CREG?)
+    """
+    if command == command_line:
+        return True
+    parts = command_line.split(";")
+    if len(parts) < 2:
+        return False
+    if command.upper().startswith("AT"):
+        command = command[2:]
+    return any(
+        x[2:] == command if x.upper().startswith("AT") else x == command for x in parts
+    )
+
+
+class FaultProfile(object):
+    """
+    FaultProfile class describes which faults a virtual device injects into its responses and how often
+    """
+
+    def __init__(
+        self,
+        rates: Optional[Dict[str, float]] = None,
+        split_gap: float = 0.05,
+        stall_time: float = 2.0,
+        late_time: float = 30.0,
+        urcs: Optional[List[str]] = None,
+    ):
+        """
+        Class constructor. Instantiates a new :class:`.FaultProfile.` object with the provided parameters.
+
+        :param rates: probability (0.0 - 1.0) of each fault to occur on a response, by fault name
+        :param split_gap: seconds between the two parts of a split line
+        :param stall_time: seconds the device stalls in the middle of a response
+        :param late_time: seconds a late response is delayed by
+        :param urcs (optional): lines used as spurious URCs
+        :type rates: dict of str => float
+        :type split_gap: float
+        :type stall_time: float
+        :type late_time: float
+        :type urcs: list of str
+        :raises VirtualSerialException
+        """
+        self.rates: Dict[str, float] = {}
+        if rates:
+            for fault, rate in rates.items():
+                if fault not in FAULTS:
+                    raise VirtualSerialException("Unknown fault '%s'" % fault)
+                if rate < 0 or rate > 1:
+                    raise VirtualSerialException(
+                        "Rate for fault '%s' is out of range: %s" % (fault, rate)
+                    )
+                self.rates[fault] = rate
+        self.split_gap = split_gap
+        self.stall_time = stall_time
+        self.late_time = late_time
+        self.urcs = urcs if urcs else ["RING", "+CREG: 0", "NO CARRIER"]
+
+    @staticmethod
+    def from_dict(profile: Dict[str, Any]) -> Any:
+        """
+        Instantiates a FaultProfile from its declarative representation, e.g.
+        {"rates": {"drop": 0.01, "late": 0.001}, "late_time": 20}
+
+        :param profile
+        :type profile: dict
+        :returns FaultProfile
+        :raises VirtualSerialException
+        """
+        return FaultProfile(
+            profile.get("rates"),
+            profile.get("split_gap", 0.05),
+            profile.get("stall_time", 2.0),
+            profile.get("late_time", 30.0),
+            profile.get("urcs"),
+        )
+
+
+class FaultInjector(object):
+    """
+    FaultInjector class injects the faults described by a FaultProfile into the responses of a
+    virtual device. Injection is reproducible when a seed is provided.
+    Each response the injector processes is recorded, in order to report how faults affected the run
+    """
+
+    def __init__(self, profile: FaultProfile, seed: Optional[int] = None):
+        """
+        Class constructor. Instantiates a new :class:`.FaultInjector.` object with the provided parameters.
+
+        :param profile: faults to inject
+        :param seed (optional): seed of the random generator
+        :type profile: FaultProfile
+        :type seed: int
+        """
+        self._profile = profile
+        self._rng = Random(seed)
+        self._records: List[Tuple[str, Tuple[str, ...]]] = []
+        self._counters: Dict[str, int] = dict.fromkeys(FAULTS, 0)
+
+    @property
+    def profile(self):
+        return self._profile
+
+    @property
+    def records(self):
+        return self._records
+
+    @property
+    def counters(self):
+        return self._counters
+
+    def inject(self, command: str, data: bytes) -> List[Tuple[float, bytes]]:
+        """
+        Inject faults into a response
+
+        :param command: command the response answers to
+        :param data: response
+        :type command: str
+        :type data: bytes
+        :returns list of tuple (seconds after the response is due, chunk); empty list means the port is lost
+        """
+        rates = self._profile.rates
+        applied = [
+            fault for fault in FAULTS if self._rng.random() < rates.get(fault, 0)
+        ]
+        for fault in applied:
+            self._counters[fault] += 1
+        self._records.append((command, tuple(applied)))
+        if FAULT_PORT_LOSS in applied:
+            return []
+        data = bytearray(data)
+        if FAULT_DROP in applied and data:
+            del data[self._rng.randrange(len(data))]
+        if FAULT_GARBLE in applied and data:
+            data[self._rng.randrange(len(data))] = self._rng.randint(0x21, 0x7E)
+        if FAULT_NON_UTF8 in applied:
+            position = self._rng.randint(0, len(data))
+            data[position:position] = self._rng.choice(INVALID_UTF8)
+        offset = self._profile.late_time if FAULT_LATE in applied else 0.0
+        segments = [(offset, bytes(data))]
+        if FAULT_SPLIT in applied:
+            segments = self.__split(segments, self._profile.split_gap)
+        if FAULT_STALL in applied:
+            segments = self.__split(segments, self._profile.stall_time)
+        if FAULT_URC in applied:
+            urc = self._rng.choice(self._profile.urcs).encode("utf-8") + b"\r\n"
+            segments.insert(0, (0.0, urc))
+        return segments
+
+    def report(self, responses: List[Any]) -> Dict[str, Dict[str, float]]:
+        """
+        Report how each fault affected latency and success of the commands.
+        Each response is associated to the first following record of its command (merged command lines
+        included); responses without a record (e.g. the command never reached the device) count as without faults.
+        A command without an expected response is considered successful
+
+        :param responses: responses returned by the runtime environment for the commands sent to the device
+        :type responses: list of ATResponse
+        :returns dict of fault (or "none") => dict with commands, failures, success_rate, mean_latency and max_latency (ms)
+        """
+        stats: Dict[str, List[Any]] = {}
+        cursor = 0
+        # Responses already associated to the record at the cursor (merged command lines have more)
+        matched = 0
+        for response in responses:
+            if response is None:
+                continue
+            command = response.command
+            applied: Tuple[str, ...] = ()
+            if command is not None:
+                for index in range(cursor, len(self._records)):
+                    command_line, faults = self._records[index]
+                    if _is_command_of(command.command, command_line):
+                        applied = faults
+                        matched = matched + 1 if index == cursor else 1
+                        cursor = index
+                        if matched >= len(command_line.split(";")):
+                            cursor, matched = index + 1, 0
+                        break
+            success = (
+                command is None
+                or not command.expected_response
+                or response.response is not None
+            )
+            for fault in applied if applied else (NO_FAULT,):
+                stats.setdefault(fault, []).append((success, response.execution_time))
+        report: Dict[str, Dict[str, float]] = {}
+        for fault, samples in stats.items():
+            failures = len([x for x in samples if not x[0]])
+            latencies = [x[1] for x in samples]
+            report[fault] = {
+                "commands": len(samples),
+                "failures": failures,
+                "success_rate": (len(samples) - failures) / len(samples),
+                "mean_latency": sum(latencies) / len(latencies),
+                "max_latency": max(latencies),
+            }
+        return report
+
+    def __split(
+        self, segments: List[Tuple[float, bytes]], gap: float
+    ) -> List[Tuple[float, bytes]]:
+        """
+        Split the longest segment in two parts, delaying the second one and the following segments by gap
+
+        :param segments
+        :param gap
+        :type segments: list of tuple (float, bytes)
+        :type gap: float
+        :returns list of tuple (float, bytes)
+        """
+        index = max(range(len(segments)), key=lambda i: len(segments[i][1]))
+        offset, chunk = segments[index]
+        if len(chunk) < 2:
+            return segments
+        position = self._rng.randint(1, len(chunk) - 1)
+        return (
+            segments[:index]
+            + [(offset, chunk[:position]), (offset + gap, chunk[position:])]
+            + [(x[0] + gap, x[1]) for x in segments[index + 1 :]]
+        )
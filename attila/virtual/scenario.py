@@ -0,0 +1,606 @@
+from attila.clock import Clock
+from attila.virtual.exceptions import VirtualSerialException
+from attila.virtual.faults import FaultInjector
+
+import heapq
+import json
+import re
+from random import Random
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# Kind of the events scheduled on a virtual device
+EVENT_DATA = 0
+EVENT_URC = 1
+
+# Prompt sent by the device when it waits for a payload
+PROMPT = b"\r\n> "
+# Payload terminator (Ctrl-Z) and abort (ESC)
+CTRL_Z = b"\x1a"
+ESC = b"\x1b"
+
+
+class Latency(object):
+    """
+    Latency class describes the distribution of the delay (in seconds) a virtual device
+    takes to answer a command
+    """
+
+    def __init__(self, distribution: str = "fixed", **params: float):
+        """
+        Class constructor. Instantiates a new :class:`.Latency.` object with the provided parameters.
+
+        :param distribution: one of fixed (value), uniform (min, max), normal (mean, stddev), exponential (mean)
+        :param params: distribution parameters in seconds
+        :type distribution: str
+        :type params: float
+        """
+        self._distribution = distribution
+        try:
+            if distribution == "fixed":
+                self._args: Tuple[float, ...] = (float(params.get("value", 0)),)
+            elif distribution == "uniform":
+                self._args = (float(params["min"]), float(params["max"]))
+            elif distribution == "normal":
+                self._args = (float(params["mean"]), float(params["stddev"]))
+            elif distribution == "exponential":
+                self._args = (1.0 / float(params["mean"]),)
+            else:
+                raise VirtualSerialException(
+                    "Unknown latency distribution '%s'" % distribution
+                )
+        except (KeyError, ValueError, ZeroDivisionError) as err:
+            raise VirtualSerialException(
+                "Bad parameters for latency distribution '%s': %s" % (distribution, err)
+            )
+
+    @property
+    def distribution(self):
+        return self._distribution
+
+    @staticmethod
+    def from_value(value: Union[None, int, float, Dict[str, Any]]) -> Any:
+        """
+        Instantiates a Latency from its declarative representation:
+        a number is a fixed latency, a dict must contain the distribution key and its parameters
+
+        :param value
+        :type value: None, number or dict
+        :returns Latency
+        :raises VirtualSerialException
+        """
+        if value is None:
+            return Latency()
+        if isinstance(value, (int, float)):
+            return Latency("fixed", value=value)
+        if isinstance(value, dict):
+            params = dict(value)
+            distribution = params.pop("distribution", "fixed")
+            return Latency(distribution, **params)
+        raise VirtualSerialException("Invalid latency '%s'" % value)
+
+    def sample(self, rng: Random) -> float:
+        """
+        Get a latency sample
+
+        :param rng: random generator to use
+        :type rng: Random
+        :returns float (seconds, never negative)
+        """
+        if self._distribution == "fixed":
+            value = self._args[0]
+        elif self._distribution == "uniform":
+            value = rng.uniform(self._args[0], self._args[1])
+        elif self._distribution == "normal":
+            value = rng.gauss(self._args[0], self._args[1])
+        else:
+            value = rng.expovariate(self._args[0])
+        return value if value > 0 else 0.0
+
+
+class ScheduledURC(object):
+    """
+    ScheduledURC class describes an unsolicited result code emitted by the virtual device
+    """
+
+    def __init__(
+        self,
+        data: str,
+        at: float = 0,
+        every: Optional[float] = None,
+        state: Optional[str] = None,
+    ):
+        """
+        Class constructor. Instantiates a new :class:`.ScheduledURC.` object with the provided parameters.
+
+        :param data: URC line (line break is appended by the device)
+        :param at: seconds after the device start (or after the command, for command URCs)
+        :param every (optional): repeat the URC with this period in seconds
+        :param state (optional): emit the URC only if the device is in this state
+        :type data: str
+        :type at: float
+        :type every: float
+        :type state: str
+        """
+        self.data = data
+        self.at = at
+        self.every = every if every and every > 0 else None
+        self.state = state
+
+    @staticmethod
+    def from_dict(urc: Dict[str, Any]) -> Any:
+        """
+        Instantiates a ScheduledURC from its declarative representation
+
+        :param urc
+        :type urc: dict
+        :returns ScheduledURC
+        :raises VirtualSerialException
+        """
+        if "data" not in urc:
+            raise VirtualSerialException("URC has no data")
+        return ScheduledURC(
+            urc["data"], urc.get("at", 0), urc.get("every"), urc.get("state")
+        )
+
+
+class ScenarioRule(object):
+    """
+    ScenarioRule class associates a command pattern to the response of the virtual device
+    """
+
+    def __init__(
+        self,
+        command: str,
+        response: Union[str, List[str]],
+        state: Optional[str] = None,
+        next_state: Optional[str] = None,
+        latency: Optional[Latency] = None,
+        urcs: Optional[List[ScheduledURC]] = None,
+        prompt: bool = False,
+        payload_length: Optional[Union[int, str]] = None,
+    ):
+        """
+        Class constructor. Instantiates a new :class:`.ScenarioRule.` object with the provided parameters.
+
+        :param command: regex which must match the entire command (case insensitive)
+        :param response: response template; groups of the command regex can be referenced with \\1 or \\g<name>
+        :param state (optional): the rule applies only if the device is in this state
+        :param next_state (optional): state the device goes into after answering
+        :param latency (optional): latency of the response
+        :param urcs (optional): URCs to emit after the command; their time is relative to the command
+        :param prompt: the device answers with the '> ' prompt and waits for a payload before answering
+        :param payload_length (optional): length of the payload; if not set the payload is terminated by Ctrl-Z. Groups of the command regex can be referenced (e.g. \\1)
+        :type command: str
+        :type response: str or list of str (one per line)
+        :type state: str
+        :type next_state: str
+        :type latency: Latency
+        :type urcs: list of ScheduledURC
+        :type prompt: bool
+        :type payload_length: int or str
+        """
+        try:
+            self.pattern = re.compile(command, re.IGNORECASE)
+        except re.error as err:
+            raise VirtualSerialException(
+                "Bad command pattern '%s': %s" % (command, err)
+            )
+        if isinstance(response, list):
+            response = "\n".join(response)
+        self.response = response
+        self.state = state
+        self.next_state = next_state
+        self.latency = latency if latency else Latency()
+        self.urcs = urcs if urcs else []
+        self.prompt = prompt
+        self.payload_length = payload_length
+
+    @staticmethod
+    def from_dict(rule: Dict[str, Any]) -> Any:
+        """
+        Instantiates a ScenarioRule from its declarative representation
+
+        :param rule
+        :type rule: dict
+        :returns ScenarioRule
+        :raises VirtualSerialException
+        """
+        if "command" not in rule:
+            raise VirtualSerialException("Rule has no command")
+        return ScenarioRule(
+            rule["command"],
+            rule.get("response", "OK"),
+            rule.get("state"),
+            rule.get("next_state"),
+            Latency.from_value(rule.get("latency")),
+            [ScheduledURC.from_dict(x) for x in rule.get("urcs", [])],
+            rule.get("prompt", False),
+            rule.get("payload_length"),
+        )
+
+
+class Scenario(object):
+    """
+    Scenario class describes the behaviour of a virtual device: how it answers to commands,
+    with which latency, its states and the URCs it emits.
+    A scenario is compiled once and can be shared by any number of virtual devices
+    """
+
+    def __init__(
+        self,
+        rules: List[ScenarioRule],
+        initial_state: Optional[str] = None,
+        urcs: Optional[List[ScheduledURC]] = None,
+        default_response: Optional[str] = "ERROR",
+        line_break: str = "\r\n",
+        echo: bool = False,
+    ):
+        """
+        Class constructor. Instantiates a new :class:`.Scenario.` object with the provided parameters.
+
+        :param rules: rules evaluated in order; the first matching rule answers
+        :param initial_state (optional): state of the device at start
+        :param urcs (optional): URCs scheduled since the device start
+        :param default_response (optional): response when no rule matches (None to stay silent)
+        :param line_break: line break appended to each response line
+        :param echo: echo commands back as a modem with ATE1 does
+        :type rules: list of ScenarioRule
+        :type initial_state: str
+        :type urcs: list of ScheduledURC
+        :type default_response: str
+        :type line_break: str
+        :type echo: bool
+        """
+        self.rules = rules
+        self.initial_state = initial_state
+        self.urcs = urcs if urcs else []
+        self.default_response = default_response
+        self.line_break = line_break
+        self.echo = echo
+
+    @staticmethod
+    def from_dict(scenario: Dict[str, Any]) -> Any:
+        """
+        Instantiates a Scenario from its declarative representation, e.g.
+
+        {
+            "initial_state": "PIN",
+            "rules": [
+                {"command": "AT\\\\+CPIN\\\\?", "state": "PIN", "response": ["+CPIN: SIM PIN", "OK"]},
+                {"command": "AT\\\\+CPIN=\\\\d{4}", "response": "OK", "next_state": "READY",
+                 "latency": {"distribution": "uniform", "min": 0.1, "max": 0.5}},
+                {"command": "AT\\\\+CPIN\\\\?", "response": ["+CPIN: READY", "OK"]}
+            ],
+            "urcs": [{"data": "+CREG: 1", "at": 5, "every": 60, "state": "READY"}]
+        }
+
+        :param scenario
+        :type scenario: dict
+        :returns Scenario
+        :raises VirtualSerialException
+        """
+        return Scenario(
+            [ScenarioRule.from_dict(x) for x in scenario.get("rules", [])],
+            scenario.get("initial_state"),
+            [ScheduledURC.from_dict(x) for x in scenario.get("urcs", [])],
+            scenario.get("default_response", "ERROR"),
+            scenario.get("line_break", "\r\n"),
+            scenario.get("echo", False),
+        )
+
+    @staticmethod
+    def from_file(file_path: str) -> Any:
+        """
+        Instantiates a Scenario from a JSON file
+
+        :param file_path
+        :type file_path: str
+        :returns Scenario
+        :raises VirtualSerialException
+        """
+        try:
+            with open(file_path) as hnd:
+                return Scenario.from_dict(json.load(hnd))
+        except (IOError, ValueError) as err:
+            raise VirtualSerialException(
+                "Could not load scenario %s: %s" % (file_path, err)
+            )
+
+    def match(
+        self, command: str, state: Optional[str]
+    ) -> Tuple[Optional[ScenarioRule], Optional[Any]]:
+        """
+        Get the rule which answers to command in the provided state
+
+        :param command
+        :param state
+        :type command: str
+        :type state: str
+        :returns tuple of (ScenarioRule, re.Match); both None if no rule matches
+        """
+        for rule in self.rules:
+            if rule.state is not None and rule.state != state:
+                continue
+            match = rule.pattern.fullmatch(command)
+            if match:
+                return (rule, match)
+        return (None, None)
+
+
+class VirtualDevice(object):
+    """
+    VirtualDevice class runs a Scenario, providing the read, write and in waiting callbacks
+    for the virtual serial. Data becomes available on the device after the latency of the response
+    has elapsed on the device clock.
+    """
+
+    def __init__(
+        self,
+        scenario: Scenario,
+        clock: Optional[Clock] = None,
+        seed: Optional[int] = None,
+        faults: Optional[FaultInjector] = None,
+    ):
+        """
+        Class constructor. Instantiates a new :class:`.VirtualDevice.` object with the provided parameters.
+
+        :param scenario: scenario to run
+        :param clock (optional): time source; must be the same used by the communicator
+        :param seed (optional): seed for latency sampling
+        :param faults (optional): fault injector applied to the responses
+        :type scenario: Scenario
+        :type clock: Clock
+        :type seed: int
+        :type faults: FaultInjector
+        """
+        self._scenario = scenario
+        self._clock = clock if clock else Clock()
+        self._rng = Random(seed)
+        self._faults = faults
+        self._port_lost = False
+        self._state = scenario.initial_state
+        self._buffer = bytearray()
+        self._input = bytearray()
+        self._events: List[Tuple[float, int, int, Any]] = []
+        self._sequence = 0
+        self._line_break = scenario.line_break.encode("utf-8")
+        # Rule and match of the command waiting for a payload
+        self._prompt: Optional[Tuple[ScenarioRule, Any, Optional[int]]] = None
+        self._payload = bytearray()
+        self._payloads: List[bytes] = []
+        start = self._clock.now()
+        for urc in scenario.urcs:
+            self._schedule(start + urc.at, EVENT_URC, urc)
+
+    @property
+    def clock(self):
+        return self._clock
+
+    @property
+    def scenario(self):
+        return self._scenario
+
+    @property
+    def faults(self):
+        return self._faults
+
+    @property
+    def port_lost(self):
+        return self._port_lost
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def payloads(self):
+        return self._payloads
+
+    @state.setter
+    def state(self, state: Optional[str]):
+        self._state = state
+
+    def write(self, data: bytes) -> None:
+        """
+        Write callback: process the commands written to the device.
+        Data without any line terminator is treated as a complete command (e.g. "+++")
+
+        :param data
+        :type data: bytes
+        :raises VirtualSerialException
+        """
+        self.__check_port()
+        if self._prompt:
+            self._receive_payload(data)
+            return
+        self._input += data
+        if b"\r" not in data and b"\n" not in data:
+            command = bytes(self._input)
+            self._input.clear()
+            self._process(command)
+            return
+        lines = re.split(b"\r\n|\r|\n", bytes(self._input))
+        # The last token is an incomplete line (empty if data ended with a line break)
+        self._input = bytearray(lines.pop())
+        for i in range(len(lines)):
+            if lines[i]:
+                self._process(lines[i])
+            if self._prompt:
+                # Following data is the payload
+                rest = self._line_break.join(lines[i + 1 :] + [bytes(self._input)])
+                self._input.clear()
+                if rest:
+                    self._receive_payload(rest)
+                return
+
+    def read(self, nbytes: int = 1) -> bytes:
+        """
+        Read callback: read at most nbytes among the data available on the device
+
+        :param nbytes
+        :type nbytes: int
+        :returns bytes
+        :raises VirtualSerialException
+        """
+        self.__check_port()
+        self._pump()
+        if nbytes < 0:
+            nbytes = len(self._buffer)
+        data = bytes(self._buffer[:nbytes])
+        del self._buffer[:nbytes]
+        return data
+
+    def in_waiting(self) -> int:
+        """
+        In waiting callback: returns the amount of bytes available on the device
+
+        :returns int
+        :raises VirtualSerialException
+        """
+        self.__check_port()
+        self._pump()
+        return len(self._buffer)
+
+    def reset_input_buffer(self) -> None:
+        """
+        Reset callback: discard the data available on the device
+
+        :raises VirtualSerialException
+        """
+        self.__check_port()
+        self._pump()
+        self._buffer.clear()
+
+    def _process(self, command: bytes) -> None:
+        """
+        Answer to a command
+
+        :param command
+        :type command: bytes
+        """
+        command_str = command.decode("utf-8", "replace")
+        response = bytearray()
+        if self._scenario.echo:
+            response += command + b"\r"
+        rule, match = self._scenario.match(command_str, self._state)
+        if rule and rule.prompt:
+            length = rule.payload_length
+            if isinstance(length, str):
+                length = int(match.expand(length))
+            self._prompt = (rule, match, length)
+            latency = rule.latency.sample(self._rng)
+            self._schedule(
+                self._clock.now() + latency, EVENT_DATA, bytes(response) + PROMPT
+            )
+            return
+        self._answer(command_str, rule, match, response)
+
+    def _receive_payload(self, data: bytes) -> None:
+        """
+        Receive the payload of the command waiting for it; then answer to the command
+
+        :param data
+        :type data: bytes
+        """
+        rule, match, length = self._prompt
+        self._payload += data
+        if length is not None:
+            if len(self._payload) < length:
+                return
+            payload = bytes(self._payload[:length])
+        else:
+            if ESC in self._payload:
+                # Payload aborted
+                self._prompt = None
+                self._payload.clear()
+                return
+            end = self._payload.find(CTRL_Z)
+            if end < 0:
+                return
+            payload = bytes(self._payload[:end])
+        self._prompt = None
+        self._payload.clear()
+        self._payloads.append(payload)
+        self._answer(match.string, rule, match, bytearray())
+
+    def _answer(
+        self,
+        command_str: str,
+        rule: Optional[ScenarioRule],
+        match: Any,
+        response: bytearray,
+    ) -> None:
+        """
+        Schedule the response to a command
+
+        :param command_str: command
+        :param rule: rule matching the command; None if no rule matches
+        :param match: match of the rule command pattern
+        :param response: data to send before the response (e.g. echo)
+        :type command_str: str
+        :type rule: ScenarioRule
+        :type match: re.Match
+        :type response: bytearray
+        """
+        now = self._clock.now()
+        if rule:
+            text = match.expand(rule.response)
+            if rule.next_state is not None:
+                self._state = rule.next_state
+            for urc in rule.urcs:
+                self._schedule(now + urc.at, EVENT_URC, urc)
+            latency = rule.latency.sample(self._rng)
+        else:
+            text = self._scenario.default_response
+            latency = 0
+        if text is not None:
+            for line in text.splitlines():
+                response += line.encode("utf-8") + self._line_break
+        if self._faults:
+            segments = self._faults.inject(command_str, bytes(response))
+            if not segments:
+                self._port_lost = True
+                return
+        else:
+            segments = [(0.0, bytes(response))]
+        for offset, chunk in segments:
+            if chunk:
+                self._schedule(now + latency + offset, EVENT_DATA, chunk)
+
+    def _schedule(self, at: float, kind: int, payload: Any) -> None:
+        """
+        Schedule an event on the device
+
+        :param at: time of the event
+        :param kind: event kind
+        :param payload: data or URC
+        :type at: float
+        :type kind: int
+        :type payload: bytes or ScheduledURC
+        """
+        self._sequence += 1
+        heapq.heappush(self._events, (at, self._sequence, kind, payload))
+
+    def _pump(self) -> None:
+        """
+        Move the data of the events which are due into the device buffer
+        """
+        now = self._clock.now()
+        while self._events and self._events[0][0] <= now:
+            at, _, kind, payload = heapq.heappop(self._events)
+            if kind == EVENT_DATA:
+                self._buffer += payload
+                continue
+            if payload.state is None or payload.state == self._state:
+                self._buffer += payload.data.encode("utf-8") + self._line_break
+            if payload.every:
+                self._schedule(at + payload.every, EVENT_URC, payload)
+
+    def __check_port(self) -> None:
+        """
+        Check whether the port of the device is still available
+
+        :raises VirtualSerialException
+        """
+        if self._port_lost:
+            raise VirtualSerialException("Virtual device disappeared")
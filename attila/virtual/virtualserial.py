@@ -1,3 +1,4 @@
+from attila.clock import Clock
 from attila.virtual.exceptions import VirtualSerialException
 
 from typing import Callable, Optional
@@ -12,6 +13,8 @@ class VirtualSerial(object):
         read_callback: Optional[Callable[[], str]] = None,
         write_callback: Optional[Callable[[str], None]] = None,
         in_waiting_callback: Optional[Callable[[], int]] = None,
+        clock: Optional[Clock] = None,
+        reset_callback: Optional[Callable[[], None]] = None,
     ):
         """
         Class constructor. Instantiates a new :class:`.virtual.VirtualSerial` object with the provided parameters.
@@ -21,11 +24,17 @@ class VirtualSerial(object):
         :param timeout (optional): the default timeout for command response read in seconds; it will be used if a timeout is not provided when executing a command
         :param read_callback (optional): Specify a read function to call to read using the virtual communicator
         :param write_callback (optional): Specifiy a write funtion to call to write using the virtual communicator
+        :param in_waiting_callback (optional): Specify a in waiting function to call
+        :param clock (optional): time source shared with the communicator; system clock if not set
+        :param reset_callback (optional): Specify a function to call when the input buffer is reset
         :type serial_port: string
         :type baud_rate: int
         :type timeout: int > 0
-        :type read_callback: function which returns string and takes nbytes as argument, if nbytes is -1 returns all lines, if 0 returns line
+        :type read_callback: function which returns string (or bytes) and takes nbytes as argument, if nbytes is -1 returns all lines, if 0 returns line
         :type write_callback: function which takes string and raises VirtualSerialException
+        :type in_waiting_callback: function which returns True if there are data available to read
+        :type clock: Clock
+        :type reset_callback: function which discards the data available to read
         """
         self.serial_port = serial_port
         self.baudrate = baudrate
@@ -33,6 +42,8 @@ class VirtualSerial(object):
         self.__writeCB = write_callback
         self.__readCB = read_callback
         self.__in_waiting_callback = in_waiting_callback
+        self._clock = clock if clock else Clock()
+        self.__reset_callback = reset_callback
 
     @property
     def serial_port(self):
@@ -55,7 +66,7 @@ class VirtualSerial(object):
         return self._timeout
 
     @timeout.setter
-    def timeout(self, timeout: int):
+    def timeout(self, timeout: float):
         if timeout:
             if timeout > 0:
                 self._timeout = timeout
@@ -64,6 +75,10 @@ class VirtualSerial(object):
         else:
             self._timeout = 10
 
+    @property
+    def clock(self):
+        return self._clock
+
     @property
     def in_waiting(self):
         if self.__in_waiting_callback:
@@ -110,6 +125,8 @@ class VirtualSerial(object):
         """
         if self.__readCB:
             response = self.__readCB(nbytes)
+            if isinstance(response, bytes):
+                return response
             return response.encode("utf-8")
 
     def read_lines(self) -> bytearray:
@@ -137,4 +154,5 @@ class VirtualSerial(object):
         Reset Input buffer
         Virtually, reset response and pointer
         """
-        pass
+        if self.__reset_callback:
+            self.__reset_callback()
@@ -0,0 +1,59 @@
+"""
+Memory footprint and construction time of the objects ATtila allocates for each command of a script.
+
+Usage: python benchmarks/bench_objects.py [AMOUNT]
+"""
+
+from os.path import abspath, dirname
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from attila.atcommand import ATCommand  # noqa: E402
+from attila.atresponse import ATResponse  # noqa: E402
+from attila.esk import ESK, ESKValue  # noqa: E402
+
+DEFAULT_AMOUNT = 100000
+
+
+def make_command(i: int) -> ATCommand:
+    return ATCommand("AT+CSQ", "OK", 5, 0, ["+CSQ: ?{rssi},"])
+
+
+def make_response(i: int) -> ATResponse:
+    return ATResponse("OK", ["+CSQ: 24,99", "", "OK"], None, 12.5)
+
+
+def make_esk(i: int) -> ESKValue:
+    return ESKValue(ESK.TIMEOUT, 5)
+
+
+def measure(name: str, factory, amount: int) -> None:
+    """
+    Print the memory allocated by amount objects and the time taken to construct them
+    """
+    tracemalloc.start()
+    objects = [factory(i) for i in range(amount)]
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    elapsed = min(
+        timeit.repeat(lambda: [factory(i) for i in range(amount)], number=1, repeat=5)
+    )
+    print(
+        "%-10s %10d objects %10.1f B/object %10.1f ns/object"
+        % (name, amount, allocated / amount, elapsed * 1e9 / amount)
+    )
+
+
+def main() -> None:
+    amount = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_AMOUNT
+    measure("ATCommand", make_command, amount)
+    measure("ATResponse", make_response, amount)
+    measure("ESKValue", make_esk, amount)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Startup time of the attila CLI: import time of its modules (python -X importtime) and wall time of `attila -h`.
+Compiled bytecode is kept in a temporary directory, so the imports are measured as after installation.
+
+Usage: python benchmarks/bench_startup.py [RUNS] [MODULE]
+"""
+
+from os.path import abspath, dirname
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+ROOT = dirname(dirname(abspath(__file__)))
+DEFAULT_RUNS = 10
+DEFAULT_MODULE = "attila.__main__"
+# Modules printed, by cumulative import time
+TOP_MODULES = 25
+
+
+def import_times(module: str, env: dict) -> Dict[str, Tuple[int, int]]:
+    """
+    Import the module in a new interpreter and get the self and cumulative import time in us of each module
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import %s" % module],
+        env=env,
+        cwd=ROOT,
+        stderr=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        universal_newlines=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = (int(self_time), int(cumulative))
+    return times
+
+
+def cli_time(env: dict) -> float:
+    """
+    Get the wall time in seconds of `attila -h`
+    """
+    t_start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", "attila", "-h"],
+        env=env,
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return time.perf_counter() - t_start
+
+
+def main() -> None:
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_RUNS
+    module = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_MODULE
+    with tempfile.TemporaryDirectory() as pycache:
+        env = dict(os.environ)
+        env.pop("PYTHONDONTWRITEBYTECODE", None)
+        env["PYTHONPYCACHEPREFIX"] = pycache
+        env["PYTHONPATH"] = ROOT
+        # Warm up: compile bytecode
+        import_times(module, env)
+        samples: List[Dict[str, Tuple[int, int]]] = [
+            import_times(module, env) for _ in range(runs)
+        ]
+        wall_times = [cli_time(env) for _ in range(runs)]
+    best = min(samples, key=lambda x: x[module][1])
+    print("%-40s %10s %12s" % ("module", "self [us]", "cumul. [us]"))
+    for name, (self_time, cumulative) in sorted(
+        best.items(), key=lambda x: x[1][1], reverse=True
+    )[:TOP_MODULES]:
+        print("%-40s %10d %12d" % (name, self_time, cumulative))
+    print()
+    print(
+        "import %s: %.1f ms (best of %d), attila modules: %d, total modules: %d"
+        % (
+            module,
+            best[module][1] / 1000,
+            runs,
+            len([x for x in best if x.startswith("attila")]),
+            len(best),
+        )
+    )
+    print("attila -h: %.1f ms (best of %d)" % (min(wall_times) * 1000, runs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import unittest
+
+from os.path import join
+from random import Random
+from tempfile import TemporaryDirectory
+
+from attila.adaptive import AdaptiveTimeouts, P2Quantile, get_command_key
+from attila.atre import ATRuntimeEnvironment
+from attila.clock import VirtualClock
+from attila.virtual.scenario import Latency, Scenario, ScenarioRule, VirtualDevice
+
+
+class HangingDevice(object):
+    """
+    Device which stops answering after a certain amount of commands
+    """
+
+    def __init__(self, answers: int):
+        self.answers = answers
+        self.output = b""
+
+    def write(self, data: bytes) -> None:
+        if self.answers > 0:
+            self.answers -= 1
+            self.output += b"\r\n+CSQ: 23,99\r\n\r\nOK\r\n"
+
+    def read(self, nbytes: int) -> bytes:
+        data = self.output
+        self.output = b""
+        return data
+
+    def in_waiting(self) -> int:
+        return len(self.output)
+
+
+class TestAdaptive(unittest.TestCase):
+    """
+    Test adaptive timeouts
+    """
+
+    def __init__(self, methodName):
+        super().__init__(methodName)
+
+    def test_command_key(self):
+        self.assertEqual(get_command_key("AT+CSQ"), "+CSQ")
+        self.assertEqual(get_command_key("AT+COPS?"), "+COPS?")
+        self.assertEqual(get_command_key("AT+COPS=?"), "+COPS=?")
+        self.assertEqual(get_command_key('AT+CGDCONT=1,"IP","apn"'), "+CGDCONT=")
+        self.assertEqual(get_command_key("ATD*99***1#"), "ATD")
+        self.assertEqual(get_command_key("AT"), "AT")
+        self.assertEqual(get_command_key("AT+CSQ;+CREG?"), "+CSQ;+CREG?")
+
+    def test_quantile(self):
+        rand = Random(0)
+        samples = [rand.expovariate(1.0) for _ in range(20000)]
+        estimator = P2Quantile(0.95)
+        self.assertIsNone(estimator.value)
+        for sample in samples:
+            estimator.add(sample)
+        self.assertEqual(estimator.count, 20000)
+        expected = sorted(samples)[int(0.95 * len(samples))]
+        self.assertAlmostEqual(estimator.value, expected, delta=expected * 0.05)
+        restored = P2Quantile.from_dict(estimator.to_dict())
+        self.assertEqual(restored.value, estimator.value)
+        with self.assertRaises(ValueError):
+            P2Quantile.from_dict(
+                {"quantile": 0.5, "heights": [], "positions": [1], "desired": []}
+            )
+
+    def test_timeouts(self):
+        timeouts = AdaptiveTimeouts(floor=0.5, ceiling=5, margin=2, min_samples=5)
+        for _ in range(4):
+            timeouts.observe("/dev/ttyUSB0", "AT+CSQ", 0.4)
+        self.assertIsNone(timeouts.get_timeout("/dev/ttyUSB0", "AT+CSQ"))
+        timeouts.observe("/dev/ttyUSB0", "AT+CSQ", 0.4)
+        self.assertAlmostEqual(timeouts.get_timeout("/dev/ttyUSB0", "AT+CSQ"), 0.8)
+        # Other devices and commands aren't affected
+        self.assertIsNone(timeouts.get_timeout("/dev/ttyUSB1", "AT+CSQ"))
+        self.assertIsNone(timeouts.get_timeout("/dev/ttyUSB0", "AT+COPS=?"))
+        # Floor, ceiling and command timeout
+        for _ in range(5):
+            timeouts.observe("/dev/ttyUSB0", "AT", 0.01)
+            timeouts.observe("/dev/ttyUSB0", "AT+COPS=?", 60)
+        self.assertEqual(timeouts.get_timeout("/dev/ttyUSB0", "AT"), 0.5)
+        self.assertEqual(timeouts.get_timeout("/dev/ttyUSB0", "AT+COPS=?"), 5)
+        self.assertEqual(timeouts.get_timeout("/dev/ttyUSB0", "AT+COPS=?", 180), 120)
+        self.assertEqual(timeouts.get_timeout("/dev/ttyUSB0", "AT+COPS=?", 90), 90)
+        # Never shorter than the highest latency observed
+        timeouts.observe("/dev/ttyUSB0", "AT", 3)
+        self.assertEqual(timeouts.get_timeout("/dev/ttyUSB0", "AT", 10), 3)
+        # Timeouts double the estimate
+        timeouts.observe("/dev/ttyUSB0", "AT+CSQ", 0.8, True)
+        self.assertAlmostEqual(timeouts.get_timeout("/dev/ttyUSB0", "AT+CSQ"), 1.6)
+        timeouts.observe("/dev/ttyUSB0", "AT+CSQ", 0.4)
+        self.assertLess(timeouts.get_timeout("/dev/ttyUSB0", "AT+CSQ"), 1.6)
+        # Persistence
+        with TemporaryDirectory() as state_dir:
+            path = join(state_dir, "attila", "latency.json")
+            timeouts.save(path)
+            restored = AdaptiveTimeouts(floor=0.5, ceiling=5, margin=2)
+            self.assertTrue(restored.load(path))
+            self.assertEqual(
+                restored.get_timeout("/dev/ttyUSB0", "AT+CSQ"),
+                timeouts.get_timeout("/dev/ttyUSB0", "AT+CSQ"),
+            )
+            self.assertFalse(restored.load(join(state_dir, "missing.json")))
+
+    def test_atre(self):
+        device = HangingDevice(5)
+        timeouts = AdaptiveTimeouts(floor=0.5, ceiling=5, min_samples=5)
+        atre = ATRuntimeEnvironment(False, VirtualClock(), adaptive_timeouts=timeouts)
+        self.assertIs(atre.adaptive_timeouts, timeouts)
+        atre.configure_virtual_communicator(
+            "virtual", 115200, 10, "\r", device.read, device.write, device.in_waiting
+        )
+        atre.open_serial()
+        for _ in range(5):
+            self.assertEqual(atre.exec("AT+CSQ;;OK").response, "OK")
+        # The device hangs: the command fails after the learned timeout, not after 10 seconds
+        response = atre.exec("AT+CSQ;;OK")
+        self.assertIsNone(response.response)
+        self.assertLess(response.execution_time, 1000)
+        self.assertEqual(timeouts.get_estimator("virtual", "AT+CSQ").timeouts, 1)
+        atre.close_serial()
+
+    def test_slow_command(self):
+        # The command is slower than the ceiling, but within its own timeout
+        clock = VirtualClock()
+        scenario = Scenario(
+            [
+                ScenarioRule(
+                    "AT\\+COPS=\\?",
+                    ['+COPS: (2,"I TIM","TIM","22201",7)', "", "OK"],
+                    latency=Latency("fixed", value=20),
+                )
+            ]
+        )
+        timeouts = AdaptiveTimeouts(floor=0.5, ceiling=5, min_samples=5)
+        atre = ATRuntimeEnvironment(True, clock, adaptive_timeouts=timeouts)
+        atre.configure_virtual_communicator(
+            "virtual", 115200, 10, "\r\n", device=VirtualDevice(scenario, clock)
+        )
+        atre.open_serial()
+        for _ in range(8):
+            self.assertEqual(atre.exec("AT+COPS=?;;OK;;0;;180").response, "OK")
+        self.assertEqual(timeouts.get_estimator("virtual", "AT+COPS=?").timeouts, 0)
+        self.assertLessEqual(timeouts.get_timeout("virtual", "AT+COPS=?", 180), 180)
+        atre.close_serial()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+
+from attila.atbatch import (
+    get_keyword,
+    get_merge_batch,
+    has_prefixed_response,
+    is_mergeable,
+    is_query,
+    merge_commands,
+    split_response,
+)
+from attila.atcommand import ATCommand
+
+
+class TestATBatch(unittest.TestCase):
+    """
+    Test merging commands in a single command line
+    """
+
+    def __init__(self, methodName):
+        super().__init__(methodName)
+
+    def test_keyword(self):
+        self.assertEqual(get_keyword("AT+CSQ"), "+CSQ")
+        self.assertEqual(get_keyword("at+creg?"), "+CREG")
+        self.assertEqual(get_keyword('AT+CGDCONT=1,"IP"'), "+CGDCONT")
+        self.assertEqual(get_keyword("AT&F"), "&F")
+        self.assertIsNone(get_keyword("ATI"))
+
+    def test_mergeable(self):
+        self.assertTrue(is_mergeable(ATCommand("AT+CSQ"), True))
+        self.assertTrue(is_mergeable(ATCommand("AT+CSQ", delay=100), True))
+        self.assertFalse(is_mergeable(ATCommand("AT+CSQ", delay=100)))
+        self.assertFalse(is_mergeable(ATCommand("AT+CPIN=${pin}")))
+        self.assertFalse(is_mergeable(ATCommand("ATI")))
+        # Set and action commands would be repeated if the command line failed
+        self.assertTrue(is_mergeable(ATCommand("AT+CREG?")))
+        self.assertTrue(is_mergeable(ATCommand("AT+CGDCONT=?")))
+        self.assertFalse(is_mergeable(ATCommand("AT+CMGD=1"), True))
+        self.assertFalse(is_mergeable(ATCommand('AT+CGDCONT=1,"IP","web"')))
+        self.assertTrue(is_query("at+cops?"))
+        self.assertFalse(is_query("AT+CFUN=1,1"))
+        self.assertFalse(is_query("ATI"))
+        # Executions replying without the keyword prefix can't be split
+        self.assertTrue(is_query("AT+CGSN"))
+        self.assertFalse(has_prefixed_response("AT+CGSN"))
+        self.assertFalse(is_mergeable(ATCommand("AT+CIMI"), True))
+        self.assertTrue(has_prefixed_response("AT+CGSN=?"))
+        self.assertTrue(has_prefixed_response("at+csq"))
+        self.assertFalse(has_prefixed_response("AT+CFUN=1"))
+        self.assertFalse(
+            is_mergeable(ATCommand("AT+CSQ", dganger=ATCommand("AT")), True)
+        )
+
+    def test_batch(self):
+        commands = [
+            ATCommand("AT+CSQ"),
+            ATCommand("AT+CREG?"),
+            ATCommand("ATI"),
+            ATCommand("AT+COPS?"),
+        ]
+        self.assertEqual(get_merge_batch([]), [])
+        self.assertEqual(get_merge_batch(commands), commands[0:2])
+        self.assertEqual(get_merge_batch(commands[2:]), commands[2:3])
+        # AT+CSQ;+CREG? is 13 characters long
+        self.assertEqual(get_merge_batch(commands, 13), commands[0:2])
+        self.assertEqual(get_merge_batch(commands, 12), commands[0:1])
+        self.assertEqual(
+            merge_commands([x.command for x in commands[0:2]]), "AT+CSQ;+CREG?"
+        )
+
+    def test_split(self):
+        commands = ["AT+CSQ", "AT+CPIN=1234", "AT+CREG?"]
+        lines = ["+CSQ: 23,99", "", "+CREG: 0,1", "", "OK"]
+        responses, final = split_response(lines, commands)
+        self.assertEqual(responses, [["+CSQ: 23,99", ""], [], ["+CREG: 0,1", ""]])
+        self.assertEqual(final, "OK")
+        responses, final = split_response([b"+CSQ: 23,99", b"+CME ERROR: 10"], commands)
+        self.assertEqual(responses, [[b"+CSQ: 23,99"], [], []])
+        self.assertEqual(final, b"+CME ERROR: 10")
+        self.assertIsNone(split_response([], commands)[1])
+        # Unprefixed lines are associated to the last matched command
+        responses, final = split_response(
+            ["+CSQ: 23,99", "356938035643809", "OK"], ["AT+CSQ", "AT+CGSN"]
+        )
+        self.assertEqual(responses, [["+CSQ: 23,99", "356938035643809"], []])
+        self.assertFalse(all(is_mergeable(ATCommand(x)) for x in ("AT+CSQ", "AT+CGSN")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,6 @@
 import unittest
 
-from attila.atcommand import ATCommand, ATResponse
+from attila.atcommand import ATCommand, ATResponse, MIN_TIMEOUT, parse_time
 
 
 class TestATCommands(unittest.TestCase):
@@ -75,8 +75,17 @@ class TestATCommands(unittest.TestCase):
         self.assertEqual(
             cmd.timeout, 10, "Expected 10 as timeout, got %d" % cmd.timeout
         )
+        cmd.timeout = 0.05
+        self.assertEqual(cmd.timeout, 0.05)
         cmd.timeout = 0  # Test bad case
-        self.assertEqual(cmd.timeout, 1, "Expected 1 as timeout, got %d" % cmd.timeout)
+        self.assertEqual(cmd.timeout, MIN_TIMEOUT)
+        self.assertEqual(parse_time("5"), 5)
+        self.assertEqual(parse_time("0.5"), 0.5)
+        self.assertEqual(parse_time("250ms"), 0.25)
+        self.assertEqual(parse_time("2s", "ms"), 2)
+        self.assertEqual(parse_time("20", "ms"), 0.02)
+        with self.assertRaises(ValueError):
+            parse_time("fast")
         # Delay
         cmd.delay = 5000
         self.assertEqual(cmd.delay, 5000, "Expected 5000 as delay, got %d" % cmd.delay)
@@ -1,5 +1,51 @@
 import unittest
 from attila.atcommunicator import ATCommunicator, ATSerialPortError
+from attila.atre import ATRuntimeEnvironment
+from attila.clock import VirtualClock
+from attila.virtual.atvirtualcommunicator import ATVirtualCommunicator
+
+import re
+from os.path import dirname
+
+
+class BaudRateDevice(object):
+    """
+    Device answering only when the host uses its baud rate; AT+IPR changes it
+    """
+
+    def __init__(self, baud_rate: int, supported: str, broken: int = 0):
+        self.baud_rate = baud_rate
+        self.supported = supported
+        # Baud rate accepted by AT+IPR whose responses get garbled
+        self.broken = broken
+        self.communicator = None
+        self.output = bytearray()
+
+    def write(self, data: bytes) -> None:
+        host_rate = self.communicator.baud_rate if self.communicator else None
+        if host_rate and host_rate != self.baud_rate:
+            self.output += b"\xf0\x00\x8f"
+            return
+        command = bytes(data).strip()
+        garbled = self.baud_rate == self.broken
+        if command == b"AT":
+            response = b"\r\nOK\r\n"
+        elif command == b"AT+IPR=?":
+            response = b"\r\n+IPR: (0,%s),()\r\n\r\nOK\r\n" % self.supported
+        elif re.match(b"AT\\+IPR=\\d+$", command):
+            response = b"\r\nOK\r\n"
+            self.baud_rate = int(command[7:])
+        else:
+            response = b"\r\nERROR\r\n"
+        self.output += b"\xf0\x00\x8f" if garbled else response
+
+    def read(self, nbytes: int) -> bytes:
+        data = bytes(self.output)
+        self.output.clear()
+        return data
+
+    def in_waiting(self) -> int:
+        return len(self.output)
 
 
 class TestATCommunicator(unittest.TestCase):
@@ -46,6 +92,52 @@ class TestATCommunicator(unittest.TestCase):
         with self.assertRaises(ATSerialPortError):
             com.exec("AT")
 
+    def test_autobaud(self):
+        device = BaudRateDevice(57600, b"9600,57600,115200,460800,921600", 921600)
+        com = ATVirtualCommunicator(
+            "virtual",
+            115200,
+            1,
+            "\r",
+            device.read,
+            device.write,
+            device.in_waiting,
+            VirtualClock(),
+        )
+        device.communicator = com
+        com.open()
+        self.assertFalse(com.probe())
+        self.assertEqual(com.autobaud(), 57600)
+        self.assertEqual(com.baud_rate, 57600)
+        self.assertEqual(
+            com.supported_baud_rates(), [921600, 460800, 115200, 57600, 9600]
+        )
+        # 921600 is accepted, but the link doesn't work: restored and 460800 is used
+        self.assertEqual(com.upshift(), 460800)
+        self.assertEqual(device.baud_rate, 460800)
+        self.assertTrue(com.probe())
+        # Limited
+        device.baud_rate = 57600
+        com.set_baud_rate(57600)
+        self.assertEqual(com.upshift(115200), 115200)
+        # Device mute
+        device.baud_rate = 1200
+        self.assertIsNone(com.autobaud())
+        self.assertEqual(com.baud_rate, 115200)
+        com.close()
+        with self.assertRaises(ATSerialPortError):
+            com.set_baud_rate(9600)
+        # ESK
+        device = BaudRateDevice(115200, b"115200,921600")
+        atre = ATRuntimeEnvironment(True, VirtualClock())
+        atre.configure_virtual_communicator(
+            "virtual", 115200, 1, "\r", device.read, device.write, device.in_waiting
+        )
+        atre.parse_ATScript("%s/scripts/autobaud.ats" % dirname(__file__))
+        responses = atre.run()
+        self.assertEqual([x.response for x in responses], ["OK"])
+        self.assertEqual(device.baud_rate, 921600)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+
+from threading import Event, Thread
+
+from attila.atqueue import (
+    ATCommandQueue,
+    PRIORITY_BACKGROUND,
+    PRIORITY_NORMAL,
+    PRIORITY_URGENT,
+)
+from attila.atre import ATRuntimeEnvironment
+from attila.exceptions import ATCancelledError, ATRuntimeError
+from attila.virtual.scenario import Scenario, ScenarioRule, VirtualDevice
+
+
+def make_atre() -> ATRuntimeEnvironment:
+    scenario = Scenario(
+        [
+            ScenarioRule("AT", "OK"),
+            ScenarioRule("ATH", "OK"),
+            ScenarioRule("AT\\+CSQ", ["+CSQ: 20,99", "OK"]),
+            ScenarioRule("AT\\+CGMM", ["SIM800", "OK"]),
+        ]
+    )
+    atre = ATRuntimeEnvironment(True)
+    atre.configure_virtual_communicator(
+        "virtual", 115200, 1, "\r\n", device=VirtualDevice(scenario, atre.clock)
+    )
+    return atre
+
+
+class TestATCommandQueue(unittest.TestCase):
+    """
+    Test thread-safe command queue
+    """
+
+    def __init__(self, methodName):
+        super().__init__(methodName)
+
+    def test_order(self):
+        command_queue = ATCommandQueue(make_atre())
+        command_queue.start()
+        order = []
+        # Keep the queue busy while tasks are submitted
+        started = Event()
+        busy = Event()
+        command_queue.submit(lambda _atre: started.set() or busy.wait(5))
+        self.assertTrue(started.wait(5))
+
+        def record(name: str):
+            return lambda _atre: order.append(name)
+
+        futures = [
+            command_queue.submit(record("poll1"), PRIORITY_BACKGROUND, "poller"),
+            command_queue.submit(record("poll2"), PRIORITY_BACKGROUND, "poller"),
+            command_queue.submit(record("a1"), PRIORITY_NORMAL, "a"),
+            command_queue.submit(record("a2"), PRIORITY_NORMAL, "a"),
+            command_queue.submit(record("a3"), PRIORITY_NORMAL, "a"),
+            command_queue.submit(record("b1"), PRIORITY_NORMAL, "b"),
+            command_queue.submit(record("hangup"), PRIORITY_URGENT, "b"),
+        ]
+        # Cancelled before being executed
+        cancelled = command_queue.submit(record("cancelled"), PRIORITY_URGENT)
+        self.assertTrue(cancelled.cancel())
+        self.assertEqual(command_queue.pending, 8)
+        busy.set()
+        for future in futures:
+            future.result(5)
+        # Urgent first, then producers in turn
+        self.assertEqual(order, ["hangup", "a1", "b1", "a2", "a3", "poll1", "poll2"])
+        self.assertEqual(command_queue.pending, 0)
+        command_queue.stop()
+
+    def test_exec(self):
+        command_queue = ATCommandQueue(make_atre())
+        # Not running
+        with self.assertRaises(ATRuntimeError):
+            command_queue.exec("AT;;OK").result()
+        command_queue.start()
+        self.assertTrue(command_queue.running)
+        responses = {}
+
+        def producer(command: str):
+            responses[command] = [
+                command_queue.exec("%s;;OK" % command).result(5) for _ in range(10)
+            ]
+
+        threads = [Thread(target=producer, args=(x,)) for x in ("AT+CSQ", "AT+CGMM")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for response in responses["AT+CSQ"]:
+            self.assertEqual(response.full_response, ["+CSQ: 20,99", "OK"])
+        for response in responses["AT+CGMM"]:
+            self.assertEqual(response.full_response, ["SIM800", "OK"])
+        many = command_queue.exec_many(["AT+CSQ;;OK", "AT+CGMM;;OK"]).result(5)
+        self.assertEqual([x.response for x in many], ["OK", "OK"])
+        # Errors are set in the future
+        with self.assertRaises(ATRuntimeError):
+            command_queue.exec("AT+CSQ;;ERROR").result(5)
+        # Stop interrupts the running task and fails the queued commands
+        started = Event()
+        running = command_queue.submit(
+            lambda atre: started.set() or atre.cancel_token.wait(5)
+        )
+        self.assertTrue(started.wait(5))
+        pending = command_queue.exec("ATH;;OK", PRIORITY_URGENT)
+        cancelled = command_queue.exec("AT;;OK")
+        self.assertTrue(cancelled.cancel())
+        command_queue.stop()
+        self.assertFalse(command_queue.running)
+        self.assertTrue(running.result(5))
+        self.assertIsInstance(pending.exception(5), ATCancelledError)
+        self.assertTrue(cancelled.cancelled())
+        with self.assertRaises(ATRuntimeError):
+            command_queue.exec("AT;;OK").result()
+
+    def test_idle(self):
+        idle = Event()
+        calls = []
+
+        def idle_callback():
+            calls.append(None)
+            if len(calls) == 1:
+                raise OSError("device unplugged")
+            idle.set()
+
+        command_queue = ATCommandQueue(make_atre(), idle_callback, 0.01)
+        command_queue.start()
+        # The worker survives a failing idle callback
+        self.assertTrue(idle.wait(5))
+        self.assertEqual(command_queue.exec("AT;;OK").result(5).response, "OK")
+        command_queue.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,12 @@
 import unittest
 
-from attila.atre import ATRuntimeEnvironment
+from attila.atre import (
+    ATRuntimeEnvironment,
+    RETENTION_FULL,
+    RETENTION_NONE,
+    RETENTION_SUMMARY,
+)
+from attila.atresponse import ATResponseSummary
 from attila.atcommand import ATCommand
 from attila.exceptions import (
     ATREUninitializedError,
@@ -10,6 +16,9 @@ from attila.exceptions import (
     ATSerialPortError,
 )
 from attila.esk import ESK, ESKValue
+from attila.clock import VirtualClock
+from attila.virtual.faults import FaultInjector, FaultProfile, FAULT_NON_UTF8
+from attila.virtual.scenario import Latency, Scenario, ScenarioRule, VirtualDevice
 
 from os.path import dirname
 
@@ -20,6 +29,8 @@ SCRIPT = "commands_esk.ats"
 SCRIPT_RUN = "atre.ats"
 SCRIPT_ERR = "errors.ats"
 SCRIPT_ATRE_ERR = "atre_error.ats"
+SCRIPT_GROUP = "group.ats"
+SCRIPT_PROMPT = "prompt.ats"
 
 response = None
 response_ptr = 0
@@ -403,6 +414,302 @@ class TestATRE(unittest.TestCase):
         self.atre.close_serial()
         self.atre.close_serial()  # Re-close, nothing strange should happen
 
+    def test_raw_responses(self):
+        clock = VirtualClock()
+        scenario = Scenario([ScenarioRule("AT\\+CSQ", ["+CSQ: 23,99", "", "OK"])])
+        profile = FaultProfile({FAULT_NON_UTF8: 1})
+        # A stray byte kills a strict run
+        device = VirtualDevice(scenario, clock, faults=FaultInjector(profile, seed=0))
+        self.atre = ATRuntimeEnvironment(True, clock)
+        self.atre.configure_virtual_communicator("virtual", 115200, device=device)
+        self.atre.open_serial()
+        with self.assertRaises(ATSerialPortError):
+            self.atre.exec("AT+CSQ;;OK")
+        self.atre.close_serial()
+        # Decoding tolerantly
+        for raw_responses in (False, True):
+            device = VirtualDevice(
+                scenario, clock, faults=FaultInjector(profile, seed=0)
+            )
+            self.atre = ATRuntimeEnvironment(True, clock, raw_responses, "replace")
+            self.assertEqual(self.atre.raw_responses, raw_responses)
+            self.assertEqual(self.atre.decode_errors, "replace")
+            self.atre.configure_virtual_communicator("virtual", 115200, device=device)
+            self.atre.open_serial()
+            response = self.atre.exec('AT+CSQ;;OK;;;;;;["+CSQ: 23,?{ber}"]')
+            self.assertEqual(response.response, "OK")
+            self.assertEqual(self.atre.get_session_value("ber"), 99)
+            self.assertIn("\ufffd", "".join(response.full_response))
+            self.atre.close_serial()
+        # Raw strict run: a failed response which can't be decoded is still reported
+        device = VirtualDevice(scenario, clock, faults=FaultInjector(profile, seed=0))
+        self.atre = ATRuntimeEnvironment(True, clock, True)
+        self.atre.configure_virtual_communicator("virtual", 115200, device=device)
+        self.atre.open_serial()
+        with self.assertRaises(ATRuntimeError) as context:
+            self.atre.exec("AT+CSQ;;ERROR")
+        with self.assertRaises(ATSerialPortError):
+            context.exception.response.full_response
+        self.atre.close_serial()
+
+    def test_exec_many(self):
+        clock = VirtualClock()
+        scenario = Scenario(
+            [
+                ScenarioRule(
+                    "AT\\+CSQ;\\+CREG\\?",
+                    ["+CSQ: 23,99", "", "+CREG: 0,1", "", "OK"],
+                ),
+                ScenarioRule("AT\\+CSQ;\\+COPS=0", ["+CSQ: 23,99", "OK"]),
+                ScenarioRule("AT\\+CSQ;\\+CGMM", ["+CSQ: 23,99", "", "EC25", "", "OK"]),
+                ScenarioRule("AT\\+CSQ", ["+CSQ: 23,99", "", "OK"]),
+                ScenarioRule("AT\\+COPS\\?", ['+COPS: 0,0,"I TIM"', "", "OK"]),
+                ScenarioRule("AT\\+COPS=0", "OK"),
+                ScenarioRule("ATI", ["Quectel", "EC25", "", "OK"]),
+                ScenarioRule("AT\\+CGMM", ["EC25", "", "OK"]),
+            ]
+        )
+        device = VirtualDevice(scenario, clock)
+        self.atre = ATRuntimeEnvironment(True, clock)
+        self.atre.configure_virtual_communicator("virtual", 115200, device=device)
+        self.atre.open_serial()
+        responses = self.atre.exec_many(
+            [
+                'AT+CSQ;;OK;;;;;;["+CSQ: ?{rssi},"]',
+                ATCommand("AT+CREG?", "OK", collectables=["+CREG: 0,?{stat}"]),
+                "ATI;;OK",
+            ]
+        )
+        self.assertEqual(len(responses), 3)
+        self.assertEqual(responses[0].full_response, ["+CSQ: 23,99", "", "OK"])
+        self.assertEqual(responses[1].full_response, ["+CREG: 0,1", "", "OK"])
+        self.assertEqual(responses[2].full_response, ["Quectel", "EC25", "", "OK"])
+        self.assertEqual(responses[0].get_collectable("rssi"), 23)
+        self.assertEqual(self.atre.get_session_value("stat"), 1)
+        # Command line fails: commands are executed one by one
+        responses = self.atre.exec_many(["AT+CSQ;;OK", "AT+COPS?;;OK"])
+        self.assertEqual([x.response for x in responses], ["OK", "OK"])
+        with self.assertRaises(ATRuntimeError):
+            self.atre.exec_many(["AT+CSQ;;OK", "AT+CGSN=?;;OK"])
+        # Responses without keyword prefix aren't merged
+        responses = self.atre.exec_many(["AT+CSQ;;OK", "AT+CGMM;;OK"])
+        self.assertEqual(responses[0].full_response, ["+CSQ: 23,99", "", "OK"])
+        self.assertEqual(responses[1].full_response, ["EC25", "", "OK"])
+        # Set commands aren't merged
+        responses = self.atre.exec_many(["AT+CSQ;;OK", "AT+COPS=0;;OK"])
+        self.assertEqual(responses[0].full_response, ["+CSQ: 23,99", "", "OK"])
+        self.assertEqual(responses[1].full_response, ["OK"])
+        with self.assertRaises(ATScriptSyntaxError):
+            self.atre.exec_many(["PRINT foo"])
+        self.atre.close_serial()
+
+    def test_group(self):
+        clock = VirtualClock()
+        scenario = Scenario(
+            [
+                ScenarioRule(
+                    "AT\\+CSQ;\\+CREG\\?;\\+COPS\\?",
+                    ["+CSQ: 23,99", "+CREG: 0,1", '+COPS: 0,0,"I TIM"', "OK"],
+                ),
+                ScenarioRule("AT\\+CGSN", ["356938035643809", "", "OK"]),
+            ]
+        )
+        device = VirtualDevice(scenario, clock)
+        self.atre = ATRuntimeEnvironment(True, clock)
+        self.atre.configure_virtual_communicator("virtual", 115200, device=device)
+        self.atre.parse_ATScript("%s%s" % (self.script_dir, SCRIPT_GROUP))
+        responses = self.atre.run()
+        self.assertEqual(len(responses), 4)
+        self.assertEqual([x.response for x in responses], ["OK"] * 4)
+        self.assertEqual(responses[2].full_response, ['+COPS: 0,0,"I TIM"', "OK"])
+        self.assertEqual(self.atre.get_session_value("rssi"), 23)
+        self.assertEqual(self.atre.get_session_value("stat"), 1)
+        self.assertEqual(self.atre.get_session_value("operator"), "I TIM")
+        self.assertEqual(self.atre.get_session_value("op"), "1")
+        self.assertEqual(self.atre.get_session_value("IMEI"), 356938035643809)
+        # Parsed while executed
+        self.atre = ATRuntimeEnvironment(True, clock)
+        self.atre.configure_virtual_communicator("virtual", 115200, device=device)
+        self.atre.parse_ATScript("%s%s" % (self.script_dir, SCRIPT_GROUP), True)
+        streamed = self.atre.run()
+        self.assertEqual(
+            [x.full_response for x in streamed], [x.full_response for x in responses]
+        )
+        self.assertEqual(self.atre.get_session_value("op"), "1")
+        self.assertEqual(self.atre.get_session_value("IMEI"), 356938035643809)
+        # Scripts run one after the other by the same runtime environment
+        for stream in (False, True, False):
+            self.atre.parse_ATScript("%s%s" % (self.script_dir, SCRIPT_GROUP), stream)
+            with self.assertRaises(KeyError):
+                self.atre.get_session_value("op")
+            again = self.atre.run()
+            self.assertEqual(
+                [x.full_response for x in again], [x.full_response for x in responses]
+            )
+            self.assertEqual(self.atre.get_session_value("op"), "1")
+
+    def test_stream(self):
+        clock = VirtualClock()
+        device = VirtualDevice(Scenario([ScenarioRule("AT.*", "OK")]), clock)
+        self.atre = ATRuntimeEnvironment(
+            True, clock, retention=RETENTION_NONE, history_size=0
+        )
+        self.atre.configure_virtual_communicator("virtual", 115200, device=device)
+        with self.assertRaises(ATScriptNotFound):
+            self.atre.parse_ATScript("/tmp/__attila_missing.ats", True)
+        with NamedTemporaryFile("w", suffix=".ats") as script:
+            script.write("SET n=1\n")
+            for _ in range(2000):
+                script.write("AT+N=${n};;OK\n")
+            script.write("AT;;OK;;soon\n")
+            script.flush()
+            # The whole script is parsed before being executed
+            with self.assertRaises(ATScriptSyntaxError):
+                self.atre.parse_ATScript(script.name)
+            # Commands are executed as soon as they are read
+            self.atre.parse_ATScript(script.name, True)
+            executed = 0
+            with self.assertRaises(ATScriptSyntaxError):
+                for response in self.atre.run_iter():
+                    self.assertEqual(response.command.command, "AT+N=1")
+                    executed += 1
+            self.assertEqual(executed, 2000)
+
+    def test_prompt(self):
+        clock = VirtualClock()
+        scenario = Scenario(
+            [
+                ScenarioRule(
+                    'AT\\+CMGS="\\+[0-9]+"', ["+CMGS: 42", "", "OK"], prompt=True
+                ),
+                ScenarioRule(
+                    "AT\\+CIPSEND=([0-9]+)",
+                    "SEND OK",
+                    prompt=True,
+                    payload_length="\\1",
+                    latency=Latency("fixed", value=0.5),
+                ),
+            ]
+        )
+        for raw_responses in (False, True):
+            device = VirtualDevice(scenario, clock)
+            self.atre = ATRuntimeEnvironment(True, clock, raw_responses)
+            self.atre.configure_virtual_communicator("virtual", 115200, device=device)
+            self.atre.parse_ATScript("%s%s" % (self.script_dir, SCRIPT_PROMPT))
+            responses = self.atre.run()
+            self.assertEqual(responses[0].response, "OK")
+            self.assertEqual(self.atre.get_session_value("mr"), 42)
+            self.assertEqual(responses[1].response, "SEND OK")
+            self.assertGreaterEqual(responses[1].execution_time, 1000)
+            self.assertEqual(
+                device.payloads, [b"Hello from ATtila", b"\x00\xff\r\n\x1a\x7e"]
+            )
+        # Python API and ESK
+        device = VirtualDevice(scenario, clock)
+        self.atre = ATRuntimeEnvironment(True, clock)
+        self.atre.configure_virtual_communicator("virtual", 115200, device=device)
+        self.atre.open_serial()
+        self.atre.add_command(
+            ATCommand("AT+CIPSEND=3", "SEND OK", payload=b"\x1a\r\n", terminator=None)
+        )
+        self.assertEqual(self.atre.exec_next().response, "SEND OK")
+        self.assertIsNone(self.atre.exec("PAYLOAD Hi"))
+        response = self.atre.exec('AT+CMGS="+393331234567";;OK')
+        self.assertEqual(response.full_response[-1], "OK")
+        self.assertEqual(device.payloads, [b"\x1a\r\n", b"Hi"])
+        # No prompt: the payload is not sent
+        with self.assertRaises(ATRuntimeError):
+            self.atre.exec('AT+CMGS="foo";;OK')
+        self.atre.close_serial()
+
+    def test_deadline(self):
+        clock = VirtualClock()
+        scenario = Scenario(
+            [
+                ScenarioRule("AT", "OK"),
+                ScenarioRule(
+                    "AT\\+COPS=\\?",
+                    ['+COPS: (2,"I TIM","TIM","22201",7)', "", "OK"],
+                    latency=Latency("fixed", value=30),
+                ),
+            ]
+        )
+        device = VirtualDevice(scenario, clock)
+        atre = ATRuntimeEnvironment(True, clock)
+        atre.configure_virtual_communicator("virtual", 115200, 5, device=device)
+        # Script deadline: the network scan is cut to the remaining budget
+        atre.parse_ATScript("%s%s" % (self.script_dir, "deadline.ats"))
+        responses = atre.run()
+        self.assertTrue(atre.deadline_exceeded)
+        self.assertEqual(len(responses), 2)
+        self.assertEqual(responses[0].response, "OK")
+        self.assertIsNone(responses[1].response)
+        self.assertAlmostEqual(clock.now(), 25, delta=0.1)
+        # Run deadline caps delays too
+        t_start = clock.now()
+        atre.init_session([ATCommand("AT", "OK", delay=5000), ATCommand("AT", "OK")])
+        responses = atre.run(1)
+        self.assertTrue(atre.deadline_exceeded)
+        self.assertEqual(len(responses), 1)
+        self.assertAlmostEqual(clock.now() - t_start, 1, delta=0.1)
+        # Enough time
+        atre.init_session([ATCommand("AT", "OK"), ATCommand("AT", "OK")])
+        responses = atre.run(60)
+        self.assertFalse(atre.deadline_exceeded)
+        self.assertEqual([x.response for x in responses], ["OK", "OK"])
+
+    def test_run_iter(self):
+        clock = VirtualClock()
+        scenario = Scenario(
+            [
+                ScenarioRule("AT\\+CSQ", ["+CSQ: 24,99", "", "OK"]),
+                ScenarioRule("AT", "OK"),
+            ]
+        )
+        device = VirtualDevice(scenario, clock)
+        commands = [
+            ATCommand("AT", "OK"),
+            ATCommand("AT+CSQ", "OK", collectables=["+CSQ: ?{rssi},"]),
+            ATCommand("AT", "OK"),
+        ]
+        atre = ATRuntimeEnvironment(True, clock, history_size=2)
+        atre.configure_virtual_communicator("virtual", 115200, 5, device=device)
+        self.assertEqual(atre.retention, RETENTION_FULL)
+        self.assertEqual(atre.history_size, 2)
+        # Responses are yielded as they complete
+        atre.init_session(commands)
+        iterator = atre.run_iter()
+        response = next(iterator)
+        self.assertEqual(response.command.command, "AT")
+        self.assertEqual([x.command.command for x in iterator], ["AT+CSQ", "AT"])
+        # History is a ring buffer
+        self.assertEqual([x.command.command for x in atre.history], ["AT+CSQ", "AT"])
+        # Stopping the iteration closes the serial port
+        atre.init_session(commands)
+        iterator = atre.run_iter()
+        next(iterator)
+        iterator.close()
+        with self.assertRaises(ATSerialPortError):
+            atre.exec("AT;;OK")
+        # Summaries, with callback
+        atre.retention = RETENTION_SUMMARY
+        atre.init_session(commands)
+        completed = []
+        history = atre.run(callback=completed.append)
+        self.assertEqual(len(completed), 3)
+        self.assertEqual(completed[1].full_response, ["+CSQ: 24,99", "", "OK"])
+        self.assertEqual(len(history), 2)
+        self.assertIsInstance(history[0], ATResponseSummary)
+        self.assertEqual(history[0].command, "AT+CSQ")
+        self.assertEqual(history[0].get_collectable("rssi"), 24)
+        self.assertTrue(history[0].succeeded)
+        # Nothing
+        atre.retention = RETENTION_NONE
+        atre.init_session(commands)
+        self.assertEqual(atre.run(), [])
+        with self.assertRaises(ValueError):
+            atre.retention = "some"
+
     def test_exceptions(self):
         # AtSerialPortError
         msg = "Could not open Serial Device"
@@ -2,6 +2,7 @@ import unittest
 
 from attila.atresponse import ATResponse
 from attila.atcommand import ATCommand
+from attila.exceptions import ATSerialPortError
 
 
 class TestATResponse(unittest.TestCase):
@@ -76,6 +77,40 @@ class TestATResponse(unittest.TestCase):
             "Execution time should be 0, but is %d" % resp.execution_time,
         )
 
+    def test_compact(self):
+        cmd = ATCommand("AT+CSQ", "OK")
+        resp = ATResponse("OK", ["+CSQ: 32,2", "", "OK"], cmd, 10)
+        # No per-instance dict; collectables are allocated only when needed
+        self.assertFalse(hasattr(resp, "__dict__"))
+        self.assertFalse(hasattr(cmd, "__dict__"))
+        self.assertIsNone(resp.get_collectable("rssi"))
+        summary = resp.summarize()
+        self.assertEqual(summary.command, "AT+CSQ")
+        self.assertEqual(summary.execution_time, 10)
+        self.assertIsNone(summary.get_collectable("rssi"))
+        resp.add_collectable("rssi", 32)
+        self.assertEqual(resp.summarize().get_collectable("rssi"), 32)
+
+    def test_raw_response(self):
+        cmd = ATCommand("AT+CSQ", "OK")
+        resp = ATResponse(
+            "OK", [b"+CSQ: 32,2", b"\xff", b"OK"], cmd, 10, "utf-8", "replace"
+        )
+        self.assertEqual(resp.raw_response, [b"+CSQ: 32,2", b"\xff", b"OK"])
+        # Full response is decoded on access
+        self.assertIsNone(resp._full_response)
+        self.assertEqual(resp.full_response, ["+CSQ: 32,2", "\ufffd", "OK"])
+        self.assertIsNotNone(resp._full_response)
+        # Strict policy raises on access only
+        resp = ATResponse("OK", [b"\xffOK"], cmd, 10)
+        with self.assertRaises(ATSerialPortError):
+            resp.full_response
+        self.assertEqual(resp.get_printable_response(), ["\ufffdOK"])
+        resp.full_response = ["OK"]
+        self.assertEqual(resp.raw_response, [b"OK"])
+        # Empty response
+        self.assertEqual(ATResponse(None, [], cmd).full_response, [])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,186 @@
+import unittest
+
+import re
+import zlib
+from io import BytesIO
+from random import Random
+
+from attila.atre import ATRuntimeEnvironment
+from attila.bulk import (
+    Checksum,
+    CRC32Checksum,
+    QFILE_CHECKSUM,
+    TransferResult,
+    XOR16Checksum,
+)
+from attila.exceptions import ATREUninitializedError, ATSerialPortError
+from attila.virtual.atvirtualcommunicator import ATVirtualCommunicator
+
+CONTENT = Random(0).randbytes(200001)
+
+
+def xor16(data: bytes) -> int:
+    value = 0
+    for i in range(0, len(data), 2):
+        value ^= data[i] << 8 | (data[i + 1] if i + 1 < len(data) else 0)
+    return value
+
+
+class FakeFileSystem(object):
+    """
+    Device storing files with AT+QFUPL="name",size and returning them with AT+QFDWL="name"
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.output = bytearray()
+        self.input = bytearray()
+        self.upload = None
+        self.corrupt = False
+
+    def write(self, data) -> None:
+        self.input += data
+        if self.upload:
+            name, size = self.upload
+            if len(self.input) < size:
+                return
+            content = bytes(self.input[:size])
+            del self.input[:size]
+            self.files[name] = content
+            self.upload = None
+            checksum = xor16(content) ^ (1 if self.corrupt else 0)
+            self.output += b"\r\n+QFUPL: %d,%x\r\n\r\nOK\r\n" % (size, checksum)
+            return
+        if b"\r" not in self.input:
+            return
+        command = bytes(self.input).strip()
+        self.input.clear()
+        match = re.match(b'AT\\+QFUPL="(.+)",(\\d+)', command)
+        if match:
+            self.upload = (match.group(1), int(match.group(2)))
+            self.output += b"\r\nCONNECT\r\n"
+            return
+        match = re.match(b'AT\\+QFDWL="(.+)"', command)
+        if match and match.group(1) in self.files:
+            content = self.files[match.group(1)]
+            self.output += b"\r\nCONNECT\r\n%s\r\n+QFDWL: %d,%x\r\n\r\nOK\r\n" % (
+                content,
+                len(content),
+                xor16(content),
+            )
+            return
+        self.output += b"\r\n+CME ERROR: 405\r\n"
+
+    def read(self, nbytes: int) -> bytes:
+        if nbytes < 0:
+            nbytes = len(self.output)
+        data = bytes(self.output[:nbytes])
+        del self.output[:nbytes]
+        return data
+
+    def in_waiting(self) -> int:
+        return len(self.output)
+
+
+class TestBulk(unittest.TestCase):
+    """
+    Test bulk transfers
+    """
+
+    def __init__(self, methodName):
+        super().__init__(methodName)
+
+    def test_checksum(self):
+        # Chunks of odd size
+        checksum = XOR16Checksum()
+        view = memoryview(CONTENT)
+        for i in range(0, len(CONTENT), 4097):
+            checksum.update(view[i : i + 4097])
+        self.assertEqual(checksum.value, xor16(CONTENT))
+        self.assertEqual(checksum.hexdigest(), "%x" % xor16(CONTENT))
+        # Odd length
+        part = view[:1001]
+        for size in (1, 2, 3, 6, 7):
+            checksum = XOR16Checksum()
+            for i in range(0, len(part), size):
+                checksum.update(part[i : i + size])
+            self.assertEqual(checksum.value, xor16(CONTENT[:1001]))
+        with self.assertRaises(TypeError):
+            Checksum()
+        crc = CRC32Checksum()
+        crc.update(view[:100])
+        crc.update(view[100:])
+        self.assertEqual(crc.value, zlib.crc32(CONTENT))
+        result = TransferResult(1000, 500, [b"+QFUPL: 1000,1f", b"", b"OK"])
+        self.assertEqual(result.bytes_per_second, 2000)
+        self.assertTrue(result.succeeded)
+        self.assertEqual(result.reported_checksum(), 0x1F)
+        self.assertIsNone(TransferResult(0, 0, [b"ERROR"]).reported_checksum())
+
+    def test_transfer(self):
+        device = FakeFileSystem()
+        communicator = ATVirtualCommunicator(
+            "virtual",
+            115200,
+            5,
+            "\r",
+            device.read,
+            device.write,
+            device.in_waiting,
+        )
+        communicator.open()
+        # Upload
+        source = BytesIO(CONTENT)
+        result = communicator.upload(
+            'AT+QFUPL="UFS:fw.bin",%d' % len(CONTENT),
+            source,
+            len(CONTENT),
+            checksum=XOR16Checksum(),
+            checksum_pattern=QFILE_CHECKSUM,
+        )
+        self.assertTrue(result.succeeded)
+        self.assertEqual(result.transferred, len(CONTENT))
+        self.assertGreater(result.bytes_per_second, 0)
+        self.assertEqual(device.files[b"UFS:fw.bin"], CONTENT)
+        # Checksum mismatch
+        device.corrupt = True
+        with self.assertRaises(ATSerialPortError):
+            communicator.upload(
+                'AT+QFUPL="UFS:cert.pem",16',
+                BytesIO(CONTENT),
+                16,
+                checksum=XOR16Checksum(),
+                checksum_pattern=QFILE_CHECKSUM,
+            )
+        # Device refuses
+        with self.assertRaises(ATSerialPortError):
+            communicator.upload("AT+QFUPL", BytesIO(CONTENT), 16, 1)
+        # Download, with and without size
+        for size in (len(CONTENT), None):
+            sink = BytesIO()
+            result = communicator.download(
+                'AT+QFDWL="UFS:fw.bin"',
+                sink,
+                size,
+                chunk_size=1024,
+                checksum=XOR16Checksum(),
+                checksum_pattern=QFILE_CHECKSUM,
+            )
+            self.assertTrue(result.succeeded)
+            self.assertEqual(result.transferred, len(CONTENT))
+            self.assertEqual(sink.getvalue(), CONTENT)
+        with self.assertRaises(ATSerialPortError):
+            communicator.download('AT+QFDWL="UFS:missing.bin"', BytesIO(), None, 1)
+        communicator.close()
+
+    def test_atre(self):
+        atre = ATRuntimeEnvironment(True)
+        atre.configure_virtual_communicator("virtual", 115200, 1, "\r")
+        with self.assertRaises(ATREUninitializedError):
+            atre.upload('AT+QFUPL="UFS:fw.bin",1', BytesIO(b"\x00"))
+        with self.assertRaises(ATREUninitializedError):
+            atre.download('AT+QFDWL="UFS:fw.bin"', BytesIO())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+import signal
+from select import select
+from threading import Timer
+from time import monotonic
+
+from attila.atcommand import ATCommand
+from attila.atre import ATRuntimeEnvironment
+from attila.cancel import CancelToken
+from attila.clock import VirtualClock
+from attila.exceptions import ATCancelledError
+from attila.virtual.atvirtualcommunicator import ATVirtualCommunicator
+
+
+def read_callback(nbytes):
+    return b""
+
+
+def write_callback(command):
+    pass
+
+
+def in_waiting():
+    return 0
+
+
+class TestCancel(unittest.TestCase):
+    """
+    Test cancellation of command execution
+    """
+
+    def __init__(self, methodName):
+        super().__init__(methodName)
+
+    def test_token(self):
+        token = CancelToken()
+        self.assertFalse(token.cancelled)
+        self.assertFalse(token.wait(0.01))
+        token.raise_if_cancelled()
+        Timer(0.05, token.cancel).start()
+        t_start = monotonic()
+        self.assertTrue(token.wait(10))
+        self.assertLess(monotonic() - t_start, 1)
+        with self.assertRaises(ATCancelledError):
+            token.raise_if_cancelled()
+        if token.fileno() is not None:
+            self.assertTrue(select([token.fileno()], [], [], 0)[0])
+        token.reset()
+        self.assertFalse(token.cancelled)
+        if token.fileno() is not None:
+            self.assertFalse(select([token.fileno()], [], [], 0)[0])
+        token.close()
+        # The self-pipe is created by the first wait
+        token = CancelToken()
+        self.assertIsNone(token._pipe)
+        token.cancel()
+        if token.fileno() is not None:
+            self.assertTrue(select([token.fileno()], [], [], 0)[0])
+        token.close()
+
+    @unittest.skipUnless(hasattr(signal, "setitimer"), "setitimer not available")
+    def test_signal(self):
+        token = CancelToken()
+        handler = signal.signal(signal.SIGALRM, lambda _signo, _frame: token.cancel())
+        try:
+            signal.setitimer(signal.ITIMER_REAL, 0.05)
+            t_start = monotonic()
+            self.assertTrue(token.wait(10))
+            self.assertLess(monotonic() - t_start, 1)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, handler)
+            token.close()
+
+    def test_communicator(self):
+        token = CancelToken()
+        communicator = ATVirtualCommunicator(
+            "virtual", 115200, 180, "\r\n", read_callback, write_callback, in_waiting
+        )
+        communicator.cancel_token = token
+        communicator.open()
+        # The device never answers: the read is interrupted
+        Timer(0.05, token.cancel).start()
+        t_start = monotonic()
+        with self.assertRaises(ATCancelledError):
+            communicator.exec("AT+COPS=?")
+        self.assertLess(monotonic() - t_start, 1)
+        # Nothing is sent while cancelled
+        with self.assertRaises(ATCancelledError):
+            communicator.exec("AT")
+        token.reset()
+        self.assertEqual(communicator.exec("AT", 0.01)[0], [])
+        communicator.close()
+        # Virtual time doesn't advance once cancelled
+        clock = VirtualClock()
+        communicator = ATVirtualCommunicator(
+            "virtual",
+            115200,
+            180,
+            "\r\n",
+            read_callback,
+            write_callback,
+            in_waiting,
+            clock,
+        )
+        communicator.cancel_token = token
+        communicator.open()
+        token.cancel()
+        with self.assertRaises(ATCancelledError):
+            communicator.exec("AT+COPS=?")
+        self.assertEqual(clock.now(), 0)
+        communicator.close()
+
+    def test_atre(self):
+        atre = ATRuntimeEnvironment(True)
+        atre.configure_virtual_communicator(
+            "virtual", 115200, 180, "\r\n", read_callback, write_callback, in_waiting
+        )
+        # Delay is interrupted
+        atre.init_session([ATCommand("AT", "OK", delay=60000)])
+        Timer(0.05, atre.cancel).start()
+        t_start = monotonic()
+        with self.assertRaises(ATCancelledError):
+            atre.run()
+        self.assertLess(monotonic() - t_start, 1)
+        self.assertTrue(atre.cancel_token.cancelled)
+        with self.assertRaises(ATCancelledError):
+            atre.exec_next()
+        # Command is interrupted
+        atre.cancel_token.reset()
+        atre.init_session([ATCommand("AT+COPS=?", "OK", 180)])
+        Timer(0.05, atre.cancel).start()
+        t_start = monotonic()
+        with self.assertRaises(ATCancelledError):
+            atre.run()
+        self.assertLess(monotonic() - t_start, 1)
+        # Provided token
+        token = CancelToken()
+        atre = ATRuntimeEnvironment(True, cancel_token=token)
+        self.assertIs(atre.cancel_token, token)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+from time import time
+
+from attila.atre import ATRuntimeEnvironment
+from attila.clock import Clock, VirtualClock
+from attila.virtual.atvirtualcommunicator import ATVirtualCommunicator
+
+
+def read_callback(nbytes):
+    return ""
+
+
+def write_callback(command):
+    pass
+
+
+def in_waiting():
+    return 0
+
+
+class TestClock(unittest.TestCase):
+    """
+    Test system and virtual clocks
+    """
+
+    def __init__(self, methodName):
+        super().__init__(methodName)
+
+    def test_clock(self):
+        clock = Clock()
+        t_start = clock.now()
+        clock.sleep(0.01)
+        clock.sleep(-1)  # Negative sleep is ignored
+        self.assertGreaterEqual(clock.now() - t_start, 0.01)
+        # Monotonic: never goes backwards
+        self.assertLessEqual(t_start, clock.now())
+
+    def test_virtual_clock(self):
+        clock = VirtualClock(100)
+        self.assertEqual(clock.now(), 100)
+        t_start = time()
+        clock.sleep(3600)
+        self.assertEqual(clock.now(), 3700)
+        # Sleeping an hour must not block
+        self.assertLess(time() - t_start, 1)
+        clock.advance(-5)
+        self.assertEqual(clock.now(), 3700)
+
+    def test_communicator_timeout(self):
+        # A device which never answers: the timeout elapses on the virtual clock
+        clock = VirtualClock()
+        com = ATVirtualCommunicator(
+            "/dev/virtual",
+            115200,
+            30,
+            "\r\n",
+            read_callback,
+            write_callback,
+            in_waiting,
+            clock,
+        )
+        self.assertIs(com.clock, clock)
+        com.open()
+        self.assertIs(com._device.clock, clock)
+        t_start = time()
+        lines, execution_time = com.exec("AT+COPS=?", 180)
+        self.assertEqual(lines, [])
+        self.assertGreaterEqual(execution_time, 180000)
+        self.assertGreaterEqual(clock.now(), 180)
+        self.assertLess(time() - t_start, 30)
+        # Sub-second timeout
+        lines, execution_time = com.exec("AT", 0.05)
+        self.assertGreaterEqual(execution_time, 50)
+        self.assertLess(execution_time, 100)
+        com.close()
+
+    def test_runtime_delay(self):
+        clock = VirtualClock()
+        atre = ATRuntimeEnvironment(False, clock)
+        self.assertIs(atre.clock, clock)
+        atre.configure_virtual_communicator(
+            "virtualAdapter",
+            115200,
+            1,
+            "\r\n",
+            read_callback,
+            write_callback,
+            in_waiting,
+        )
+        atre.open_serial()
+        t_start = time()
+        atre.exec("AT;;OK;;600000")
+        self.assertGreaterEqual(clock.now(), 601)
+        self.assertLess(time() - t_start, 30)
+        atre.close_serial()
+
+
+if __name__ == "__main__":
+    unittest.main()
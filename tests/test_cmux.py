@@ -0,0 +1,141 @@
+import unittest
+
+from threading import Thread
+
+from attila.atcommand import ATCommand
+from attila.atre import ATRuntimeEnvironment
+from attila.cmux import (
+    ATCMUXCommunicator,
+    CMUXDecoder,
+    CMUXMultiplexer,
+    FCS_GOOD,
+    FCS_TABLE,
+    FRAME_SABM,
+    FRAME_UI,
+    FRAME_UIH,
+    CONTROL_PF,
+    encode_frame,
+    fcs,
+)
+from attila.exceptions import ATSerialPortError
+from attila.virtual.cmuxsimulator import CMUXSimulator
+from attila.virtual.exceptions import VirtualSerialException
+from attila.virtual.scenario import Scenario, ScenarioRule
+
+SCENARIO = Scenario(
+    [
+        ScenarioRule("AT", "OK"),
+        ScenarioRule("AT\\+CSQ", ["+CSQ: 23,99", "", "OK"]),
+        ScenarioRule("AT\\+CGSN", ["356938035643809", "", "OK"]),
+        ScenarioRule('AT\\+CGDCONT=1,"IP","(.*)"', ['+CGDCONT: 1,"IP","\\1"', "OK"]),
+    ]
+)
+
+
+class TestCMUX(unittest.TestCase):
+    """
+    Test GSM 07.10 multiplexer
+    """
+
+    def __init__(self, methodName):
+        super().__init__(methodName)
+
+    def test_fcs(self):
+        self.assertEqual(len(FCS_TABLE), 256)
+        # SABM on DLCI 0
+        self.assertEqual(
+            encode_frame(0, FRAME_SABM | CONTROL_PF), b"\xf9\x03\x3f\x01\x1c\xf9"
+        )
+        # Receiver check
+        header = b"\x07\xef\x09"
+        crc = 0xFF
+        for byte in header + bytes((fcs(header),)):
+            crc = FCS_TABLE[crc ^ byte]
+        self.assertEqual(crc, FCS_GOOD)
+
+    def test_decoder(self):
+        decoder = CMUXDecoder()
+        frame = encode_frame(1, FRAME_UIH, b"AT\r")
+        long_frame = encode_frame(2, FRAME_UI, b"A" * 200)
+        # Garbage, a frame with corrupted header (UIH FCS doesn't cover data) and split frames
+        corrupted = bytearray(encode_frame(3, FRAME_UIH, b"ATI\r"))
+        corrupted[2] ^= 0x20
+        stream = b"\x00garbage" + bytes(corrupted) + frame + long_frame
+        frames = decoder.feed(stream[:20])
+        frames += decoder.feed(stream[20:])
+        self.assertEqual(len(frames), 2)
+        self.assertEqual(frames[0].dlci, 1)
+        self.assertEqual(frames[0].frame_type, FRAME_UIH)
+        self.assertEqual(frames[0].data, b"AT\r")
+        self.assertTrue(frames[0].command)
+        self.assertEqual(frames[1].dlci, 2)
+        self.assertEqual(frames[1].data, b"A" * 200)
+        # Frames sharing flags
+        frames = decoder.feed(frame[:-1] + frame)
+        self.assertEqual(len(frames), 2)
+
+    def test_multiplexer(self):
+        simulator = CMUXSimulator(SCENARIO, seed=0)
+        try:
+            simulator.start()
+        except VirtualSerialException:
+            self.skipTest("pty is not available")
+        try:
+            multiplexer = CMUXMultiplexer(simulator.port, 115200, timeout=2)
+            self.assertFalse(multiplexer.is_open())
+            with self.assertRaises(ATSerialPortError):
+                multiplexer.open_channel(0)
+            # DLCI refused by the device
+            with self.assertRaises(ATSerialPortError):
+                multiplexer.open_channel(10)
+            self.assertTrue(multiplexer.is_open())
+            self.assertTrue(simulator.multiplexing)
+            # Independent scripts running in parallel on different DLCIs
+            results = {}
+
+            def run_script(dlci: int):
+                atre = ATRuntimeEnvironment(True)
+                atre.configure_cmux_communicator(multiplexer, dlci, 5)
+                atre.add_command(ATCommand("AT", "OK"))
+                atre.add_command(
+                    ATCommand("AT+CSQ", "OK", collectables=["+CSQ: ?{rssi},"])
+                )
+                atre.add_command(
+                    ATCommand(
+                        'AT+CGDCONT=1,"IP","very.long.access.point.name%d"' % dlci,
+                        "OK",
+                        collectables=['+CGDCONT: 1,"IP","?{apn}"'],
+                    )
+                )
+                atre.add_command(ATCommand("AT+CGSN", "OK"))
+                responses = atre.run()
+                results[dlci] = (responses, atre.get_session_value("apn"))
+
+            threads = [Thread(target=run_script, args=(dlci,)) for dlci in (1, 2, 3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            for dlci in (1, 2, 3):
+                responses, apn = results[dlci]
+                self.assertEqual([x.response for x in responses], ["OK"] * 4)
+                self.assertEqual(responses[1].get_collectable("rssi"), 23)
+                self.assertEqual(apn, "very.long.access.point.name%d" % dlci)
+            # Channels have been released when the runtime environments closed the serial
+            self.assertEqual(multiplexer.channels, [])
+            communicator = ATCMUXCommunicator(multiplexer, 1)
+            self.assertEqual(communicator.serial_port, "%s:1" % simulator.port)
+            communicator.open()
+            self.assertEqual(multiplexer.channels, [1])
+            lines, _ = communicator.exec("AT+CGSN")
+            self.assertEqual(lines, ["356938035643809", "", "OK"])
+            multiplexer.close()
+            self.assertFalse(multiplexer.is_open())
+            with self.assertRaises(ATSerialPortError):
+                communicator.exec("AT")
+        finally:
+            simulator.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
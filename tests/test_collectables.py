@@ -0,0 +1,116 @@
+import unittest
+
+from attila.atcommand import ATCommand
+from attila.collectables import (
+    compile_collectable,
+    compile_collectables,
+    get_collectable,
+    parse_collectables,
+)
+from attila.exceptions import ATCollectableSyntaxError
+
+
+class TestCollectables(unittest.TestCase):
+    """
+    Test collectables parser and extractors
+    """
+
+    def __init__(self, methodName):
+        super().__init__(methodName)
+
+    def test_parse(self):
+        collectables = parse_collectables(
+            "[\"AT+CSQ=?{rssi::[0-9]{1,2}},\", '?{IMEI::^\\\\d{15}$}' , ]"
+        )
+        self.assertEqual(
+            [x.source for x in collectables],
+            ["AT+CSQ=?{rssi::[0-9]{1,2}},", "?{IMEI::^\\d{15}$}"],
+        )
+        self.assertEqual([x.key for x in collectables], ["rssi", "IMEI"])
+        self.assertEqual(
+            [x.key_regex for x in collectables], ["[0-9]{1,2}", "^\\d{15}$"]
+        )
+        self.assertEqual(parse_collectables(" [ ] "), ())
+        # Escape sequences; unknown ones are kept
+        self.assertEqual(
+            parse_collectables('["\\"?{a}\\t\\x41", "\\d?{b}"]')[0].source,
+            '"?{a}\tA',
+        )
+        self.assertEqual(parse_collectables('["\\d?{b}"]')[0].source, "\\d?{b}")
+        # Same text is parsed once
+        self.assertIs(parse_collectables('["?{a}"]'), parse_collectables('["?{a}"]'))
+
+    def test_errors(self):
+        for text, column in [
+            ('"?{a}"', 1),
+            ("[foo]", 2),
+            ('["?{a}"', 8),
+            ('["?{a}" "?{b}"]', 9),
+            ('["?{a}",,]', 9),
+            ('["?{a}', 2),
+            ('["?{a}"] x', 10),
+            ('["x"]', 3),
+            ('["?{}"]', 5),
+            ('["?{a::}"]', 8),
+            ('["?{a"]', 3),
+            ('["?{a}?{b}"]', 7),
+            ('["?{a::[0-9}"]', 8),
+            ('["\\xZZ?{a}"]', 3),
+        ]:
+            with self.assertRaises(ATCollectableSyntaxError) as err:
+                parse_collectables(text)
+            self.assertEqual(err.exception.column, column, text)
+        self.assertIsNone(get_collectable("nokey"))
+        self.assertEqual(len(compile_collectables(["nokey", "?{a}"])), 1)
+        self.assertEqual(compile_collectables(None), [])
+
+    def test_extract(self):
+        response = ["+CSQ: 12,99", "OK"]
+        # Prefix and suffix
+        self.assertEqual(
+            compile_collectable("+CSQ: ?{rssi},").extract(response), ("rssi", 12)
+        )
+        # Whole line with key regex
+        self.assertEqual(
+            compile_collectable("?{IMEI::^[0-9]{15}$}").extract(
+                ["AT+CGSN", "123456789012345", "OK"]
+            ),
+            ("IMEI", 123456789012345),
+        )
+        self.assertIsNone(compile_collectable("?{IMEI::^[0-9]{15}$}").extract(response))
+        # String values
+        self.assertEqual(
+            compile_collectable("+COPS: 0,0,?{operator}").extract(
+                ['+COPS: 0,0,"I TIM"']
+            ),
+            ("operator", '"I TIM"'),
+        )
+        # Session keys in prefix and suffix
+        collectable = compile_collectable("+CSQ: ${rssi},?{ber}")
+        self.assertEqual(
+            collectable.extract(response, lambda x: x.replace("${rssi}", "12")),
+            ("ber", 99),
+        )
+        # Bytes responses
+        self.assertEqual(
+            compile_collectable("+CSQ: ?{rssi},").extract([b"+CSQ: 12,99", b"OK"]),
+            ("rssi", 12),
+        )
+        self.assertEqual(
+            collectable.extract(
+                [b"+CSQ: 12,99", b"OK"], lambda x: x.replace("${rssi}", "12")
+            ),
+            ("ber", 99),
+        )
+        self.assertIsNone(compile_collectable("+CREG: ?{stat}").extract(response))
+        self.assertIsNone(compile_collectable("?{a}").extract([]))
+        # Commands compile their collectables once
+        command = ATCommand("AT+CSQ", "OK", collectables=["+CSQ: ?{rssi},"])
+        self.assertIs(command.extractors, command.extractors)
+        self.assertEqual(command.extractors[0].key, "rssi")
+        command.collectables = ["?{a}"]
+        self.assertEqual(command.extractors[0].key, "a")
+
+
+if __name__ == "__main__":
+    unittest.main()
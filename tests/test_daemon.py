@@ -0,0 +1,165 @@
+import unittest
+
+import io
+import json
+import os
+import socket
+from contextlib import redirect_stdout
+from tempfile import TemporaryDirectory
+from threading import Thread
+
+from attila.__main__ import client_main, daemon_main
+from attila.atre import RETENTION_FULL, RETENTION_NONE, ATRuntimeEnvironment
+from attila.exceptions import ATDaemonError
+from attila.virtual.scenario import Scenario, ScenarioRule, ScheduledURC, VirtualDevice
+
+
+def make_atre(urcs: list, retention: str = RETENTION_FULL) -> ATRuntimeEnvironment:
+    scenario = Scenario(
+        [
+            ScenarioRule("AT", "OK"),
+            ScenarioRule("AT\\+CSQ", ["+CSQ: 20,99", "OK"]),
+            ScenarioRule("AT\\+CGMM", ["ERROR"]),
+        ],
+        urcs=urcs,
+    )
+    atre = ATRuntimeEnvironment(False, retention=retention)
+    atre.configure_virtual_communicator(
+        "virtual", 115200, 1, "\r\n", device=VirtualDevice(scenario, atre.clock)
+    )
+    return atre
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Unix sockets not available")
+class TestDaemon(unittest.TestCase):
+    """
+    Test daemon and its client
+    """
+
+    def __init__(self, methodName):
+        super().__init__(methodName)
+
+    def setUp(self):
+        from attila.daemon import ATDaemon
+
+        self.tmp_dir = TemporaryDirectory()
+        self.socket_path = os.path.join(self.tmp_dir.name, "attila.sock")
+        self.daemon = ATDaemon(self.socket_path)
+        self.daemon.add_port("modem", make_atre([ScheduledURC("RING", 0, every=0.05)]))
+        # Responses of the scripts don't depend on the retention policy
+        self.daemon.add_port("gps", make_atre([], RETENTION_NONE))
+        self.daemon.start()
+        self.thread = Thread(target=self.daemon.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.thread.join()
+        self.assertFalse(os.path.exists(self.socket_path))
+        self.tmp_dir.cleanup()
+
+    def test_requests(self):
+        from attila.daemon import ATDaemon, ATDaemonClient
+
+        self.assertEqual(os.stat(self.socket_path).st_mode & 0o777, 0o600)
+        with ATDaemonClient(self.socket_path) as client:
+            self.assertEqual(client.ports(), ["modem", "gps"])
+            response = client.exec("modem", 'AT+CSQ;;OK;;;;;;["+CSQ: ?{rssi},"]')
+            self.assertEqual(response["command"], "AT+CSQ")
+            self.assertEqual(response["response"], "OK")
+            self.assertEqual(response["full_response"], ["+CSQ: 20,99", "OK"])
+            self.assertEqual(response["collectables"], {"rssi": 20})
+            self.assertTrue(response["succeeded"])
+            # Session values are kept between requests
+            self.assertIsNone(client.exec("modem", "PRINT ${rssi}"))
+            # Script
+            result = client.run("gps", text="AT;;OK\nAT+CGMM;;OK\nAT+CSQ;;OK\n")
+            self.assertFalse(result["deadline_exceeded"])
+            self.assertEqual(
+                [x["succeeded"] for x in result["responses"]], [True, False, True]
+            )
+            # ESKs of the next script are executed too
+            result = client.run("gps", text="AT;;OK\nSET cmd=CSQ\nAT+${cmd};;OK\n")
+            self.assertEqual(
+                [x["full_response"] for x in result["responses"]],
+                [["OK"], ["+CSQ: 20,99", "OK"]],
+            )
+            stats = client.stats()
+            self.assertEqual(stats["gps"]["requests"], 2)
+            self.assertEqual(stats["gps"]["commands"], 5)
+            self.assertEqual(stats["gps"]["failed_commands"], 1)
+            self.assertEqual(stats["modem"]["requests"], 2)
+            self.assertEqual(stats["modem"]["queued"], 0)
+            self.assertEqual(list(client.stats("gps").keys()), ["gps"])
+            # Port stays open after the script
+            self.assertTrue(client.exec("gps", "AT;;OK")["succeeded"])
+            # Errors
+            with self.assertRaises(ATDaemonError):
+                client.exec("modem", "AT;;OK;;soon")
+            with self.assertRaises(ATDaemonError):
+                client.exec("wifi", "AT;;OK")
+            with self.assertRaises(ATDaemonError):
+                client.run("gps")
+            with self.assertRaises(ATDaemonError):
+                client.request("reboot")
+            self.assertEqual(client.stats("modem")["modem"]["errors"], 1)
+        # Daemon already running
+        with self.assertRaises(ATDaemonError):
+            ATDaemon(self.socket_path).start()
+        with self.assertRaises(ATDaemonError):
+            ATDaemonClient(os.path.join(self.tmp_dir.name, "missing.sock"))
+
+    def test_subscribe(self):
+        from attila.daemon import ATDaemonClient
+
+        with ATDaemonClient(self.socket_path) as client:
+            urcs = client.subscribe("modem")
+            self.assertEqual(next(urcs), ("modem", "RING"))
+        with ATDaemonClient(self.socket_path) as client:
+            self.assertGreaterEqual(client.stats("modem")["modem"]["urcs"], 1)
+
+    def test_partial_urc(self):
+        from attila.daemon import DaemonPort
+
+        port = DaemonPort("modem", make_atre([]))
+        port.start()
+        subscriber = port.subscribe()
+        port._urc_buffer += b"+CREG: "
+        self.assertTrue(port.submit({"op": "exec", "command": "AT;;OK"}).result(5))
+        # The partial line isn't dropped by the request
+        self.assertEqual(port._urc_buffer, b"+CREG: ")
+        self.assertTrue(subscriber.empty())
+        port.stop()
+
+    def test_cli(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            self.assertEqual(client_main(["-s", self.socket_path, "ports"]), 0)
+            self.assertEqual(
+                client_main(["-s", self.socket_path, "exec", "gps", "AT;;OK"]), 0
+            )
+            self.assertEqual(client_main(["-s", self.socket_path, "stats", "gps"]), 0)
+            self.assertEqual(
+                client_main(["-s", self.socket_path, "exec", "gps", "AT;;OK;;soon"]), 1
+            )
+            # Port can't be opened
+            missing = os.path.join(self.tmp_dir.name, "missing")
+            self.assertEqual(
+                daemon_main(["-s", os.path.join(self.tmp_dir.name, "d.sock"), missing]),
+                1,
+            )
+        lines = output.getvalue().splitlines()
+        decoder = json.JSONDecoder()
+        text = output.getvalue()
+        ports, end = decoder.raw_decode(text)
+        self.assertEqual(ports, ["modem", "gps"])
+        response, end = decoder.raw_decode(text, end + 1)
+        self.assertTrue(response["succeeded"])
+        stats, end = decoder.raw_decode(text, end + 1)
+        self.assertEqual(stats["gps"]["commands"], 1)
+        self.assertTrue(lines[-2].startswith("Request failed"))
+        self.assertTrue(lines[-1].startswith("Could not start daemon"))
+
+
+if __name__ == "__main__":
+    unittest.main()
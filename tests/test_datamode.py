@@ -0,0 +1,164 @@
+import unittest
+
+import os
+from select import select
+from socket import socketpair
+from threading import Thread
+
+from attila.atre import ATRuntimeEnvironment
+from attila.datamode import DataModeRelay, open_pty
+from attila.exceptions import (
+    ATREUninitializedError,
+    ATRuntimeError,
+    ATSerialPortError,
+)
+
+PAYLOAD = bytes(range(256)) * 1024
+
+
+def fake_modem(fd: int, greeting: bytes = b"") -> None:
+    """
+    Answer CONNECT to dial commands (followed by greeting), then loop back data until the escape sequence
+    """
+    data_mode = False
+    received = bytearray()
+    while True:
+        if not select([fd], [], [], 5)[0]:
+            return
+        try:
+            data = os.read(fd, 65536)
+        except OSError:
+            return
+        if not data_mode:
+            received += data
+            if b"\r" not in received:
+                continue
+            command = bytes(received).strip()
+            received.clear()
+            if command.startswith(b"ATD"):
+                os.write(fd, b"\r\nCONNECT 150000000\r\n" + greeting)
+                data_mode = True
+            elif command == b"ATH":
+                os.write(fd, b"\r\nOK\r\n")
+                return
+            else:
+                os.write(fd, b"\r\nERROR\r\n")
+        elif data == b"+++":
+            os.write(fd, b"\r\nOK\r\n")
+            data_mode = False
+        else:
+            os.write(fd, data)
+
+
+class TestDataMode(unittest.TestCase):
+    """
+    Test data mode relay
+    """
+
+    def __init__(self, methodName):
+        super().__init__(methodName)
+
+    def setUp(self):
+        try:
+            self.modem, self.slave, self.port = open_pty()
+        except ATSerialPortError:
+            self.skipTest("pty is not available")
+        self.peer, self.local = socketpair()
+
+    def tearDown(self):
+        for fd in (self.modem, self.slave):
+            os.close(fd)
+        self.peer.close()
+        self.local.close()
+
+    def loopback(self, relay: DataModeRelay) -> None:
+        thread = Thread(target=relay.run)
+        thread.start()
+        received = bytearray()
+        view = memoryview(PAYLOAD)
+        sent = 0
+        while len(received) < len(PAYLOAD):
+            if sent < len(PAYLOAD):
+                sent += self.local.send(view[sent : sent + 4096])
+            if select([self.local], [], [], 5)[0]:
+                received += self.local.recv(65536)
+            else:
+                break
+        relay.stop()
+        thread.join()
+        self.assertEqual(received, PAYLOAD)
+        self.assertEqual(relay.stats.bytes_to_device, len(PAYLOAD))
+        self.assertEqual(relay.stats.bytes_from_device, len(PAYLOAD))
+        self.assertGreater(relay.stats.throughput_to_device, 0)
+
+    def test_relay(self):
+        for use_splice in (True, False):
+            modem = Thread(target=fake_modem, args=(self.modem,))
+            modem.start()
+            os.write(self.slave, b"ATD*99***1#\r")
+            self.assertIn(b"CONNECT", os.read(self.slave, 64))
+            relay = DataModeRelay(
+                self.slave, self.peer.fileno(), 4096, None, use_splice
+            )
+            self.loopback(relay)
+            self.assertTrue(relay.escape(0.01, 2))
+            os.write(self.slave, b"ATH\r")
+            modem.join()
+            self.assertIn(b"OK", os.read(self.slave, 64))
+        # Peer closes
+        relay = DataModeRelay(self.slave, self.peer.fileno())
+        self.local.close()
+        stats = relay.run(5)
+        self.assertLess(stats.elapsed, 5)
+        # Nobody answers to escape sequence
+        self.assertFalse(relay.escape(0.01, 0.1))
+
+    def test_no_data(self):
+        # Readable, but no data was available (e.g. a spurious wakeup)
+        relay = DataModeRelay(self.slave, self.peer.fileno())
+        results = [-1, 0]
+        relay._DataModeRelay__transfer = lambda src, dst, direction: results.pop(0)
+        os.write(self.modem, b"x")
+        stats = relay.run(5)
+        self.assertEqual(results, [])
+        self.assertEqual(stats.bytes_from_device, 0)
+
+    def test_atre(self):
+        modem = Thread(target=fake_modem, args=(self.modem,))
+        modem.start()
+        atre = ATRuntimeEnvironment(True)
+        atre.configure_communicator(self.port, 115200, 5, "\r", False, False)
+        with self.assertRaises(ATREUninitializedError):
+            atre.data_mode(self.peer)
+        atre.open_serial()
+        with self.assertRaises(ATRuntimeError):
+            atre.data_mode(self.peer, "AT+CGDATA;;CONNECT")
+        relay = atre.data_mode(self.peer, "ATD*99***1#;;CONNECT")
+        self.loopback(relay)
+        self.assertTrue(relay.escape(0.01, 2))
+        # Back to command mode on the same serial port
+        self.assertEqual(atre.exec("ATH;;OK").response, "OK")
+        atre.close_serial()
+        modem.join()
+
+    def test_atre_pending(self):
+        # Data sent by the device along with CONNECT (e.g. the first LCP frame)
+        lcp = b"~\xff\x7d\x23\xc0\x21~"
+        modem = Thread(target=fake_modem, args=(self.modem, lcp))
+        modem.start()
+        atre = ATRuntimeEnvironment(True)
+        atre.configure_communicator(self.port, 115200, 5, "\r", False, False)
+        atre.open_serial()
+        relay = atre.data_mode(self.peer, "ATD*99***1#;;CONNECT")
+        relay.run(0.1)
+        self.assertTrue(select([self.local], [], [], 5)[0])
+        self.assertEqual(self.local.recv(64), lcp)
+        self.assertEqual(relay.stats.bytes_from_device, len(lcp))
+        self.assertTrue(relay.escape(0.01, 2))
+        self.assertEqual(atre.exec("ATH;;OK").response, "OK")
+        atre.close_serial()
+        modem.join()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+
+import json
+import os
+from tempfile import TemporaryDirectory
+
+from attila.datamode import open_pty
+from attila.discovery import DiscoveryCache, discover
+from attila.exceptions import ATSerialPortError
+from attila.virtual.cmuxsimulator import CMUXSimulator
+from attila.virtual.exceptions import VirtualSerialException
+from attila.virtual.scenario import Scenario, ScenarioRule
+
+
+def get_scenario(imei: str) -> Scenario:
+    return Scenario(
+        [
+            ScenarioRule("AT", "OK"),
+            ScenarioRule(
+                "ATI", ["Quectel", "EC25", "Revision: EC25EFAR06A06M4G", "", "OK"]
+            ),
+            ScenarioRule("AT\\+CGMM", ["EC25", "", "OK"]),
+            ScenarioRule("AT\\+CGSN", [imei, "", "OK"]),
+        ]
+    )
+
+
+class TestDiscovery(unittest.TestCase):
+    """
+    Test serial port discovery
+    """
+
+    def __init__(self, methodName):
+        super().__init__(methodName)
+
+    def test_discover(self):
+        simulators = [
+            CMUXSimulator(get_scenario("35693803564380%d" % i)) for i in range(3)
+        ]
+        try:
+            for simulator in simulators:
+                simulator.start()
+            # A pty nobody answers on
+            master, slave, mute_port = open_pty()
+        except (ATSerialPortError, VirtualSerialException):
+            for simulator in simulators:
+                if simulator.port:
+                    simulator.stop()
+            self.skipTest("pty is not available")
+        ports = [x.port for x in simulators] + [mute_port, "/dev/ttyNOTEXISTING"]
+        try:
+            with TemporaryDirectory() as cache_dir:
+                cache_path = os.path.join(cache_dir, "attila", "discovery.json")
+                cache = DiscoveryCache(cache_path)
+                devices = discover(ports, timeout=0.1, cache=cache)
+                self.assertEqual(list(devices), ports[:3])
+                for i, simulator in enumerate(simulators):
+                    device = devices[simulator.port]
+                    self.assertEqual(device.baud_rate, 115200)
+                    self.assertEqual(device.model, "EC25")
+                    self.assertEqual(device.imei, "35693803564380%d" % i)
+                    self.assertEqual(device.identification[0], "Quectel")
+                # Results come from the cache
+                with open(cache_path) as cache_file:
+                    entries = json.load(cache_file)
+                self.assertIsNone(entries[mute_port]["device"])
+                entries[ports[0]]["device"]["model"] = "CACHED"
+                with open(cache_path, "w") as cache_file:
+                    json.dump(entries, cache_file)
+                devices = discover(ports, cache=DiscoveryCache(cache_path))
+                self.assertEqual(devices[ports[0]].model, "CACHED")
+                self.assertEqual(len(devices), 3)
+                # Expired
+                devices = discover(
+                    ports, timeout=0.1, cache=DiscoveryCache(cache_path, 0)
+                )
+                self.assertEqual(devices[ports[0]].model, "EC25")
+        finally:
+            for simulator in simulators:
+                simulator.stop()
+            os.close(master)
+            os.close(slave)
+
+
+if __name__ == "__main__":
+    unittest.main()
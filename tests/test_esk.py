@@ -27,6 +27,13 @@ class TestEsk(unittest.TestCase):
         self.assertIsNotNone(ESK.get_esk_from_string("RTSCTS"))
         self.assertIsNotNone(ESK.get_esk_from_string("DSRDTR"))
         self.assertIsNotNone(ESK.get_esk_from_string("WRITE"))
+        self.assertIsNotNone(ESK.get_esk_from_string("GROUP"))
+        self.assertIsNotNone(ESK.get_esk_from_string("PAYLOAD"))
+        self.assertIsNotNone(ESK.get_esk_from_string("PAYLOADRAW"))
+        self.assertIsNotNone(ESK.get_esk_from_string("AUTOBAUD"))
+        self.assertIsNotNone(ESK.get_esk_from_string("DEADLINE"))
+        self.assertIsNotNone(ESK.get_esk_from_string("ASYNC"))
+        self.assertIsNotNone(ESK.get_esk_from_string("BARRIER"))
         # Try to fail
         self.assertIsNone(ESK.get_esk_from_string("FOOBAR"))
 
@@ -36,6 +43,8 @@ class TestEsk(unittest.TestCase):
         self.assertIsNone(ESK.to_ESKValue(ESK.BAUDRATE, "ABC"))
         self.assertIsNotNone(ESK.to_ESKValue(ESK.TIMEOUT, 5))
         self.assertIsNone(ESK.to_ESKValue(ESK.TIMEOUT, "ABC"))
+        self.assertEqual(ESK.to_ESKValue(ESK.TIMEOUT, "0.5").value, 0.5)
+        self.assertEqual(ESK.to_ESKValue(ESK.TIMEOUT, "20ms").value, 0.02)
         self.assertIsNotNone(ESK.to_ESKValue(ESK.BREAK, "CRLF"))
         self.assertIsNotNone(ESK.to_ESKValue(ESK.BREAK, "LF"))
         self.assertIsNotNone(ESK.to_ESKValue(ESK.BREAK, "CR"))
@@ -57,6 +66,21 @@ class TestEsk(unittest.TestCase):
             ESK.to_ESKValue(ESK.WRITE, '/tmp/foo.txt {"csq":${CSQ} }').value,
             ("/tmp/foo.txt", '{"csq":${CSQ} }'),
         )
+        self.assertEqual(ESK.to_ESKValue(ESK.GROUP, "BEGIN").value, True)
+        self.assertEqual(ESK.to_ESKValue(ESK.GROUP, "END").value, False)
+        self.assertEqual(ESK.to_ESKValue(ESK.PAYLOAD, "Hello").value, "Hello")
+        self.assertEqual(
+            ESK.to_ESKValue(ESK.PAYLOADRAW, "00ff1a").value, b"\x00\xff\x1a"
+        )
+        self.assertEqual(ESK.to_ESKValue(ESK.AUTOBAUD, None).value, (False, None))
+        self.assertEqual(ESK.to_ESKValue(ESK.AUTOBAUD, "MAX").value, (True, None))
+        self.assertEqual(ESK.to_ESKValue(ESK.AUTOBAUD, "921600").value, (True, 921600))
+        self.assertEqual(ESK.to_ESKValue(ESK.DEADLINE, "30").value, 30)
+        self.assertEqual(ESK.to_ESKValue(ESK.DEADLINE, "1500ms").value, 1.5)
+        self.assertTrue(ESK.to_ESKValue(ESK.ASYNC, "True").value)
+        self.assertFalse(ESK.to_ESKValue(ESK.ASYNC, "false").value)
+        self.assertIsNone(ESK.to_ESKValue(ESK.BARRIER, None).value)
+        self.assertEqual(ESK.to_ESKValue(ESK.BARRIER, "500ms").value, 0.5)
         # Bad cases
         self.assertFalse(ESK.to_ESKValue(None, "FOOBAR"))
         self.assertIsNone(ESK.to_ESKValue(ESK.DEVICE, None))
@@ -73,6 +97,16 @@ class TestEsk(unittest.TestCase):
         self.assertIsNone(ESK.to_ESKValue(ESK.WRITE, None))
         self.assertIsNone(ESK.to_ESKValue(ESK.WRITE, ""))
         self.assertIsNone(ESK.to_ESKValue(ESK.WRITE, "/tmp/foo.txt"))  # No string
+        self.assertIsNone(ESK.to_ESKValue(ESK.GROUP, None))
+        self.assertIsNone(ESK.to_ESKValue(ESK.GROUP, "START"))
+        self.assertIsNone(ESK.to_ESKValue(ESK.PAYLOAD, None))
+        self.assertIsNone(ESK.to_ESKValue(ESK.PAYLOADRAW, "0g"))
+        self.assertIsNone(ESK.to_ESKValue(ESK.AUTOBAUD, "fast"))
+        self.assertIsNone(ESK.to_ESKValue(ESK.DEADLINE, "soon"))
+        self.assertIsNone(ESK.to_ESKValue(ESK.DEADLINE, None))
+        self.assertIsNone(ESK.to_ESKValue(ESK.ASYNC, None))
+        self.assertIsNone(ESK.to_ESKValue(ESK.ASYNC, "maybe"))
+        self.assertIsNone(ESK.to_ESKValue(ESK.BARRIER, "later"))
 
     def tests_setters_getters(self):
         esk = ESKValue("DEVICE", "/dev/ttyS0")
@@ -0,0 +1,157 @@
+import unittest
+
+from attila.atcommand import ATCommand
+from attila.atresponse import ATResponse
+from attila.atre import ATRuntimeEnvironment
+from attila.clock import VirtualClock
+from attila.exceptions import ATSerialPortError
+from attila.virtual.exceptions import VirtualSerialException
+from attila.virtual.faults import (
+    FaultInjector,
+    FaultProfile,
+    FAULT_DROP,
+    FAULT_GARBLE,
+    FAULT_LATE,
+    FAULT_NON_UTF8,
+    FAULT_PORT_LOSS,
+    FAULT_SPLIT,
+    FAULT_STALL,
+    FAULT_URC,
+    NO_FAULT,
+)
+from attila.virtual.scenario import Scenario, ScenarioRule, VirtualDevice
+
+RESPONSE = b"+CSQ: 23,99\r\n\r\nOK\r\n"
+
+
+class TestFaults(unittest.TestCase):
+    """
+    Test fault injection on virtual devices
+    """
+
+    def __init__(self, methodName):
+        super().__init__(methodName)
+
+    def inject(self, fault, **params):
+        injector = FaultInjector(FaultProfile({fault: 1.0}, **params), seed=0)
+        segments = injector.inject("AT+CSQ", RESPONSE)
+        self.assertEqual(injector.counters[fault], 1)
+        self.assertEqual(injector.records, [("AT+CSQ", (fault,))])
+        return segments
+
+    def test_profile(self):
+        profile = FaultProfile.from_dict({"rates": {"drop": 0.5}, "late_time": 20})
+        self.assertEqual(profile.rates, {"drop": 0.5})
+        self.assertEqual(profile.late_time, 20)
+        with self.assertRaises(VirtualSerialException):
+            FaultProfile({"meteor": 0.1})
+        with self.assertRaises(VirtualSerialException):
+            FaultProfile({"drop": 1.5})
+
+    def test_inject(self):
+        # No faults
+        injector = FaultInjector(FaultProfile(), seed=0)
+        self.assertEqual(injector.inject("AT", RESPONSE), [(0.0, RESPONSE)])
+        # Corruption
+        segments = self.inject(FAULT_DROP)
+        self.assertEqual(len(segments[0][1]), len(RESPONSE) - 1)
+        segments = self.inject(FAULT_GARBLE)
+        self.assertEqual(len(segments[0][1]), len(RESPONSE))
+        self.assertNotEqual(segments[0][1], RESPONSE)
+        segments = self.inject(FAULT_NON_UTF8)
+        with self.assertRaises(UnicodeDecodeError):
+            segments[0][1].decode("utf-8")
+        # Timing
+        segments = self.inject(FAULT_SPLIT, split_gap=0.1)
+        self.assertEqual(len(segments), 2)
+        self.assertEqual(segments[1][0], 0.1)
+        self.assertEqual(segments[0][1] + segments[1][1], RESPONSE)
+        segments = self.inject(FAULT_STALL, stall_time=3)
+        self.assertEqual(segments[1][0], 3)
+        segments = self.inject(FAULT_LATE, late_time=20)
+        self.assertEqual(segments, [(20, RESPONSE)])
+        segments = self.inject(FAULT_URC, urcs=["RING"])
+        self.assertEqual(segments, [(0.0, b"RING\r\n"), (0.0, RESPONSE)])
+        self.assertEqual(self.inject(FAULT_PORT_LOSS), [])
+        # Split and stall keep the segments in order
+        profile = FaultProfile({FAULT_SPLIT: 1, FAULT_STALL: 1, FAULT_LATE: 1})
+        for seed in range(20):
+            segments = FaultInjector(profile, seed).inject("AT", RESPONSE)
+            self.assertEqual(b"".join([x[1] for x in segments]), RESPONSE)
+            offsets = [x[0] for x in segments]
+            self.assertEqual(offsets, sorted(offsets))
+
+    def test_reproducible(self):
+        profile = FaultProfile({FAULT_DROP: 0.3, FAULT_SPLIT: 0.3, FAULT_URC: 0.3})
+        first = FaultInjector(profile, seed=42)
+        second = FaultInjector(profile, seed=42)
+        for _ in range(50):
+            self.assertEqual(
+                first.inject("AT", RESPONSE), second.inject("AT", RESPONSE)
+            )
+        self.assertEqual(first.records, second.records)
+
+    def test_run(self):
+        clock = VirtualClock()
+        scenario = Scenario([ScenarioRule("AT\\+CSQ", ["+CSQ: 23,99", "", "OK"])])
+        profile = FaultProfile(
+            {FAULT_LATE: 0.2, FAULT_STALL: 0.2, FAULT_SPLIT: 0.2, FAULT_URC: 0.2},
+            late_time=10,
+        )
+        injector = FaultInjector(profile, seed=7)
+        device = VirtualDevice(scenario, clock, faults=injector)
+        self.assertIs(device.faults, injector)
+        atre = ATRuntimeEnvironment(False, clock)
+        atre.configure_virtual_communicator("virtual", 115200, 5, device=device)
+        for _ in range(100):
+            atre.add_command(ATCommand("AT+CSQ", "OK"))
+        responses = atre.run()
+        self.assertEqual(len(responses), 100)
+        report = injector.report(responses)
+        self.assertEqual(report[NO_FAULT]["failures"], 0)
+        self.assertEqual(report[NO_FAULT]["success_rate"], 1)
+        # Late responses make commands time out (and pollute the following ones)
+        self.assertGreaterEqual(report[FAULT_LATE]["max_latency"], 5000)
+        self.assertLess(report[FAULT_LATE]["success_rate"], 1)
+        # Stalls and split lines make the communicator stop reading too early
+        self.assertGreater(report[FAULT_STALL]["failures"], 0)
+        self.assertGreater(report[FAULT_SPLIT]["failures"], 0)
+        for stats in report.values():
+            self.assertAlmostEqual(
+                stats["commands"] * stats["success_rate"],
+                stats["commands"] - stats["failures"],
+            )
+
+    def test_report_join(self):
+        injector = FaultInjector(FaultProfile({FAULT_LATE: 1}))
+        injector.inject("AT+CSQ", RESPONSE)
+        injector.inject("AT+CGMM;+CREG?", RESPONSE)
+        csq = ATResponse(None, [], ATCommand("AT+CSQ", "OK"), 5000)
+        # Never sent to the device
+        ath = ATResponse("OK", ["OK"], ATCommand("ATH", "OK"), 10)
+        cgmm = ATResponse("OK", ["OK"], ATCommand("AT+CGMM", "OK"), 20)
+        creg = ATResponse("OK", ["OK"], ATCommand("AT+CREG?", "OK"), 20)
+        report = injector.report([csq, None, ath, cgmm, creg])
+        self.assertEqual(report[NO_FAULT]["commands"], 1)
+        self.assertEqual(report[NO_FAULT]["max_latency"], 10)
+        # The merged command line was recorded once, for both commands
+        self.assertEqual(report[FAULT_LATE]["commands"], 3)
+        self.assertEqual(report[FAULT_LATE]["failures"], 1)
+
+    def test_port_loss(self):
+        clock = VirtualClock()
+        scenario = Scenario([ScenarioRule("AT", "OK")])
+        injector = FaultInjector(FaultProfile({FAULT_PORT_LOSS: 1}))
+        device = VirtualDevice(scenario, clock, faults=injector)
+        atre = ATRuntimeEnvironment(False, clock)
+        atre.configure_virtual_communicator("virtual", 115200, 5, device=device)
+        atre.add_command(ATCommand("AT", "OK"))
+        with self.assertRaises(ATSerialPortError):
+            atre.run()
+        self.assertTrue(device.port_lost)
+        with self.assertRaises(VirtualSerialException):
+            device.read(1)
+
+
+if __name__ == "__main__":
+    unittest.main()
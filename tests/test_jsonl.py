@@ -0,0 +1,93 @@
+import unittest
+
+import io
+import json
+
+from attila.atre import ATRuntimeEnvironment
+from attila.exceptions import ATRuntimeError, ATSerialPortError
+from attila.jsonl import (
+    JSONLinesWriter,
+    STATUS_CANCELLED,
+    STATUS_ERROR,
+    STATUS_FAILED,
+    STATUS_OK,
+    error_to_record,
+    response_to_record,
+)
+from attila.virtual.scenario import Scenario, ScenarioRule, VirtualDevice
+
+
+class TestJSONLines(unittest.TestCase):
+    """
+    Test JSON Lines records
+    """
+
+    def __init__(self, methodName):
+        super().__init__(methodName)
+
+    def test_records(self):
+        scenario = Scenario(
+            [
+                ScenarioRule("AT\\+CSQ", ["+CSQ: 20,99", "OK"]),
+                ScenarioRule("AT\\+CGMM", ["ERROR"]),
+            ]
+        )
+        atre = ATRuntimeEnvironment(True)
+        atre.configure_virtual_communicator(
+            "virtual", 115200, 1, "\r\n", device=VirtualDevice(scenario, atre.clock)
+        )
+        atre.open_serial()
+        response = atre.exec('AT+CSQ;;OK;;100;;2;;["+CSQ: ?{rssi},"]')
+        record = response_to_record(response, "/dev/ttyUSB0")
+        self.assertEqual(record["command"], "AT+CSQ")
+        self.assertEqual(record["expected"], "OK")
+        self.assertEqual(record["response"], "OK")
+        self.assertEqual(record["full_response"], ["+CSQ: 20,99", "OK"])
+        self.assertEqual(record["collectables"], {"rssi": 20})
+        self.assertEqual(record["timing"]["delay"], 100)
+        self.assertEqual(record["timing"]["timeout"], 2)
+        self.assertEqual(record["timing"]["execution"], response.execution_time)
+        self.assertEqual(record["device"], "/dev/ttyUSB0")
+        self.assertEqual(record["status"], STATUS_OK)
+        # Failed command: the response is in the error raised on abort on failure
+        with self.assertRaises(ATRuntimeError) as context:
+            atre.exec("AT+CGMM;;OK")
+        record = response_to_record(context.exception.response)
+        self.assertEqual(record["status"], STATUS_FAILED)
+        self.assertIsNone(record["response"])
+        self.assertEqual(record["full_response"], ["ERROR"])
+        self.assertEqual(record["collectables"], {})
+        atre.close_serial()
+        # Errors
+        record = error_to_record(ATSerialPortError("Serial port device is closed"))
+        self.assertEqual(record["error"], "Serial port device is closed")
+        self.assertEqual(record["status"], STATUS_ERROR)
+        record = error_to_record("Execution cancelled", STATUS_CANCELLED, "COM1")
+        self.assertEqual(record["error"], "Execution cancelled")
+        self.assertEqual(record["device"], "COM1")
+
+    def test_writer(self):
+        stream = io.BytesIO()
+        writer = JSONLinesWriter(stream, 64)
+        writer.write({"command": "AT", "response": "OK"})
+        # Buffered
+        self.assertEqual(stream.getvalue(), b"")
+        writer.write({"command": "AT+CSQ", "response": "OK", "rssi": "°"})
+        self.assertGreater(len(stream.getvalue()), 0)
+        writer.write({"command": "ATI"})
+        writer.flush()
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(lines[0], b'{"command":"AT","response":"OK"}')
+        self.assertEqual(
+            [json.loads(x)["command"] for x in lines], ["AT", "AT+CSQ", "ATI"]
+        )
+        self.assertEqual(json.loads(lines[1])["rssi"], "°")
+        # Unbuffered
+        stream = io.BytesIO()
+        writer = JSONLinesWriter(stream, 0)
+        writer.write({"command": "AT"})
+        self.assertEqual(stream.getvalue(), b'{"command":"AT"}\n')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,13 +4,14 @@ from os.path import dirname
 
 from attila.atscriptparser import ATScriptParser
 from attila.exceptions import ATScriptNotFound, ATScriptSyntaxError
-from attila.esk import ESK
+from attila.esk import ESK, ESKValue
 
 SCRIPT_1 = "basic_command.ats"
 SCRIPT_2 = "commands_response.ats"
 SCRIPT_3 = "command_complex.ats"
 SCRIPT_4 = "commands_esk.ats"
 SCRIPT_ERR = "errors.ats"
+SCRIPT_PROMPT = "prompt.ats"
 
 
 class TestParser(unittest.TestCase):
@@ -18,6 +19,28 @@ class TestParser(unittest.TestCase):
         super().__init__(methodName)
         self.script_dir = "%s/scripts/" % dirname(__file__)
 
+    def test_payload(self):
+        script_parser = ATScriptParser()
+        commands, esks = script_parser.parse_file(
+            "%s%s" % (self.script_dir, SCRIPT_PROMPT)
+        )
+        self.assertEqual(len(commands), 2)
+        # Payloads are attached to the following command
+        self.assertEqual(len(esks), 1)
+        self.assertEqual(commands[0].payload, "${text}")
+        self.assertEqual(commands[0].terminator, b"\x1a")
+        self.assertEqual(commands[1].payload, b"\x00\xff\r\n\x1a\x7e")
+        self.assertIsNone(commands[1].terminator)
+        # Whitespaces in payloads are preserved
+        commands, esks = script_parser.parse(
+            "PAYLOAD  Hello,\tworld  ${name} \nAT+CMGS=42;;OK"
+        )
+        self.assertEqual(commands[0].payload, " Hello,\tworld  ${name} ")
+        # Payload without command
+        commands, esks = script_parser.parse("PAYLOAD foo")
+        self.assertEqual(len(commands), 0)
+        self.assertIs(esks[0][0].keyword, ESK.PAYLOAD)
+
     def test_file_parser(self):
         """
         Test File parser; files used for tests can be found in scripts/
@@ -471,6 +494,40 @@ class TestParser(unittest.TestCase):
                 % (cmd_index, eskpair.keyword, eskpair.value)
             )
 
+    def test_sub_second_times(self):
+        parser = ATScriptParser()
+        commands, esks = parser.parse(
+            "TIMEOUT 250ms\nAT;;OK;;2.5;;0.05\nATI;;OK;;1s;;20ms"
+        )
+        self.assertEqual(esks[0][0].value, 0.25)
+        self.assertEqual(commands[0].delay, 2.5)
+        self.assertEqual(commands[0].timeout, 0.05)
+        self.assertEqual(commands[1].delay, 1000)
+        self.assertEqual(commands[1].timeout, 0.02)
+
+    def test_iter_parse(self):
+        parser = ATScriptParser()
+        # Items are yielded in order, rows are read one at a time
+        items = parser.iter_parse(iter(["TIMEOUT 5\r\n", "AT;;OK\n", "AT;;OK;;soon\n"]))
+        self.assertIs(next(items).keyword, ESK.TIMEOUT)
+        self.assertEqual(next(items).command, "AT")
+        with self.assertRaises(ATScriptSyntaxError):
+            next(items)
+        # Same result as parse_file
+        path = "%s%s" % (self.script_dir, SCRIPT_4)
+        commands, esks = parser.parse_file(path)
+        items = list(parser.iter_parse_file(path))
+        self.assertEqual(
+            [x.command for x in items if not isinstance(x, ESKValue)],
+            [x.command for x in commands],
+        )
+        self.assertEqual(
+            [x.keyword for x in items if isinstance(x, ESKValue)],
+            [x[0].keyword for x in esks],
+        )
+        with self.assertRaises(ATScriptNotFound):
+            parser.iter_parse_file("/tmp/__attila_missing.ats")
+
     def test_syntax_errors(self):
         parser = ATScriptParser()
         with self.assertRaises(ATScriptSyntaxError):
@@ -485,6 +542,15 @@ class TestParser(unittest.TestCase):
             parser.parse('AT+CGSN;;OK;;5000;;5;;["?{IMEI::^[0-9]{15}$}"')
         with self.assertRaises(ATScriptSyntaxError):  # Invalid collectable syntax
             parser.parse("AT+CGSN;;OK;;5000;;5;;foobar")
+        with self.assertRaises(ATScriptSyntaxError):  # Collectables are not evaluated
+            parser.parse('AT;;OK;;;;;;__import__("os").system("true")')
+        # Errors report the column in the row
+        with self.assertRaises(ATScriptSyntaxError) as err:
+            parser.parse('AT+CSQ;;OK;;;;;;["+CSQ: ?{rssi,"]')
+        self.assertIn("unterminated ?{ at column 25", err.exception.message)
+        with self.assertRaises(ATScriptSyntaxError) as err:
+            parser.parse('AT;;OK;;;;;;["?{x::[0-9}"]')
+        self.assertIn("at column 20", err.exception.message)
         self.assertEqual(parser._ATScriptParser__parse_esk(""), (None, "Empty row"))
         self.assertEqual(parser._ATScriptParser__parse_command(""), (None, "Empty row"))
 
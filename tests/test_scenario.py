@@ -0,0 +1,149 @@
+import unittest
+from random import Random
+from time import time
+
+from os.path import dirname
+
+from attila.atre import ATRuntimeEnvironment
+from attila.clock import VirtualClock
+from attila.virtual.atvirtualcommunicator import ATVirtualCommunicator
+from attila.virtual.exceptions import VirtualSerialException
+from attila.virtual.scenario import (
+    Latency,
+    Scenario,
+    ScenarioRule,
+    ScheduledURC,
+    VirtualDevice,
+)
+
+SCENARIO = "modem.json"
+SCRIPT = "scenario.ats"
+
+
+class TestScenario(unittest.TestCase):
+    """
+    Test virtual device scenario engine
+    """
+
+    def __init__(self, methodName):
+        super().__init__(methodName)
+        self.scenario_dir = "%s/scenarios/" % dirname(__file__)
+        self.script_dir = "%s/scripts/" % dirname(__file__)
+
+    def test_latency(self):
+        rng = Random(0)
+        self.assertEqual(Latency.from_value(None).sample(rng), 0)
+        self.assertEqual(Latency.from_value(0.5).sample(rng), 0.5)
+        uniform = Latency.from_value(
+            {"distribution": "uniform", "min": 0.1, "max": 0.2}
+        )
+        self.assertEqual(uniform.distribution, "uniform")
+        for _ in range(100):
+            sample = uniform.sample(rng)
+            self.assertTrue(0.1 <= sample <= 0.2)
+        # Normal distribution never returns negative latencies
+        normal = Latency("normal", mean=0, stddev=1)
+        for _ in range(100):
+            self.assertGreaterEqual(normal.sample(rng), 0)
+        self.assertGreater(Latency("exponential", mean=1).sample(rng), 0)
+        # Bad cases
+        with self.assertRaises(VirtualSerialException):
+            Latency("pareto")
+        with self.assertRaises(VirtualSerialException):
+            Latency("uniform", min=1)
+        with self.assertRaises(VirtualSerialException):
+            Latency.from_value("fast")
+
+    def test_device(self):
+        clock = VirtualClock()
+        scenario = Scenario(
+            [
+                ScenarioRule("AT", "OK"),
+                ScenarioRule(
+                    "AT\\+CFUN=(\\d)",
+                    ["+CFUN: \\1", "OK"],
+                    next_state="ON",
+                    latency=Latency("fixed", value=1),
+                ),
+            ],
+            urcs=[ScheduledURC("RING", at=10, every=10, state="ON")],
+            echo=True,
+        )
+        device = VirtualDevice(scenario, clock)
+        self.assertIsNone(device.state)
+        device.write(b"AT\r\n")
+        self.assertEqual(device.in_waiting(), 7)
+        self.assertEqual(device.read(-1), b"AT\rOK\r\n")
+        device.write(b"AT+CFUN=1\r")
+        self.assertEqual(device.state, "ON")
+        # Response is not available before latency has elapsed
+        self.assertEqual(device.in_waiting(), 0)
+        clock.advance(1)
+        self.assertEqual(device.read(64), b"AT+CFUN=1\r+CFUN: 1\r\nOK\r\n")
+        # Unknown command written without line break
+        device.write(b"AT+FOO")
+        self.assertEqual(device.read(64), b"AT+FOO\rERROR\r\n")
+        # URCs
+        clock.advance(20)
+        self.assertEqual(device.read(64), b"RING\r\nRING\r\n")
+        device.state = "OFF"
+        clock.advance(10)
+        self.assertEqual(device.in_waiting(), 0)
+        device.write(b"AT\r")
+        device.reset_input_buffer()
+        self.assertEqual(device.in_waiting(), 0)
+
+    def test_load(self):
+        scenario = Scenario.from_file("%s%s" % (self.scenario_dir, SCENARIO))
+        self.assertEqual(scenario.initial_state, "PIN")
+        self.assertEqual(len(scenario.rules), 6)
+        with self.assertRaises(VirtualSerialException):
+            Scenario.from_file("%s/unexisting.json" % self.scenario_dir)
+        with self.assertRaises(VirtualSerialException):
+            Scenario.from_dict({"rules": [{"response": "OK"}]})
+        with self.assertRaises(VirtualSerialException):
+            Scenario.from_dict({"rules": [{"command": "AT("}]})
+        with self.assertRaises(VirtualSerialException):
+            Scenario.from_dict({"urcs": [{"at": 5}]})
+
+    def test_run(self):
+        clock = VirtualClock()
+        scenario = Scenario.from_file("%s%s" % (self.scenario_dir, SCENARIO))
+        device = VirtualDevice(scenario, clock, seed=1)
+        atre = ATRuntimeEnvironment(True, clock)
+        atre.configure_virtual_communicator(
+            "virtualAdapter", 115200, 10, "\r\n", device=device
+        )
+        atre.parse_ATScript("%s%s" % (self.script_dir, SCRIPT))
+        responses = atre.run()
+        self.assertEqual(device.state, "READY")
+        self.assertEqual(len(responses), 6)
+        self.assertIsNone(responses[1].response)
+        self.assertEqual(responses[2].command.command, "AT+CPIN=1234")
+        self.assertGreaterEqual(responses[2].execution_time, 200)
+        self.assertEqual(responses[3].response, "READY")
+        self.assertEqual(atre.get_session_value("rssi"), 23)
+        self.assertEqual(atre.get_session_value("IMEI"), 356938035643809)
+        self.assertGreaterEqual(responses[5].execution_time, 100)
+
+    def test_fleet(self):
+        # Many devices sharing the same scenario in the same process
+        clock = VirtualClock()
+        scenario = Scenario.from_file("%s%s" % (self.scenario_dir, SCENARIO))
+        t_start = time()
+        for i in range(200):
+            device = VirtualDevice(scenario, clock, seed=i)
+            com = ATVirtualCommunicator("modem%d" % i, 115200, 5, device=device)
+            self.assertIs(com.clock, clock)
+            com.open()
+            lines, _ = com.exec("AT+CPIN=0000")
+            self.assertEqual(lines, ["OK"])
+            lines, _ = com.exec("AT+CSQ")
+            self.assertEqual(lines, ["+CSQ: 23,99", "", "OK"])
+            com.close()
+            self.assertEqual(device.state, "READY")
+        self.assertLess(time() - t_start, 30)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+
+import os
+import shutil
+from os.path import dirname
+from tempfile import TemporaryDirectory
+
+from attila.__main__ import compile_main
+from attila.atscriptparser import ATScriptParser
+from attila.exceptions import ATScriptNotFound, ATScriptSyntaxError
+from attila.scriptcache import ScriptCache, get_default_cache_dir
+
+SCRIPT = "commands_esk.ats"
+
+
+def dump(result) -> tuple:
+    commands, esks = result
+    return (
+        [
+            (
+                x.command,
+                x.expected_response,
+                x.timeout,
+                x.delay,
+                x.collectables,
+                x.doppel_ganger.command if x.doppel_ganger else None,
+                x.payload,
+                x.terminator,
+            )
+            for x in commands
+        ],
+        [(esk.keyword, esk.value, index) for esk, index in esks],
+    )
+
+
+class TestScriptCache(unittest.TestCase):
+    """
+    Test compiled script cache
+    """
+
+    def __init__(self, methodName):
+        super().__init__(methodName)
+        self.script_dir = "%s/scripts/" % dirname(__file__)
+
+    def test_cache(self):
+        with TemporaryDirectory() as tmp_dir:
+            script = os.path.join(tmp_dir, SCRIPT)
+            shutil.copy("%s%s" % (self.script_dir, SCRIPT), script)
+            cache = ScriptCache(os.path.join(tmp_dir, "cache"))
+            parser = ATScriptParser(cache)
+            with open(script, "rb") as hnd:
+                content = hnd.read()
+            self.assertIsNone(cache.load(script, content))
+            # Compiled on first parse, then loaded
+            expected = dump(ATScriptParser().parse_file(script))
+            self.assertEqual(dump(parser.parse_file(script)), expected)
+            self.assertTrue(os.path.isfile(cache.get_compiled_path(script)))
+            loaded = cache.load(script, content)
+            self.assertIsNotNone(loaded)
+            self.assertEqual(dump(loaded), expected)
+            # Loaded commands are new objects
+            loaded[0][0].command = "ATZ"
+            self.assertEqual(dump(parser.parse_file(script)), expected)
+            # Changed script
+            with open(script, "a") as hnd:
+                hnd.write("ATI;;OK\n")
+            with open(script, "rb") as hnd:
+                content = hnd.read()
+            self.assertIsNone(cache.load(script, content))
+            self.assertEqual(parser.parse_file(script)[0][-1].command, "ATI")
+            # Corrupted compiled script
+            with open(cache.get_compiled_path(script), "wb") as hnd:
+                hnd.write(b"\x00garbage")
+            self.assertIsNone(cache.load(script, content))
+            self.assertEqual(parser.parse_file(script)[0][-1].command, "ATI")
+            # Errors
+            with self.assertRaises(ATScriptNotFound):
+                parser.parse_file(os.path.join(tmp_dir, "missing.ats"))
+            bad_script = os.path.join(tmp_dir, "bad.ats")
+            with open(bad_script, "w") as hnd:
+                hnd.write("AT;;OK;;soon\n")
+            with self.assertRaises(ATScriptSyntaxError):
+                parser.parse_file(bad_script)
+            # A cache directory which can't be written is ignored
+            not_a_dir = os.path.join(tmp_dir, "file")
+            with open(not_a_dir, "w") as hnd:
+                hnd.write("")
+            parser = ATScriptParser(ScriptCache(os.path.join(not_a_dir, "cache")))
+            self.assertEqual(parser.parse_file(script)[0][-1].command, "ATI")
+
+    def test_compile(self):
+        with TemporaryDirectory() as tmp_dir:
+            cache_dir = os.path.join(tmp_dir, "cache")
+            script = "%s%s" % (self.script_dir, SCRIPT)
+            self.assertEqual(compile_main(["-c", cache_dir, script]), 0)
+            cache = ScriptCache(cache_dir)
+            with open(script, "rb") as hnd:
+                self.assertIsNotNone(cache.load(script, hnd.read()))
+            self.assertEqual(
+                compile_main(["-c", cache_dir, os.path.join(tmp_dir, "missing")]), 1
+            )
+        environ = {
+            x: os.environ.pop(x, None) for x in ("ATTILA_CACHE_DIR", "XDG_CACHE_HOME")
+        }
+        try:
+            os.environ["XDG_CACHE_HOME"] = "/tmp/cache"
+            self.assertEqual(get_default_cache_dir(), "/tmp/cache/attila/scripts")
+            os.environ["ATTILA_CACHE_DIR"] = "/tmp/attila"
+            self.assertEqual(get_default_cache_dir(), "/tmp/attila")
+        finally:
+            for key, value in environ.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+
+if __name__ == "__main__":
+    unittest.main()
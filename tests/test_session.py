@@ -2,6 +2,7 @@ import unittest
 
 from attila.atsession import ATSession
 from attila.atcommand import ATCommand
+from attila.collectables import get_collectable
 
 
 class TestSession(unittest.TestCase):
@@ -359,11 +360,48 @@ class TestSession(unittest.TestCase):
         Test particular cases
         """
         session = ATSession([])
-        self.assertIsNone(session._ATSession__get_value_from_response("", ["OK"]))
-        self.assertIsNotNone(
-            session._ATSession__get_value_from_response("?{value}", ["123456", "OK"])
+        self.assertIsNone(get_collectable(""))
+        self.assertEqual(
+            get_collectable("?{value}").extract(
+                ["123456", "OK"], session.replace_session_keys
+            ),
+            ("value", 123456),
         )
 
+    def test_raw_response(self):
+        """
+        Test validation of responses made up of bytes
+        """
+        session = ATSession([])
+        session.add_command(
+            ATCommand(
+                "AT+CSQ",
+                "OK",
+                collectables=["+CSQ: ?{rssi},", "+CSQ: ${rssi},?{ber::[0-9]{2}}"],
+            )
+        )
+        session.add_command(ATCommand("AT+COPS?", "OPERATOR", dganger=ATCommand("AT")))
+        session.add_command(
+            ATCommand("AT+CGSN", "OK", collectables=["?{IMEI::^[0-9]{15}$}"])
+        )
+        session.get_next_command()
+        response = session.validate_response(
+            [b"\xfe+CSQ: 23,99", b"", b"OK"], 100, "utf-8", "replace"
+        )
+        self.assertFalse(session.last_command_failed)
+        self.assertEqual(response.response, "OK")
+        self.assertEqual(response.get_collectable("rssi"), 23)
+        self.assertEqual(response.get_collectable("ber"), 99)
+        self.assertEqual(response.full_response[0], "\ufffd+CSQ: 23,99")
+        session.get_next_command()
+        session.validate_response([b"+COPS: 0", b"OK"], 100)
+        self.assertTrue(session.last_command_failed)
+        self.assertEqual(session.get_next_command().command, "AT")
+        session.validate_response([b"OK"], 100)
+        session.get_next_command()
+        response = session.validate_response([b"356938035643809", b"OK"], 100)
+        self.assertEqual(session.get_session_value("IMEI"), 356938035643809)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,169 @@
+import unittest
+
+import io
+import os
+import tempfile
+
+from attila.atre import ATRuntimeEnvironment
+from attila.esk import ESK
+from attila.exceptions import ATRuntimeError
+from attila.sideeffects import SideEffectExecutor
+from attila.virtual.scenario import Scenario, ScenarioRule, VirtualDevice
+
+
+class TestSideEffects(unittest.TestCase):
+    """
+    Test side effect ESKs executed in background
+    """
+
+    def __init__(self, methodName):
+        super().__init__(methodName)
+
+    def test_executor(self):
+        output = io.StringIO()
+        executor = SideEffectExecutor(output)
+        # Nothing to wait for
+        self.assertEqual(executor.barrier(), ([], True))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, "rssi")
+            futures = [
+                executor.print("first"),
+                executor.write(file_path, "10"),
+                executor.print("second"),
+                executor.exec("cat %s > %s.copy" % (file_path, file_path)),
+                executor.write(file_path, "20"),
+                executor.write(file_path, "30"),
+                executor.exec("exit 3"),
+                executor.print("third"),
+            ]
+            results, completed = executor.barrier(5)
+            self.assertTrue(completed)
+            self.assertEqual(executor.pending, 0)
+            # Completed in order
+            self.assertEqual([x.result() for x in futures], results)
+            self.assertEqual(
+                [x.keyword for x in results],
+                [
+                    ESK.PRINT,
+                    ESK.WRITE,
+                    ESK.PRINT,
+                    ESK.EXEC,
+                    ESK.WRITE,
+                    ESK.WRITE,
+                    ESK.EXEC,
+                    ESK.PRINT,
+                ],
+            )
+            self.assertEqual(output.getvalue(), "first\nsecond\nthird\n")
+            # The shell command read the file written before it
+            with open("%s.copy" % file_path) as hnd:
+                self.assertEqual(hnd.read(), "10")
+            with open(file_path) as hnd:
+                self.assertEqual(hnd.read(), "30")
+            self.assertEqual(results[3].exit_status, 0)
+            self.assertTrue(results[3].succeeded)
+            self.assertEqual(results[6].exit_status, 3)
+            self.assertFalse(results[6].succeeded)
+            # Write errors
+            executor.write(os.path.join(tmp_dir, "missing", "file"), "1")
+            results, completed = executor.barrier(5)
+            self.assertTrue(completed)
+            self.assertIsNotNone(results[0].error)
+            self.assertFalse(results[0].succeeded)
+
+    def test_errors(self):
+        class BrokenStream(io.StringIO):
+            def write(self, text: str) -> int:
+                return len(text.encode("ascii"))
+
+        executor = SideEffectExecutor(BrokenStream())
+        executor.print("città")
+        executor.exec("echo \x00")
+        executor.write("/tmp/\x00", "1")
+        executor.exec("exit 0")
+        results, completed = executor.barrier(5)
+        # The worker survives: every side effect completes
+        self.assertTrue(completed)
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(x.error for x in results[:3]))
+        self.assertEqual(results[3].exit_status, 0)
+        self.assertTrue(results[3].succeeded)
+        # Cancelled by the caller
+        future = executor.exec("sleep 0.2")
+        executor.print("cancelled").cancel()
+        results, completed = executor.barrier(5)
+        self.assertTrue(completed)
+        self.assertEqual(results, [future.result()])
+
+    def test_barrier_timeout(self):
+        output = io.StringIO()
+        executor = SideEffectExecutor(output)
+        executor.print("before")
+        executor.exec("sleep 0.3")
+        executor.print("after")
+        # Only the side effects completed before the slow command are collected
+        results, completed = executor.barrier(0.1)
+        self.assertFalse(completed)
+        self.assertEqual([x.value for x in results], ["before"])
+        self.assertEqual(executor.pending, 2)
+        results, completed = executor.barrier(5)
+        self.assertTrue(completed)
+        self.assertEqual([x.value for x in results], ["sleep 0.3", "after"])
+
+    def test_atscript(self):
+        atre = self.__make_atre()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, "rssi")
+            script = os.path.join(tmp_dir, "script.ats")
+            self.__write_script(
+                script,
+                [
+                    "ASYNC True",
+                    'AT+CSQ;;OK;;;;;;["+CSQ: ?{rssi},"]',
+                    "WRITE %s ${rssi}" % file_path,
+                    "EXEC sleep 0.2",
+                    "AT;;OK",
+                    "BARRIER 5",
+                    "AT;;OK",
+                ],
+            )
+            atre.parse_ATScript(script)
+            atre.run()
+            self.assertTrue(atre.async_side_effects)
+            self.assertEqual(
+                [x.keyword for x in atre.side_effect_results], [ESK.WRITE, ESK.EXEC]
+            )
+            with open(file_path) as hnd:
+                self.assertEqual(hnd.read(), "20")
+            # A failed shell command fails the barrier
+            self.__write_script(script, ["EXEC exit 1", "AT;;OK", "BARRIER", "AT;;OK"])
+            atre = self.__make_atre(True)
+            atre.parse_ATScript(script)
+            with self.assertRaises(ATRuntimeError):
+                atre.run()
+            self.assertEqual(atre.side_effect_results[0].exit_status, 1)
+            # Waited at the end of the run (same runtime environment)
+            self.__write_script(script, ["AT;;OK", "WRITE %s 99" % file_path, "AT;;OK"])
+            atre.parse_ATScript(script)
+            atre.run()
+            self.assertEqual(len(atre.side_effect_results), 1)
+            with open(file_path) as hnd:
+                self.assertEqual(hnd.read(), "99")
+
+    def __make_atre(self, async_side_effects: bool = False) -> ATRuntimeEnvironment:
+        scenario = Scenario(
+            [ScenarioRule("AT\\+CSQ", ["+CSQ: 20,99", "OK"]), ScenarioRule("AT", "OK")]
+        )
+        atre = ATRuntimeEnvironment(True, async_side_effects=async_side_effects)
+        atre.configure_virtual_communicator(
+            "virtual", 115200, 1, "\r\n", device=VirtualDevice(scenario, atre.clock)
+        )
+        return atre
+
+    def __write_script(self, script: str, rows: list):
+        with open(script, "w") as hnd:
+            hnd.write("\n".join(rows))
+
+
+if __name__ == "__main__":
+    unittest.main()
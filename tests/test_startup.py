@@ -0,0 +1,63 @@
+import unittest
+
+import subprocess
+import sys
+from os.path import abspath, dirname
+
+# Modules which must not be loaded to parse the CLI options
+LAZY_MODULES = [
+    "serial",
+    "attila.atre",
+    "attila.adaptive",
+    "attila.cmux",
+    "attila.datamode",
+    "attila.discovery",
+    "attila.virtual",
+    "json",
+]
+# Modules needed to run a script, loaded by the CLI once the options are valid
+CLI_LAZY_MODULES = [
+    "attila.atscriptparser",
+    "attila.scriptcache",
+    "attila.cancel",
+    "hashlib",
+    "logging",
+]
+
+
+class TestStartup(unittest.TestCase):
+    """
+    Test modules loaded by the CLI at startup
+    """
+
+    def __init__(self, methodName):
+        super().__init__(methodName)
+        self.root = dirname(dirname(abspath(__file__)))
+
+    def get_loaded_modules(self, code: str) -> list:
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "%s\nimport sys\nprint('\\n'.join(sys.modules))" % code,
+            ],
+            cwd=self.root,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+            check=True,
+        )
+        return result.stdout.splitlines()
+
+    def test_cli_imports(self):
+        modules = self.get_loaded_modules("import attila.__main__")
+        for module in LAZY_MODULES + CLI_LAZY_MODULES:
+            self.assertNotIn(module, modules)
+        # Runtime environment doesn't load the backends until they are configured
+        modules = self.get_loaded_modules("import attila.atre")
+        self.assertIn("serial", modules)
+        for module in LAZY_MODULES[2:]:
+            self.assertNotIn(module, modules)
+
+
+if __name__ == "__main__":
+    unittest.main()